@@ -0,0 +1,245 @@
+"""
+Binary (length-prefixed msgpack) server for the Node.js backend
+Serves recommend / predict / batch from the same model registry as the
+HTTP API, over a Unix socket and/or TCP with persistent connections
+
+Usage:
+    python -m api.binary_server --unix /tmp/smartbottle.sock
+    python -m api.binary_server --host 0.0.0.0 --port 8001
+"""
+import argparse
+import asyncio
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from api.services.registry import ModelRegistry
+from api.services.binary_protocol import (
+    HEADER,
+    MAX_FRAME_BYTES,
+    ProtocolError,
+    encode_ranking,
+    pack_frame,
+    unpack_payload,
+    validate_profile,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BinaryServer:
+    """
+    Asyncio server answering protocol frames
+
+    Each request is handled as its own task, so a slow batch does not hold
+    up other requests on the connection. Single-profile recommends go
+    through the registry's micro-batcher when enabled.
+    """
+
+    def __init__(self, registry: ModelRegistry):
+        """
+        Initialize server
+
+        Args:
+            registry: Model registry to serve from
+        """
+        self.registry = registry
+        self.connections = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read frames until the peer disconnects"""
+        self.connections += 1
+        tasks = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                (length,) = HEADER.unpack(header)
+                if length > MAX_FRAME_BYTES:
+                    writer.write(pack_frame({"id": None, "ok": False, "code": 413, "error": "Frame too large"}))
+                    await writer.drain()
+                    break
+                payload = await reader.readexactly(length)
+
+                task = asyncio.create_task(self.handle_frame(payload, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.connections -= 1
+            writer.close()
+
+    async def handle_frame(self, payload: bytes, writer: asyncio.StreamWriter):
+        """Answer one request frame"""
+        request_id = None
+        try:
+            request = unpack_payload(payload)
+            request_id = request.get("id")
+            result = await self.dispatch(request)
+            response = {"id": request_id, "ok": True, "result": result}
+        except ProtocolError as e:
+            response = {"id": request_id, "ok": False, "code": e.code, "error": str(e)}
+        except ValueError as e:
+            response = {"id": request_id, "ok": False, "code": 400, "error": str(e)}
+        except Exception as e:
+            logger.error(f"Error handling binary request: {e}")
+            response = {"id": request_id, "ok": False, "code": 500, "error": str(e)}
+
+        try:
+            frame = pack_frame(response)
+        except ProtocolError as e:
+            # Result too large for one frame: the caller still gets an answer
+            frame = pack_frame({"id": request_id, "ok": False, "code": e.code, "error": str(e)})
+        except Exception as e:
+            logger.error(f"Error encoding binary response: {e}")
+            frame = pack_frame({"id": request_id, "ok": False, "code": 500, "error": str(e)})
+
+        if not writer.is_closing():
+            writer.write(frame)
+            await writer.drain()
+
+    def _recommender(self, request: Dict):
+        """Route a request to a model"""
+        try:
+            return self.registry.route(request.get("model_version"), request.get("routing_key"))
+        except KeyError as e:
+            raise ProtocolError(str(e.args[0]))
+
+    async def dispatch(self, request: Dict):
+        """Run one operation"""
+        op = request.get("op")
+        loop = asyncio.get_running_loop()
+
+        if op == "ping":
+            return "pong"
+
+        if op == "formulas":
+            rec = self.registry.default
+            return rec.catalog.records()
+
+        started = time.perf_counter()
+
+        top_n = int(request.get("top_n", 3))
+        min_good_prob = float(request.get("min_good_prob", 0.3))
+        use_symptoms = bool(request.get("use_symptoms", False))
+        include_all = bool(request.get("include_all", False))
+
+        if op == "recommend":
+            rec = self._recommender(request)
+            profile = validate_profile(request.get("profile"))
+            batcher = self.registry.batcher(rec)
+            if batcher is not None:
+                ranking = await batcher.rank(profile, top_n=top_n, min_good_prob=min_good_prob, use_symptoms=use_symptoms)
+            else:
+                ranking = await loop.run_in_executor(
+                    None, lambda: rec.rank(profile, top_n=top_n, min_good_prob=min_good_prob, use_symptoms=use_symptoms)
+                )
+            self.registry.shadow(rec, [profile], [ranking], top_n, min_good_prob, use_symptoms)
+            self.registry.log("binary/recommend", rec, [profile], [ranking], started)
+            return encode_ranking(ranking, rec.model_version, include_all=include_all)
+
+        if op == "batch":
+            rec = self._recommender(request)
+            raw_profiles = request.get("profiles")
+            if not isinstance(raw_profiles, list) or not raw_profiles:
+                raise ProtocolError("profiles must be a non-empty list")
+            profiles = [validate_profile(p) for p in raw_profiles]
+            rankings = await loop.run_in_executor(
+                None, lambda: rec.rank_batch(profiles, top_n=top_n, min_good_prob=min_good_prob, use_symptoms=use_symptoms)
+            )
+            self.registry.shadow(rec, profiles, rankings, top_n, min_good_prob, use_symptoms)
+            self.registry.log("binary/batch", rec, profiles, rankings, started)
+            return {
+                "model_version": rec.model_version,
+                "results": [
+                    encode_ranking(ranking, rec.model_version, include_all=include_all)
+                    for ranking in rankings
+                ],
+            }
+
+        if op == "predict":
+            rec = self._recommender(request)
+            profile = validate_profile(request.get("profile"))
+            formula_id = request.get("formula_id")
+            if not isinstance(formula_id, int) or isinstance(formula_id, bool) or formula_id not in rec.catalog:
+                raise ProtocolError(f"Formula ID {formula_id} not found", code=404)
+            result = await loop.run_in_executor(None, lambda: rec.predict_single(profile, formula_id))
+            self.registry.log_prediction("binary/predict", rec, profile, result, started)
+            return {"model_version": rec.model_version, **result}
+
+        raise ProtocolError(f"Unknown op: {op}")
+
+
+async def serve(
+    registry: ModelRegistry,
+    unix_path: Optional[str] = None,
+    host: Optional[str] = None,
+    port: Optional[int] = None
+):
+    """
+    Run the server until cancelled
+
+    Args:
+        registry: Model registry
+        unix_path: Unix socket path (optional)
+        host: TCP bind address (optional)
+        port: TCP port (optional)
+    """
+    server = BinaryServer(registry)
+    servers = []
+
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        servers.append(await asyncio.start_unix_server(server.handle_connection, path=unix_path))
+        logger.info(f"Binary protocol listening on unix:{unix_path}")
+    if port:
+        servers.append(await asyncio.start_server(server.handle_connection, host=host or "0.0.0.0", port=port))
+        logger.info(f"Binary protocol listening on {host or '0.0.0.0'}:{port}")
+    if not servers:
+        raise ValueError("Give a Unix socket path and/or a TCP port")
+
+    try:
+        await asyncio.gather(*(s.serve_forever() for s in servers))
+    finally:
+        registry.shutdown(wait=False)
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Length-prefixed msgpack recommendation server")
+    parser.add_argument("--unix", default=os.getenv("BINARY_SOCKET_PATH") or None, help="Unix socket path")
+    parser.add_argument("--host", default=os.getenv("BINARY_HOST", "0.0.0.0"), help="TCP bind address")
+    parser.add_argument("--port", type=int, default=int(os.getenv("BINARY_PORT", "0")) or None, help="TCP port")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Start the binary server from the command line"""
+    args = parse_args(argv)
+    registry = ModelRegistry.from_env()
+    try:
+        asyncio.run(serve(registry, unix_path=args.unix, host=args.host, port=args.port))
+    except KeyboardInterrupt:
+        logger.info("Binary server stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -2,7 +2,7 @@
 Smart Bottle Formula Recommendation API
 FastAPI application entry point
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from pathlib import Path
@@ -11,7 +11,9 @@ import sys
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from api.routers import recommendation
+from api.routers import anomaly, growth, recommendation
+from api.services import prediction_log
+from api.services.drift import prometheus_text
 
 # Configure logging
 logging.basicConfig(
@@ -40,6 +42,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(recommendation.router)
+app.include_router(anomaly.router)
+app.include_router(growth.router)
 
 
 @app.on_event("startup")
@@ -48,12 +52,12 @@ async def startup_event():
     logger.info("Starting Smart Bottle Formula Recommender API...")
     logger.info("Loading model...")
 
-    # Pre-load the recommender to reduce first request latency
-    from api.services.recommender import FormulaRecommender
+    # Pre-load the model registry to reduce first request latency
     try:
-        rec = FormulaRecommender()
-        logger.info(f"Model loaded: {rec.model_version}")
-        logger.info(f"Available formulas: {len(rec.formula_df)}")
+        registry = recommendation.get_registry()
+        rec = registry.default
+        logger.info(f"Models loaded: {list(registry.models)} (default: {rec.model_version})")
+        logger.info(f"Available formulas: {len(rec.catalog)}")
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
         raise
@@ -65,6 +69,8 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Smart Bottle Formula Recommender API...")
+    if recommendation.registry is not None:
+        recommendation.registry.shutdown(wait=False)
 
 
 @app.get("/")
@@ -84,13 +90,14 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Check if model is loaded
-        from api.services.recommender import FormulaRecommender
-        rec = FormulaRecommender()
+        registry = recommendation.get_registry()
+        rec = registry.default
 
         return {
             "status": "healthy",
             "model": rec.model_version,
-            "formulas": len(rec.formula_df)
+            "models": list(registry.models),
+            "formulas": len(rec.catalog)
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -100,6 +107,32 @@ async def health_check():
         }
 
 
+@app.get("/metrics")
+async def metrics(format: str = "prometheus"):
+    """
+    Drift of served profiles and predicted class mix vs training data,
+    and prediction log counters
+
+    Args:
+        format: "prometheus" (text exposition) or "json"
+    """
+    registry = recommendation.get_registry()
+    monitors = {name: rec.drift for name, rec in registry.models.items() if rec.drift is not None}
+    log_stats = registry.prediction_log.stats() if registry.prediction_log is not None else None
+
+    if format == "json":
+        # Models nested under their own key: a model file stem may be any name
+        return {
+            "models": {name: monitor.scores() for name, monitor in monitors.items()},
+            "prediction_log": log_stats,
+        }
+
+    text = prometheus_text(monitors)
+    if log_stats is not None:
+        text += prediction_log.prometheus_text(log_stats)
+    return Response(content=text, media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
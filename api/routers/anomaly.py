@@ -0,0 +1,125 @@
+"""
+Feeding anomaly detection API router
+"""
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from ..schemas.feeding import AnomalyResponse, FeedingRecord
+from ..services.anomaly import DEFAULT_STATE_PATH, METRICS, FeedingAnomalyDetector
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1", tags=["anomaly"])
+
+# Detector (singleton, per worker process). The stream job is the single
+# writer of the statistics; workers reload its state file when it changes.
+detector = None
+_state_mtime: Optional[int] = None
+_checked_at = 0.0
+
+
+def get_detector() -> FeedingAnomalyDetector:
+    """
+    Get the anomaly detector, reloading the stream job's state when the
+    state file changed (checked at most every ANOMALY_RELOAD_SECONDS)
+    """
+    global detector, _state_mtime, _checked_at
+    now = time.monotonic()
+    if detector is not None and now - _checked_at < float(os.getenv("ANOMALY_RELOAD_SECONDS", "30")):
+        return detector
+    _checked_at = now
+
+    state_path = os.getenv("ANOMALY_STATE_PATH", DEFAULT_STATE_PATH)
+    mtime = os.stat(state_path).st_mtime_ns if os.path.exists(state_path) else None
+    if detector is None:
+        detector = FeedingAnomalyDetector.from_env()
+    elif mtime is not None and mtime != _state_mtime:
+        detector = FeedingAnomalyDetector.load(state_path, forest=detector.forest)
+        logger.info(f"Anomaly state reloaded from {state_path} (mark {detector.mark})")
+    _state_mtime = mtime
+    return detector
+
+
+@router.post("/anomaly/feedings", response_model=AnomalyResponse)
+async def score_feedings(records: List[FeedingRecord], update: bool = False):
+    """
+    Score feeding records against each baby's running statistics
+
+    The statistics are the stream job's saved state, so every worker
+    scores against the same baseline.
+
+    Args:
+        records: Feeding records (any order; each baby's are scored in time order)
+        update: Also fold the records into this worker's copy of the
+            statistics (default: False); the copy is replaced at the next
+            state reload and never saved
+
+    Returns:
+        Per-record anomaly flag, score, z-scores and reasons
+    """
+    if not records:
+        return {"status": "success", "count": 0, "anomalies": 0, "results": []}
+
+    try:
+        frame = pd.DataFrame([record.dict() for record in records])
+        scored = get_detector().score(frame, update=update)
+    except Exception as e:
+        logger.error(f"Error in anomaly endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    z = scored[[f"z_{name}" for name in METRICS]].to_numpy()
+    z = np.where(np.isnan(z), None, np.round(z, 4))
+    forest = scored["forest_score"].tolist() if "forest_score" in scored else [None] * len(scored)
+    results = [
+        {
+            "feeding_id": None if pd.isna(feeding_id) else int(feeding_id),
+            "baby_id": int(baby_id),
+            "is_anomaly": bool(flag),
+            "anomaly_score": float(score),
+            "z_scores": dict(zip(METRICS, row)),
+            "forest_score": forest_score,
+            "reasons": reasons,
+        }
+        for feeding_id, baby_id, flag, score, row, forest_score, reasons in zip(
+            scored["feeding_id"], scored["baby_id"], scored["is_anomaly"],
+            scored["anomaly_score"], z.tolist(), forest, scored["reasons"]
+        )
+    ]
+    flagged = int(scored["is_anomaly"].sum())
+    if flagged:
+        logger.info(f"{flagged} of {len(records)} feedings flagged as anomalous")
+
+    return {"status": "success", "count": len(results), "anomalies": flagged, "results": results}
+
+
+@router.get("/anomaly/baby/{baby_id}")
+async def get_baby_statistics(baby_id: int):
+    """
+    Running feeding statistics of a baby
+
+    Args:
+        baby_id: Baby identifier
+
+    Returns:
+        Count, mean and standard deviation per metric
+    """
+    stats = get_detector().baby_stats(baby_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No feedings seen for baby {baby_id}")
+    return {"status": "success", "baby_id": baby_id, "statistics": stats}
+
+
+@router.get("/anomaly/stats")
+async def get_detector_stats():
+    """
+    Anomaly detector settings and counters
+
+    Returns:
+        Babies tracked, records seen, anomalies and settings
+    """
+    return {"status": "success", **get_detector().stats()}
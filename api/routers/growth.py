@@ -0,0 +1,129 @@
+"""
+Growth forecast API router
+"""
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import Dict, List, Optional, Tuple
+import logging
+import time
+import pandas as pd
+
+from ..schemas.baby import BabyProfile
+from ..schemas.growth import GrowthForecastRequest, GrowthForecastResponse
+from ..services.growth import MEASURES, fit_growth, forecast, projected_profiles, who_percentile
+from .recommendation import get_recommender, get_registry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/v1", tags=["growth"])
+
+
+def _forecast(request: GrowthForecastRequest) -> Tuple[Dict, Dict, List[Dict]]:
+    """
+    Fit the baby's trend and project it
+
+    Returns:
+        (Current profile dict, current percentiles, forecast rows with
+        projected_profile)
+    """
+    baby_dict = request.baby_profile.dict()
+    history = pd.DataFrame(
+        [m.dict() for m in request.measurements] + [baby_dict],
+        columns=["age_month", *MEASURES],
+    ).assign(baby_id=0, sex=baby_dict["sex"])
+    trends = fit_growth(history)
+    for column in ("allergy_risk", "lactose_sensitivity", "feed_ml_per_intake"):
+        trends[column] = baby_dict[column]
+
+    female = baby_dict["sex"] == "F"
+    current = {
+        f"{measure}_percentile": float(who_percentile(measure, female, baby_dict["age_month"], baby_dict[measure]))
+        for measure in MEASURES
+    }
+
+    projected = forecast(trends, request.horizon_months)
+    profiles = projected_profiles(trends, projected).drop(columns=["baby_id", "horizon_months"])
+    forecasts = [
+        {
+            **{key: float(value) for key, value in row.items() if key != "baby_id"},
+            "projected_profile": BabyProfile(**profile, baby_id=baby_dict.get("baby_id")).dict(),
+        }
+        for row, profile in zip(projected.to_dict("records"), profiles.to_dict("records"))
+    ]
+    return baby_dict, current, forecasts
+
+
+@router.post("/growth/forecast", response_model=GrowthForecastResponse)
+async def forecast_growth(request: GrowthForecastRequest):
+    """
+    Project a baby's weight and height
+
+    The current profile is the latest measurement; earlier measurements
+    set the trend of the baby's WHO percentile (see api/services/growth.py).
+
+    Args:
+        request: Current profile, earlier measurements, horizons
+
+    Returns:
+        Current percentiles and, per horizon within 36 months, projected
+        measurements, percentiles and BabyProfile
+    """
+    try:
+        baby_dict, current, forecasts = _forecast(request)
+    except Exception as e:
+        logger.error(f"Error in growth forecast endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "status": "success",
+        "baby_profile": baby_dict,
+        "current_percentiles": current,
+        "forecasts": forecasts,
+    }
+
+
+@router.post("/growth/recommend")
+async def recommend_for_projected_growth(
+    request: GrowthForecastRequest,
+    top_n: int = 3,
+    min_good_prob: float = 0.3,
+    include_all: bool = False,
+    x_model_version: Optional[str] = Header(None),
+    x_routing_key: Optional[str] = Header(None)
+):
+    """
+    Recommend formulas for the baby's projected profiles
+
+    Every horizon's projected BabyProfile is scored in one batch call;
+    the response has the /recommend/batch shape, one result per horizon.
+
+    Args:
+        request: Current profile, earlier measurements, horizons
+        top_n: Number of top recommendations per horizon (default: 3)
+        min_good_prob: Minimum good probability threshold (default: 0.3)
+        include_all: Include all_formulas for each horizon (default: False)
+        x_model_version: Serve with this model version
+        x_routing_key: Caller key for sticky traffic split
+
+    Returns:
+        Batch recommendation response for the projected profiles
+    """
+    started = time.perf_counter()
+    rec_engine = get_recommender(x_model_version, x_routing_key)
+
+    try:
+        _, _, forecasts = _forecast(request)
+        if not forecasts:
+            raise HTTPException(status_code=400, detail="No horizon within the 36-month profile range")
+        baby_dicts = [f["projected_profile"] for f in forecasts]
+
+        rankings = rec_engine.rank_batch(baby_dicts, top_n=top_n, min_good_prob=min_good_prob)
+        body = rec_engine.encoder.encode_batch_response(baby_dicts, rankings, include_all=include_all)
+
+        get_registry().log("growth/recommend", rec_engine, baby_dicts, rankings, started)
+        return Response(content=body, media_type="application/json")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in growth recommendation endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
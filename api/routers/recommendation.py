@@ -1,36 +1,78 @@
 """
 Formula recommendation API router
 """
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import List, Optional
 import logging
+import os
+import time
 
-from ..schemas.baby import BabyProfile
+from ..schemas.baby import BabyProfile, BabyProfileWithSymptoms
 from ..schemas.formula import FormulaRecommendation
-from ..schemas.recommendation import RecommendationResponse
-from ..services.recommender import FormulaRecommender
+from ..schemas.recommendation import (
+    RecommendationResponse,
+    SymptomRecommendationResponse,
+    BatchRecommendationResponse,
+)
+from ..services.registry import ModelRegistry
+from ..services.precompute import DEFAULT_RESULTS_PATH, ResultStore
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["recommendation"])
 
-# Initialize recommender (singleton)
-recommender = None
+# Initialize model registry (singleton)
+registry = None
 
+# Precomputed per-baby results (opened on first read)
+result_store = None
 
-def get_recommender():
-    """Get or create recommender instance"""
-    global recommender
-    if recommender is None:
-        recommender = FormulaRecommender()
-    return recommender
+
+def get_registry() -> ModelRegistry:
+    """Get or create model registry instance"""
+    global registry
+    if registry is None:
+        registry = ModelRegistry.from_env()
+    return registry
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """Get the precomputed results store, or None if the job has not run"""
+    global result_store
+    if result_store is None:
+        path = os.getenv("PRECOMPUTED_RESULTS_PATH", DEFAULT_RESULTS_PATH)
+        if not os.path.exists(path):
+            return None
+        result_store = ResultStore(path)
+    return result_store
+
+
+def get_recommender(
+    model_version: Optional[str] = None,
+    routing_key: Optional[str] = None
+):
+    """
+    Get the recommender serving a request
+
+    Args:
+        model_version: X-Model-Version header (explicit model)
+        routing_key: X-Routing-Key header (sticky split bucket)
+    """
+    try:
+        return get_registry().route(model_version, routing_key)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
 
 
 @router.post("/recommend", response_model=RecommendationResponse)
 async def recommend_formula(
     baby_profile: BabyProfile,
     top_n: int = 3,
-    min_good_prob: float = 0.3
+    min_good_prob: float = 0.3,
+    include_all: bool = True,
+    explain: bool = False,
+    x_model_version: Optional[str] = Header(None),
+    x_routing_key: Optional[str] = Header(None)
 ):
     """
     Recommend formulas for a baby profile
@@ -39,45 +81,187 @@ async def recommend_formula(
         baby_profile: Baby profile information
         top_n: Number of top recommendations (default: 3)
         min_good_prob: Minimum good probability threshold (default: 0.3)
+        include_all: Include all_formulas in the response (default: True)
+        explain: Add the neighbor feeding logs behind each top formula (default: False)
+        x_model_version: Serve with this model version
+        x_routing_key: Caller key for sticky traffic split
 
     Returns:
         Recommendation response with top N formulas
     """
-    try:
-        rec_engine = get_recommender()
+    started = time.perf_counter()
+    rec_engine = get_recommender(x_model_version, x_routing_key)
+    if explain and rec_engine.engine is None:
+        raise HTTPException(status_code=400, detail=f"Model {rec_engine.model_version} does not support explanations")
 
+    try:
         # Convert Pydantic model to dict
         baby_dict = baby_profile.dict()
 
-        # Get recommendations
-        result = rec_engine.recommend(
-            baby_profile=baby_dict,
-            top_n=top_n,
-            min_good_prob=min_good_prob
+        # Get ranking
+        # Concurrent requests share one scoring call (explain bypasses it)
+        batcher = get_registry().batcher(rec_engine)
+        if batcher is not None and not explain:
+            ranking = await batcher.rank(baby_dict, top_n=top_n, min_good_prob=min_good_prob)
+        else:
+            ranking = rec_engine.rank(
+                baby_profile=baby_dict,
+                top_n=top_n,
+                min_good_prob=min_good_prob,
+                explain=explain
+            )
+
+        extra = None
+        if explain:
+            extra = {"explanations": rec_engine.explain(baby_dict, ranking)}
+
+        # Build response from pre-encoded formula fragments
+        body = rec_engine.encoder.encode_response(
+            baby_dict,
+            ranking,
+            include_all=include_all,
+            extra=extra
         )
 
-        # Build response
-        response = {
-            "status": "success",
-            "baby_profile": baby_dict,
-            "recommendations": result["recommendations"],
-            "all_formulas": result["all_formulas"],
-            "model_version": rec_engine.model_version
-        }
+        get_registry().shadow(rec_engine, [baby_dict], [ranking], top_n, min_good_prob)
+        get_registry().log("recommend", rec_engine, [baby_dict], [ranking], started)
 
-        logger.info(f"Recommendation generated for baby: age={baby_dict['age_month']}m, sex={baby_dict['sex']}")
+        logger.debug("Recommendation generated for baby: age=%sm, sex=%s", baby_dict['age_month'], baby_dict['sex'])
 
-        return response
+        return Response(content=body, media_type="application/json")
 
     except Exception as e:
         logger.error(f"Error in recommendation endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/recommend/symptoms", response_model=SymptomRecommendationResponse)
+async def recommend_formula_with_symptoms(
+    baby_profile: BabyProfileWithSymptoms,
+    top_n: int = 3,
+    min_good_prob: float = 0.3,
+    include_all: bool = True,
+    x_model_version: Optional[str] = Header(None),
+    x_routing_key: Optional[str] = Header(None)
+):
+    """
+    Recommend formulas re-ranked by recent symptoms
+
+    Each formula's good probability is multiplied by the category weight of
+    every present symptom; min_good_prob applies to the unadjusted probability.
+
+    Args:
+        baby_profile: Baby profile with recent symptoms
+        top_n: Number of top recommendations (default: 3)
+        min_good_prob: Minimum good probability threshold (default: 0.3)
+        include_all: Include all_formulas in the response (default: True)
+        x_model_version: Serve with this model version
+        x_routing_key: Caller key for sticky traffic split
+
+    Returns:
+        Recommendation response ordered by adjusted score
+    """
+    started = time.perf_counter()
+    rec_engine = get_recommender(x_model_version, x_routing_key)
+
+    try:
+        baby_dict = baby_profile.dict()
+
+        batcher = get_registry().batcher(rec_engine)
+        if batcher is not None:
+            ranking = await batcher.rank(baby_dict, top_n=top_n, min_good_prob=min_good_prob, use_symptoms=True)
+        else:
+            ranking = rec_engine.rank(
+                baby_profile=baby_dict,
+                top_n=top_n,
+                min_good_prob=min_good_prob,
+                use_symptoms=True
+            )
+
+        body = rec_engine.encoder.encode_response(
+            baby_dict,
+            ranking,
+            include_all=include_all
+        )
+
+        get_registry().shadow(rec_engine, [baby_dict], [ranking], top_n, min_good_prob, use_symptoms=True)
+        get_registry().log("recommend/symptoms", rec_engine, [baby_dict], [ranking], started)
+
+        logger.debug("Symptom recommendation generated for baby: age=%sm, sex=%s", baby_dict['age_month'], baby_dict['sex'])
+
+        return Response(content=body, media_type="application/json")
+
+    except Exception as e:
+        logger.error(f"Error in symptom recommendation endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def recommend_formula_batch(
+    baby_profiles: List[BabyProfileWithSymptoms],
+    top_n: int = 3,
+    min_good_prob: float = 0.3,
+    use_symptoms: bool = False,
+    include_all: bool = False,
+    x_model_version: Optional[str] = Header(None),
+    x_routing_key: Optional[str] = Header(None)
+):
+    """
+    Recommend formulas for several babies in one model call
+
+    Args:
+        baby_profiles: Baby profiles (symptom fields optional)
+        top_n: Number of top recommendations per baby (default: 3)
+        min_good_prob: Minimum good probability threshold (default: 0.3)
+        use_symptoms: Re-rank by symptoms (default: False)
+        include_all: Include all_formulas for each baby (default: False)
+        x_model_version: Serve with this model version
+        x_routing_key: Caller key for sticky traffic split
+
+    Returns:
+        Batch recommendation response
+    """
+    if not baby_profiles:
+        raise HTTPException(status_code=400, detail="Empty batch")
+
+    started = time.perf_counter()
+    rec_engine = get_recommender(x_model_version, x_routing_key)
+
+    try:
+        baby_dicts = [profile.dict() for profile in baby_profiles]
+
+        rankings = rec_engine.rank_batch(
+            baby_dicts,
+            top_n=top_n,
+            min_good_prob=min_good_prob,
+            use_symptoms=use_symptoms
+        )
+
+        body = rec_engine.encoder.encode_batch_response(
+            baby_dicts,
+            rankings,
+            include_all=include_all
+        )
+
+        get_registry().shadow(rec_engine, baby_dicts, rankings, top_n, min_good_prob, use_symptoms)
+        get_registry().log("recommend/batch", rec_engine, baby_dicts, rankings, started)
+
+        logger.debug("Batch recommendation generated for %d babies", len(baby_dicts))
+
+        return Response(content=body, media_type="application/json")
+
+    except Exception as e:
+        logger.error(f"Error in batch recommendation endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/predict")
 async def predict_tolerance(
     baby_profile: BabyProfile,
-    formula_id: int
+    formula_id: int,
+    explain: bool = False,
+    x_model_version: Optional[str] = Header(None),
+    x_routing_key: Optional[str] = Header(None)
 ):
     """
     Predict tolerance for a specific baby-formula combination
@@ -85,21 +269,30 @@ async def predict_tolerance(
     Args:
         baby_profile: Baby profile information
         formula_id: Formula identifier
+        explain: Add the neighbor feeding logs behind the prediction (default: False)
+        x_model_version: Serve with this model version
+        x_routing_key: Caller key for sticky traffic split
 
     Returns:
         Prediction with probabilities
     """
-    try:
-        rec_engine = get_recommender()
+    started = time.perf_counter()
+    rec_engine = get_recommender(x_model_version, x_routing_key)
+    if explain and rec_engine.engine is None:
+        raise HTTPException(status_code=400, detail=f"Model {rec_engine.model_version} does not support explanations")
 
+    try:
         baby_dict = baby_profile.dict()
 
         result = rec_engine.predict_single(
             baby_profile=baby_dict,
-            formula_id=formula_id
+            formula_id=formula_id,
+            explain=explain
         )
 
-        logger.info(f"Prediction for formula {formula_id}: {result['predicted_tolerance']}")
+        get_registry().log_prediction("predict", rec_engine, baby_dict, result, started)
+
+        logger.debug("Prediction for formula %s: %s", formula_id, result['predicted_tolerance'])
 
         return {
             "status": "success",
@@ -124,21 +317,91 @@ async def list_formulas():
         List of formula products
     """
     try:
-        rec_engine = get_recommender()
+        rec_engine = get_registry().default
+
+        # Response body is serialized once when the catalog is loaded
+        return Response(
+            content=rec_engine.catalog.list_json,
+            media_type="application/json"
+        )
+
+    except Exception as e:
+        logger.error(f"Error listing formulas: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/formulas/reload")
+async def reload_formulas(source: str = "csv"):
+    """
+    Reload formula catalog
+
+    Args:
+        source: "csv" for formula_master.csv, "db" for the formulas table
+
+    Returns:
+        Number of formulas loaded
+    """
+    if source not in ("csv", "db"):
+        raise HTTPException(status_code=400, detail=f"Unknown formula source: {source}")
+
+    try:
+        get_registry().reload_formulas(source=source)
+        rec_engine = get_registry().default
 
-        formulas = rec_engine.formula_df.to_dict('records')
+        logger.info(f"Formula catalog reloaded from {source}")
 
         return {
             "status": "success",
-            "count": len(formulas),
-            "formulas": formulas
+            "source": rec_engine.catalog.source,
+            "count": len(rec_engine.catalog)
         }
 
     except Exception as e:
-        logger.error(f"Error listing formulas: {e}")
+        logger.error(f"Error reloading formulas: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/models")
+async def list_models():
+    """
+    Get loaded models, traffic split and shadow agreement counters
+
+    Returns:
+        Model registry description
+    """
+    return {"status": "success", **get_registry().describe()}
+
+
+@router.get("/recommend/baby/{baby_id}", response_model=RecommendationResponse)
+async def get_precomputed_recommendation(baby_id: int):
+    """
+    Get the stored recommendation for a registered baby
+
+    Results are written by the precompute job (api/services/precompute.py)
+    whenever the baby's feeding records change; this is a key lookup.
+
+    Args:
+        baby_id: Baby identifier
+
+    Returns:
+        Recommendation response as of the last precompute
+    """
+    store = get_result_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Precomputed recommendations are not available")
+
+    stored = store.get(baby_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No precomputed recommendation for baby {baby_id}")
+
+    model_version, body, updated_at = stored
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"X-Model-Version": model_version, "X-Precomputed-At": f"{updated_at:.0f}"}
+    )
+
+
 @router.get("/formulas/{formula_id}")
 async def get_formula(formula_id: int):
     """
@@ -151,17 +414,14 @@ async def get_formula(formula_id: int):
         Formula details
     """
     try:
-        rec_engine = get_recommender()
+        rec_engine = get_registry().default
 
-        formula = rec_engine.formula_df[rec_engine.formula_df["formula_id"] == formula_id]
+        body = rec_engine.catalog.formula_json(formula_id)
 
-        if len(formula) == 0:
+        if body is None:
             raise HTTPException(status_code=404, detail=f"Formula {formula_id} not found")
 
-        return {
-            "status": "success",
-            "formula": formula.iloc[0].to_dict()
-        }
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise
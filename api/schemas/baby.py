@@ -1,8 +1,8 @@
 """
 Pydantic schemas for baby profiles
 """
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, model_serializer
+from typing import Dict, Optional, Type
 
 
 class BabyProfile(BaseModel):
@@ -15,6 +15,15 @@ class BabyProfile(BaseModel):
     allergy_risk: int = Field(..., ge=0, le=1, description="Allergy risk: 0 or 1")
     lactose_sensitivity: int = Field(..., ge=0, le=1, description="Lactose sensitivity: 0 or 1")
     feed_ml_per_intake: int = Field(..., gt=0, le=300, description="Feeding amount per intake in ml")
+    baby_id: Optional[int] = Field(None, description="Registered baby ID (personalizes collaborative-filtering models)")
+
+    @model_serializer(mode="wrap")
+    def _omit_missing_baby_id(self, handler):
+        """Leave baby_id out of dumped / echoed profiles unless it was given"""
+        data = handler(self)
+        if data.get("baby_id") is None:
+            data.pop("baby_id", None)
+        return data
 
     class Config:
         schema_extra = {
@@ -54,3 +63,36 @@ class BabyProfileWithSymptoms(BabyProfile):
                 "skin_rash": 0
             }
         }
+
+
+def profile_constraints(model: Type[BaseModel] = BabyProfileWithSymptoms) -> Dict[str, Dict]:
+    """
+    Field constraints of a profile schema as plain dictionaries
+
+    Lets code outside request validation (binary protocol, training data
+    checks) apply exactly the bounds declared above.
+
+    Args:
+        model: Profile schema class
+
+    Returns:
+        Field name -> {"type", "required", "default", and any of
+        "ge", "gt", "le", "lt", "pattern"}
+    """
+    constraints = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        # Optional[int] -> int
+        args = [a for a in getattr(annotation, "__args__", ()) if a is not type(None)]
+        spec = {
+            "type": args[0] if args else annotation,
+            "required": field.is_required(),
+            "default": None if field.is_required() else field.default,
+        }
+        for meta in field.metadata:
+            for key in ("ge", "gt", "le", "lt", "pattern"):
+                value = getattr(meta, key, None)
+                if value is not None:
+                    spec[key] = value
+        constraints[name] = spec
+    return constraints
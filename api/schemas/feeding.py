@@ -0,0 +1,54 @@
+"""
+Pydantic schemas for feeding records
+"""
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+
+class FeedingRecord(BaseModel):
+    """One smart-bottle feeding (feeding_records row)"""
+
+    feeding_id: Optional[int] = Field(None, description="Feeding record ID")
+    baby_id: int = Field(..., description="Baby identifier")
+    formula_id: Optional[int] = Field(None, description="Formula identifier")
+    amount_consumed: Optional[float] = Field(None, ge=0, le=1000, description="Amount consumed in ml")
+    temperature: Optional[float] = Field(None, ge=0, le=100, description="Milk temperature in degrees C")
+    duration: Optional[float] = Field(None, ge=0, le=600, description="Feeding duration in minutes")
+    timestamp: datetime = Field(..., description="Feeding time")
+    age_month: Optional[int] = Field(None, ge=0, le=36, description="Age in months at the feeding")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "feeding_id": 1024,
+                "baby_id": 17,
+                "formula_id": 3,
+                "amount_consumed": 95.0,
+                "temperature": 37.5,
+                "duration": 14.0,
+                "timestamp": "2026-01-05T08:30:00",
+                "age_month": 4
+            }
+        }
+
+
+class FeedingAnomaly(BaseModel):
+    """Anomaly score of one feeding"""
+
+    feeding_id: Optional[int] = None
+    baby_id: int
+    is_anomaly: bool
+    anomaly_score: float
+    z_scores: Dict[str, Optional[float]]
+    forest_score: Optional[float] = None
+    reasons: List[str]
+
+
+class AnomalyResponse(BaseModel):
+    """Anomaly scores of a list of feedings"""
+
+    status: str
+    count: int
+    anomalies: int
+    results: List[FeedingAnomaly]
@@ -55,3 +55,26 @@ class FormulaRecommendation(BaseModel):
                 "recommendation_reason": "Optimized for constipation issues"
             }
         }
+
+
+class SymptomFormulaRecommendation(FormulaRecommendation):
+    """Formula recommendation re-ranked by recent symptoms"""
+
+    adjusted_score: Optional[float] = None
+    symptom_matched: Optional[bool] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "formula_id": 4,
+                "formula_brand": "GutCare_Constipation",
+                "category": "constipation_care",
+                "lactose_level": "normal",
+                "target_issue": "constipation",
+                "protein_type": "standard",
+                "good_probability": 0.848,
+                "predicted_tolerance": "good",
+                "adjusted_score": 2.544,
+                "symptom_matched": True
+            }
+        }
@@ -0,0 +1,83 @@
+"""
+Pydantic schemas for growth forecasts
+"""
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Dict, List, Optional
+from .baby import BabyProfile
+
+# Horizons per request
+MAX_HORIZONS = 12
+
+
+class GrowthMeasurement(BaseModel):
+    """Earlier weight and/or height measurement"""
+
+    age_month: float = Field(..., ge=0, le=36, description="Age in months (fractional allowed)")
+    weight_kg: Optional[float] = Field(None, gt=0, le=50, description="Weight in kilograms")
+    height_cm: Optional[float] = Field(None, gt=0, le=150, description="Height in centimeters")
+
+
+class GrowthForecastRequest(BaseModel):
+    """Current profile, measurement history and forecast horizons"""
+
+    baby_profile: BabyProfile
+    measurements: List[GrowthMeasurement] = []
+    horizon_months: List[Annotated[float, Field(gt=0, le=36)]] = Field(
+        [1, 3, 6], min_length=1, max_length=MAX_HORIZONS, description="Months ahead of the current profile"
+    )
+
+    @model_validator(mode="after")
+    def _measurements_before_profile(self):
+        """
+        The current profile is the latest measurement (forecast origin)
+
+        A measurement at the profile's age would be averaged into the
+        level, so the current percentile no longer comes from the profile.
+        """
+        later = [m.age_month for m in self.measurements if m.age_month >= self.baby_profile.age_month]
+        if later:
+            raise ValueError(
+                f"measurements at age_month {later} are not before baby_profile.age_month {self.baby_profile.age_month}"
+            )
+        return self
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "baby_profile": {
+                    "age_month": 4,
+                    "sex": "M",
+                    "height_cm": 62.0,
+                    "weight_kg": 6.5,
+                    "allergy_risk": 0,
+                    "lactose_sensitivity": 1,
+                    "feed_ml_per_intake": 90
+                },
+                "measurements": [
+                    {"age_month": 0, "weight_kg": 3.4, "height_cm": 50.5},
+                    {"age_month": 2, "weight_kg": 5.4, "height_cm": 57.8}
+                ],
+                "horizon_months": [1, 3, 6]
+            }
+        }
+
+
+class GrowthForecast(BaseModel):
+    """Projected measurements at one horizon"""
+
+    horizon_months: float
+    age_month: float
+    weight_kg: float
+    weight_kg_percentile: float
+    height_cm: float
+    height_cm_percentile: float
+    projected_profile: dict
+
+
+class GrowthForecastResponse(BaseModel):
+    """Growth forecast for one baby"""
+
+    status: str
+    baby_profile: dict
+    current_percentiles: Dict[str, float]
+    forecasts: List[GrowthForecast]
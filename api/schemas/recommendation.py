@@ -2,9 +2,9 @@
 Pydantic schemas for recommendations
 """
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 from .baby import BabyProfile
-from .formula import FormulaRecommendation
+from .formula import FormulaRecommendation, SymptomFormulaRecommendation
 
 
 class RecommendationRequest(BaseModel):
@@ -32,13 +32,31 @@ class RecommendationRequest(BaseModel):
         }
 
 
+class NeighborAttribution(BaseModel):
+    """Training feeding log that voted for a formula's prediction"""
+
+    log_id: int
+    distance: float
+    label: str
+    weight: float
+    distance_components: Dict[str, float]
+
+
+class FormulaExplanation(BaseModel):
+    """Neighbors behind one formula's probability"""
+
+    formula_id: int
+    neighbors: List[NeighborAttribution]
+
+
 class RecommendationResponse(BaseModel):
     """Response with formula recommendations"""
 
     status: str
     baby_profile: dict
     recommendations: List[FormulaRecommendation]
-    all_formulas: List[FormulaRecommendation]
+    all_formulas: Optional[List[FormulaRecommendation]] = None
+    explanations: Optional[List[FormulaExplanation]] = None
     model_version: str
 
     class Config:
@@ -70,3 +88,30 @@ class RecommendationResponse(BaseModel):
                 "model_version": "knn_v1_legacy"
             }
         }
+
+
+class SymptomRecommendationResponse(BaseModel):
+    """Response with symptom re-ranked formula recommendations"""
+
+    status: str
+    baby_profile: dict
+    recommendations: List[SymptomFormulaRecommendation]
+    all_formulas: Optional[List[SymptomFormulaRecommendation]] = None
+    model_version: str
+
+
+class BatchRecommendationResult(BaseModel):
+    """Recommendations for one baby in a batch"""
+
+    baby_profile: dict
+    recommendations: List[SymptomFormulaRecommendation]
+    all_formulas: Optional[List[SymptomFormulaRecommendation]] = None
+
+
+class BatchRecommendationResponse(BaseModel):
+    """Response with recommendations for a batch of babies"""
+
+    status: str
+    count: int
+    results: List[BatchRecommendationResult]
+    model_version: str
@@ -0,0 +1,779 @@
+"""
+Feeding anomaly detection (MODEL_PROPOSAL.md 3-3)
+Scores smart-bottle feeding records (the feeding_records columns selected
+by SmartBottleDataLoader.load_feeding_records) as they arrive. Each baby
+keeps running statistics of amount, temperature, duration and the interval
+since its previous feeding, so memory is O(1) per baby and no history is
+re-read; an optional isolation forest fitted on past records adds a
+multivariate score
+
+Usage:
+    # Replay exported records, write the scored rows
+    python -m api.services.anomaly bulk --input data/feeding_records.parquet --out data/anomaly/scored.parquet
+
+    # Fit the isolation forest on past records
+    python -m api.services.anomaly fit --input data/feeding_records.parquet
+
+    # Poll feeding_records for new rows, keep the state in data/anomaly/state.npz
+    python -m api.services.anomaly stream --interval 10
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPE = "feeding_anomaly"
+
+DEFAULT_STATE_PATH = "data/anomaly/state.npz"
+DEFAULT_OUTPUT_PATH = "data/anomaly/anomalies.jsonl"
+DEFAULT_MODEL_PATH = "models/anomaly/feeding_iforest.pkl"
+
+RECORD_COLUMNS = [
+    "feeding_id",
+    "baby_id",
+    "formula_id",
+    "amount_consumed",
+    "temperature",
+    "duration",
+    "timestamp",
+    "age_month",
+]
+
+# Monitored values; interval_hours is derived from consecutive timestamps
+METRICS = ["amount_consumed", "temperature", "duration", "interval_hours"]
+
+# Smallest standard deviation used in z-scores (ml, degrees C, minutes,
+# hours), so a baby with very regular feedings is not flagged for noise
+MIN_STD = {"amount_consumed": 5.0, "temperature": 0.5, "duration": 1.0, "interval_hours": 0.25}
+
+FOREST_FEATURES = METRICS + [f"z_{name}" for name in METRICS] + ["age_month"]
+
+# Same selection as SmartBottleDataLoader.load_feeding_records
+RECORDS_SQL = """
+    SELECT
+        fr.feeding_id,
+        fr.baby_id,
+        fr.formula_id,
+        fr.amount_consumed,
+        fr.temperature,
+        fr.duration,
+        fr.timestamp,
+        TIMESTAMPDIFF(MONTH, b.birth_date, fr.timestamp) as age_month
+    FROM feeding_records fr
+    JOIN babies b ON fr.baby_id = b.baby_id
+    WHERE fr.feeding_id > %s
+    ORDER BY fr.feeding_id
+    LIMIT %s
+"""
+
+
+def _hours(timestamps: pd.Series) -> np.ndarray:
+    """Timestamps as hours since the epoch (naive values are taken as UTC)"""
+    ts = pd.to_datetime(timestamps, utc=True)
+    return ts.to_numpy(dtype="datetime64[ns]").astype(np.int64) / 3.6e12
+
+
+def forest_features(values: np.ndarray, z: np.ndarray, age_month: np.ndarray, fill: np.ndarray) -> np.ndarray:
+    """
+    Isolation forest inputs: raw values, z-scores and age
+
+    Args:
+        values: Record values (n x len(METRICS), NaN if missing)
+        z: Z-scores (NaN if not scored)
+        age_month: Age per record (NaN if unknown)
+        fill: Replacement per raw column (training medians), age last
+
+    Returns:
+        Feature matrix in FOREST_FEATURES order
+    """
+    raw = np.column_stack([values, age_month])
+    raw = np.where(np.isnan(raw), fill, raw)
+    return np.column_stack([raw[:, :-1], np.nan_to_num(z), raw[:, -1]])
+
+
+class FeedingAnomalyDetector:
+    """
+    Streaming per-baby feeding statistics and anomaly scores
+
+    For every baby and metric a count, mean and variance are kept. The
+    first updates are exact running moments (Welford); from 1/alpha
+    records on they become exponentially weighted, so the baseline follows
+    a growing baby. A record is scored against its baby's statistics
+    before they are updated with it; babies with fewer than `warmup`
+    values of a metric are scored against population statistics instead.
+    A record is anomalous if any |z| exceeds z_threshold or the isolation
+    forest (if loaded) puts it outside its training contamination.
+
+    score() is vectorized: a batch is processed in rounds, round k holding
+    the k-th record (in time order) of every baby in the batch. Records of
+    one baby are assumed to arrive in time order across batches.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.1,
+        warmup: int = 10,
+        z_threshold: float = 5.0,
+        min_std: Optional[Dict[str, float]] = None,
+        forest: Optional[Dict] = None
+    ):
+        """
+        Initialize detector
+
+        Args:
+            alpha: EWMA weight of a new value once past 1/alpha records
+            warmup: Values of a metric before a baby's own statistics are used
+            z_threshold: |z| above which a metric is flagged
+            min_std: Standard deviation floor per metric (default MIN_STD)
+            forest: Isolation forest package (see fit_forest)
+        """
+        self.alpha = alpha
+        self.warmup = warmup
+        self.z_threshold = z_threshold
+        self.min_std = np.array([(min_std or MIN_STD)[name] for name in METRICS])
+        self.forest = forest
+
+        # Per-baby state rows; arrays grow by doubling, the first _size rows are used
+        self._index: Dict[int, int] = {}
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self.counts = np.zeros((0, len(METRICS)))
+        self.means = np.zeros((0, len(METRICS)))
+        self.variances = np.zeros((0, len(METRICS)))
+        self.last_seen = np.zeros(0)
+
+        # Population moments (Welford / Chan) for babies in warm-up
+        self.global_count = np.zeros(len(METRICS))
+        self.global_mean = np.zeros(len(METRICS))
+        self.global_m2 = np.zeros(len(METRICS))
+
+        self.records_seen = 0
+        self.anomalies = 0
+        # Last feeding_id processed by a stream job
+        self.mark = 0
+        self._lock = threading.Lock()
+
+    @property
+    def params(self) -> Dict:
+        """Constructor settings (without the forest)"""
+        return {
+            "alpha": self.alpha,
+            "warmup": self.warmup,
+            "z_threshold": self.z_threshold,
+            "min_std": dict(zip(METRICS, self.min_std.tolist())),
+        }
+
+    @property
+    def baby_ids(self) -> np.ndarray:
+        """Babies with state, in state row order"""
+        return self._ids[:self._size]
+
+    def _grow(self, size: int):
+        """Make room for at least size state rows"""
+        capacity = max(len(self._ids) * 2, size, 1024)
+        extra = capacity - len(self._ids)
+        self._ids = np.concatenate([self._ids, np.zeros(extra, dtype=np.int64)])
+        self.counts = np.vstack([self.counts, np.zeros((extra, len(METRICS)))])
+        self.means = np.vstack([self.means, np.zeros((extra, len(METRICS)))])
+        self.variances = np.vstack([self.variances, np.zeros((extra, len(METRICS)))])
+        self.last_seen = np.concatenate([self.last_seen, np.full(extra, np.nan)])
+
+    def _slots(self, baby_ids: np.ndarray, create: bool) -> np.ndarray:
+        """State row per baby_id (-1 for unknown babies unless create)"""
+        uniques, inverse = np.unique(baby_ids, return_inverse=True)
+        slots = np.array([self._index.get(b, -1) for b in uniques.tolist()], dtype=np.int64)
+        new = np.flatnonzero(slots < 0)
+        if create and len(new):
+            start = self._size
+            if start + len(new) > len(self._ids):
+                self._grow(start + len(new))
+            slots[new] = np.arange(start, start + len(new))
+            self._index.update(zip(uniques[new].tolist(), slots[new].tolist()))
+            self._ids[start:start + len(new)] = uniques[new]
+            self._size += len(new)
+        return slots[inverse]
+
+    def _global_std(self) -> np.ndarray:
+        """Population standard deviation per metric"""
+        return np.sqrt(self.global_m2 / np.maximum(self.global_count - 1, 1))
+
+    def _update_global(self, x: np.ndarray):
+        """Fold a round of values into the population moments (Chan et al.)"""
+        present = ~np.isnan(x)
+        n = present.sum(axis=0)
+        if not n.any():
+            return
+        mean = np.where(n > 0, np.nansum(x, axis=0) / np.maximum(n, 1), 0.0)
+        m2 = np.nansum((x - mean) ** 2, axis=0)
+        total = self.global_count + n
+        delta = mean - self.global_mean
+        self.global_mean = self.global_mean + delta * n / np.maximum(total, 1)
+        self.global_m2 = self.global_m2 + m2 + delta ** 2 * self.global_count * n / np.maximum(total, 1)
+        self.global_count = total
+
+    def score(self, records: pd.DataFrame, update: bool = True) -> pd.DataFrame:
+        """
+        Score feeding records and (optionally) fold them into the state
+
+        Args:
+            records: Feeding records (baby_id, timestamp and any of
+                amount_consumed, temperature, duration, age_month,
+                feeding_id)
+            update: Update the per-baby statistics; with False every
+                record is scored against the current state only
+
+        Returns:
+            DataFrame in input order with feeding_id (if given), baby_id,
+            interval_hours, z_<metric>, anomaly_score (max |z|),
+            forest_score (if a forest is loaded; negative = anomalous),
+            is_anomaly and reasons
+        """
+        n = len(records)
+        baby = records["baby_id"].to_numpy(dtype=np.int64)
+        hours = _hours(records["timestamp"])
+        values = np.full((n, len(METRICS)), np.nan)
+        for j, name in enumerate(METRICS[:-1]):
+            if name in records:
+                values[:, j] = pd.to_numeric(records[name], errors="coerce").to_numpy(dtype=np.float64)
+
+        # Time order within each baby; occurrence k goes to round k
+        order = np.lexsort((hours, baby))
+        sorted_baby = baby[order]
+        first = np.r_[True, sorted_baby[1:] != sorted_baby[:-1]]
+        starts = np.flatnonzero(first)
+        occurrence = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+
+        z = np.full((n, len(METRICS)), np.nan)
+        with self._lock:
+            if not len(self._ids):
+                # Unknown babies read row 0 (masked), so keep one allocated
+                self._grow(1)
+            slots = self._slots(baby, create=update)
+
+            # Intervals: previous record of the baby in this batch, else its last state
+            previous = np.empty(n)
+            previous[order[~first]] = hours[order][np.flatnonzero(~first) - 1]
+            head = order[first]
+            previous[head] = np.where(slots[head] >= 0, self.last_seen[np.maximum(slots[head], 0)], np.nan)
+            values[:, -1] = hours - previous
+
+            rounds = [order] if not update else [order[occurrence == k] for k in range(occurrence.max() + 1 if n else 0)]
+            for idx in rounds:
+                s = slots[idx]
+                known = (s >= 0)[:, None]
+                row = np.maximum(s, 0)
+                x = values[idx]
+
+                counts = np.where(known, self.counts[row], 0.0)
+                means = np.where(known, self.means[row], 0.0)
+                variances = np.where(known, self.variances[row], 0.0)
+
+                warm = counts >= self.warmup
+                baseline = np.where(warm, means, self.global_mean)
+                std = np.where(warm, np.sqrt(variances), self._global_std())
+                scored = warm | (self.global_count >= self.warmup)
+                z[idx] = np.where(scored, (x - baseline) / np.maximum(std, self.min_std), np.nan)
+
+                if update:
+                    # Outliers enter the baby's statistics clipped to the
+                    # threshold, so one spike does not mask the next
+                    limit = self.z_threshold * np.maximum(std, self.min_std)
+                    x = np.where(warm, np.clip(x, baseline - limit, baseline + limit), x)
+                    present = ~np.isnan(x)
+                    counts = counts + present
+                    weight = np.where(present, np.maximum(1.0 / np.maximum(counts, 1), self.alpha), 0.0)
+                    diff = np.where(present, x - means, 0.0)
+                    step = weight * diff
+                    self.counts[s] = counts
+                    self.means[s] = means + step
+                    self.variances[s] = (1.0 - weight) * (variances + diff * step)
+                    self._update_global(x)
+
+            if update and n:
+                # Latest timestamp per baby (last of each group in time order)
+                last = order[np.r_[starts[1:] - 1, n - 1]]
+                self.last_seen[slots[last]] = np.fmax(self.last_seen[slots[last]], hours[last])
+
+        magnitude = np.abs(z)
+        flagged = magnitude > self.z_threshold
+        is_anomaly = flagged.any(axis=1)
+        columns = {"feeding_id": records["feeding_id"].to_numpy()} if "feeding_id" in records else {}
+        columns["baby_id"] = baby
+        columns["interval_hours"] = values[:, -1]
+        for j, name in enumerate(METRICS):
+            columns[f"z_{name}"] = z[:, j]
+        columns["anomaly_score"] = np.nan_to_num(magnitude).max(axis=1, initial=0.0)
+
+        forest_flag = np.zeros(n, dtype=bool)
+        if self.forest is not None and n:
+            age = (
+                pd.to_numeric(records["age_month"], errors="coerce").to_numpy(dtype=np.float64)
+                if "age_month" in records else np.full(n, np.nan)
+            )
+            features = forest_features(values, z, age, self.forest["fill"])
+            columns["forest_score"] = self.forest["forest"].decision_function(features)
+            forest_flag = columns["forest_score"] < 0
+            is_anomaly = is_anomaly | forest_flag
+
+        # Reason strings only for flagged rows
+        reasons = [[] for _ in range(n)]
+        for i in np.flatnonzero(is_anomaly):
+            reasons[i] = [
+                f"{name}_{'high' if z[i, j] > 0 else 'low'}"
+                for j, name in enumerate(METRICS) if flagged[i, j]
+            ]
+            if forest_flag[i]:
+                reasons[i].append("isolation_forest")
+        columns["is_anomaly"] = is_anomaly
+        columns["reasons"] = reasons
+        result = pd.DataFrame(columns)
+
+        if update:
+            self.records_seen += n
+            self.anomalies += int(is_anomaly.sum())
+        return result
+
+    def baby_stats(self, baby_id: int) -> Optional[Dict]:
+        """Running statistics of one baby, or None if never seen"""
+        slot = self._index.get(int(baby_id))
+        if slot is None:
+            return None
+        return {
+            name: {
+                "count": int(self.counts[slot, j]),
+                "mean": float(self.means[slot, j]),
+                "std": float(np.sqrt(self.variances[slot, j])),
+            }
+            for j, name in enumerate(METRICS)
+        }
+
+    def stats(self) -> Dict:
+        """Detector counters"""
+        return {
+            "babies": len(self.baby_ids),
+            "records_seen": self.records_seen,
+            "anomalies": self.anomalies,
+            "mark": self.mark,
+            "forest": self.forest is not None,
+            **self.params,
+        }
+
+    def save(self, path: str):
+        """Write the state to an .npz file atomically"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        with self._lock:
+            np.savez(
+                tmp,
+                baby_ids=self.baby_ids,
+                counts=self.counts[:self._size],
+                means=self.means[:self._size],
+                variances=self.variances[:self._size],
+                last_seen=self.last_seen[:self._size],
+                global_count=self.global_count,
+                global_mean=self.global_mean,
+                global_m2=self.global_m2,
+                meta=np.array(json.dumps({
+                    "params": self.params,
+                    "records_seen": self.records_seen,
+                    "anomalies": self.anomalies,
+                    "mark": self.mark,
+                })),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, forest: Optional[Dict] = None) -> "FeedingAnomalyDetector":
+        """
+        Detector restored from save()
+
+        Args:
+            path: State file
+            forest: Isolation forest package (not stored in the state)
+
+        Returns:
+            Detector with the saved settings and statistics
+        """
+        with np.load(path) as state:
+            meta = json.loads(str(state["meta"]))
+            detector = cls(forest=forest, **meta["params"])
+            detector._ids = state["baby_ids"]
+            detector._size = len(detector._ids)
+            detector.counts = state["counts"]
+            detector.means = state["means"]
+            detector.variances = state["variances"]
+            detector.last_seen = state["last_seen"]
+            detector.global_count = state["global_count"]
+            detector.global_mean = state["global_mean"]
+            detector.global_m2 = state["global_m2"]
+        detector._index = {int(b): i for i, b in enumerate(detector.baby_ids)}
+        detector.records_seen = meta["records_seen"]
+        detector.anomalies = meta["anomalies"]
+        detector.mark = meta["mark"]
+        return detector
+
+    @classmethod
+    def from_env(cls) -> "FeedingAnomalyDetector":
+        """
+        Detector configured from environment variables
+
+        ANOMALY_STATE_PATH: state written by the stream job (loaded if it exists)
+        ANOMALY_MODEL_PATH: isolation forest package (loaded if it exists)
+        ANOMALY_Z_THRESHOLD, ANOMALY_ALPHA, ANOMALY_WARMUP: settings for a
+            fresh state
+        """
+        model_path = os.getenv("ANOMALY_MODEL_PATH", DEFAULT_MODEL_PATH)
+        forest = joblib.load(model_path) if os.path.exists(model_path) else None
+        state_path = os.getenv("ANOMALY_STATE_PATH", DEFAULT_STATE_PATH)
+        if os.path.exists(state_path):
+            detector = cls.load(state_path, forest=forest)
+            logger.info(f"Anomaly state loaded from {state_path} ({len(detector.baby_ids)} babies)")
+            return detector
+        return cls(
+            alpha=float(os.getenv("ANOMALY_ALPHA", "0.1")),
+            warmup=int(os.getenv("ANOMALY_WARMUP", "10")),
+            z_threshold=float(os.getenv("ANOMALY_Z_THRESHOLD", "5.0")),
+            forest=forest,
+        )
+
+
+def fit_forest(
+    records: pd.DataFrame,
+    detector_params: Optional[Dict] = None,
+    n_estimators: int = 100,
+    contamination: float = 0.01,
+    max_samples: int = 256,
+    seed: int = 42,
+    n_jobs: Optional[int] = None
+) -> Dict:
+    """
+    Fit an isolation forest on past feeding records
+
+    The records are replayed through a fresh detector so the forest sees
+    the same z-scores as serving.
+
+    Args:
+        records: Feeding records, oldest first
+        detector_params: FeedingAnomalyDetector settings for the replay
+        n_estimators: Trees
+        contamination: Expected anomaly share (sets the decision threshold)
+        max_samples: Records per tree
+        seed: Random seed
+        n_jobs: Parallel jobs for fitting (default: all cores)
+
+    Returns:
+        Package for FeedingAnomalyDetector(forest=...)
+    """
+    from sklearn.ensemble import IsolationForest
+
+    detector = FeedingAnomalyDetector(**(detector_params or {}))
+    scored = detector.score(records)
+    values = np.column_stack([
+        pd.to_numeric(records[name], errors="coerce").to_numpy(dtype=np.float64)
+        if name in records else np.full(len(records), np.nan)
+        for name in METRICS[:-1]
+    ] + [scored["interval_hours"].to_numpy()])
+    age = (
+        pd.to_numeric(records["age_month"], errors="coerce").to_numpy(dtype=np.float64)
+        if "age_month" in records else np.full(len(records), np.nan)
+    )
+    z = scored[[f"z_{name}" for name in METRICS]].to_numpy()
+
+    raw = np.column_stack([values, age])
+    fill = np.nan_to_num(np.nanmedian(raw, axis=0))
+    features = forest_features(values, z, age, fill)
+
+    forest = IsolationForest(
+        n_estimators=n_estimators,
+        contamination=contamination,
+        max_samples=min(max_samples, len(features)),
+        random_state=seed,
+        n_jobs=n_jobs if n_jobs is not None else -1,
+    ).fit(features)
+    # Scoring single requests in parallel costs more than it saves
+    forest.set_params(n_jobs=1)
+
+    return {
+        "model_type": MODEL_TYPE,
+        "forest": forest,
+        "features": FOREST_FEATURES,
+        "fill": fill,
+        "detector_params": detector.params,
+        "contamination": contamination,
+        "rows": int(len(records)),
+    }
+
+
+def _input_files(path: str) -> List[Path]:
+    """A single file, or the sorted .csv / .parquet files of a directory"""
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(p for p in path.iterdir() if p.suffix in (".csv", ".parquet"))
+        if not files:
+            raise FileNotFoundError(f"No .csv or .parquet files in {path}")
+        return files
+    if not path.exists():
+        raise FileNotFoundError(f"Input not found: {path}")
+    return [path]
+
+
+def iter_records(path: str, batch_size: int = 100000) -> Iterator[pd.DataFrame]:
+    """Feeding record chunks of a CSV / Parquet file or directory of parts"""
+    import pyarrow.parquet as pq
+
+    for file in _input_files(path):
+        if file.suffix == ".csv":
+            yield from pd.read_csv(file, chunksize=batch_size, usecols=lambda c: c in RECORD_COLUMNS)
+        else:
+            parquet = pq.ParquetFile(file)
+            columns = [c for c in RECORD_COLUMNS if c in parquet.schema_arrow.names]
+            for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+                yield batch.to_pandas()
+
+
+class DbRecordSource:
+    """New feeding_records rows after a feeding_id mark"""
+
+    def __init__(self, batch_limit: int = 100000):
+        """
+        Args:
+            batch_limit: Maximum records per poll
+        """
+        self.batch_limit = batch_limit
+
+    def records(self, mark: int) -> Tuple[pd.DataFrame, int]:
+        """
+        Records after the mark, in feeding_id order
+
+        Args:
+            mark: Last processed feeding_id
+
+        Returns:
+            (Records, new mark)
+        """
+        from config.database import get_connection
+
+        conn = get_connection()
+        try:
+            records = pd.read_sql(RECORDS_SQL, conn, params=[int(mark), int(self.batch_limit)])
+        finally:
+            conn.close()
+        if records.empty:
+            return records, mark
+        return records, int(records["feeding_id"].max())
+
+
+def _write_anomalies(scored: pd.DataFrame, records: pd.DataFrame, path: Path) -> int:
+    """Append flagged records with their scores as JSON lines"""
+    flagged = scored["is_anomaly"].to_numpy()
+    if not flagged.any():
+        return 0
+    rows = records.loc[flagged].reset_index(drop=True)
+    rows["timestamp"] = pd.to_datetime(rows["timestamp"]).astype(str)
+    scores = scored.loc[flagged].drop(columns=["feeding_id", "baby_id"], errors="ignore").reset_index(drop=True)
+    lines = pd.concat([rows, scores], axis=1).to_json(orient="records", lines=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(lines if lines.endswith("\n") else lines + "\n")
+    return int(flagged.sum())
+
+
+def score_file(
+    detector: FeedingAnomalyDetector,
+    input_path: str,
+    output_path: Optional[str] = None,
+    batch_size: int = 100000,
+    anomalies_only: bool = False
+) -> Dict:
+    """
+    Replay exported feeding records through the detector
+
+    Args:
+        detector: Detector (its state is updated)
+        input_path: CSV / Parquet file or directory of parts, oldest first
+        output_path: Scored rows (.parquet or .csv); None to only count
+        batch_size: Records per chunk
+        anomalies_only: Write flagged rows only
+
+    Returns:
+        Totals and records per second
+    """
+    start = time.perf_counter()
+    parts = []
+    rows = anomalies = 0
+    for chunk in iter_records(input_path, batch_size):
+        scored = detector.score(chunk)
+        rows += len(chunk)
+        anomalies += int(scored["is_anomaly"].sum())
+        if output_path is not None:
+            chunk = chunk.reset_index(drop=True)
+            out = pd.concat([chunk, scored.drop(columns=["feeding_id", "baby_id"], errors="ignore")], axis=1)
+            parts.append(out[out["is_anomaly"]] if anomalies_only else out)
+        logger.info(f"{rows} records, {anomalies} anomalies ({rows / (time.perf_counter() - start):.0f} records/s)")
+
+    if output_path is not None and parts:
+        output = pd.concat(parts, ignore_index=True)
+        output["reasons"] = output["reasons"].map(",".join)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        if str(output_path).endswith(".parquet"):
+            output.to_parquet(output_path, index=False)
+        else:
+            output.to_csv(output_path, index=False)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "records": rows,
+        "anomalies": anomalies,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(rows / max(elapsed, 1e-9), 1),
+    }
+
+
+class AnomalyStream:
+    """
+    Poll feeding_records and score new rows
+
+    After each poll the flagged records are appended to output_path and
+    the detector state (including the feeding_id mark) is saved, so a
+    restarted job resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        source: DbRecordSource,
+        detector: FeedingAnomalyDetector,
+        state_path: str = DEFAULT_STATE_PATH,
+        output_path: str = DEFAULT_OUTPUT_PATH
+    ):
+        """
+        Args:
+            source: Record source
+            detector: Detector (restored state or fresh)
+            state_path: State file written after each poll
+            output_path: JSON lines file of anomalies
+        """
+        self.source = source
+        self.detector = detector
+        self.state_path = state_path
+        self.output_path = Path(output_path)
+
+    def run_once(self) -> Dict:
+        """
+        Score all records after the detector's mark
+
+        Returns:
+            Poll statistics
+        """
+        records, mark = self.source.records(self.detector.mark)
+        if records.empty:
+            return {"records": 0, "anomalies": 0, "mark": mark, "seconds": 0.0}
+
+        start = time.perf_counter()
+        scored = self.detector.score(records)
+        flagged = _write_anomalies(scored, records, self.output_path)
+        self.detector.mark = mark
+        self.detector.save(self.state_path)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Scored {len(records)} feedings up to {mark}: {flagged} anomalies in {elapsed:.2f}s")
+        return {"records": len(records), "anomalies": flagged, "mark": mark, "seconds": round(elapsed, 3)}
+
+    def run_forever(self, interval: float = 10.0):
+        """Poll until interrupted"""
+        logger.info(f"Anomaly stream polling every {interval}s from feeding_id {self.detector.mark}")
+        while True:
+            try:
+                # Drain a backlog before sleeping
+                while self.run_once()["records"] >= self.source.batch_limit:
+                    pass
+            except Exception as e:
+                logger.error(f"Anomaly poll failed: {e}")
+            time.sleep(interval)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Feeding anomaly detection")
+    parser.add_argument("--state", default=os.getenv("ANOMALY_STATE_PATH", DEFAULT_STATE_PATH), help="Detector state file")
+    parser.add_argument("--model", default=os.getenv("ANOMALY_MODEL_PATH", DEFAULT_MODEL_PATH), help="Isolation forest package")
+    parser.add_argument("--z-threshold", type=float, default=5.0, help="|z| above which a metric is flagged (fresh state)")
+    parser.add_argument("--alpha", type=float, default=0.1, help="EWMA weight (fresh state)")
+    parser.add_argument("--warmup", type=int, default=10, help="Values before a baby's own statistics are used (fresh state)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bulk = commands.add_parser("bulk", help="Score exported records")
+    bulk.add_argument("--input", required=True, help="CSV / Parquet file or directory of parts, oldest first")
+    bulk.add_argument("--out", default=None, help="Scored rows (.parquet or .csv)")
+    bulk.add_argument("--anomalies-only", action="store_true", help="Write flagged rows only")
+    bulk.add_argument("--batch-size", type=int, default=100000, help="Records per chunk")
+    bulk.add_argument("--save-state", action="store_true", help="Save the detector state afterwards")
+
+    fit = commands.add_parser("fit", help="Fit the isolation forest on exported records")
+    fit.add_argument("--input", required=True, help="CSV / Parquet file or directory of parts, oldest first")
+    fit.add_argument("--trees", type=int, default=100, help="Trees")
+    fit.add_argument("--contamination", type=float, default=0.01, help="Expected anomaly share")
+    fit.add_argument("--n-jobs", type=int, default=None, help="Parallel jobs (default: all cores)")
+
+    stream = commands.add_parser("stream", help="Poll feeding_records for new rows")
+    stream.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="Anomalies JSON lines file")
+    stream.add_argument("--batch-limit", type=int, default=100000, help="Maximum records per poll")
+    stream.add_argument("--interval", type=float, default=10.0, help="Poll interval in seconds")
+    stream.add_argument("--once", action="store_true", help="Process current records and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run anomaly detection from the command line"""
+    args = parse_args(argv)
+    settings = {"alpha": args.alpha, "warmup": args.warmup, "z_threshold": args.z_threshold}
+
+    if args.command == "fit":
+        records = pd.concat(iter_records(args.input), ignore_index=True)
+        package = fit_forest(
+            records, settings, n_estimators=args.trees,
+            contamination=args.contamination, n_jobs=args.n_jobs
+        )
+        Path(args.model).parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(package, args.model)
+        print(f"Isolation forest ({package['rows']} records) saved to {args.model}")
+        return
+
+    forest = joblib.load(args.model) if os.path.exists(args.model) else None
+    if os.path.exists(args.state):
+        detector = FeedingAnomalyDetector.load(args.state, forest=forest)
+    else:
+        detector = FeedingAnomalyDetector(forest=forest, **settings)
+
+    if args.command == "bulk":
+        summary = score_file(detector, args.input, args.out, args.batch_size, args.anomalies_only)
+        if args.save_state:
+            detector.save(args.state)
+        print(json.dumps(summary, indent=2))
+        return
+
+    job = AnomalyStream(DbRecordSource(args.batch_limit), detector, args.state, args.output)
+    if args.once:
+        print(json.dumps(job.run_once()))
+    else:
+        job.run_forever(args.interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
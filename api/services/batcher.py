@@ -0,0 +1,150 @@
+"""
+Micro-batching for concurrent recommendation requests
+Coalesces single-profile requests arriving within a short window into one
+scoring call and fans the rankings back out to the waiting handlers
+"""
+import asyncio
+import time
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.recommender import FormulaRecommender
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collect rank requests for one recommender and score them together
+
+    A batch is flushed when max_batch_size requests are waiting or
+    max_wait_ms after its first request, whichever comes first. Scoring
+    runs in a worker thread so the event loop keeps accepting requests.
+    Each request keeps its own top_n / min_good_prob / use_symptoms.
+    """
+
+    def __init__(
+        self,
+        recommender: FormulaRecommender,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0
+    ):
+        """
+        Initialize batcher
+
+        Args:
+            recommender: Recommender to score with
+            max_batch_size: Flush when this many requests are waiting
+            max_wait_ms: Flush this long after the first waiting request
+        """
+        self.recommender = recommender
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Counters for /models
+        self.batches = 0
+        self.requests = 0
+        self.max_seen = 0
+
+    async def rank(
+        self,
+        baby_profile: Dict,
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        use_symptoms: bool = False
+    ) -> Dict:
+        """
+        Rank formulas for one baby as part of the next batch
+
+        Args:
+            baby_profile: Dictionary with baby profile data
+            top_n: Number of top recommendations
+            min_good_prob: Minimum good probability threshold
+            use_symptoms: Re-rank with symptom weights
+
+        Returns:
+            Ranking dictionary (see FormulaRecommender.rank)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((baby_profile, top_n, min_good_prob, use_symptoms, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Dispatch waiting requests as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        items, self._pending = self._pending, []
+        if not items:
+            return
+
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(None, self._score, items)
+        task.add_done_callback(lambda done: self._resolve(items, done))
+
+    def _score(self, items: List[tuple]) -> List[Dict]:
+        """Score a batch and rank each request (worker thread)"""
+        rec = self.recommender
+        profiles = [item[0] for item in items]
+
+        start = time.perf_counter()
+        scores = rec.score_batch(profiles)
+
+        rankings = []
+        for i, (profile, top_n, min_good_prob, use_symptoms, _) in enumerate(items):
+            rankings.extend(rec.rank_scores(
+                scores,
+                [profile],
+                top_n=top_n,
+                min_good_prob=min_good_prob,
+                use_symptoms=use_symptoms,
+                offset=i
+            ))
+
+        logger.debug(f"Micro-batch of {len(items)} scored in {(time.perf_counter() - start) * 1000:.2f} ms")
+        return rankings
+
+    def _resolve(self, items: List[tuple], done: asyncio.Future):
+        """Hand results (or the error) back to each waiting request"""
+        self.batches += 1
+        self.requests += len(items)
+        self.max_seen = max(self.max_seen, len(items))
+
+        error = done.exception()
+        if error is not None:
+            logger.error(f"Micro-batch of {len(items)} failed: {error}")
+            for item in items:
+                if not item[-1].done():
+                    item[-1].set_exception(error)
+            return
+
+        for item, ranking in zip(items, done.result()):
+            if not item[-1].done():
+                item[-1].set_result(ranking)
+
+    def stats(self) -> Dict:
+        """Batching counters"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else None,
+            "max_batch_seen": self.max_seen,
+        }
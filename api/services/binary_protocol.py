@@ -0,0 +1,223 @@
+"""
+Length-prefixed msgpack protocol for service-to-service calls
+Framing, profile validation and result encoding shared by
+api/binary_server.py and BinaryClient
+
+Frame: 4-byte big-endian payload length + msgpack map.
+
+Request:  {"id": 1, "op": "recommend", "profile": {...}, "top_n": 3, ...}
+Response: {"id": 1, "ok": true, "result": {...}}
+          {"id": 1, "ok": false, "code": 400, "error": "..."}
+
+Responses carry the request id; several requests may be in flight on one
+connection and answers can come back out of order.
+"""
+import re
+import socket
+import struct
+from pathlib import Path
+import logging
+from typing import Any, Dict, Tuple, Union
+import sys
+
+import msgpack
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.schemas.baby import profile_constraints
+from api.services.ranking import ranking_order
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+OPS = ("ping", "formulas", "recommend", "predict", "batch")
+
+PROFILE_CONSTRAINTS = profile_constraints()
+
+
+class ProtocolError(Exception):
+    """Request error reported back to the caller"""
+
+    def __init__(self, message: str, code: int = 400):
+        super().__init__(message)
+        self.code = code
+
+
+def pack_frame(message: Dict) -> bytes:
+    """Encode a message as one length-prefixed frame"""
+    payload = msgpack.packb(message, use_bin_type=True)
+    if len(payload) > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds limit", code=413)
+    return HEADER.pack(len(payload)) + payload
+
+
+def unpack_payload(payload: bytes) -> Dict:
+    """Decode a frame payload"""
+    message = msgpack.unpackb(payload, raw=False)
+    if not isinstance(message, dict):
+        raise ProtocolError("Frame payload must be a map")
+    return message
+
+
+def validate_profile(raw: Any) -> Dict:
+    """
+    Check a baby profile against the BabyProfileWithSymptoms constraints
+
+    Args:
+        raw: Decoded profile map
+
+    Returns:
+        Profile dictionary with optional fields defaulted
+
+    Raises:
+        ProtocolError: Missing or out-of-range field
+    """
+    if not isinstance(raw, dict):
+        raise ProtocolError("profile must be a map")
+
+    profile = {}
+    for name, spec in PROFILE_CONSTRAINTS.items():
+        value = raw.get(name)
+        if value is None:
+            if spec["required"]:
+                raise ProtocolError(f"{name}: field required")
+            profile[name] = spec["default"]
+            continue
+
+        kind = spec["type"]
+        if kind is str:
+            if not isinstance(value, str) or ("pattern" in spec and not re.match(spec["pattern"], value)):
+                raise ProtocolError(f"{name}: invalid value {value!r}")
+        else:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ProtocolError(f"{name}: expected a number")
+            if kind is int:
+                if value != int(value):
+                    raise ProtocolError(f"{name}: expected an integer")
+                value = int(value)
+            else:
+                value = float(value)
+            if (
+                ("ge" in spec and value < spec["ge"])
+                or ("gt" in spec and value <= spec["gt"])
+                or ("le" in spec and value > spec["le"])
+                or ("lt" in spec and value >= spec["lt"])
+            ):
+                raise ProtocolError(f"{name}: {value} out of range")
+        profile[name] = value
+
+    return profile
+
+
+def encode_ranking(ranking: Dict, model_version: str, include_all: bool = False) -> Dict:
+    """
+    Columnar ranking result
+
+    Formula attributes are not repeated; callers fetch them once with the
+    "formulas" op.
+
+    Args:
+        ranking: Result of FormulaRecommender.rank / rank_scores
+        model_version: Model that produced the ranking
+        include_all: Also return every formula in ranked order
+
+    Returns:
+        Map with formula_id / good_probability / predicted_tolerance lists
+        (and adjusted_score with symptoms)
+    """
+    catalog = ranking["catalog"]
+    probs = ranking["good_probabilities"]
+    labels = ranking["predicted_labels"]
+    adjusted = ranking.get("adjusted_scores")
+
+    def columns(positions) -> Dict:
+        positions = list(positions)
+        result = {
+            "formula_id": catalog.formula_ids[positions].tolist(),
+            "good_probability": probs[positions].tolist(),
+            "predicted_tolerance": [str(label) for label in labels[positions]],
+        }
+        if adjusted is not None:
+            result["adjusted_score"] = adjusted[positions].tolist()
+        return result
+
+    result = {"model_version": model_version, "recommendations": columns(ranking["top"])}
+    if include_all:
+        result["all_formulas"] = columns(ranking_order(ranking))
+    return result
+
+
+class BinaryClient:
+    """
+    Blocking client with a persistent connection
+
+    Example:
+        client = BinaryClient("/tmp/smartbottle.sock")
+        client.call("recommend", profile={...}, top_n=3)
+    """
+
+    def __init__(self, address: Union[str, Tuple[str, int]], timeout: float = 5.0):
+        """
+        Connect to a server
+
+        Args:
+            address: Unix socket path or (host, port)
+            timeout: Socket timeout in seconds
+        """
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self._next_id = 0
+
+    def _recv_exact(self, n: int) -> bytes:
+        """Read exactly n bytes"""
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("Connection closed by server")
+            buf += chunk
+        return bytes(buf)
+
+    def send(self, op: str, **params) -> int:
+        """Send a request without waiting; returns its id"""
+        self._next_id += 1
+        self.sock.sendall(pack_frame({"id": self._next_id, "op": op, **params}))
+        return self._next_id
+
+    def receive(self) -> Dict:
+        """Read the next response frame"""
+        (length,) = HEADER.unpack(self._recv_exact(HEADER.size))
+        return unpack_payload(self._recv_exact(length))
+
+    def call(self, op: str, **params) -> Any:
+        """
+        Send a request and wait for its result
+
+        Raises:
+            ProtocolError: Server reported an error
+        """
+        request_id = self.send(op, **params)
+        response = self.receive()
+        if response.get("id") != request_id:
+            raise ProtocolError(f"Out-of-order response {response.get('id')} for {request_id}; use send/receive when pipelining")
+        if not response.get("ok"):
+            raise ProtocolError(response.get("error", "unknown error"), code=response.get("code", 500))
+        return response["result"]
+
+    def close(self):
+        """Close the connection"""
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
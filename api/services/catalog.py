@@ -0,0 +1,303 @@
+"""
+Formula catalog service
+Immutable columnar view of formula master data
+"""
+import json
+import zlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Sequence
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.symptoms import compile_symptom_matrix
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FORMULA_PATH = "data/raw/formula_master.csv"
+
+FORMULA_COLUMNS = [
+    "formula_id",
+    "formula_brand",
+    "category",
+    "lactose_level",
+    "target_issue",
+    "protein_type",
+]
+
+# Formula attributes stored as categorical codes
+CATEGORICAL_COLUMNS = [
+    "category",
+    "lactose_level",
+    "target_issue",
+    "protein_type",
+]
+
+# Formula columns used as model features
+FORMULA_FEATURE_COLUMNS = ["formula_id"] + CATEGORICAL_COLUMNS
+
+
+def _code_dtype(n_categories: int):
+    """Smallest signed integer dtype able to hold category codes (and -1)"""
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+class FormulaCatalog:
+    """
+    Immutable formula catalog
+
+    Formula attributes are stored column-wise: ids as an int64 array with a
+    dict index for O(1) lookup, categorical attributes as small integer codes
+    plus a category table. JSON payloads for the list/detail endpoints and
+    the symptom weight matrix are built once at load time.
+    """
+
+    def __init__(self, formula_df: pd.DataFrame, source: str = "csv"):
+        """
+        Build catalog from formula master data
+
+        Args:
+            formula_df: DataFrame with FORMULA_COLUMNS
+            source: Where the data came from ("csv" or "db")
+        """
+        missing = [col for col in FORMULA_COLUMNS if col not in formula_df.columns]
+        if missing:
+            raise ValueError(f"Formula data missing columns: {missing}")
+
+        df = formula_df[FORMULA_COLUMNS].reset_index(drop=True)
+
+        formula_ids = df["formula_id"].to_numpy(dtype=np.int64)
+        if len(np.unique(formula_ids)) != len(formula_ids):
+            raise ValueError("Duplicate formula_id in formula data")
+        formula_ids.flags.writeable = False
+
+        codes = {}
+        categories = {}
+        for col in CATEGORICAL_COLUMNS:
+            cat = pd.Categorical(df[col].astype(str))
+            col_codes = cat.codes.astype(_code_dtype(len(cat.categories)))
+            col_codes.flags.writeable = False
+            codes[col] = col_codes
+            categories[col] = tuple(str(c) for c in cat.categories)
+
+        brands = tuple(str(b) for b in df["formula_brand"])
+        index = {int(fid): pos for pos, fid in enumerate(formula_ids)}
+
+        records = tuple(
+            {
+                "formula_id": int(formula_ids[pos]),
+                "formula_brand": brands[pos],
+                **{
+                    col: categories[col][codes[col][pos]]
+                    for col in CATEGORICAL_COLUMNS
+                },
+            }
+            for pos in range(len(formula_ids))
+        )
+
+        # Model input columns for all formulas, reused for every request
+        feature_frame = pd.DataFrame(
+            {
+                "formula_id": formula_ids,
+                **{
+                    col: np.asarray(categories[col], dtype=object)[codes[col]]
+                    for col in CATEGORICAL_COLUMNS
+                },
+            }
+        )
+
+        list_json = json.dumps({
+            "status": "success",
+            "count": len(records),
+            "formulas": list(records),
+        }).encode("utf-8")
+        detail_json = tuple(
+            json.dumps({"status": "success", "formula": record}).encode("utf-8")
+            for record in records
+        )
+
+        symptom_matrix = compile_symptom_matrix(
+            [categories["category"][code] for code in codes["category"]]
+        )
+
+        object.__setattr__(self, "source", source)
+        # Content hash: changes whenever any formula or attribute changes
+        object.__setattr__(self, "version", f"{zlib.crc32(list_json):08x}")
+        object.__setattr__(self, "formula_ids", formula_ids)
+        object.__setattr__(self, "brands", brands)
+        object.__setattr__(self, "codes", codes)
+        object.__setattr__(self, "categories", categories)
+        object.__setattr__(self, "symptom_matrix", symptom_matrix)
+        object.__setattr__(self, "_index", index)
+        object.__setattr__(self, "_records", records)
+        object.__setattr__(self, "_feature_frame", feature_frame)
+        object.__setattr__(self, "_list_json", list_json)
+        object.__setattr__(self, "_detail_json", detail_json)
+
+        logger.info(f"Formula catalog built: {len(records)} formulas from {source}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FormulaCatalog is immutable")
+
+    def __len__(self) -> int:
+        return len(self.formula_ids)
+
+    def __contains__(self, formula_id) -> bool:
+        return int(formula_id) in self._index
+
+    @classmethod
+    def from_csv(cls, path: str = DEFAULT_FORMULA_PATH) -> "FormulaCatalog":
+        """
+        Load catalog from formula master CSV
+
+        Args:
+            path: Path to formula_master.csv
+
+        Returns:
+            FormulaCatalog
+        """
+        try:
+            formula_df = pd.read_csv(Path(path))
+            return cls(formula_df, source="csv")
+
+        except FileNotFoundError:
+            logger.error(f"Formula master data not found: {path}")
+            raise
+
+    @classmethod
+    def from_db(cls, loader=None) -> "FormulaCatalog":
+        """
+        Load catalog from the 'formulas' table
+        Falls back to CSV data when the database is unavailable
+
+        Args:
+            loader: SmartBottleDataLoader instance (optional)
+
+        Returns:
+            FormulaCatalog
+        """
+        from src.data.data_loader import SmartBottleDataLoader
+
+        loader = loader or SmartBottleDataLoader()
+        formula_df = loader.load_formulas_from_db()
+        # The loader returns its CSV frame when the database is unavailable
+        source = "csv" if formula_df is loader.formula_df else "db"
+        return cls(formula_df, source=source)
+
+    def position(self, formula_id: int) -> Optional[int]:
+        """Row position of a formula, or None if not in catalog"""
+        return self._index.get(int(formula_id))
+
+    def get(self, formula_id: int) -> Optional[Dict]:
+        """
+        Get formula attributes by id
+
+        Args:
+            formula_id: Formula identifier
+
+        Returns:
+            Formula dictionary, or None if not found
+        """
+        pos = self.position(formula_id)
+        if pos is None:
+            return None
+        return dict(self._records[pos])
+
+    def record(self, pos: int) -> Dict:
+        """Formula attributes at a row position"""
+        return dict(self._records[pos])
+
+    def records(self) -> List[Dict]:
+        """All formulas as a list of dictionaries"""
+        return [dict(r) for r in self._records]
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Decoded values of a formula column
+
+        Args:
+            name: Column name from FORMULA_COLUMNS
+
+        Returns:
+            Array of column values in catalog order
+        """
+        if name == "formula_id":
+            return self.formula_ids
+        if name == "formula_brand":
+            return np.asarray(self.brands, dtype=object)
+        if name in self.codes:
+            return np.asarray(self.categories[name], dtype=object)[self.codes[name]]
+        raise KeyError(f"Unknown formula column: {name}")
+
+    def to_frame(self) -> pd.DataFrame:
+        """Catalog as a DataFrame with the original formula columns"""
+        return pd.DataFrame({col: self.column(col) for col in FORMULA_COLUMNS})
+
+    @property
+    def list_json(self) -> bytes:
+        """Pre-serialized GET /formulas response body"""
+        return self._list_json
+
+    def formula_json(self, formula_id: int) -> Optional[bytes]:
+        """Pre-serialized GET /formulas/{formula_id} response body"""
+        pos = self.position(formula_id)
+        if pos is None:
+            return None
+        return self._detail_json[pos]
+
+    def candidate_frame(
+        self,
+        baby_profile: Dict,
+        positions: Optional[Sequence[int]] = None
+    ) -> pd.DataFrame:
+        """
+        Build model input rows pairing a baby profile with formulas
+
+        Args:
+            baby_profile: Dictionary with baby profile data
+            positions: Catalog row positions (default: all formulas)
+
+        Returns:
+            DataFrame with one row per formula
+        """
+        if positions is None:
+            frame = self._feature_frame.copy()
+        else:
+            frame = self._feature_frame.iloc[list(positions)].reset_index(drop=True)
+
+        for key, value in baby_profile.items():
+            frame[key] = value
+
+        return frame
+
+    def candidate_frame_batch(self, baby_profiles: List[Dict]) -> pd.DataFrame:
+        """
+        Build model input rows pairing several baby profiles with all formulas
+
+        Args:
+            baby_profiles: List of baby profile dictionaries
+
+        Returns:
+            DataFrame with len(self) rows per profile, profile-major
+        """
+        n_formulas = len(self)
+        n_profiles = len(baby_profiles)
+
+        frame = pd.DataFrame({
+            col: np.tile(self._feature_frame[col].to_numpy(), n_profiles)
+            for col in self._feature_frame.columns
+        })
+
+        profile_df = pd.DataFrame(baby_profiles)
+        for col in profile_df.columns:
+            frame[col] = np.repeat(profile_df[col].to_numpy(), n_formulas)
+
+        return frame
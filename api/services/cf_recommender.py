@@ -0,0 +1,358 @@
+"""
+Collaborative-filtering recommendation service
+Scores registered babies with matrix factorization factors (see
+src/training/matrix_factorization.py) and falls back to the KNN model for
+cold starts: babies without factors (or without a baby_id) and formulas
+added after training
+"""
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Union
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.catalog import FormulaCatalog
+from api.services.recommender import FormulaRecommender
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPE = "matrix_factorization"
+
+
+class CFRecommender(FormulaRecommender):
+    """
+    FormulaRecommender backed by baby and formula factors
+
+    A warm cell's predicted tolerance rating (mu + b_u + c_i + p_u . q_i;
+    good = 1, moderate = 0.5, poor = 0) is mapped to its 'good'
+    probability by the package's held-out calibration, so warm and cold
+    cells are ranked and thresholded on one P(good) scale; the predicted
+    label is the nearest rating level. Everything else (ranking, symptoms,
+    encoding, batching) is inherited, and cold cells are scored by the
+    KNN package named in the CF package ("fallback_model"), which also
+    serves explanations.
+    """
+
+    def __init__(self, model_path: str, min_ratings: int = 1, **kwargs):
+        """
+        Initialize recommender
+
+        Args:
+            model_path: CF model package path
+            min_ratings: Ratings a baby needs to be scored by its factors
+            **kwargs: Passed to FormulaRecommender (apply to the fallback)
+        """
+        self.min_ratings = min_ratings
+        self.fallback_version = None
+        self._columns = (None, None)
+        super().__init__(model_path=model_path, **kwargs)
+
+    def load_model(self):
+        """Load the CF package and its KNN fallback package"""
+        package, self._preloaded = self._preloaded, None
+        cf = package if package is not None else joblib.load(self.model_path)
+        if cf.get("model_type") != MODEL_TYPE:
+            raise ValueError(f"{self.model_path} is not a {MODEL_TYPE} package")
+        if cf.get("calibration") is None:
+            raise ValueError(
+                f"{self.model_path} has no P(good) calibration, retrain it with src.training.matrix_factorization"
+            )
+
+        self.cf_package = cf
+        self.baby_ids = np.asarray(cf["baby_ids"], dtype=np.int64)
+        self.baby_factors = cf["baby_factors"]
+        self.baby_bias = cf["baby_bias"]
+        self.baby_counts = cf["baby_counts"]
+        self.factor_formula_ids = np.asarray(cf["formula_ids"], dtype=np.int64)
+        self.formula_factors = cf["formula_factors"]
+        self.formula_bias = cf["formula_bias"]
+        self.formula_counts = cf["formula_counts"]
+        self.global_mean = float(cf["global_mean"])
+        levels = sorted(cf["ratings"].items(), key=lambda item: item[1])
+        self.rating_labels = np.array([label for label, _ in levels], dtype=object)
+        self.rating_values = np.array([value for _, value in levels])
+        self.calibration_ratings = np.asarray(cf["calibration"]["ratings"], dtype=np.float64)
+        self.calibration_good = np.asarray(cf["calibration"]["good_probabilities"], dtype=np.float64)
+        self._columns = (None, None)
+
+        # Fallback package through the regular loader; model_version stays
+        # the CF package name
+        fallback_path = self.model_path.parent / cf["fallback_model"]
+        self._preloaded = joblib.load(fallback_path)
+        self.fallback_version = fallback_path.stem
+        super().load_model()
+        logger.info(
+            f"CF factors: {len(self.baby_ids)} babies x {len(self.factor_formula_ids)} formulas "
+            f"(k={self.baby_factors.shape[1]}), cold starts scored by {self.fallback_version}"
+        )
+
+    @property
+    def model_name(self) -> Optional[str]:
+        """Model family of the CF package"""
+        return self.cf_package.get("model_name")
+
+    def factor_rows(self, baby_profiles: Union[List[Dict], pd.DataFrame]) -> np.ndarray:
+        """
+        Factor row of each profile's baby_id (-1 for cold starts)
+
+        Args:
+            baby_profiles: Profile dictionaries or DataFrame
+
+        Returns:
+            Row index per profile
+        """
+        if isinstance(baby_profiles, pd.DataFrame):
+            if "baby_id" not in baby_profiles:
+                return np.full(len(baby_profiles), -1, dtype=np.int64)
+            ids = pd.to_numeric(baby_profiles["baby_id"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+        else:
+            ids = np.array([
+                -1 if p.get("baby_id") is None else int(p["baby_id"])
+                for p in baby_profiles
+            ], dtype=np.int64)
+
+        positions = np.searchsorted(self.baby_ids, ids)
+        positions = np.minimum(positions, len(self.baby_ids) - 1)
+        found = (self.baby_ids[positions] == ids) & (self.baby_counts[positions] >= self.min_ratings)
+        return np.where(found, positions, -1)
+
+    def formula_columns(self, catalog: FormulaCatalog) -> np.ndarray:
+        """Factor column of each catalog formula (-1 if never rated), cached per catalog"""
+        cached_catalog, columns = self._columns
+        if cached_catalog is catalog:
+            return columns
+        ids = catalog.formula_ids
+        positions = np.minimum(np.searchsorted(self.factor_formula_ids, ids), len(self.factor_formula_ids) - 1)
+        found = (self.factor_formula_ids[positions] == ids) & (self.formula_counts[positions] > 0)
+        columns = np.where(found, positions, -1)
+        self._columns = (catalog, columns)
+        return columns
+
+    def cf_ratings(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """
+        Predicted ratings of factor rows x factor columns
+
+        Args:
+            rows: Baby factor rows
+            columns: Formula factor columns
+
+        Returns:
+            Rating matrix (len(rows) x len(columns))
+        """
+        ratings = (
+            self.baby_factors[rows] @ self.formula_factors[columns].T
+            + self.baby_bias[rows][:, None]
+            + self.formula_bias[columns][None, :]
+            + self.global_mean
+        )
+        return ratings.astype(np.float64)
+
+    def cf_good_probabilities(self, ratings: np.ndarray) -> np.ndarray:
+        """Calibrated 'good' probability of predicted ratings"""
+        return np.interp(ratings, self.calibration_ratings, self.calibration_good)
+
+    def cf_labels(self, ratings: np.ndarray) -> np.ndarray:
+        """Nearest rating level of predicted ratings"""
+        nearest = np.abs(ratings[..., None] - self.rating_values).argmin(axis=-1)
+        return self.rating_labels[nearest]
+
+    def score_batch(
+        self,
+        baby_profiles: Union[List[Dict], pd.DataFrame],
+        use_grid: bool = True,
+        return_neighbors: bool = False
+    ) -> Dict:
+        """
+        Score every formula for a batch of babies
+
+        Warm cells come from the factors; cold rows and formulas without
+        factors are scored by the fallback model in one call. With
+        return_neighbors the fallback scores every row so the neighbor
+        arrays cover the whole matrix, and warm cells keep their factor
+        scores.
+
+        Args:
+            baby_profiles: Profile dictionaries or DataFrame (baby_id
+                selects the factors)
+            use_grid: Passed to the fallback scoring
+            return_neighbors: Keep the fallback's neighbors (explanations)
+
+        Returns:
+            Dictionary like FormulaRecommender.score_batch with
+            probabilities None when any cell came from the factors, and
+            cf_cells (n_babies x n_formulas, True where the factors scored)
+        """
+        rows = self.factor_rows(baby_profiles)
+        warm = rows >= 0
+        if not warm.any():
+            scores = super().score_batch(baby_profiles, use_grid=use_grid, return_neighbors=return_neighbors)
+            scores["cf_cells"] = np.zeros(scores["good_probabilities"].shape, dtype=bool)
+            return scores
+
+        catalog = self.catalog
+        columns = self.formula_columns(catalog)
+        rated = columns >= 0
+        shape = (len(rows), len(catalog))
+
+        good = np.empty(shape)
+        labels = np.empty(shape, dtype=object)
+        cf_cells = np.zeros(shape, dtype=bool)
+        warm_idx = np.flatnonzero(warm)
+        rated_idx = np.flatnonzero(rated)
+        ratings = self.cf_ratings(rows[warm_idx], columns[rated_idx])
+        good[np.ix_(warm_idx, rated_idx)] = self.cf_good_probabilities(ratings)
+        labels[np.ix_(warm_idx, rated_idx)] = self.cf_labels(ratings)
+        cf_cells[np.ix_(warm_idx, rated_idx)] = True
+
+        # Cold babies need every formula, warm babies only unrated ones
+        if return_neighbors or not rated.all():
+            fallback_idx = np.arange(len(rows))
+        else:
+            fallback_idx = np.flatnonzero(~warm)
+        neighbors = {}
+        if len(fallback_idx):
+            if isinstance(baby_profiles, pd.DataFrame):
+                subset = baby_profiles.iloc[fallback_idx]
+            else:
+                subset = [baby_profiles[i] for i in fallback_idx]
+            fallback = super().score_batch(subset, use_grid=use_grid, return_neighbors=return_neighbors)
+            if fallback["catalog"] is not catalog:
+                # Catalog reloaded mid-call: score again against the new one
+                return self.score_batch(baby_profiles, use_grid=use_grid, return_neighbors=return_neighbors)
+            fb_cells = ~cf_cells[fallback_idx]
+            good[fallback_idx] = np.where(fb_cells, fallback["good_probabilities"], good[fallback_idx])
+            labels[fallback_idx] = np.where(fb_cells, fallback["predicted_labels"], labels[fallback_idx])
+            if return_neighbors:
+                neighbors = {
+                    "neighbor_distances": fallback["neighbor_distances"],
+                    "neighbor_indices": fallback["neighbor_indices"],
+                }
+
+        return {
+            "catalog": catalog,
+            "probabilities": None,
+            "good_probabilities": good,
+            "predicted_labels": labels,
+            "source": "cf" if cf_cells.all() else "cf+model",
+            "cf_cells": cf_cells,
+            **neighbors,
+        }
+
+    def rank_scores(
+        self,
+        scores: Dict,
+        baby_profiles: List[Dict],
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        use_symptoms: bool = False,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Rank formulas from an existing score_batch result
+
+        Same as FormulaRecommender.rank_scores; each ranking also keeps
+        its row of cf_cells for explain().
+        """
+        rankings = super().rank_scores(
+            scores,
+            baby_profiles,
+            top_n=top_n,
+            min_good_prob=min_good_prob,
+            use_symptoms=use_symptoms,
+            offset=offset
+        )
+        cf_cells = scores.get("cf_cells")
+        if cf_cells is not None:
+            for i, ranking in enumerate(rankings):
+                ranking["cf_cells"] = cf_cells[offset + i]
+        return rankings
+
+    def explain(
+        self,
+        baby_profile: Dict,
+        ranking: Dict,
+        positions: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """
+        Neighbor attribution for formulas scored by the fallback model
+
+        Formulas scored from the factors have no neighbors behind their
+        score and are left out, so explaining never changes the ranking.
+
+        Args:
+            baby_profile: Baby profile the ranking was computed for
+            ranking: Result of rank(..., explain=True)
+            positions: Catalog positions to explain (default: top N)
+
+        Returns:
+            One dictionary per explained position (see
+            FormulaRecommender.explain)
+        """
+        positions = list(ranking["top"] if positions is None else positions)
+        cf_cells = ranking.get("cf_cells")
+        if cf_cells is not None:
+            positions = [pos for pos in positions if not cf_cells[pos]]
+        return super().explain(baby_profile, ranking, positions)
+
+    def predict_single(
+        self,
+        baby_profile: Dict,
+        formula_id: int,
+        explain: bool = False
+    ) -> Dict:
+        """
+        Predict tolerance for a specific baby-formula combination
+
+        Warm pairs return the factor score with probabilities None and no
+        explanation; cold pairs use the fallback model.
+
+        Args:
+            baby_profile: Dictionary with baby profile (baby_id for factors)
+            formula_id: Formula identifier
+            explain: Add neighbor attribution to fallback predictions
+
+        Returns:
+            Prediction dictionary with "source" ("cf" or "model")
+        """
+        catalog = self.catalog
+        pos = catalog.position(formula_id)
+        if pos is None:
+            raise ValueError(f"Formula ID {formula_id} not found")
+
+        row = self.factor_rows([baby_profile])[0]
+        column = self.formula_columns(catalog)[pos]
+        if row < 0 or column < 0:
+            return {**super().predict_single(baby_profile, formula_id, explain=explain), "source": "model"}
+
+        rating = self.cf_ratings(np.array([row]), np.array([column]))[0]
+        return {
+            "formula_id": formula_id,
+            "formula_brand": catalog.record(pos)["formula_brand"],
+            "predicted_tolerance": str(self.cf_labels(rating)[0]),
+            "good_probability": float(self.cf_good_probabilities(rating)[0]),
+            "probabilities": None,
+            "source": "cf",
+        }
+
+
+def load_recommender(model_path: str, **kwargs) -> FormulaRecommender:
+    """
+    Recommender for any model package
+
+    Args:
+        model_path: Model package path
+        **kwargs: Passed to the recommender
+
+    Returns:
+        CFRecommender for matrix factorization packages, FormulaRecommender
+        otherwise (the package is read once)
+    """
+    package = joblib.load(model_path)
+    if isinstance(package, dict) and package.get("model_type") == MODEL_TYPE:
+        return CFRecommender(model_path=model_path, model_package=package, **kwargs)
+    return FormulaRecommender(model_path=model_path, model_package=package, **kwargs)
@@ -0,0 +1,278 @@
+"""
+Input and prediction drift monitoring
+Keeps fixed-size histograms of incoming baby profiles and of the predicted
+class mix, and compares them with reference statistics of the training
+set (stored in the model package as "reference_stats", built by
+src/evaluation/reference.py) using PSI and KL divergence
+
+Usage (add reference stats to an existing model package):
+    python -m api.services.drift --model models/trained/knn_v1_legacy.pkl
+"""
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from collections import deque
+from pathlib import Path
+import logging
+from typing import Dict, List, Sequence
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.evaluation.reference import build_reference
+
+logger = logging.getLogger(__name__)
+
+# Probability floor so empty bins do not give infinite scores
+EPSILON = 1e-4
+
+
+def psi(live: np.ndarray, reference: np.ndarray) -> float:
+    """Population stability index between two count vectors"""
+    p = np.maximum(live / max(live.sum(), 1e-12), EPSILON)
+    q = np.maximum(reference / max(reference.sum(), 1e-12), EPSILON)
+    return float(np.sum((p - q) * np.log(p / q)))
+
+
+def kl_divergence(live: np.ndarray, reference: np.ndarray) -> float:
+    """KL(live || reference) between two count vectors"""
+    p = np.maximum(live / max(live.sum(), 1e-12), EPSILON)
+    q = np.maximum(reference / max(reference.sum(), 1e-12), EPSILON)
+    p, q = p / p.sum(), q / q.sum()
+    return float(np.sum(p * np.log(p / q)))
+
+
+class DriftMonitor:
+    """
+    Streaming histograms of served profiles and predicted labels
+
+    observe() only appends to a deque (atomic under the GIL). Every
+    batch_size calls, the caller that crosses the threshold folds the
+    queue into the histograms if no other thread is folding; otherwise it
+    returns at once. Memory is the fixed histogram size plus at most
+    max_pending queued observations (further observations are counted as
+    dropped).
+
+    Two windows are kept: "total" since start and "recent", whose counts
+    decay with a half-life of half_life profiles.
+    """
+
+    def __init__(
+        self,
+        reference: Dict,
+        half_life: float = 5000.0,
+        batch_size: int = 256,
+        max_pending: int = 65536
+    ):
+        """
+        Initialize monitor
+
+        Args:
+            reference: Result of build_reference
+            half_life: Profiles after which recent counts weigh half
+            batch_size: Observations queued before folding
+            max_pending: Queue bound
+        """
+        self.reference = reference
+        self.half_life = half_life
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        self.features = reference["features"]
+        self.classes = reference["classes"]
+        self._class_index = {label: i for i, label in enumerate(self.classes)}
+
+        self.total = {name: np.zeros(len(spec["counts"])) for name, spec in self.features.items()}
+        self.recent = {name: np.zeros(len(spec["counts"])) for name, spec in self.features.items()}
+        self.total_classes = np.zeros(len(self.classes))
+        self.recent_classes = np.zeros(len(self.classes))
+
+        self.profiles_seen = 0
+        self.dropped = 0
+        self._pending = deque()
+        self._fold_lock = threading.Lock()
+
+    def observe(self, baby_profiles, predicted_labels: np.ndarray):
+        """
+        Record served profiles and their predicted labels (hot path)
+
+        Args:
+            baby_profiles: List of profile dictionaries or a DataFrame
+            predicted_labels: Predicted label per profile x formula
+        """
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((baby_profiles, predicted_labels))
+        if len(self._pending) >= self.batch_size:
+            self.fold(blocking=False)
+
+    def fold(self, blocking: bool = True):
+        """Move queued observations into the histograms"""
+        if not self._fold_lock.acquire(blocking=blocking):
+            return
+        try:
+            items = []
+            while self._pending:
+                items.append(self._pending.popleft())
+            if not items:
+                return
+
+            # Column values without building per-observation DataFrames
+            columns = {name: [] for name in self.features}
+            n = 0
+            for profiles, _ in items:
+                if isinstance(profiles, pd.DataFrame):
+                    for name in columns:
+                        if name in profiles:
+                            columns[name].extend(profiles[name].tolist())
+                    n += len(profiles)
+                else:
+                    for name, values in columns.items():
+                        values.extend(p.get(name) for p in profiles)
+                    n += len(profiles)
+            labels = np.concatenate([np.asarray(l).ravel() for _, l in items])
+
+            decay = 0.5 ** (n / self.half_life)
+
+            for name, spec in self.features.items():
+                if spec["kind"] == "numeric":
+                    values = np.array([v for v in columns[name] if v is not None], dtype=np.float64)
+                    values = values[~np.isnan(values)]
+                    counts = np.bincount(
+                        np.searchsorted(spec["edges"], values, side="right"),
+                        minlength=len(spec["counts"])
+                    )
+                else:
+                    # Unknown categories go to the last ("other") slot
+                    index = {c: i for i, c in enumerate(spec["categories"])}
+                    other = len(spec["categories"])
+                    codes = [index.get(str(v), other) for v in columns[name]]
+                    counts = np.bincount(np.asarray(codes, dtype=np.intp), minlength=len(spec["counts"]))
+                self.total[name] += counts
+                self.recent[name] = self.recent[name] * decay + counts
+
+            uniques, counts = np.unique(labels.astype(str), return_counts=True)
+            class_counts = np.zeros(len(self.classes))
+            for label, count in zip(uniques, counts):
+                index = self._class_index.get(label)
+                if index is not None:
+                    class_counts[index] += count
+            self.total_classes += class_counts
+            self.recent_classes = self.recent_classes * decay + class_counts
+
+            self.profiles_seen += n
+        finally:
+            self._fold_lock.release()
+
+    def scores(self) -> Dict:
+        """
+        PSI / KL per feature and for the class mix, both windows
+
+        Returns:
+            Dictionary with profiles_seen, dropped and
+            scores[window][name] = {"psi", "kl"}
+        """
+        self.fold()
+        result = {"profiles_seen": self.profiles_seen, "dropped": self.dropped, "scores": {}}
+        for window, live, live_classes in (
+            ("total", self.total, self.total_classes),
+            ("recent", self.recent, self.recent_classes),
+        ):
+            window_scores = {}
+            if self.profiles_seen:
+                for name, spec in self.features.items():
+                    reference = np.asarray(spec["counts"], dtype=np.float64)
+                    window_scores[name] = {
+                        "psi": psi(live[name], reference),
+                        "kl": kl_divergence(live[name], reference),
+                    }
+                reference = np.asarray(self.reference["class_counts"], dtype=np.float64)
+                window_scores["predicted_class"] = {
+                    "psi": psi(live_classes, reference),
+                    "kl": kl_divergence(live_classes, reference),
+                }
+            result["scores"][window] = window_scores
+        return result
+
+
+def prometheus_text(monitors: Dict[str, DriftMonitor]) -> str:
+    """
+    Render drift scores in the Prometheus text exposition format
+
+    Args:
+        monitors: Model version -> monitor
+
+    Returns:
+        Metrics text
+    """
+    lines = [
+        "# HELP smartbottle_drift_psi Population stability index of served inputs vs training",
+        "# TYPE smartbottle_drift_psi gauge",
+    ]
+    kl_lines = [
+        "# HELP smartbottle_drift_kl KL divergence of served inputs vs training",
+        "# TYPE smartbottle_drift_kl gauge",
+    ]
+    seen_lines = [
+        "# HELP smartbottle_drift_profiles_total Profiles observed by the drift monitor",
+        "# TYPE smartbottle_drift_profiles_total counter",
+    ]
+    dropped_lines = [
+        "# HELP smartbottle_drift_dropped_total Observations dropped because the monitor queue was full",
+        "# TYPE smartbottle_drift_dropped_total counter",
+    ]
+    for model, monitor in monitors.items():
+        snapshot = monitor.scores()
+        seen_lines.append(f'smartbottle_drift_profiles_total{{model="{model}"}} {snapshot["profiles_seen"]}')
+        dropped_lines.append(f'smartbottle_drift_dropped_total{{model="{model}"}} {snapshot["dropped"]}')
+        for window, window_scores in snapshot["scores"].items():
+            for name, values in window_scores.items():
+                labels = f'model="{model}",feature="{name}",window="{window}"'
+                lines.append(f"smartbottle_drift_psi{{{labels}}} {values['psi']:.6g}")
+                kl_lines.append(f"smartbottle_drift_kl{{{labels}}} {values['kl']:.6g}")
+    return "\n".join(lines + kl_lines + seen_lines + dropped_lines) + "\n"
+
+
+def reference_from_training_data(model, classes: Sequence[str], data_dir: str = "data/raw") -> Dict:
+    """
+    Reference statistics from the current training data
+
+    For model packages saved without "reference_stats".
+
+    Args:
+        model: Fitted pipeline (predict_proba)
+        classes: Class labels
+        data_dir: Training data directory
+
+    Returns:
+        Reference dictionary
+    """
+    from src.data.data_loader import SmartBottleDataLoader
+
+    X, _ = SmartBottleDataLoader(data_dir=data_dir).prepare_training_data(quarantine_path=None)
+    return build_reference(X, model.predict_proba, classes)
+
+
+def main(argv=None):
+    """Add reference_stats to a model package"""
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Store drift reference statistics in a model package")
+    parser.add_argument("--model", required=True, help="Model package path")
+    parser.add_argument("--data-dir", default="data/raw", help="Training data directory")
+    args = parser.parse_args(argv)
+
+    package = joblib.load(args.model)
+    package["reference_stats"] = reference_from_training_data(
+        package["model_pipeline"], package["label_encoder"].classes_, args.data_dir
+    )
+    joblib.dump(package, args.model)
+    print(f"Reference statistics saved to {args.model}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
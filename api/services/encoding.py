@@ -0,0 +1,218 @@
+"""
+Pre-encoded JSON serialization for recommendation responses
+"""
+import json
+import math
+from pathlib import Path
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.catalog import FormulaCatalog
+from api.services.ranking import ranking_order
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        """Serialize object to JSON bytes"""
+        return orjson.dumps(obj)
+
+except ImportError:  # pragma: no cover - orjson is optional
+    logger.warning("orjson not installed, using standard json encoder")
+
+    def dumps(obj) -> bytes:
+        """Serialize object to JSON bytes"""
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class RecommendationEncoder:
+    """
+    Encode recommendation responses from cached per-formula fragments
+
+    Static formula fields (brand, category, lactose_level, target_issue,
+    protein_type) are encoded once per catalog. Per request only the
+    probability and predicted label are validated and appended.
+    """
+
+    def __init__(
+        self,
+        catalog: FormulaCatalog,
+        classes: Sequence[str],
+        model_version: str
+    ):
+        """
+        Build encoder for a catalog / model pair
+
+        Args:
+            catalog: Formula catalog
+            classes: Tolerance class labels of the model
+            model_version: Model version string
+        """
+        self.catalog = catalog
+        self.model_version = model_version
+
+        # '{"formula_id":1,...,"protein_type":"standard",' - closed per request
+        self._fragments = tuple(
+            dumps(record)[:-1] + b","
+            for record in catalog.records()
+        )
+        self._labels = {str(label): dumps(str(label)) for label in classes}
+        self._suffix = b',"model_version":' + dumps(model_version) + b"}"
+
+    def encode_formula(
+        self,
+        pos: int,
+        good_probability: float,
+        label: str,
+        adjusted_score: Optional[float] = None
+    ) -> bytes:
+        """
+        Encode one formula recommendation
+
+        Args:
+            pos: Catalog row position
+            good_probability: Predicted 'good' probability
+            label: Predicted tolerance label
+            adjusted_score: Symptom-adjusted score (optional)
+
+        Returns:
+            JSON object bytes
+        """
+        prob = float(good_probability)
+        if not math.isfinite(prob) or prob < 0.0 or prob > 1.0:
+            raise ValueError(f"Invalid good_probability for formula position {pos}: {prob}")
+
+        encoded_label = self._labels.get(label)
+        if encoded_label is None:
+            raise ValueError(f"Unknown tolerance label: {label}")
+
+        parts = [
+            self._fragments[pos],
+            b'"good_probability":', repr(prob).encode("ascii"),
+            b',"predicted_tolerance":', encoded_label,
+            b',"recommendation_reason":null',
+        ]
+
+        if adjusted_score is not None:
+            score = float(adjusted_score)
+            if not math.isfinite(score) or score < 0.0:
+                raise ValueError(f"Invalid adjusted_score for formula position {pos}: {score}")
+            parts += [
+                b',"adjusted_score":', repr(score).encode("ascii"),
+                b',"symptom_matched":', b"true" if score > prob else b"false",
+            ]
+
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def encode_formulas(
+        self,
+        positions: Iterable[int],
+        good_probabilities: Sequence[float],
+        labels: Sequence[str],
+        adjusted_scores: Optional[Sequence[float]] = None
+    ) -> bytes:
+        """
+        Encode a list of formula recommendations
+
+        Args:
+            positions: Catalog row positions, in output order
+            good_probabilities: 'good' probability per catalog position
+            labels: Predicted label per catalog position
+            adjusted_scores: Symptom-adjusted score per catalog position (optional)
+
+        Returns:
+            JSON array bytes
+        """
+        if adjusted_scores is None:
+            return b"[" + b",".join(
+                self.encode_formula(pos, good_probabilities[pos], labels[pos])
+                for pos in positions
+            ) + b"]"
+
+        return b"[" + b",".join(
+            self.encode_formula(pos, good_probabilities[pos], labels[pos], adjusted_scores[pos])
+            for pos in positions
+        ) + b"]"
+
+    def _encode_ranking(self, ranking: Dict, include_all: bool) -> List[bytes]:
+        """Encode the recommendations / all_formulas fields of a ranking"""
+        probs = ranking["good_probabilities"]
+        labels = ranking["predicted_labels"]
+        adjusted = ranking.get("adjusted_scores")
+
+        parts = [
+            b'"recommendations":', self.encode_formulas(ranking["top"], probs, labels, adjusted),
+        ]
+        if include_all:
+            parts += [
+                b',"all_formulas":', self.encode_formulas(ranking_order(ranking), probs, labels, adjusted),
+            ]
+        return parts
+
+    def encode_response(
+        self,
+        baby_profile: Dict,
+        ranking: Dict,
+        include_all: bool = True,
+        extra: Optional[Dict] = None
+    ) -> bytes:
+        """
+        Encode a full /recommend response body
+
+        Args:
+            baby_profile: Validated baby profile dictionary
+            ranking: Result of FormulaRecommender.rank()
+            include_all: Include the all_formulas list
+            extra: Additional top-level fields (encoded with dumps)
+
+        Returns:
+            JSON response bytes
+        """
+        parts = [
+            b'{"status":"success","baby_profile":', dumps(baby_profile), b",",
+        ]
+        parts += self._encode_ranking(ranking, include_all)
+        if extra:
+            for key, value in extra.items():
+                parts += [b",", dumps(key), b":", dumps(value)]
+        parts.append(self._suffix)
+
+        return b"".join(parts)
+
+    def encode_batch_response(
+        self,
+        baby_profiles: List[Dict],
+        rankings: List[Dict],
+        include_all: bool = False
+    ) -> bytes:
+        """
+        Encode a batch recommendation response body
+
+        Args:
+            baby_profiles: Validated baby profile dictionaries
+            rankings: Results of FormulaRecommender.rank_batch()
+            include_all: Include all_formulas for each baby
+
+        Returns:
+            JSON response bytes
+        """
+        results = []
+        for baby_profile, ranking in zip(baby_profiles, rankings):
+            results.append(b"".join(
+                [b'{"baby_profile":', dumps(baby_profile), b","]
+                + self._encode_ranking(ranking, include_all)
+                + [b"}"]
+            ))
+
+        return b"".join((
+            b'{"status":"success","count":', str(len(results)).encode("ascii"),
+            b',"results":[', b",".join(results), b"]",
+            self._suffix,
+        ))
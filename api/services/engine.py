@@ -0,0 +1,534 @@
+"""
+Compact KNN serving engine
+Re-implements predict_proba of a fitted (ColumnTransformer + KNeighborsClassifier)
+pipeline over a compact training index: scaled numeric features as float32
+and one-hot categoricals as small integer codes.
+
+Squared euclidean distance on the one-hot block is 2 per mismatched column
+(1 if the query category was unseen in training), and manhattan distance is
+the same count, so the categorical part comes from code equality instead of
+dense one-hot vectors.
+
+Probabilities differ from sklearn only by float32 rounding of the numeric
+distances, which can reorder neighbors whose distances tie to ~1e-6. On
+knn_v1_legacy (recommend candidates for the 100 training profiles) the
+maximum absolute difference is below 1e-6 and predicted labels agree; use
+compare_with_pipeline() to measure a new model.
+
+Neighbor search is blocked: each query block is compared with the training
+index one tile at a time and only the running k best survive each tile, so
+memory is bounded by the tile size instead of queries x training rows.
+Query blocks run on a shared thread pool (NumPy releases the GIL).
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.catalog import _code_dtype
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_METRICS = ("euclidean", "manhattan")
+
+# Tile of query rows x training rows; 128 x 2048 float32 = 1 MB, about one
+# L2 cache, plus the same again for the categorical mismatch count
+QUERY_BLOCK = 128
+TRAIN_BLOCK = 2048
+
+# Skip the thread pool below this many distance evaluations
+PARALLEL_MIN_PAIRS = 1 << 20
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def default_threads() -> int:
+    """ENGINE_THREADS, or the CPUs available to this process"""
+    value = os.getenv("ENGINE_THREADS")
+    if value:
+        return max(1, int(value))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _thread_pool(n_threads: int) -> ThreadPoolExecutor:
+    """Shared pool for query blocks (grown if a larger size is requested)"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL._max_workers < n_threads:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL = ThreadPoolExecutor(max_workers=n_threads, thread_name_prefix="knn-engine")
+        return _POOL
+
+
+def _knn_metric(knn) -> Optional[str]:
+    """Normalized metric name of a KNeighborsClassifier, None if unsupported"""
+    metric = knn.effective_metric_
+    params = knn.effective_metric_params_ or {}
+    if metric == "minkowski":
+        p = params.get("p", knn.p)
+        metric = {1: "manhattan", 2: "euclidean"}.get(p)
+    if metric in ("l2",):
+        metric = "euclidean"
+    if metric in ("l1", "cityblock"):
+        metric = "manhattan"
+    return metric if metric in SUPPORTED_METRICS else None
+
+
+class KNNServingEngine:
+    """
+    Compact-dtype KNN engine for serving
+
+    Build with from_pipeline(); predict_proba() accepts the same DataFrame
+    as the sklearn pipeline.
+    """
+
+    def __init__(
+        self,
+        numeric_cols: List[str],
+        categorical_cols: List[str],
+        numeric_transform,
+        categories: List[np.ndarray],
+        train_numeric: np.ndarray,
+        train_codes: np.ndarray,
+        train_labels: np.ndarray,
+        n_classes: int,
+        n_neighbors: int,
+        weights: str,
+        metric: str,
+        n_threads: Optional[int] = None
+    ):
+        """
+        Initialize engine (use from_pipeline)
+
+        Args:
+            numeric_cols: Numeric input columns
+            categorical_cols: Categorical input columns
+            numeric_transform: Callable mapping raw numeric values to scaled float64
+            categories: Fitted categories per categorical column
+            train_numeric: Scaled training numerics (n_train x n_numeric, float32)
+            train_codes: Training category codes (n_train x n_categorical)
+            train_labels: Encoded training labels
+            n_classes: Number of classes
+            n_neighbors: k
+            weights: "uniform" or "distance"
+            metric: "euclidean" or "manhattan"
+            n_threads: Threads for neighbor search (default: default_threads())
+        """
+        self.numeric_cols = numeric_cols
+        self.categorical_cols = categorical_cols
+        self.numeric_transform = numeric_transform
+        self.categories = categories
+        # Hash index per column: unseen values map to -1 without a Categorical
+        self._category_index = [pd.Index(cats) for cats in categories]
+        self.train_numeric = np.ascontiguousarray(train_numeric, dtype=np.float32)
+        self.train_codes = np.ascontiguousarray(train_codes)
+        self.train_labels = np.asarray(train_labels, dtype=np.intp)
+        self.n_classes = n_classes
+        self.n_neighbors = min(n_neighbors, len(train_labels))
+        self.weights = weights
+        self.metric = metric
+        self.n_threads = n_threads or default_threads()
+        self.query_block = QUERY_BLOCK
+        self.train_block = TRAIN_BLOCK
+
+        self.train_numeric.flags.writeable = False
+        self.train_codes.flags.writeable = False
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> Optional["KNNServingEngine"]:
+        """
+        Build engine from a fitted preprocessor + KNeighborsClassifier pipeline
+
+        Args:
+            pipeline: Fitted sklearn Pipeline
+
+        Returns:
+            KNNServingEngine, or None if the pipeline is not supported
+        """
+        from sklearn.compose import ColumnTransformer
+        from sklearn.neighbors import KNeighborsClassifier
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        try:
+            preprocessor = pipeline.named_steps["preprocessor"]
+            knn = pipeline.named_steps["classifier"]
+        except (AttributeError, KeyError):
+            return None
+
+        if not isinstance(preprocessor, ColumnTransformer) or not isinstance(knn, KNeighborsClassifier):
+            return None
+        if knn.weights not in ("uniform", "distance"):
+            logger.info(f"Compact engine: unsupported weights {knn.weights!r}")
+            return None
+
+        metric = _knn_metric(knn)
+        if metric is None:
+            logger.info(f"Compact engine: unsupported metric {knn.effective_metric_!r}")
+            return None
+
+        numeric = categorical = None
+        for name, transformer, cols in preprocessor.transformers_:
+            if name == "remainder" and transformer == "drop":
+                continue
+            if name == "num":
+                numeric = (transformer, list(cols))
+            elif name == "cat":
+                categorical = (transformer, list(cols))
+            else:
+                return None
+        if numeric is None or categorical is None:
+            return None
+
+        num_transformer, numeric_cols = numeric
+        cat_transformer, categorical_cols = categorical
+
+        encoder = cat_transformer.steps[-1][1] if isinstance(cat_transformer, Pipeline) else cat_transformer
+        if not isinstance(encoder, OneHotEncoder) or getattr(encoder, "drop_idx_", None) is not None:
+            return None
+        if getattr(encoder, "_infrequent_enabled", False):
+            return None
+
+        # Numeric transform: direct formula for StandardScaler, sklearn otherwise
+        scaler = num_transformer.steps[-1][1] if isinstance(num_transformer, Pipeline) else num_transformer
+        if isinstance(num_transformer, Pipeline) and len(num_transformer.steps) == 1 and isinstance(scaler, StandardScaler):
+            mean = scaler.mean_ if scaler.with_mean else np.zeros(len(numeric_cols))
+            scale = scaler.scale_ if scaler.with_std else np.ones(len(numeric_cols))
+
+            def numeric_transform(values, mean=mean, scale=scale):
+                return (values - mean) / scale
+        elif num_transformer == "passthrough":
+            def numeric_transform(values):
+                return values
+        else:
+            def numeric_transform(values, transformer=num_transformer, cols=numeric_cols):
+                return transformer.transform(pd.DataFrame(values, columns=cols))
+
+        # Decode the fitted training matrix into numerics + category codes
+        fit_X = knn._fit_X
+        fit_X = fit_X.toarray() if hasattr(fit_X, "toarray") else np.asarray(fit_X)
+        n_numeric = len(numeric_cols)
+        train_numeric = fit_X[:, :n_numeric]
+
+        categories = [np.asarray(c) for c in encoder.categories_]
+        code_dtype = _code_dtype(max(len(c) for c in categories))
+        train_codes = np.empty((fit_X.shape[0], len(categories)), dtype=code_dtype)
+        offset = n_numeric
+        for j, cats in enumerate(categories):
+            block = fit_X[:, offset:offset + len(cats)]
+            if not np.all(block.sum(axis=1) == 1):
+                logger.info("Compact engine: training one-hot block is not single-hot")
+                return None
+            train_codes[:, j] = block.argmax(axis=1)
+            offset += len(cats)
+        if offset != fit_X.shape[1]:
+            return None
+
+        engine = cls(
+            numeric_cols=numeric_cols,
+            categorical_cols=categorical_cols,
+            numeric_transform=numeric_transform,
+            categories=categories,
+            train_numeric=train_numeric,
+            train_codes=train_codes,
+            train_labels=knn._y,
+            n_classes=len(knn.classes_),
+            n_neighbors=knn.n_neighbors,
+            weights=knn.weights,
+            metric=metric,
+        )
+        logger.info(
+            f"Compact engine built: {fit_X.shape[0]} rows, {engine.nbytes} bytes "
+            f"(dense float64 index: {fit_X.nbytes} bytes)"
+        )
+        return engine
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the training index"""
+        return (
+            self.train_numeric.nbytes
+            + self.train_codes.nbytes
+            + self.train_labels.nbytes
+        )
+
+    def transform(self, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encode query rows
+
+        Args:
+            X: Feature DataFrame (pipeline input columns)
+
+        Returns:
+            (scaled numerics float32, category codes with -1 for unseen values)
+        """
+        numeric = self.numeric_transform(X[self.numeric_cols].to_numpy(dtype=np.float64))
+        numeric = np.ascontiguousarray(numeric, dtype=np.float32)
+
+        codes = np.empty((len(X), len(self.categorical_cols)), dtype=self.train_codes.dtype)
+        for j, (col, index) in enumerate(zip(self.categorical_cols, self._category_index)):
+            codes[:, j] = index.get_indexer(X[col].to_numpy())
+        return numeric, codes
+
+    def distances(
+        self,
+        numeric: np.ndarray,
+        codes: np.ndarray,
+        start: int = 0,
+        stop: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Distances from encoded queries to a range of training rows
+
+        Args:
+            numeric: Scaled query numerics (n_queries x n_numeric)
+            codes: Query category codes (n_queries x n_categorical)
+            start: First training row
+            stop: End of the training row range (default: all rows)
+
+        Returns:
+            Distance matrix (n_queries x (stop - start), float32)
+        """
+        train_numeric = self.train_numeric[start:stop]
+        train_codes = self.train_codes[start:stop]
+        n_queries, n_train = len(codes), len(train_codes)
+
+        # One pass per column keeps memory at n_queries x n_train and
+        # gives exact zeros for identical rows (no |q|^2 + |t|^2 - 2qt
+        # cancellation)
+        dist = np.zeros((n_queries, n_train), dtype=np.float32)
+        diff = np.empty((n_queries, n_train), dtype=np.float32)
+        for j in range(numeric.shape[1]):
+            np.subtract(numeric[:, j, None], train_numeric[None, :, j], out=diff)
+            if self.metric == "euclidean":
+                np.multiply(diff, diff, out=diff)
+            else:
+                np.abs(diff, out=diff)
+            dist += diff
+
+        mismatch = diff
+        mismatch.fill(0.0)
+        for j in range(codes.shape[1]):
+            mismatch += codes[:, j, None] != train_codes[None, :, j]
+        unseen = (codes < 0).sum(axis=1).astype(np.float32)
+        dist += 2.0 * mismatch - unseen[:, None]
+
+        if self.metric == "euclidean":
+            np.sqrt(dist, out=dist)
+        return dist
+
+    def kneighbors(self, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest training rows for each query
+
+        Args:
+            X: Feature DataFrame
+
+        Returns:
+            (distances, training row indices), each n_queries x k, nearest first
+        """
+        numeric, codes = self.transform(X)
+        return self.kneighbors_encoded(numeric, codes)
+
+    def kneighbors_encoded(self, numeric: np.ndarray, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest training rows for encoded queries
+
+        Query blocks are searched in parallel when the batch is large
+        enough; each block holds at most one tile of distances.
+
+        Args:
+            numeric: Scaled query numerics (n_queries x n_numeric)
+            codes: Query category codes (n_queries x n_categorical)
+
+        Returns:
+            (distances, training row indices), each n_queries x k, nearest first
+        """
+        n_queries, k = len(codes), self.n_neighbors
+        neigh_dist = np.empty((n_queries, k), dtype=np.float32)
+        neigh_idx = np.empty((n_queries, k), dtype=np.intp)
+
+        def search(start: int):
+            stop = min(start + self.query_block, n_queries)
+            neigh_dist[start:stop], neigh_idx[start:stop] = self._search_block(
+                numeric[start:stop], codes[start:stop]
+            )
+
+        starts = range(0, n_queries, self.query_block)
+        parallel = (
+            self.n_threads > 1
+            and len(starts) > 1
+            and n_queries * len(self.train_labels) >= PARALLEL_MIN_PAIRS
+        )
+        if parallel:
+            # list() re-raises worker exceptions
+            list(_thread_pool(self.n_threads).map(search, starts))
+        else:
+            for start in starts:
+                search(start)
+        return neigh_dist, neigh_idx
+
+    def _search_block(self, numeric: np.ndarray, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Running top-k of one query block over the training tiles"""
+        k = self.n_neighbors
+        n_train = len(self.train_labels)
+        best_dist = best_idx = None
+
+        for start in range(0, n_train, self.train_block):
+            stop = min(start + self.train_block, n_train)
+            dist = self.distances(numeric, codes, start, stop)
+
+            if k < stop - start:
+                idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                cand_dist = np.take_along_axis(dist, idx, axis=1)
+                cand_idx = idx + start
+            else:
+                cand_dist = dist
+                cand_idx = np.broadcast_to(np.arange(start, stop), dist.shape)
+
+            if best_dist is not None:
+                cand_dist = np.concatenate([best_dist, cand_dist], axis=1)
+                cand_idx = np.concatenate([best_idx, cand_idx], axis=1)
+
+            # Keep the k smallest by (distance, row index) for deterministic ties
+            order = np.lexsort((cand_idx, cand_dist), axis=1)[:, :k]
+            best_dist = np.take_along_axis(cand_dist, order, axis=1)
+            best_idx = np.take_along_axis(cand_idx, order, axis=1)
+
+        return best_dist, best_idx
+
+    def neighbor_weights(self, neigh_dist: np.ndarray) -> np.ndarray:
+        """Vote weights with sklearn semantics (exact matches take all weight)"""
+        if self.weights == "uniform":
+            return np.ones_like(neigh_dist, dtype=np.float64)
+
+        with np.errstate(divide="ignore"):
+            w = 1.0 / neigh_dist.astype(np.float64)
+        inf_mask = np.isinf(w)
+        inf_row = inf_mask.any(axis=1)
+        w[inf_row] = inf_mask[inf_row]
+        return w
+
+    def proba_from_neighbors(self, neigh_dist: np.ndarray, neigh_idx: np.ndarray) -> np.ndarray:
+        """Class probabilities from neighbor distances and indices"""
+        w = self.neighbor_weights(neigh_dist)
+        labels = self.train_labels[neigh_idx]
+
+        proba = np.zeros((len(neigh_idx), self.n_classes), dtype=np.float64)
+        rows = np.repeat(np.arange(len(neigh_idx)), neigh_idx.shape[1])
+        np.add.at(proba, (rows, labels.ravel()), w.ravel())
+
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        return proba / normalizer
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Class probabilities, same layout as pipeline.predict_proba
+
+        Args:
+            X: Feature DataFrame
+
+        Returns:
+            Probabilities (n_queries x n_classes)
+        """
+        neigh_dist, neigh_idx = self.kneighbors(X)
+        return self.proba_from_neighbors(neigh_dist, neigh_idx)
+
+    @property
+    def feature_names(self) -> List[str]:
+        """Input columns in distance component order"""
+        return self.numeric_cols + self.categorical_cols
+
+    def distance_components(self, X: pd.DataFrame, neigh_idx: np.ndarray) -> np.ndarray:
+        """
+        Per-feature terms of the distance to given training rows
+
+        Terms sum to the squared distance (euclidean) or the distance
+        (manhattan). Only the given rows are touched, so explaining a few
+        results does not repeat the neighbor search.
+
+        Args:
+            X: Feature rows (n_rows)
+            neigh_idx: Training row indices (n_rows x k)
+
+        Returns:
+            Components (n_rows x k x n_features), columns as feature_names
+        """
+        numeric, codes = self.transform(X)
+
+        diff = numeric[:, None, :] - self.train_numeric[neigh_idx]
+        numeric_terms = diff * diff if self.metric == "euclidean" else np.abs(diff)
+
+        train_codes = self.train_codes[neigh_idx]
+        mismatch = codes[:, None, :] != train_codes
+        categorical_terms = np.where(mismatch, np.where(codes[:, None, :] < 0, 1.0, 2.0), 0.0)
+
+        return np.concatenate([numeric_terms, categorical_terms.astype(np.float32)], axis=2)
+
+    def match_training_rows(self, X: pd.DataFrame, labels: np.ndarray) -> np.ndarray:
+        """
+        Locate training rows in a feature table by exact match
+
+        Used to recover log_ids for model packages saved without them.
+
+        Args:
+            X: Candidate source rows (e.g. all feeding logs)
+            labels: Encoded labels of X
+
+        Returns:
+            Row position in X per training row (-1 when not found)
+        """
+        numeric, codes = self.transform(X)
+        labels = np.asarray(labels)
+
+        matches = np.full(len(self.train_labels), -1, dtype=np.int64)
+        used = np.zeros(len(X), dtype=bool)
+        n_train = len(self.train_labels)
+        for start in range(0, len(X), self.query_block):
+            stop = min(start + self.query_block, len(X))
+            for train_start in range(0, n_train, self.train_block):
+                train_stop = min(train_start + self.train_block, n_train)
+                dist = self.distances(numeric[start:stop], codes[start:stop], train_start, train_stop)
+                for row, train in zip(*np.nonzero(dist == 0.0)):
+                    pos, train = start + row, train_start + train
+                    if matches[train] < 0 and not used[pos] and labels[pos] == self.train_labels[train]:
+                        matches[train] = pos
+                        used[pos] = True
+        return matches
+
+
+def compare_with_pipeline(engine: KNNServingEngine, pipeline, X: pd.DataFrame) -> Dict:
+    """
+    Measure probability differences between the engine and sklearn
+
+    Args:
+        engine: Compact engine
+        pipeline: Source sklearn pipeline
+        X: Feature rows to compare on
+
+    Returns:
+        Dictionary with max/mean absolute difference and label agreement
+    """
+    exact = pipeline.predict_proba(X)
+    approx = engine.predict_proba(X)
+    diff = np.abs(exact - approx)
+    return {
+        "rows": int(len(X)),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "label_agreement": float(np.mean(exact.argmax(axis=1) == approx.argmax(axis=1))),
+    }
@@ -0,0 +1,372 @@
+"""
+Growth trajectory forecasting (MODEL_PROPOSAL.md 3-2)
+Fits a trend per baby of its weight and length WHO z-scores
+(z = level + slope * months) and projects both forward. All babies are fitted at once with closed-form
+weighted least squares over grouped arrays, instead of one time-series
+model per baby
+
+Projected measurements can be turned into BabyProfile rows (age, weight
+and height moved forward, other fields kept) and scored like any other
+profile, e.g. with src.scoring.bulk
+
+Usage:
+    # Forecasts for every baby in a feeding log file, plus 3-month profiles for bulk scoring
+    python -m api.services.growth --input data/raw/feeding_logs.csv --horizon 1 3 6 \\
+        --out data/growth/forecasts.parquet --profiles-out data/growth/profiles_3m.parquet --profile-horizon 3
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Sequence
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.schemas.baby import BabyProfile, profile_constraints
+from api.services.precompute import PROFILE_COLUMNS, db_profile_sql
+
+logger = logging.getLogger(__name__)
+
+MEASURES = ["weight_kg", "height_cm"]
+
+# BabyProfile age range; forecasts past it are dropped
+MAX_AGE_MONTH = 36
+
+# WHO Child Growth Standards medians by completed month 0-36. Length is
+# recumbent length; from 24 months WHO tabulates standing height, which is
+# converted back to length (+0.7 cm) so the series is continuous.
+WHO_MEDIAN = {
+    ("weight_kg", "M"): [
+        3.3464, 4.4709, 5.5675, 6.3762, 7.0023, 7.5105, 7.9340, 8.2970, 8.6151, 8.9014,
+        9.1649, 9.4122, 9.6479, 9.8749, 10.0953, 10.3108, 10.5228, 10.7319, 10.9385, 11.1430,
+        11.3462, 11.5486, 11.7504, 11.9514, 12.1515, 12.3502, 12.5466, 12.7401, 12.9303, 13.1169,
+        13.3000, 13.4798, 13.6567, 13.8309, 14.0031, 14.1736, 14.3429,
+    ],
+    ("weight_kg", "F"): [
+        3.2322, 4.1873, 5.1282, 5.8458, 6.4237, 6.8985, 7.2970, 7.6422, 7.9487, 8.2254,
+        8.4800, 8.7192, 8.9481, 9.1699, 9.3870, 9.6008, 9.8124, 10.0226, 10.2315, 10.4393,
+        10.6464, 10.8534, 11.0608, 11.2688, 11.4775, 11.6864, 11.8947, 12.1015, 12.3059, 12.5073,
+        12.7055, 12.9006, 13.0930, 13.2837, 13.4731, 13.6618, 13.8503,
+    ],
+    ("height_cm", "M"): [
+        49.8842, 54.7244, 58.4249, 61.4292, 63.8860, 65.9026, 67.6236, 69.1645, 70.5994, 71.9687,
+        73.2812, 74.5388, 75.7488, 76.9186, 78.0497, 79.1458, 80.2113, 81.2487, 82.2587, 83.2418,
+        84.1996, 85.1348, 86.0477, 86.9410, 87.8161, 88.6720, 89.5065, 90.3197, 91.1120, 91.8828,
+        92.6327, 93.3631, 94.0753, 94.7711, 95.4532, 96.1236, 96.7835,
+    ],
+    ("height_cm", "F"): [
+        49.1477, 53.6872, 57.0673, 59.8029, 62.0899, 64.0301, 65.7311, 67.2873, 68.7498, 70.1435,
+        71.4818, 72.7710, 74.0150, 75.2176, 76.3817, 77.5099, 78.6055, 79.6710, 80.7079, 81.7182,
+        82.7036, 83.6654, 84.6040, 85.5202, 86.4153, 87.2904, 88.1462, 88.9830, 89.8004, 90.5991,
+        91.3797, 92.1430, 92.8906, 93.6239, 94.3444, 95.0533, 95.7515,
+    ],
+}
+
+# WHO coefficients of variation (LMS "S") at a few ages, interpolated in
+# between; percentiles use the log-normal approximation z = log(x / M) / S
+WHO_S_MONTHS = [0, 1, 2, 3, 6, 12, 24, 36]
+WHO_S = {
+    ("weight_kg", "M"): [0.1460, 0.1340, 0.1239, 0.1173, 0.1093, 0.1068, 0.1107, 0.1140],
+    ("weight_kg", "F"): [0.1417, 0.1372, 0.1300, 0.1262, 0.1220, 0.1227, 0.1275, 0.1320],
+    ("height_cm", "M"): [0.0380, 0.0356, 0.0342, 0.0333, 0.0317, 0.0314, 0.0340, 0.0370],
+    ("height_cm", "F"): [0.0379, 0.0364, 0.0357, 0.0352, 0.0345, 0.0348, 0.0365, 0.0380],
+}
+
+_MONTHS = np.arange(len(WHO_MEDIAN[("weight_kg", "M")]), dtype=np.float64)
+
+
+def who_median(measure: str, female: np.ndarray, age: np.ndarray) -> np.ndarray:
+    """WHO median of a measure at (fractional) ages, per sex"""
+    return np.where(
+        female,
+        np.interp(age, _MONTHS, WHO_MEDIAN[(measure, "F")]),
+        np.interp(age, _MONTHS, WHO_MEDIAN[(measure, "M")]),
+    )
+
+
+def who_cv(measure: str, female: np.ndarray, age: np.ndarray) -> np.ndarray:
+    """WHO coefficient of variation of a measure at (fractional) ages, per sex"""
+    return np.where(
+        female,
+        np.interp(age, WHO_S_MONTHS, WHO_S[(measure, "F")]),
+        np.interp(age, WHO_S_MONTHS, WHO_S[(measure, "M")]),
+    )
+
+
+def who_zscore(measure: str, female: np.ndarray, age: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Approximate WHO z-score of measurements"""
+    return np.log(values / who_median(measure, female, age)) / who_cv(measure, female, age)
+
+
+def who_percentile(measure: str, female: np.ndarray, age: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Approximate WHO percentile (0-100) of measurements"""
+    from scipy.special import ndtr
+
+    return 100.0 * ndtr(who_zscore(measure, female, age, values))
+
+
+def fit_growth(
+    measurements: pd.DataFrame,
+    slope_penalty: float = 10.0,
+    half_life_months: float = 6.0
+) -> pd.DataFrame:
+    """
+    Fit every baby's growth trend in one pass
+
+    For each measure, the WHO z-score is regressed on t = age - last age
+    per baby by weighted least squares with a ridge penalty on the slope:
+    the level is the baby's current z-score and the slope how fast it
+    changes its percentile channel.
+    A baby with one measurement keeps its channel (slope 0). Weights halve
+    every half_life_months back from the baby's latest measurement. The
+    2x2 normal equations are accumulated with bincount and solved in
+    closed form for all babies at once.
+
+    Args:
+        measurements: Rows of baby_id, sex, age_month and weight_kg and/or
+            height_cm (NaN where not measured); other PROFILE_COLUMNS are
+            kept from each baby's latest row
+        slope_penalty: Ridge penalty on the slope (larger = closer to
+            keeping the current percentile)
+        half_life_months: Recency weighting of older measurements
+
+    Returns:
+        DataFrame indexed by baby_id with last_age, female, and per measure
+        n_<measure>, <measure>_level, <measure>_slope, plus the latest
+        PROFILE_COLUMNS values present in the input
+    """
+    ages = pd.to_numeric(measurements["age_month"], errors="coerce")
+    measurements = measurements[ages.notna().to_numpy()]
+    baby = measurements["baby_id"].to_numpy()
+    age = ages.dropna().to_numpy(dtype=np.float64)
+    order = np.lexsort((age, baby))
+    baby, age = baby[order], age[order]
+
+    first = np.r_[True, baby[1:] != baby[:-1]]
+    group = np.cumsum(first) - 1
+    n_babies = int(group[-1]) + 1 if len(group) else 0
+    last_row = np.r_[np.flatnonzero(first)[1:] - 1, len(baby) - 1] if len(group) else np.empty(0, dtype=np.int64)
+    latest = measurements.iloc[order[last_row]]
+
+    last_age = age[last_row]
+    t = age - last_age[group]
+    female = (latest["sex"].astype(str).str.upper() == "F").to_numpy()
+    recency = 0.5 ** (-t / half_life_months)
+
+    result = {"last_age": last_age, "female": female}
+    for measure in MEASURES:
+        if measure not in measurements:
+            continue
+        values = pd.to_numeric(measurements[measure], errors="coerce").to_numpy(dtype=np.float64)[order]
+        valid = values > 0
+        y = np.zeros(len(values))
+        y[valid] = who_zscore(measure, female[group][valid], age[valid], values[valid])
+        w = np.where(valid, recency, 0.0)
+
+        s0 = np.bincount(group, w, n_babies)
+        s1 = np.bincount(group, w * t, n_babies)
+        s2 = np.bincount(group, w * t * t, n_babies) + slope_penalty
+        y0 = np.bincount(group, w * y, n_babies)
+        y1 = np.bincount(group, w * t * y, n_babies)
+        det = s0 * s2 - s1 * s1
+        fitted = det > 0
+        safe = np.where(fitted, det, 1.0)
+
+        result[f"n_{measure}"] = np.bincount(group, valid, n_babies).astype(np.int64)
+        result[f"{measure}_level"] = np.where(fitted, (s2 * y0 - s1 * y1) / safe, np.nan)
+        result[f"{measure}_slope"] = np.where(fitted, (s0 * y1 - s1 * y0) / safe, np.nan)
+
+    trends = pd.DataFrame(result, index=pd.Index(baby[last_row], name="baby_id"))
+    for column in PROFILE_COLUMNS:
+        if column in latest and column not in ("age_month", *MEASURES):
+            trends[column] = latest[column].to_numpy()
+    return trends
+
+
+def forecast(trends: pd.DataFrame, horizons: Sequence[float]) -> pd.DataFrame:
+    """
+    Project every baby's measurements forward
+
+    Args:
+        trends: Result of fit_growth
+        horizons: Months ahead of each baby's latest measurement
+
+    Returns:
+        Long DataFrame of baby_id, horizon_months, age_month and per
+        measure the projected value and its WHO percentile; rows past
+        MAX_AGE_MONTH are dropped
+    """
+    from scipy.special import ndtr
+
+    horizons = np.asarray(horizons, dtype=np.float64)
+    n = len(trends)
+    h = np.tile(horizons, n)
+    rows = np.repeat(np.arange(n), len(horizons))
+    age = trends["last_age"].to_numpy()[rows] + h
+    female = trends["female"].to_numpy()[rows]
+
+    result = {
+        "baby_id": trends.index.to_numpy()[rows],
+        "horizon_months": h,
+        "age_month": age,
+    }
+    for measure in MEASURES:
+        if f"{measure}_level" not in trends:
+            continue
+        z = trends[f"{measure}_level"].to_numpy()[rows] + trends[f"{measure}_slope"].to_numpy()[rows] * h
+        result[measure] = who_median(measure, female, age) * np.exp(z * who_cv(measure, female, age))
+        result[f"{measure}_percentile"] = 100.0 * ndtr(z)
+
+    projected = pd.DataFrame(result)
+    return projected[projected["age_month"] <= MAX_AGE_MONTH].reset_index(drop=True)
+
+
+def projected_profiles(trends: pd.DataFrame, projected: pd.DataFrame) -> pd.DataFrame:
+    """
+    BabyProfile rows at projected ages
+
+    Age, weight and height come from the forecast (rounded like
+    BabyProfile fields and clipped to its bounds, so an extreme trend
+    still gives a valid profile); sex, allergy and lactose flags and the
+    feeding amount are the baby's latest values.
+
+    Args:
+        trends: Result of fit_growth (with the other PROFILE_COLUMNS)
+        projected: Rows of forecast() (one horizon per baby for bulk scoring)
+
+    Returns:
+        DataFrame of baby_id, horizon_months and PROFILE_COLUMNS
+    """
+    missing = [c for c in PROFILE_COLUMNS if c not in projected and c not in trends]
+    if missing:
+        raise ValueError(f"Profile columns missing from the measurements: {missing}")
+
+    constraints = profile_constraints(BabyProfile)
+    latest = trends.loc[projected["baby_id"].to_numpy()]
+    profiles = pd.DataFrame({
+        "baby_id": projected["baby_id"].to_numpy(),
+        "horizon_months": projected["horizon_months"].to_numpy(),
+    })
+    for column in PROFILE_COLUMNS:
+        if column == "age_month":
+            profiles[column] = np.floor(projected["age_month"].to_numpy() + 1e-9).astype(np.int64)
+        elif column in MEASURES:
+            spec = constraints[column]
+            low = spec["ge"] if "ge" in spec else spec.get("gt", 0.0) + 0.1
+            profiles[column] = np.clip(np.round(projected[column].to_numpy(), 1), low, spec["le"])
+        else:
+            profiles[column] = latest[column].to_numpy()
+    return profiles
+
+
+def read_measurements(path: str) -> pd.DataFrame:
+    """Measurement rows from a CSV or Parquet file (feeding log format)"""
+    wanted = {"baby_id", "sex", *PROFILE_COLUMNS}
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        names = pq.ParquetFile(path).schema_arrow.names
+        return pd.read_parquet(path, columns=[c for c in names if c in wanted])
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
+
+
+def db_measurements() -> pd.DataFrame:
+    """
+    Measurement rows from the babies table
+
+    Each baby gets its birth weight at age 0 and its current profile
+    (db_profile_sql expressions, see api/services/precompute.py).
+    """
+    from config.database import get_connection
+
+    profile_sql = db_profile_sql()
+    columns = ",\n".join(f"{expr} AS {col}" for col, expr in profile_sql.items())
+    conn = get_connection()
+    try:
+        current = pd.read_sql(
+            f"""
+            SELECT b.baby_id, {columns}
+            FROM babies b
+            LEFT JOIN (
+                SELECT baby_id, AVG(amount_consumed) AS avg_amount
+                FROM feeding_records
+                WHERE timestamp >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+                GROUP BY baby_id
+            ) f ON f.baby_id = b.baby_id
+            """,
+            conn
+        )
+        birth = pd.read_sql(
+            f"SELECT baby_id, {profile_sql['sex']} AS sex, weight_at_birth AS weight_kg FROM babies b "
+            "WHERE weight_at_birth IS NOT NULL",
+            conn
+        )
+    finally:
+        conn.close()
+    birth["age_month"] = 0
+    return pd.concat([birth, current], ignore_index=True)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Forecast baby growth trajectories")
+    parser.add_argument("--input", default="data/raw/feeding_logs.csv", help="Measurements (CSV / Parquet); 'db' for the babies table")
+    parser.add_argument("--horizon", type=float, nargs="+", default=[1, 3, 6], help="Months ahead")
+    parser.add_argument("--out", default="data/growth/forecasts.parquet", help="Forecast output (.parquet or .csv)")
+    parser.add_argument("--profiles-out", default=None, help="Projected BabyProfile rows for bulk scoring")
+    parser.add_argument("--profile-horizon", type=float, default=None, help="Horizon of --profiles-out (default: largest)")
+    parser.add_argument("--slope-penalty", type=float, default=10.0, help="Ridge penalty on the percentile slope")
+    parser.add_argument("--half-life", type=float, default=6.0, help="Recency half-life in months")
+    return parser.parse_args(argv)
+
+
+def _write(frame: pd.DataFrame, path: str):
+    """Write a DataFrame as Parquet or CSV by suffix"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if str(path).endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def main(argv=None):
+    """Fit all babies and write forecasts (and projected profiles)"""
+    args = parse_args(argv)
+
+    measurements = db_measurements() if args.input == "db" else read_measurements(args.input)
+    start = time.perf_counter()
+    trends = fit_growth(measurements, args.slope_penalty, args.half_life)
+    projected = forecast(trends, args.horizon)
+    elapsed = time.perf_counter() - start
+    _write(projected, args.out)
+
+    summary = {
+        "measurements": int(len(measurements)),
+        "babies": int(len(trends)),
+        "forecasts": int(len(projected)),
+        "seconds": round(elapsed, 3),
+    }
+    if args.profiles_out:
+        horizon = args.profile_horizon if args.profile_horizon is not None else max(args.horizon)
+        rows = projected[np.isclose(projected["horizon_months"], horizon)]
+        if rows.empty:
+            rows = forecast(trends, [horizon])
+        profiles = projected_profiles(trends, rows)
+        _write(profiles, args.profiles_out)
+        summary["profiles"] = int(len(profiles))
+
+    logger.info(f"Forecast {summary['babies']} babies in {elapsed:.2f}s")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
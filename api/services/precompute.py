@@ -0,0 +1,663 @@
+"""
+Per-baby recommendation precompute
+Polls feeding data for babies changed since a high-water mark (and, for
+the database source, babies whose row changed), re-scores them in parallel
+chunks with the batch path and stores the encoded /recommend response per
+baby in a local SQLite table, so reads become a key lookup
+
+Usage:
+    python -m api.services.precompute --source csv --once
+    python -m api.services.precompute --source db --interval 30
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.catalog import DEFAULT_FORMULA_PATH, FormulaCatalog
+from api.services.recommender import FormulaRecommender
+from api.services.cf_recommender import load_recommender
+from src.data.validation import check_profiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULTS_PATH = "data/precomputed/recommendations.sqlite"
+
+PROFILE_COLUMNS = [
+    "age_month",
+    "sex",
+    "height_cm",
+    "weight_kg",
+    "allergy_risk",
+    "lactose_sensitivity",
+    "feed_ml_per_intake",
+]
+
+# SQL expressions for profile columns, evaluated on 'babies b' joined with
+# the recent feeding amount average 'f'. The babies table only has
+# birth_date, gender and weight_at_birth, so measurements and health flags
+# have no default (None) and must be mapped with PRECOMPUTE_SQL_<COLUMN>.
+DB_PROFILE_SQL = {
+    "age_month": "TIMESTAMPDIFF(MONTH, b.birth_date, NOW())",
+    "sex": (
+        "CASE WHEN UPPER(b.gender) IN ('M', 'MALE', 'BOY', '남', '남아') THEN 'M' "
+        "WHEN UPPER(b.gender) IN ('F', 'FEMALE', 'GIRL', '여', '여아') THEN 'F' END"
+    ),
+    "height_cm": None,
+    "weight_kg": None,
+    "allergy_risk": None,
+    "lactose_sensitivity": None,
+    "feed_ml_per_intake": "f.avg_amount",
+}
+
+# Profile columns read from the babies row (checksummed to detect edits)
+BABY_ROW_COLUMNS = [col for col in PROFILE_COLUMNS if col != "feed_ml_per_intake"]
+
+
+def db_profile_sql() -> Dict[str, str]:
+    """
+    Profile column SQL expressions, with PRECOMPUTE_SQL_<COLUMN> overrides
+
+    Returns:
+        Column -> SQL expression
+
+    Raises:
+        ValueError: If a column has no default and no override
+    """
+    profile_sql = {col: os.getenv(f"PRECOMPUTE_SQL_{col.upper()}", expr) for col, expr in DB_PROFILE_SQL.items()}
+    missing = [col for col, expr in profile_sql.items() if not expr]
+    if missing:
+        raise ValueError(
+            "No SQL expression for profile columns "
+            + ", ".join(missing)
+            + " (not in the babies table); set "
+            + ", ".join(f"PRECOMPUTE_SQL_{col.upper()}" for col in missing)
+        )
+    return profile_sql
+
+
+def valid_profiles(profiles: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop profiles failing the BabyProfile bounds, logging the reasons
+
+    Args:
+        profiles: DataFrame with PROFILE_COLUMNS
+
+    Returns:
+        Passing rows
+    """
+    checks = check_profiles(profiles)
+    if not checks:
+        return profiles
+    invalid = np.zeros(len(profiles), dtype=bool)
+    for mask in checks.values():
+        invalid |= mask
+    counts = ", ".join(f"{reason}: {int(mask.sum())}" for reason, mask in checks.items())
+    logger.warning(f"Skipping {int(invalid.sum())} babies with invalid profiles ({counts})")
+    return profiles[~invalid].reset_index(drop=True)
+
+# Per-process state for pool workers
+_WORKER_RECOMMENDER: Optional[FormulaRecommender] = None
+
+
+class ResultStore:
+    """
+    SQLite table of encoded recommendation responses keyed by baby_id
+
+    WAL mode lets the API read while the job writes. Connections are
+    per thread.
+    """
+
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH):
+        """
+        Open (and create) the results database
+
+        Args:
+            path: SQLite file path
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS baby_recommendations (
+                baby_id INTEGER PRIMARY KEY,
+                model_version TEXT NOT NULL,
+                response BLOB NOT NULL,
+                source_mark INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS precompute_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS baby_checksums (baby_id INTEGER PRIMARY KEY, checksum INTEGER NOT NULL)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, baby_id: int) -> Optional[Tuple[str, bytes, float]]:
+        """
+        Stored response for a baby
+
+        Returns:
+            (model_version, response JSON bytes, updated_at) or None
+        """
+        row = self._connection().execute(
+            "SELECT model_version, response, updated_at FROM baby_recommendations WHERE baby_id = ?",
+            (int(baby_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], bytes(row[1]), row[2]
+
+    def put_many(self, rows: List[Tuple[int, str, bytes, int]]):
+        """
+        Upsert responses
+
+        Args:
+            rows: (baby_id, model_version, response bytes, source mark)
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.executemany(
+            """
+            INSERT INTO baby_recommendations (baby_id, model_version, response, source_mark, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(baby_id) DO UPDATE SET
+                model_version = excluded.model_version,
+                response = excluded.response,
+                source_mark = excluded.source_mark,
+                updated_at = excluded.updated_at
+            """,
+            [(int(b), m, sqlite3.Binary(r), int(s), now) for b, m, r, s in rows]
+        )
+        conn.commit()
+
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Read a job state value (e.g. high-water mark)"""
+        row = self._connection().execute("SELECT value FROM precompute_state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, key: str, value: str):
+        """Write a job state value"""
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO precompute_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+        conn.commit()
+
+    def get_checksums(self) -> pd.DataFrame:
+        """Stored babies row checksums (baby_id, checksum)"""
+        return pd.read_sql("SELECT baby_id, checksum FROM baby_checksums", self._connection())
+
+    def put_checksums(self, rows):
+        """
+        Upsert babies row checksums
+
+        Args:
+            rows: (baby_id, checksum) pairs
+        """
+        conn = self._connection()
+        conn.executemany(
+            "INSERT INTO baby_checksums (baby_id, checksum) VALUES (?, ?) "
+            "ON CONFLICT(baby_id) DO UPDATE SET checksum = excluded.checksum",
+            [(int(b), int(c)) for b, c in rows]
+        )
+        conn.commit()
+
+    def count(self) -> int:
+        """Number of stored babies"""
+        return self._connection().execute("SELECT COUNT(*) FROM baby_recommendations").fetchone()[0]
+
+
+class CsvChangeSource:
+    """
+    Changed babies from feeding_logs.csv
+
+    The mark is the largest log_id seen; a baby's profile is taken from
+    its latest log.
+    """
+
+    def __init__(self, path: str = "data/raw/feeding_logs.csv"):
+        """
+        Args:
+            path: Feeding log CSV
+        """
+        self.path = Path(path)
+
+    def changes(self, mark: int) -> Tuple[pd.DataFrame, int]:
+        """
+        Profiles of babies with logs after the mark
+
+        Args:
+            mark: Last processed log_id
+
+        Returns:
+            (DataFrame with baby_id, source_mark and PROFILE_COLUMNS, new mark)
+        """
+        logs = pd.read_csv(self.path)
+        new = logs[logs["log_id"] > mark]
+        if new.empty:
+            return new.iloc[:0].assign(source_mark=pd.Series(dtype="int64")), mark
+
+        changed = new["baby_id"].unique()
+        latest = (
+            logs[logs["baby_id"].isin(changed)]
+            .sort_values("log_id")
+            .groupby("baby_id", sort=False)
+            .tail(1)
+        )
+        profiles = latest[["baby_id"] + PROFILE_COLUMNS].assign(source_mark=latest["log_id"].to_numpy())
+        return profiles.reset_index(drop=True), int(new["log_id"].max())
+
+
+class DbChangeSource:
+    """
+    Changed babies from the feeding_records / babies tables
+
+    Two change signals are combined per poll:
+    - feeding records after the mark (largest feeding_id seen)
+    - babies whose row-derived profile columns (BABY_ROW_COLUMNS, e.g.
+      birth date, gender, and age rolling over to a new month) changed,
+      detected with a CRC32 checksum per baby compared with the checksums
+      of the previous poll. babies has no updated_at column, so this is a
+      scan of the table (one integer per baby).
+    New checksums are kept in the result store once the job has stored
+    the poll's results (commit()).
+
+    feed_ml_per_intake is the mean amount_consumed over the last `days`
+    days; other profile columns come from db_profile_sql().
+    """
+
+    def __init__(self, store: Optional[ResultStore] = None, days: int = 7, batch_limit: int = 100000):
+        """
+        Args:
+            store: Result store keeping the babies checksums (None: only
+                feeding records trigger a recompute)
+            days: Window for the feeding amount average
+            batch_limit: Maximum new feeding records per poll
+
+        Raises:
+            ValueError: If a profile column has no SQL expression
+        """
+        self.store = store
+        self.days = days
+        self.batch_limit = batch_limit
+        self.profile_sql = db_profile_sql()
+        self._pending_checksums: Optional[pd.DataFrame] = None
+
+    def _changed_rows(self, conn) -> pd.DataFrame:
+        """baby_id and checksum of babies whose row changed since the last commit"""
+        fields = ", ".join(f"COALESCE({self.profile_sql[col]}, '')" for col in BABY_ROW_COLUMNS)
+        current = pd.read_sql(f"SELECT b.baby_id, CRC32(CONCAT_WS('|', {fields})) AS checksum FROM babies b", conn)
+        previous = self.store.get_checksums()
+        merged = current.merge(previous, on="baby_id", how="left", suffixes=("", "_previous"))
+        return merged.loc[merged["checksum"] != merged["checksum_previous"], ["baby_id", "checksum"]]
+
+    def _profiles(self, conn, baby_ids: List[int]) -> pd.DataFrame:
+        """Profiles of the given babies, queried in pages"""
+        columns = ",\n".join(f"{expr} AS {col}" for col, expr in self.profile_sql.items())
+        pages = []
+        for start in range(0, len(baby_ids), 10000):
+            page = baby_ids[start:start + 10000]
+            placeholders = ",".join(["%s"] * len(page))
+            pages.append(pd.read_sql(
+                f"""
+                SELECT b.baby_id, {columns}
+                FROM babies b
+                LEFT JOIN (
+                    SELECT baby_id, AVG(amount_consumed) AS avg_amount
+                    FROM feeding_records
+                    WHERE baby_id IN ({placeholders})
+                      AND timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                    GROUP BY baby_id
+                ) f ON f.baby_id = b.baby_id
+                WHERE b.baby_id IN ({placeholders})
+                """,
+                conn, params=page + [self.days] + page
+            ))
+        return pd.concat(pages, ignore_index=True)
+
+    def changes(self, mark: int) -> Tuple[pd.DataFrame, int]:
+        """
+        Profiles of babies with feeding records after the mark or a changed row
+
+        Args:
+            mark: Last processed feeding_id
+
+        Returns:
+            (DataFrame with baby_id, source_mark and PROFILE_COLUMNS, new mark)
+        """
+        from config.database import get_connection
+
+        conn = get_connection()
+        try:
+            changed = pd.read_sql(
+                """
+                SELECT baby_id, MAX(feeding_id) AS source_mark
+                FROM (
+                    SELECT baby_id, feeding_id FROM feeding_records
+                    WHERE feeding_id > %s ORDER BY feeding_id LIMIT %s
+                ) recent
+                GROUP BY baby_id
+                """,
+                conn, params=[int(mark), int(self.batch_limit)]
+            )
+            new_mark = int(changed["source_mark"].max()) if not changed.empty else mark
+
+            if self.store is not None:
+                self._pending_checksums = self._changed_rows(conn)
+                edited = self._pending_checksums[~self._pending_checksums["baby_id"].isin(changed["baby_id"])]
+                changed = pd.concat(
+                    [changed, pd.DataFrame({"baby_id": edited["baby_id"].to_numpy(), "source_mark": new_mark})],
+                    ignore_index=True
+                )
+            if changed.empty:
+                return changed.assign(**{col: [] for col in PROFILE_COLUMNS}), mark
+
+            profiles = self._profiles(conn, [int(b) for b in changed["baby_id"]])
+        finally:
+            conn.close()
+
+        profiles = profiles.merge(changed, on="baby_id", how="inner")
+        complete = profiles[PROFILE_COLUMNS].notna().all(axis=1)
+        if not complete.all():
+            logger.warning(f"Skipping {int((~complete).sum())} babies with incomplete profiles")
+        profiles = profiles[complete].reset_index(drop=True)
+        profiles["feed_ml_per_intake"] = profiles["feed_ml_per_intake"].round()
+        return profiles, new_mark
+
+    def commit(self):
+        """Keep the checksums of the last poll (after its results are stored)"""
+        if self.store is not None and self._pending_checksums is not None:
+            self.store.put_checksums(self._pending_checksums.itertuples(index=False, name=None))
+            self._pending_checksums = None
+
+
+def load_catalog(source: str = "csv", path: str = DEFAULT_FORMULA_PATH) -> FormulaCatalog:
+    """Formula catalog from formula_master.csv or the formulas table"""
+    if source == "csv":
+        return FormulaCatalog.from_csv(path)
+    if source == "db":
+        return FormulaCatalog.from_db()
+    raise ValueError(f"Unknown formula source: {source}")
+
+
+def _init_worker(model_path: str, formula_source: str = "csv", formula_path: str = DEFAULT_FORMULA_PATH):
+    """Load the model and formula catalog once per pool worker"""
+    global _WORKER_RECOMMENDER
+    logging.getLogger("api.services").setLevel(logging.WARNING)
+    _WORKER_RECOMMENDER = load_recommender(model_path, drift_monitor=False)
+    _WORKER_RECOMMENDER.load_formula_data(source=formula_source, path=formula_path)
+
+
+def _score_chunk(task: Tuple[pd.DataFrame, int, float, str]) -> List[Tuple[int, str, bytes, int]]:
+    """
+    Rank and encode one chunk of babies (pool worker)
+
+    Args:
+        task: (profiles with baby_id and source_mark, top_n, min_good_prob,
+            catalog version the job polled with)
+
+    Returns:
+        Rows for ResultStore.put_many
+
+    Raises:
+        RuntimeError: If the worker loaded a different catalog (it changed
+            since the poll started; the next poll recomputes with it)
+    """
+    profiles, top_n, min_good_prob, catalog_version = task
+    rec = _WORKER_RECOMMENDER
+    if rec.catalog.version != catalog_version:
+        raise RuntimeError(f"Worker catalog {rec.catalog.version} differs from polled catalog {catalog_version}")
+
+    baby_profiles = profiles[["baby_id"] + PROFILE_COLUMNS].to_dict("records")
+    for profile in baby_profiles:
+        profile["baby_id"] = int(profile["baby_id"])
+        profile["age_month"] = int(profile["age_month"])
+        profile["allergy_risk"] = int(profile["allergy_risk"])
+        profile["lactose_sensitivity"] = int(profile["lactose_sensitivity"])
+        profile["feed_ml_per_intake"] = int(round(profile["feed_ml_per_intake"]))
+        profile["height_cm"] = float(profile["height_cm"])
+        profile["weight_kg"] = float(profile["weight_kg"])
+
+    rankings = rec.rank_batch(baby_profiles, top_n=top_n, min_good_prob=min_good_prob)
+    encoder = rec.encoder
+
+    return [
+        (int(baby_id), rec.model_version, encoder.encode_response(profile, ranking, include_all=True), int(mark))
+        for baby_id, mark, profile, ranking in zip(
+            profiles["baby_id"], profiles["source_mark"], baby_profiles, rankings
+        )
+    ]
+
+
+class PrecomputeJob:
+    """
+    Poll for changed babies and refresh their stored recommendations
+
+    Chunks are scored in a process pool with at most max_pending chunks in
+    flight; the high-water mark is advanced only after every chunk of a
+    poll is stored, so a crash re-processes instead of skipping babies.
+    The mark is kept per model version and formula catalog version: a new
+    model or a changed catalog (e.g. after POST /formulas/reload picked up
+    new formulas) recomputes everyone. The catalog is re-read every poll.
+    """
+
+    def __init__(
+        self,
+        source,
+        store: ResultStore,
+        model_path: str = "models/trained/knn_v1_legacy.pkl",
+        chunk_size: int = 512,
+        n_jobs: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        formula_source: str = "csv",
+        formula_path: str = DEFAULT_FORMULA_PATH
+    ):
+        """
+        Args:
+            source: CsvChangeSource or DbChangeSource
+            store: Result store
+            model_path: Model package to score with
+            chunk_size: Babies per task
+            n_jobs: Worker processes (default: CPU count)
+            max_pending: Chunks in flight (default: 2 x n_jobs)
+            top_n: Recommendations per baby
+            min_good_prob: Minimum good probability threshold
+            formula_source: "csv" for formula_master.csv, "db" for the
+                formulas table
+            formula_path: Formula master CSV for formula_source "csv"
+        """
+        self.source = source
+        self.store = store
+        self.model_path = model_path
+        self.model_version = Path(model_path).stem
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.n_jobs
+        self.top_n = top_n
+        self.min_good_prob = min_good_prob
+        self.formula_source = formula_source
+        self.formula_path = formula_path
+        self.catalog_version: Optional[str] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_catalog: Optional[str] = None
+
+    @property
+    def mark_key(self) -> str:
+        """State key of the high-water mark"""
+        return f"mark:{type(self.source).__name__}:{self.model_version}:{self.catalog_version}"
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """Worker pool, created on first use and kept while the catalog is unchanged"""
+        if self._executor is not None and self._executor_catalog != self.catalog_version:
+            logger.info(f"Formula catalog changed to {self.catalog_version}, restarting workers")
+            self.close()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(self.model_path, self.formula_source, self.formula_path)
+            )
+            self._executor_catalog = self.catalog_version
+        return self._executor
+
+    def run_once(self) -> Dict:
+        """
+        Process all changes since the stored mark
+
+        Returns:
+            Poll statistics
+        """
+        self.catalog_version = load_catalog(self.formula_source, self.formula_path).version
+        mark = int(self.store.get_state(self.mark_key, "0"))
+        profiles, new_mark = self.source.changes(mark)
+        profiles = valid_profiles(profiles)
+        if profiles.empty:
+            self._commit(mark, new_mark)
+            return {"babies": 0, "mark": new_mark, "seconds": 0.0}
+
+        start = time.perf_counter()
+        chunks = (
+            (profiles.iloc[i:i + self.chunk_size], self.top_n, self.min_good_prob, self.catalog_version)
+            for i in range(0, len(profiles), self.chunk_size)
+        )
+
+        written = 0
+        pool = self._pool()
+        pending = set()
+        for task in chunks:
+            # Backpressure: never more than max_pending chunks queued
+            while len(pending) >= self.max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += self._store(done)
+            pending.add(pool.submit(_score_chunk, task))
+        if pending:
+            written += self._store(wait(pending).done)
+
+        self._commit(mark, new_mark)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Precomputed {written} babies up to mark {new_mark} in {elapsed:.2f}s "
+            f"({written / max(elapsed, 1e-9):.0f} babies/s)"
+        )
+        return {"babies": written, "mark": new_mark, "seconds": round(elapsed, 3)}
+
+    def _commit(self, mark: int, new_mark: int):
+        """Advance the mark and the source's own change state"""
+        if new_mark != mark:
+            self.store.set_state(self.mark_key, str(new_mark))
+        commit = getattr(self.source, "commit", None)
+        if commit is not None:
+            commit()
+
+    def _store(self, futures) -> int:
+        """Write finished chunks (raises if a chunk failed)"""
+        n = 0
+        for future in futures:
+            rows = future.result()
+            self.store.put_many(rows)
+            n += len(rows)
+        return n
+
+    def run_forever(self, interval: float = 30.0):
+        """Poll until interrupted"""
+        logger.info(f"Precompute polling every {interval}s ({self.mark_key})")
+        try:
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Precompute poll failed: {e}")
+                time.sleep(interval)
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._executor_catalog = None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Precompute per-baby recommendations")
+    parser.add_argument("--source", choices=["csv", "db"], default="csv", help="Change source")
+    parser.add_argument("--logs", default="data/raw/feeding_logs.csv", help="Feeding log CSV (csv source)")
+    parser.add_argument("--results", default=os.getenv("PRECOMPUTED_RESULTS_PATH", DEFAULT_RESULTS_PATH), help="SQLite results path")
+    parser.add_argument("--model", default="models/trained/knn_v1_legacy.pkl", help="Model package path")
+    parser.add_argument("--formula-source", choices=["csv", "db"], default="csv", help="Formula catalog source")
+    parser.add_argument("--formulas", default=DEFAULT_FORMULA_PATH, help="Formula master CSV (csv formula source)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="Babies per task")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=None, help="Chunks in flight (default: 2 x n-jobs)")
+    parser.add_argument("--top-n", type=int, default=3, help="Recommendations per baby")
+    parser.add_argument("--min-good-prob", type=float, default=0.3, help="Minimum good probability")
+    parser.add_argument("--interval", type=float, default=30.0, help="Poll interval in seconds")
+    parser.add_argument("--once", action="store_true", help="Process current changes and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the precompute job from the command line"""
+    args = parse_args(argv)
+
+    store = ResultStore(args.results)
+    source = CsvChangeSource(args.logs) if args.source == "csv" else DbChangeSource(store)
+    job = PrecomputeJob(
+        source,
+        store,
+        model_path=args.model,
+        chunk_size=args.chunk_size,
+        n_jobs=args.n_jobs,
+        max_pending=args.max_pending,
+        top_n=args.top_n,
+        min_good_prob=args.min_good_prob,
+        formula_source=args.formula_source,
+        formula_path=args.formulas,
+    )
+
+    if args.once:
+        try:
+            print(json.dumps(job.run_once()))
+        finally:
+            job.close()
+    else:
+        job.run_forever(args.interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
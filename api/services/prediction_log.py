@@ -0,0 +1,446 @@
+"""
+Structured prediction log
+Records every served prediction (profile, per-formula scores, model version,
+latency) for retraining and auditing. Requests only enqueue a reference to
+objects they already hold; a background thread serializes and writes the
+records in batches to rotating, compressed segments:
+
+    <log_dir>/predictions-<UTC start>-<pid>-<seq>.jsonl.gz   (format "jsonl")
+    <log_dir>/predictions-<UTC start>-<pid>-<seq>.parquet    (format "parquet")
+
+A segment is written under a ".part" name and renamed when it is rotated,
+so readers only ever see complete files.
+
+Usage (load segments as a DataFrame):
+    python -m api.services.prediction_log --log-dir data/prediction_log
+"""
+import argparse
+import gzip
+import os
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.encoding import dumps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_DIR = "data/prediction_log"
+
+FORMATS = ("jsonl", "parquet")
+
+# Stops the writer thread
+_STOP = object()
+
+
+class PredictionLog:
+    """
+    Bounded, asynchronous writer of prediction records
+
+    log() never blocks: when max_queue requests are already waiting, the
+    request is dropped and its records are counted in `dropped`. The writer
+    thread starts on first use in each process (so it is created after a
+    gunicorn fork, not in the master) and rotates a segment once it holds
+    segment_records records or is segment_seconds old.
+    """
+
+    def __init__(
+        self,
+        log_dir: str = DEFAULT_LOG_DIR,
+        fmt: str = "jsonl",
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        segment_records: int = 100_000,
+        segment_seconds: float = 300.0
+    ):
+        """
+        Initialize prediction log
+
+        Args:
+            log_dir: Segment directory
+            fmt: "jsonl" (gzip) or "parquet" (zstd)
+            max_queue: Requests held in memory before dropping
+            batch_size: Requests written per writer pass
+            segment_records: Records per segment before rotating
+            segment_seconds: Segment age before rotating
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown prediction log format: {fmt} (expected one of {FORMATS})")
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401 - fail at startup, not in the writer
+
+        self.log_dir = Path(log_dir)
+        self.fmt = fmt
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.segments = 0
+
+        self._pid = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # Writer-thread state
+        self._segment_path: Optional[Path] = None
+        self._segment_file = None
+        self._segment_rows: List[Dict] = []
+        self._segment_count = 0
+        self._segment_started = 0.0
+        self._seq = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["PredictionLog"]:
+        """Prediction log from environment settings, or None when PREDICTION_LOG_DIR is unset"""
+        log_dir = os.getenv("PREDICTION_LOG_DIR")
+        if not log_dir:
+            return None
+        return cls(
+            log_dir=log_dir,
+            fmt=os.getenv("PREDICTION_LOG_FORMAT", "jsonl"),
+            max_queue=int(os.getenv("PREDICTION_LOG_MAX_QUEUE", "10000")),
+            segment_records=int(os.getenv("PREDICTION_LOG_SEGMENT_RECORDS", "100000")),
+            segment_seconds=float(os.getenv("PREDICTION_LOG_SEGMENT_SECONDS", "300"))
+        )
+
+    def _ensure_started(self):
+        """Start the writer thread in this process"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            # A forked child inherits the parent's queue but not its thread
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._segment_path = None
+            self._segment_file = None
+            self._segment_rows = []
+            self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+            self._thread.start()
+            self._pid = pid
+
+    def log(
+        self,
+        endpoint: str,
+        model_version: str,
+        baby_profiles: List[Dict],
+        rankings: List[Dict],
+        latency_ms: float
+    ) -> bool:
+        """
+        Queue the rankings of one request (hot path)
+
+        Rankings are referenced, not copied; they must not be modified
+        afterwards (responses only read them).
+
+        Args:
+            endpoint: Serving endpoint name
+            model_version: Model that produced the rankings
+            baby_profiles: Request profiles
+            rankings: One ranking per profile (FormulaRecommender.rank_batch)
+            latency_ms: Request latency up to the log call
+
+        Returns:
+            Whether the request was queued
+        """
+        return self._put(("rankings", time.time(), endpoint, model_version, latency_ms, baby_profiles, rankings))
+
+    def log_prediction(
+        self,
+        endpoint: str,
+        model_version: str,
+        baby_profile: Dict,
+        prediction: Dict,
+        latency_ms: float
+    ) -> bool:
+        """
+        Queue a single-formula prediction (hot path)
+
+        Args:
+            endpoint: Serving endpoint name
+            model_version: Model that produced the prediction
+            baby_profile: Request profile
+            prediction: Result of FormulaRecommender.predict_single
+            latency_ms: Request latency up to the log call
+
+        Returns:
+            Whether the request was queued
+        """
+        return self._put(("prediction", time.time(), endpoint, model_version, latency_ms, [baby_profile], prediction))
+
+    def _put(self, item: Tuple) -> bool:
+        """Enqueue without blocking, counting drops"""
+        self._ensure_started()
+        n = len(item[5])
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += n
+            return False
+        self.logged += n
+        return True
+
+    @staticmethod
+    def records(item: Tuple) -> List[Dict]:
+        """Flat records of one queued request (writer thread)"""
+        kind, ts, endpoint, model_version, latency_ms, profiles, result = item
+        base = {"ts": ts, "endpoint": endpoint, "model_version": model_version, "latency_ms": latency_ms}
+
+        if kind == "prediction":
+            return [{
+                **base,
+                "profile": profiles[0],
+                "formula_ids": [int(result["formula_id"])],
+                "good_probabilities": [float(result["good_probability"])],
+                "predicted_labels": [str(result["predicted_tolerance"])],
+                "top_formula_ids": [],
+            }]
+
+        rows = []
+        for profile, ranking in zip(profiles, result):
+            formula_ids = ranking["catalog"].formula_ids
+            row = {
+                **base,
+                "profile": profile,
+                "formula_ids": formula_ids.tolist(),
+                "good_probabilities": np.asarray(ranking["good_probabilities"], dtype=np.float64).tolist(),
+                "predicted_labels": np.asarray(ranking["predicted_labels"]).astype(str).tolist(),
+                "top_formula_ids": formula_ids[ranking["top"]].tolist(),
+            }
+            if ranking.get("adjusted_scores") is not None:
+                row["adjusted_scores"] = np.asarray(ranking["adjusted_scores"], dtype=np.float64).tolist()
+            rows.append(row)
+        return rows
+
+    def _run(self):
+        """Writer loop: drain the queue in batches until stopped"""
+        q = self._queue
+        stop = False
+        while not stop:
+            timeout = None
+            if self._segment_path is not None:
+                timeout = max(0.0, self._segment_started + self.segment_seconds - time.time())
+            try:
+                items = [q.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            while len(items) < self.batch_size:
+                try:
+                    items.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            if any(item is _STOP for item in items):
+                items = [item for item in items if item is not _STOP]
+                stop = True
+
+            try:
+                rows = [row for item in items for row in self.records(item)]
+                if rows:
+                    self._write(rows)
+                if stop or (
+                    self._segment_path is not None
+                    and time.time() - self._segment_started >= self.segment_seconds
+                ):
+                    self._rotate()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Prediction log write failed: {e}")
+
+    def _write(self, rows: List[Dict]):
+        """Append records to the open segment, rotating when it is full"""
+        while rows:
+            if self._segment_path is None:
+                self._open_segment()
+            room = self.segment_records - self._segment_count
+            part, rows = rows[:room], rows[room:]
+
+            if self.fmt == "jsonl":
+                self._segment_file.write(b"".join(dumps(row) + b"\n" for row in part))
+            else:
+                # Parquet needs the whole segment; memory is bounded by segment_records
+                self._segment_rows.extend(part)
+            self._segment_count += len(part)
+            self.written += len(part)
+
+            if self._segment_count >= self.segment_records:
+                self._rotate()
+
+    def _open_segment(self):
+        """Start a new .part segment"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        started = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        suffix = ".jsonl.gz" if self.fmt == "jsonl" else ".parquet"
+        self._seq += 1
+        self._segment_path = self.log_dir / f"predictions-{started}-{os.getpid()}-{self._seq:05d}{suffix}"
+        self._segment_started = time.time()
+        self._segment_count = 0
+        if self.fmt == "jsonl":
+            self._segment_file = gzip.open(str(self._segment_path) + ".part", "wb", compresslevel=6)
+
+    def _rotate(self):
+        """Finish the open segment and publish it under its final name"""
+        if self._segment_path is None:
+            return
+        part = Path(str(self._segment_path) + ".part")
+        if self.fmt == "jsonl":
+            self._segment_file.close()
+            self._segment_file = None
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            pq.write_table(pa.Table.from_pylist(self._segment_rows), part, compression="zstd")
+            self._segment_rows = []
+        os.replace(part, self._segment_path)
+        self.segments += 1
+        logger.info(f"Prediction log segment written: {self._segment_path} ({self._segment_count} records)")
+        self._segment_path = None
+
+    def stats(self) -> Dict:
+        """Counters and queue depth"""
+        return {
+            "log_dir": str(self.log_dir),
+            "format": self.fmt,
+            "logged": self.logged,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "segments": self.segments,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    def close(self, timeout: float = 10.0):
+        """Write everything queued, close the open segment and stop the writer"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        # Blocking put: the stop marker must not be dropped
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+
+def prometheus_text(stats: Dict) -> str:
+    """
+    Render prediction log counters in the Prometheus text exposition format
+
+    Args:
+        stats: PredictionLog.stats()
+
+    Returns:
+        Metrics text
+    """
+    lines = []
+    for name, kind, help_text in (
+        ("logged", "counter", "Prediction records queued for the log"),
+        ("written", "counter", "Prediction records written to segments"),
+        ("dropped", "counter", "Prediction records dropped because the log queue was full"),
+        ("segments", "counter", "Prediction log segments completed"),
+        ("queued", "gauge", "Requests waiting in the prediction log queue"),
+    ):
+        metric = f"smartbottle_prediction_log_{name}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}", f"{metric} {stats[name]}"]
+    return "\n".join(lines) + "\n"
+
+
+def segment_paths(log_dir: str = DEFAULT_LOG_DIR) -> List[Path]:
+    """Completed segments in a directory, oldest first"""
+    root = Path(log_dir)
+    paths = list(root.glob("predictions-*.jsonl.gz")) + list(root.glob("predictions-*.parquet"))
+    return sorted(paths, key=lambda p: p.name)
+
+
+def read_prediction_log(
+    log_dir: str = DEFAULT_LOG_DIR,
+    since: Optional[float] = None,
+    explode: bool = False
+) -> pd.DataFrame:
+    """
+    Load completed segments as a DataFrame
+
+    Profile fields become columns; per-formula fields stay lists (one row
+    per request profile) unless explode is set, which gives one row per
+    profile x formula like the feeding logs.
+
+    Args:
+        log_dir: Segment directory
+        since: Keep records with ts >= since (epoch seconds)
+        explode: One row per profile x formula
+
+    Returns:
+        DataFrame of prediction records
+    """
+    frames = []
+    for path in segment_paths(log_dir):
+        if path.suffix == ".parquet":
+            frames.append(pd.read_parquet(path))
+        else:
+            frames.append(pd.read_json(path, lines=True, compression="gzip"))
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    if since is not None:
+        df = df[df["ts"] >= since]
+
+    profiles = pd.json_normalize(df["profile"].tolist())
+    profiles.index = df.index
+    df = pd.concat([df.drop(columns="profile"), profiles], axis=1)
+
+    if explode:
+        if "adjusted_scores" in df:
+            # Requests ranked without symptoms have no adjusted scores
+            df["adjusted_scores"] = [
+                scores if isinstance(scores, (list, np.ndarray)) else [None] * len(ids)
+                for scores, ids in zip(df["adjusted_scores"], df["formula_ids"])
+            ]
+        per_formula = [c for c in ("formula_ids", "good_probabilities", "predicted_labels", "adjusted_scores") if c in df]
+        df = df.explode(per_formula, ignore_index=True).rename(
+            columns={"formula_ids": "formula_id", "good_probabilities": "good_probability",
+                     "predicted_labels": "predicted_label", "adjusted_scores": "adjusted_score"}
+        )
+    return df
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Summarize or export the prediction log")
+    parser.add_argument("--log-dir", default=os.getenv("PREDICTION_LOG_DIR", DEFAULT_LOG_DIR), help="Segment directory")
+    parser.add_argument("--explode", action="store_true", help="One row per profile x formula")
+    parser.add_argument("--output", default=None, help="Write the records to this CSV")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Load the prediction log from the command line"""
+    args = parse_args(argv)
+    df = read_prediction_log(args.log_dir, explode=args.explode)
+    print(f"{len(df)} records from {len(segment_paths(args.log_dir))} segments in {args.log_dir}")
+    if args.output and len(df):
+        df.to_csv(args.output, index=False)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
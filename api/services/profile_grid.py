@@ -0,0 +1,220 @@
+"""
+Precomputed recommendation scores over a quantized baby profile grid
+Serving mode that answers recommend with an array lookup instead of a
+model call (built by src/training/build_profile_grid.py)
+"""
+import json
+import itertools
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Sequence, Union
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+logger = logging.getLogger(__name__)
+
+GRID_META_FILE = "grid.json"
+GOOD_PROB_FILE = "good_prob.npy"
+LABELS_FILE = "labels.npy"
+
+# Probabilities are stored as uint8 (resolution 1/255)
+PROB_SCALE = 255.0
+
+
+class ProfileGrid:
+    """
+    Quantized profile grid with per-formula 'good' probabilities
+
+    Axes are either categorical ({"name", "values"}) or regular numeric
+    ({"name", "start", "step", "size"}). Scores are stored as a
+    (n_grid_profiles x n_formulas) uint8 array in C order over the axes.
+    """
+
+    def __init__(
+        self,
+        meta: Dict,
+        good_prob: np.ndarray,
+        labels: np.ndarray
+    ):
+        """
+        Initialize grid
+
+        Args:
+            meta: Grid metadata (axes, formula_ids, classes, model_version, ...)
+            good_prob: uint8 'good' probabilities (n_grid_profiles x n_formulas)
+            labels: uint8 predicted class codes (n_grid_profiles x n_formulas)
+        """
+        self.meta = meta
+        self.axes = meta["axes"]
+        self.formula_ids = np.asarray(meta["formula_ids"], dtype=np.int64)
+        self.classes = np.asarray(meta["classes"], dtype=object)
+        self.model_version = meta.get("model_version")
+        self.good_prob = good_prob
+        self.labels = labels
+
+        self.shape = tuple(axis_size(axis) for axis in self.axes)
+        self.strides = np.array(
+            [int(np.prod(self.shape[i + 1:])) for i in range(len(self.shape))],
+            dtype=np.int64
+        )
+        expected = int(np.prod(self.shape))
+        if good_prob.shape != (expected, len(self.formula_ids)):
+            raise ValueError(
+                f"Grid array shape {good_prob.shape} does not match axes "
+                f"({expected} profiles x {len(self.formula_ids)} formulas)"
+            )
+
+        self._numeric = [i for i, axis in enumerate(self.axes) if "values" not in axis]
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "ProfileGrid":
+        """
+        Load a grid directory
+
+        Args:
+            path: Directory with grid.json, good_prob.npy and labels.npy
+            mmap: Memory-map the arrays instead of reading them
+
+        Returns:
+            ProfileGrid
+        """
+        path = Path(path)
+        meta = json.loads((path / GRID_META_FILE).read_text())
+        mmap_mode = "r" if mmap else None
+        good_prob = np.load(path / GOOD_PROB_FILE, mmap_mode=mmap_mode)
+        labels = np.load(path / LABELS_FILE, mmap_mode=mmap_mode)
+
+        grid = cls(meta, good_prob, labels)
+        logger.info(
+            f"Profile grid loaded: {good_prob.shape[0]} profiles x "
+            f"{good_prob.shape[1]} formulas ({good_prob.nbytes + labels.nbytes} bytes)"
+        )
+        return grid
+
+    def _positions(self, profiles: pd.DataFrame) -> tuple:
+        """
+        Fractional grid position of each profile on each axis
+
+        Returns:
+            (positions n_profiles x n_axes, in-grid mask)
+        """
+        n = len(profiles)
+        positions = np.zeros((n, len(self.axes)), dtype=np.float64)
+        in_grid = np.ones(n, dtype=bool)
+
+        for i, axis in enumerate(self.axes):
+            column = profiles[axis["name"]].to_numpy()
+            if "values" in axis:
+                lookup = {value: code for code, value in enumerate(axis["values"])}
+                codes = np.array([lookup.get(v, -1) for v in column], dtype=np.float64)
+                in_grid &= codes >= 0
+                positions[:, i] = codes
+            else:
+                pos = (column.astype(np.float64) - axis["start"]) / axis["step"]
+                in_grid &= (pos >= -0.5) & (pos <= axis["size"] - 0.5)
+                positions[:, i] = pos
+
+        return positions, in_grid
+
+    def lookup(
+        self,
+        baby_profiles: Union[List[Dict], pd.DataFrame],
+        interpolate: bool = False
+    ) -> Optional[Dict]:
+        """
+        Look up precomputed scores for a batch of profiles
+
+        Args:
+            baby_profiles: Baby profile dictionaries or DataFrame
+            interpolate: Multilinear interpolation over numeric axes
+                (predicted labels always come from the nearest grid point)
+
+        Returns:
+            Dictionary with good_probabilities and predicted_labels
+            (n_profiles x n_formulas), or None if any profile is off-grid
+        """
+        profiles = pd.DataFrame(baby_profiles)
+        positions, in_grid = self._positions(profiles)
+        if not in_grid.all():
+            return None
+
+        nearest = np.rint(positions).astype(np.int64)
+        for i in self._numeric:
+            nearest[:, i] = np.clip(nearest[:, i], 0, self.shape[i] - 1)
+        nearest_flat = nearest @ self.strides
+
+        labels = self.classes[np.asarray(self.labels[nearest_flat])]
+
+        if not interpolate or not self._numeric:
+            good = np.asarray(self.good_prob[nearest_flat], dtype=np.float64) / PROB_SCALE
+            return {"good_probabilities": good, "predicted_labels": labels}
+
+        # Multilinear interpolation between the 2^d surrounding grid points
+        lower = nearest.copy()
+        frac = np.zeros((len(profiles), len(self._numeric)), dtype=np.float64)
+        for j, i in enumerate(self._numeric):
+            size = self.shape[i]
+            pos = np.clip(positions[:, i], 0, size - 1)
+            lo = np.clip(np.floor(pos).astype(np.int64), 0, max(size - 2, 0))
+            lower[:, i] = lo
+            frac[:, j] = pos - lo if size > 1 else 0.0
+
+        good = np.zeros((len(profiles), len(self.formula_ids)), dtype=np.float64)
+        for corner in itertools.product((0, 1), repeat=len(self._numeric)):
+            idx = lower.copy()
+            weight = np.ones(len(profiles), dtype=np.float64)
+            for j, (i, bit) in enumerate(zip(self._numeric, corner)):
+                if bit:
+                    idx[:, i] = np.minimum(idx[:, i] + 1, self.shape[i] - 1)
+                    weight *= frac[:, j]
+                else:
+                    weight *= 1.0 - frac[:, j]
+            if not weight.any():
+                continue
+            good += weight[:, None] * np.asarray(self.good_prob[idx @ self.strides], dtype=np.float64)
+
+        return {"good_probabilities": good / PROB_SCALE, "predicted_labels": labels}
+
+    def matches(self, formula_ids: Sequence[int], classes: Sequence[str]) -> bool:
+        """Whether the grid was built for this catalog order and class set"""
+        return (
+            np.array_equal(self.formula_ids, np.asarray(formula_ids, dtype=np.int64))
+            and list(self.classes) == [str(c) for c in classes]
+        )
+
+
+def axis_size(axis: Dict) -> int:
+    """Number of grid points on an axis"""
+    if "values" in axis:
+        return len(axis["values"])
+    return int(axis["size"])
+
+
+def axis_values(axis: Dict) -> np.ndarray:
+    """Grid point values of an axis"""
+    if "values" in axis:
+        return np.asarray(axis["values"], dtype=object)
+    return np.round(axis["start"] + axis["step"] * np.arange(axis["size"]), 6)
+
+
+def grid_profiles(axes: List[Dict], flat_indices: np.ndarray) -> pd.DataFrame:
+    """
+    Decode flat grid indices into baby profiles
+
+    Args:
+        axes: Grid axes
+        flat_indices: C-order indices into the grid
+
+    Returns:
+        DataFrame with one profile per index
+    """
+    shape = tuple(axis_size(axis) for axis in axes)
+    coords = np.unravel_index(flat_indices, shape)
+    return pd.DataFrame({
+        axis["name"]: axis_values(axis)[coord]
+        for axis, coord in zip(axes, coords)
+    })
@@ -0,0 +1,72 @@
+"""
+Top-N selection over score matrices
+Selects each row's best formulas with a threshold mask and argpartition
+instead of sorting the whole catalog; the full order is computed only
+when a caller asks for all formulas
+"""
+import numpy as np
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+def top_positions(scores: np.ndarray, eligible: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k best eligible scores per row, best first
+
+    Ties are broken by position, matching a stable descending sort.
+    Ineligible positions rank last, so a row with fewer than k eligible
+    positions has them first, followed by ineligible filler.
+
+    Args:
+        scores: Score matrix (n_rows x n_items)
+        eligible: Boolean mask of the same shape
+        k: Number of positions per row
+
+    Returns:
+        Positions (n_rows x min(k, n_items))
+    """
+    n_rows, n_items = scores.shape
+    k = max(0, min(k, n_items))
+    masked = np.where(eligible, scores, -np.inf)
+
+    if k == 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+
+    if k < n_items:
+        # k-th largest value per row; keep everything above it and the
+        # lowest-position ties needed to make k
+        kth = -np.partition(-masked, k - 1, axis=1)[:, k - 1:k]
+        above = masked > kth
+        tie = masked == kth
+        need = k - above.sum(axis=1, keepdims=True)
+        keep = above | (tie & (np.cumsum(tie, axis=1) <= need))
+        positions = np.nonzero(keep)[1].reshape(n_rows, k)
+    else:
+        positions = np.broadcast_to(np.arange(n_items), (n_rows, n_items))
+
+    values = np.take_along_axis(masked, positions, axis=1)
+    order = np.lexsort((positions, -values), axis=1)
+    return np.take_along_axis(positions, order, axis=1)
+
+
+def ranking_order(ranking: Dict) -> np.ndarray:
+    """
+    Full ranked order of a ranking's formulas (computed once, on demand)
+
+    Args:
+        ranking: Result of FormulaRecommender.rank / rank_scores
+
+    Returns:
+        Catalog positions by adjusted score (if present) or 'good'
+        probability, descending and stable
+    """
+    order = ranking.get("order")
+    if order is None:
+        key = ranking.get("adjusted_scores")
+        if key is None:
+            key = ranking["good_probabilities"]
+        order = np.argsort(-key, kind="stable")
+        ranking["order"] = order
+    return order
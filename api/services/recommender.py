@@ -2,51 +2,99 @@
 Formula recommendation service
 """
 import joblib
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 import sys
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
+from api.services.catalog import FormulaCatalog, DEFAULT_FORMULA_PATH
+from api.services.encoding import RecommendationEncoder
+from api.services.symptoms import adjust_scores, symptom_vectors
+from api.services.profile_grid import ProfileGrid
+from api.services.engine import KNNServingEngine
+from api.services.ranking import ranking_order, top_positions
+from api.services.drift import DriftMonitor, reference_from_training_data
+
 logger = logging.getLogger(__name__)
 
 
 class FormulaRecommender:
     """Formula recommendation engine"""
 
-    def __init__(self, model_path: str = "models/trained/knn_v1_legacy.pkl"):
+    def __init__(
+        self,
+        model_path: str = "models/trained/knn_v1_legacy.pkl",
+        grid_path: Optional[str] = None,
+        grid_interpolate: bool = False,
+        compact_engine: bool = True,
+        drift_monitor: bool = True,
+        model_package: Optional[Dict] = None
+    ):
         """
         Initialize recommender with trained model
 
         Args:
             model_path: Path to trained model pickle file
+            grid_path: Precomputed profile grid directory (optional serving mode)
+            grid_interpolate: Interpolate grid scores over numeric axes
+            compact_engine: Score KNN pipelines with the float32 compact
+                engine (see api/services/engine.py) instead of sklearn
+            drift_monitor: Track served profiles against the training
+                reference statistics (see api/services/drift.py)
+            model_package: Package already loaded from model_path (skips
+                reading the file once)
         """
         self.model_path = Path(model_path)
         self.model_package = None
         self.model = None
         self.label_encoder = None
         self.feature_cols = None
-        self.formula_df = None
+        self.catalog = None
+        self.encoder = None
         self.model_version = "unknown"
+        self.grid = None
+        self.grid_interpolate = grid_interpolate
+        self.compact_engine = compact_engine
+        self.engine = None
+        self._training_log_ids = None
+        self.use_drift_monitor = drift_monitor
+        self.drift = None
+        self._preloaded = model_package
 
         self.load_model()
         self.load_formula_data()
+        if grid_path:
+            self.load_grid(grid_path)
 
     def load_model(self):
         """Load trained model from pickle file"""
         try:
-            self.model_package = joblib.load(self.model_path)
+            package, self._preloaded = self._preloaded, None
+            self.model_package = package if package is not None else joblib.load(self.model_path)
             self.model = self.model_package["model_pipeline"]
             self.label_encoder = self.model_package["label_encoder"]
             self.feature_cols = self.model_package["feature_cols"]
             self.model_version = self.model_path.stem
+            self.engine = KNNServingEngine.from_pipeline(self.model) if self.compact_engine else None
+            self._training_log_ids = None
+            self.drift = self._build_drift_monitor() if self.use_drift_monitor else None
 
             logger.info(f"Model loaded successfully: {self.model_version}")
             logger.info(f"Features: {self.feature_cols}")
             logger.info(f"Classes: {self.label_encoder.classes_}")
+            logger.info(f"Scoring engine: {'compact' if self.engine is not None else 'sklearn'}")
+
+            if self.catalog is not None:
+                self.encoder = self._build_encoder(self.catalog)
+
+            if self.grid is not None and not self._grid_matches(self.grid):
+                logger.warning("Model changed, profile grid disabled")
+                self.grid = None
 
         except FileNotFoundError:
             logger.error(f"Model file not found: {self.model_path}")
@@ -55,12 +103,43 @@ class FormulaRecommender:
             logger.error(f"Error loading model: {e}")
             raise
 
-    def load_formula_data(self):
-        """Load formula master data"""
+    def _build_drift_monitor(self) -> Optional[DriftMonitor]:
+        """Drift monitor from the package's reference stats (or the training data)"""
+        reference = self.model_package.get("reference_stats")
+        if reference is None:
+            try:
+                reference = reference_from_training_data(self.model, self.label_encoder.classes_)
+                logger.info("No reference_stats in model package, drift reference built from data/raw")
+            except Exception as e:
+                logger.warning(f"Drift monitor disabled: {e}")
+                return None
+        return DriftMonitor(reference)
+
+    def load_formula_data(self, source: str = "csv", path: str = DEFAULT_FORMULA_PATH):
+        """
+        Load formula master data into an immutable catalog
+
+        Args:
+            source: "csv" for formula_master.csv, "db" for the formulas table
+            path: Formula master CSV for source "csv"
+        """
         try:
-            formula_path = Path("data/raw/formula_master.csv")
-            self.formula_df = pd.read_csv(formula_path)
-            logger.info(f"Loaded {len(self.formula_df)} formulas")
+            if source == "csv":
+                catalog = FormulaCatalog.from_csv(path)
+            elif source == "db":
+                catalog = FormulaCatalog.from_db()
+            else:
+                raise ValueError(f"Unknown formula source: {source}")
+
+            encoder = self._build_encoder(catalog)
+
+            # Swap in so concurrent requests see old or new catalog
+            self.catalog, self.encoder = catalog, encoder
+
+            if self.grid is not None and not self._grid_matches(self.grid):
+                logger.warning("Formula catalog changed, profile grid disabled")
+                self.grid = None
+            logger.info(f"Loaded {len(self.catalog)} formulas")
 
         except FileNotFoundError:
             logger.error("Formula master data not found")
@@ -69,85 +148,443 @@ class FormulaRecommender:
             logger.error(f"Error loading formula data: {e}")
             raise
 
-    def recommend(
+    def _grid_matches(self, grid: ProfileGrid) -> bool:
+        """Whether a grid was built for the loaded model and catalog"""
+        return (
+            grid.model_version == self.model_version
+            and grid.matches(self.catalog.formula_ids, self.label_encoder.classes_)
+        )
+
+    def load_grid(self, grid_path: str):
+        """
+        Load a precomputed profile grid (see src/training/build_profile_grid.py)
+
+        Profiles inside the grid are answered by lookup; anything outside
+        falls back to the model. A grid built for another model or catalog
+        is rejected.
+
+        Args:
+            grid_path: Grid directory
+        """
+        try:
+            grid = ProfileGrid.load(grid_path)
+        except FileNotFoundError:
+            logger.error(f"Profile grid not found: {grid_path}")
+            raise
+
+        if not self._grid_matches(grid):
+            logger.warning(
+                f"Profile grid {grid_path} was built for {grid.model_version} "
+                f"or another formula catalog, ignoring it"
+            )
+            return
+
+        self.grid = grid
+        logger.info(f"Profile grid serving enabled (interpolate={self.grid_interpolate})")
+
+    def _build_encoder(self, catalog: FormulaCatalog) -> RecommendationEncoder:
+        """Build response encoder for a catalog and the loaded model"""
+        return RecommendationEncoder(
+            catalog,
+            classes=self.label_encoder.classes_,
+            model_version=self.model_version
+        )
+
+    @property
+    def model_name(self) -> Optional[str]:
+        """Model family stored in the package"""
+        return self.model_package.get("model_name")
+
+    @property
+    def formula_df(self) -> pd.DataFrame:
+        """Formula master data as a DataFrame"""
+        return self.catalog.to_frame()
+
+    def _good_index(self) -> int:
+        """Column of the 'good' class in predict_proba output"""
+        classes = self.label_encoder.classes_
+        try:
+            return list(classes).index("good")
+        except ValueError:
+            raise ValueError(f"'good' class not found in: {classes}")
+
+    def predict_proba(self, X_candidates: pd.DataFrame, return_neighbors: bool = False):
+        """
+        Class probabilities from the compact engine or the sklearn pipeline
+
+        Args:
+            X_candidates: Model input rows
+            return_neighbors: Also return the neighbors behind each row
+                (compact engine only)
+
+        Returns:
+            Probabilities, or (probabilities, neighbor distances, neighbor
+            training row indices) with return_neighbors
+        """
+        engine = self.engine
+        if return_neighbors:
+            if engine is None:
+                raise ValueError(f"Neighbor explanations are not available for model {self.model_version}")
+            neigh_dist, neigh_idx = engine.kneighbors(X_candidates)
+            return engine.proba_from_neighbors(neigh_dist, neigh_idx), neigh_dist, neigh_idx
+        if engine is not None:
+            return engine.predict_proba(X_candidates)
+        return self.model.predict_proba(X_candidates)
+
+    def training_log_ids(self) -> np.ndarray:
+        """
+        Feeding log id of each training row of the loaded model
+
+        Read from the package's train_log_ids when present; older packages
+        are matched against data/raw/feeding_logs.csv (-1 where no row
+        matches). Computed on first use.
+        """
+        log_ids = self.model_package.get("train_log_ids")
+        if log_ids is not None:
+            return np.asarray(log_ids, dtype=np.int64)
+
+        if self._training_log_ids is not None:
+            return self._training_log_ids
+
+        from src.data.data_loader import SmartBottleDataLoader, TARGET_COL
+
+        formula_df, logs = SmartBottleDataLoader().load_csv_data()
+        data = logs.merge(formula_df, on="formula_id", how="left")
+        labels = self.label_encoder.transform(data[TARGET_COL])
+        matches = self.engine.match_training_rows(data[self.feature_cols], labels)
+
+        log_ids = np.where(matches >= 0, data["log_id"].to_numpy()[np.maximum(matches, 0)], -1)
+        n_missing = int((matches < 0).sum())
+        if n_missing:
+            logger.warning(f"{n_missing} training rows not found in feeding logs")
+
+        self._training_log_ids = log_ids
+        return log_ids
+
+    def explain(
+        self,
+        baby_profile: Dict,
+        ranking: Dict,
+        positions: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """
+        Neighbor attribution for scored formulas
+
+        Args:
+            baby_profile: Baby profile the ranking was computed for
+            ranking: Result of rank(..., explain=True)
+            positions: Catalog positions to explain (default: top N)
+
+        Returns:
+            One dictionary per position with the voting feeding logs
+            (log_id, distance, label, vote weight) and per-feature
+            distance components
+        """
+        positions = list(ranking["top"] if positions is None else positions)
+        if not positions:
+            return []
+
+        return self._explain_rows(
+            baby_profile,
+            ranking["catalog"],
+            positions,
+            ranking["neighbor_distances"][positions],
+            ranking["neighbor_indices"][positions]
+        )
+
+    def _explain_rows(
         self,
         baby_profile: Dict,
+        catalog: FormulaCatalog,
+        positions: List[int],
+        neigh_dist: np.ndarray,
+        neigh_idx: np.ndarray
+    ) -> List[Dict]:
+        """Build explanations for catalog positions and their neighbors (aligned rows)"""
+        engine = self.engine
+
+        X = catalog.candidate_frame(baby_profile, positions=positions)[self.feature_cols]
+        components = engine.distance_components(X, neigh_idx)
+        weights = engine.neighbor_weights(neigh_dist)
+        log_ids = self.training_log_ids()
+        classes = self.label_encoder.classes_
+        features = engine.feature_names
+
+        explanations = []
+        for row, pos in enumerate(positions):
+            explanations.append({
+                "formula_id": int(catalog.formula_ids[pos]),
+                "neighbors": [
+                    {
+                        "log_id": int(log_ids[idx]),
+                        "distance": float(neigh_dist[row, j]),
+                        "label": str(classes[engine.train_labels[idx]]),
+                        "weight": float(weights[row, j]),
+                        "distance_components": {
+                            feature: float(value)
+                            for feature, value in zip(features, components[row, j])
+                        },
+                    }
+                    for j, idx in enumerate(neigh_idx[row])
+                ],
+            })
+        return explanations
+
+    def score_batch(
+        self,
+        baby_profiles: List[Dict],
+        use_grid: bool = True,
+        return_neighbors: bool = False
+    ) -> Dict:
+        """
+        Score every formula for a batch of babies in one model call
+
+        Args:
+            baby_profiles: List of baby profile dictionaries (or a DataFrame)
+            use_grid: Answer from the profile grid when loaded and every
+                profile is on it
+            return_neighbors: Keep the neighbors found while scoring
+                (compact engine only, bypasses the grid)
+
+        Returns:
+            Dictionary with the catalog used, class probabilities
+            (n_babies x n_formulas x n_classes, None for grid lookups),
+            'good' probabilities and predicted labels (n_babies x n_formulas),
+            plus neighbor_distances / neighbor_indices
+            (n_babies x n_formulas x k) with return_neighbors
+        """
+        good_index = self._good_index()
+        catalog = self.catalog
+
+        grid = self.grid
+        if use_grid and grid is not None and not return_neighbors:
+            result = grid.lookup(baby_profiles, interpolate=self.grid_interpolate)
+            if result is not None:
+                result.update({"catalog": catalog, "probabilities": None, "source": "grid"})
+                return result
+
+        # 1. 아기 프로필과 전체 분유 조합 생성
+        if isinstance(baby_profiles, list) and len(baby_profiles) == 1:
+            X_candidates = catalog.candidate_frame(baby_profiles[0])[self.feature_cols]
+        else:
+            X_candidates = catalog.candidate_frame_batch(baby_profiles)[self.feature_cols]
+
+        # 2. 모델 예측 (predicted class = argmax of probabilities)
+        classes = np.asarray(self.label_encoder.classes_, dtype=object)
+        shape = (len(baby_profiles), len(catalog))
+        neighbors = {}
+        if return_neighbors:
+            prob_matrix, neigh_dist, neigh_idx = self.predict_proba(X_candidates, return_neighbors=True)
+            neighbors = {
+                "neighbor_distances": neigh_dist.reshape(shape + (-1,)),
+                "neighbor_indices": neigh_idx.reshape(shape + (-1,)),
+            }
+        else:
+            prob_matrix = self.predict_proba(X_candidates)
+        prob_matrix = prob_matrix.reshape(shape + (len(classes),))
+
+        return {
+            "catalog": catalog,
+            "probabilities": prob_matrix,
+            "good_probabilities": prob_matrix[:, :, good_index],
+            "predicted_labels": classes[prob_matrix.argmax(axis=2)],
+            "source": "model",
+            **neighbors,
+        }
+
+    def rank_batch(
+        self,
+        baby_profiles: List[Dict],
         top_n: int = 3,
-        min_good_prob: float = 0.3
+        min_good_prob: float = 0.3,
+        use_symptoms: bool = False,
+        explain: bool = False
     ) -> List[Dict]:
         """
-        Recommend formulas for a baby
+        Score and rank all formulas for a batch of babies
 
         Args:
-            baby_profile: Dictionary with baby profile data
-            top_n: Number of top recommendations to return
+            baby_profiles: List of baby profile dictionaries
+            top_n: Number of top recommendations per baby
             min_good_prob: Minimum good probability threshold
+            use_symptoms: Re-rank with symptom weights (diarrhea,
+                constipation, vomiting, skin_rash keys of each profile)
+            explain: Keep each formula's neighbors for explain()
 
         Returns:
-            List of recommendation dictionaries
+            One ranking dictionary per baby (see rank)
         """
         try:
-            # Find 'good' class index
-            classes = self.label_encoder.classes_
-            try:
-                good_index = list(classes).index("good")
-            except ValueError:
-                raise ValueError(f"'good' class not found in: {classes}")
-
-            # 1. 아기 프로필과 6가지 분유 조합 생성
-            candidates = []
-            for _, formula in self.formula_df.iterrows():
-                candidate = {**baby_profile}
-                candidate.update({
-                    "formula_id": int(formula["formula_id"]),
-                    "category": formula["category"],
-                    "lactose_level": formula["lactose_level"],
-                    "target_issue": formula["target_issue"],
-                    "protein_type": formula["protein_type"],
-                })
-                candidates.append(candidate)
-
-            candidates_df = pd.DataFrame(candidates)
-            X_candidates = candidates_df[self.feature_cols]
-
-           # 2. KNN 모델로 예측
-            prob_matrix = self.model.predict_proba(X_candidates)
-            good_probs = prob_matrix[:, good_index]
-
-            # Predict classes
-            y_pred_encoded = self.model.predict(X_candidates)
-            y_pred_labels = self.label_encoder.inverse_transform(y_pred_encoded)
-
-            # Build results
-            recommendations = []
-            for i, (_, formula) in enumerate(self.formula_df.iterrows()):
-                rec = {
-                    "formula_id": int(formula["formula_id"]),
-                    "formula_brand": formula["formula_brand"],
-                    "category": formula["category"],
-                    "lactose_level": formula["lactose_level"],
-                    "target_issue": formula["target_issue"],
-                    "protein_type": formula["protein_type"],
-                    "good_probability": float(good_probs[i]),
-                    "predicted_tolerance": y_pred_labels[i],
-                }
-                recommendations.append(rec)
+            scores = self.score_batch(baby_profiles, return_neighbors=explain)
+            rankings = self.rank_scores(
+                scores,
+                baby_profiles,
+                top_n=top_n,
+                min_good_prob=min_good_prob,
+                use_symptoms=use_symptoms
+            )
 
-            # 3. 확률 순 정렬 및 Top N 반환
-            recommendations.sort(key=lambda x: x["good_probability"], reverse=True)
+            logger.debug("Ranked formulas for %d profile(s)", len(baby_profiles))
 
-            # Filter by minimum probability
-            filtered = [r for r in recommendations if r["good_probability"] >= min_good_prob]
+            return rankings
+
+        except Exception as e:
+            logger.error(f"Error in ranking: {e}")
+            raise
+
+    def rank_scores(
+        self,
+        scores: Dict,
+        baby_profiles: List[Dict],
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        use_symptoms: bool = False,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Rank formulas from an existing score_batch result
 
-            # Return top N
-            top_recommendations = filtered[:top_n]
+        Lets several callers share one scoring pass with their own ranking
+        parameters (see api/services/batcher.py).
 
-            logger.info(f"Generated {len(top_recommendations)} recommendations (from {len(filtered)} filtered)")
+        Args:
+            scores: Result of score_batch
+            baby_profiles: Profiles to rank, rows offset.. of scores
+            top_n: Number of top recommendations per baby
+            min_good_prob: Minimum good probability threshold
+            use_symptoms: Re-rank with symptom weights
+            offset: Row of scores holding baby_profiles[0]
 
-            return {
-                "recommendations": top_recommendations,
-                "all_formulas": recommendations
+        Returns:
+            One ranking dictionary per baby (see rank)
+        """
+        catalog = scores["catalog"]
+        rows = slice(offset, offset + len(baby_profiles))
+        good_probs = scores["good_probabilities"][rows]
+        labels = scores["predicted_labels"][rows]
+        neighbors = "neighbor_indices" in scores
+
+        if self.drift is not None:
+            self.drift.observe(baby_profiles, labels)
+
+        adjusted = None
+        if use_symptoms:
+            adjusted = adjust_scores(
+                good_probs,
+                catalog.symptom_matrix,
+                symptom_vectors(baby_profiles)
+            )
+
+        # 3. 점수 순 Top N 선택: ordered by adjusted score when given,
+        # the threshold always applies to the 'good' probability
+        key = good_probs if adjusted is None else adjusted
+        eligible = good_probs >= min_good_prob
+        n_filtered = eligible.sum(axis=1)
+        top = top_positions(key, eligible, top_n)
+
+        rankings = []
+        for i in range(len(baby_profiles)):
+            ranking = {
+                "top": top[i, :min(top_n, n_filtered[i])],
+                "n_filtered": int(n_filtered[i]),
+                # Full order is built on demand by ranking_order()
+                "order": None,
+                "catalog": catalog,
+                "good_probabilities": good_probs[i],
+                "predicted_labels": labels[i],
             }
+            if adjusted is not None:
+                ranking["adjusted_scores"] = adjusted[i]
+            if neighbors:
+                ranking["neighbor_distances"] = scores["neighbor_distances"][offset + i]
+                ranking["neighbor_indices"] = scores["neighbor_indices"][offset + i]
+            rankings.append(ranking)
+
+        return rankings
+
+    def rank(
+        self,
+        baby_profile: Dict,
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        use_symptoms: bool = False,
+        explain: bool = False
+    ) -> Dict:
+        """
+        Score and rank all formulas for a baby
+
+        Args:
+            baby_profile: Dictionary with baby profile data
+            top_n: Number of top recommendations to return
+            min_good_prob: Minimum good probability threshold
+            use_symptoms: Re-rank with symptom weights
+            explain: Keep each formula's neighbors for explain()
+
+        Returns:
+            Dictionary with per-formula arrays (catalog order), the catalog
+            positions of the top N and the number of formulas passing the
+            threshold. "order" (full ranking) is None until ranking_order()
+            is called.
+        """
+        ranking = self.rank_batch(
+            [baby_profile],
+            top_n=top_n,
+            min_good_prob=min_good_prob,
+            use_symptoms=use_symptoms,
+            explain=explain
+        )[0]
+
+        logger.debug("Generated %d recommendations (from %d filtered)", len(ranking["top"]), ranking["n_filtered"])
+
+        return ranking
+
+    def recommend(
+        self,
+        baby_profile: Dict,
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        explain: bool = False,
+        include_all: bool = False
+    ) -> Dict:
+        """
+        Recommend formulas for a baby
+
+        Args:
+            baby_profile: Dictionary with baby profile data
+            top_n: Number of top recommendations to return
+            min_good_prob: Minimum good probability threshold
+            explain: Add neighbor attribution for the top N (see explain)
+            include_all: Also list every formula in ranked order
+
+        Returns:
+            Dictionary with top N recommendations (and all formulas,
+            explanations)
+        """
+        try:
+            ranking = self.rank(baby_profile, top_n=top_n, min_good_prob=min_good_prob, explain=explain)
+
+            catalog = ranking["catalog"]
+            good_probs = ranking["good_probabilities"]
+            labels = ranking["predicted_labels"]
+
+            def build(positions) -> List[Dict]:
+                return [
+                    {
+                        **catalog.record(pos),
+                        "good_probability": float(good_probs[pos]),
+                        "predicted_tolerance": labels[pos],
+                    }
+                    for pos in positions
+                ]
+
+            # Build results (dicts only for the returned rows)
+            result = {"recommendations": build(ranking["top"])}
+            if include_all:
+                result["all_formulas"] = build(ranking_order(ranking))
+            if explain:
+                result["explanations"] = self.explain(baby_profile, ranking)
+
+            return result
 
         except Exception as e:
             logger.error(f"Error in recommendation: {e}")
@@ -156,7 +593,8 @@ class FormulaRecommender:
     def predict_single(
         self,
         baby_profile: Dict,
-        formula_id: int
+        formula_id: int,
+        explain: bool = False
     ) -> Dict:
         """
         Predict tolerance for a specific baby-formula combination
@@ -164,37 +602,30 @@ class FormulaRecommender:
         Args:
             baby_profile: Dictionary with baby profile
             formula_id: Formula identifier
+            explain: Add neighbor attribution (see explain)
 
         Returns:
             Prediction dictionary
         """
         try:
             # Get formula info
-            formula = self.formula_df[self.formula_df["formula_id"] == formula_id]
-            if len(formula) == 0:
+            catalog = self.catalog
+            pos = catalog.position(formula_id)
+            if pos is None:
                 raise ValueError(f"Formula ID {formula_id} not found")
 
-            formula = formula.iloc[0]
+            formula = catalog.record(pos)
 
             # Create test case
-            test_case = {**baby_profile}
-            test_case.update({
-                "formula_id": int(formula["formula_id"]),
-                "category": formula["category"],
-                "lactose_level": formula["lactose_level"],
-                "target_issue": formula["target_issue"],
-                "protein_type": formula["protein_type"],
-            })
-
-            X_test = pd.DataFrame([test_case])[self.feature_cols]
-
-            # Predict
-            y_pred_encoded = self.model.predict(X_test)[0]
-            y_pred_label = self.label_encoder.inverse_transform([y_pred_encoded])[0]
+            X_test = catalog.candidate_frame(baby_profile, positions=[pos])[self.feature_cols]
 
-            # Get probabilities
-            prob_matrix = self.model.predict_proba(X_test)
+            # Predict (predicted class = argmax of probabilities)
+            if explain:
+                prob_matrix, neigh_dist, neigh_idx = self.predict_proba(X_test, return_neighbors=True)
+            else:
+                prob_matrix = self.predict_proba(X_test)
             classes = self.label_encoder.classes_
+            y_pred_label = classes[int(prob_matrix[0].argmax())]
             good_index = list(classes).index("good")
             good_prob = float(prob_matrix[0, good_index])
 
@@ -208,8 +639,12 @@ class FormulaRecommender:
                     for i, class_name in enumerate(classes)
                 }
             }
+            if explain:
+                result["explanation"] = self._explain_rows(
+                    baby_profile, catalog, [pos], neigh_dist, neigh_idx
+                )[0]
 
-            logger.info(f"Prediction for formula {formula_id}: {y_pred_label} ({good_prob:.3f})")
+            logger.debug("Prediction for formula %s: %s (%.3f)", formula_id, y_pred_label, good_prob)
 
             return result
 
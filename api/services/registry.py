@@ -0,0 +1,461 @@
+"""
+Model registry
+Serves several trained models side by side, routes requests by header or
+percentage split, scores a shadow model off the request path and hands
+served predictions to the prediction log
+"""
+import os
+import threading
+import time
+import zlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import logging
+import random
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.recommender import FormulaRecommender
+from api.services.cf_recommender import load_recommender
+from api.services.batcher import MicroBatcher
+from api.services.prediction_log import PredictionLog
+
+logger = logging.getLogger(__name__)
+shadow_logger = logging.getLogger(__name__ + ".shadow")
+
+DEFAULT_MODEL_DIR = "models/trained"
+
+# Routing buckets for percentage splits (0.01% resolution)
+SPLIT_BUCKETS = 10000
+
+
+def parse_split(spec: Optional[str]) -> Dict[str, float]:
+    """
+    Parse a traffic split specification
+
+    Args:
+        spec: "model_a:90,model_b:10" (weights need not sum to 100)
+
+    Returns:
+        Dictionary of model name -> weight
+    """
+    split = {}
+    if not spec:
+        return split
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition(":")
+        split[name.strip()] = float(weight) if weight else 1.0
+    return split
+
+
+class ShadowStats:
+    """Running agreement counters between shadow and primary models"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scored = 0
+        self.skipped = 0
+        self.errors = 0
+        self.top1_agree = 0
+        self.topn_overlap = 0.0
+        self.label_agree = 0.0
+        self.max_abs_diff = 0.0
+
+    def record(self, comparison: Dict):
+        """Add one profile comparison"""
+        with self._lock:
+            self.scored += 1
+            self.top1_agree += int(comparison["top1_agree"])
+            self.topn_overlap += comparison["topn_overlap"]
+            self.label_agree += comparison["label_agreement"]
+            self.max_abs_diff = max(self.max_abs_diff, comparison["max_abs_diff"])
+
+    def skip(self):
+        """Count a request not shadowed because the queue was full"""
+        with self._lock:
+            self.skipped += 1
+
+    def error(self):
+        """Count a failed shadow scoring"""
+        with self._lock:
+            self.errors += 1
+
+    def to_dict(self) -> Dict:
+        """Snapshot of the counters"""
+        with self._lock:
+            n = max(self.scored, 1)
+            return {
+                "scored": self.scored,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "top1_agreement": self.top1_agree / n if self.scored else None,
+                "topn_overlap": self.topn_overlap / n if self.scored else None,
+                "label_agreement": self.label_agree / n if self.scored else None,
+                "max_abs_diff": self.max_abs_diff,
+            }
+
+
+class ModelRegistry:
+    """
+    Several FormulaRecommender instances keyed by model version
+
+    Request routing:
+        1. explicit model version (X-Model-Version header)
+        2. percentage split, bucketed by routing key (X-Routing-Key header)
+           so one caller sticks to one model; random when no key is given
+        3. default model
+
+    The shadow model, if set, re-scores a request in a background thread
+    after the primary has answered. Disagreement is logged and counted,
+    and requests are dropped from shadowing when max_pending is reached.
+    """
+
+    def __init__(
+        self,
+        model_dir: str = DEFAULT_MODEL_DIR,
+        default_model: Optional[str] = None,
+        split: Optional[Dict[str, float]] = None,
+        shadow_model: Optional[str] = None,
+        shadow_max_pending: int = 64,
+        batch_max_size: int = 0,
+        batch_max_wait_ms: float = 2.0,
+        prediction_log: Optional[PredictionLog] = None,
+        **recommender_kwargs
+    ):
+        """
+        Load every model package in a directory
+
+        Args:
+            model_dir: Directory with *.pkl model packages
+            default_model: Model version served when no route applies
+                (default: knn_v1_legacy if present, else first by name)
+            split: Model version -> traffic weight
+            shadow_model: Model version scored in shadow mode
+            shadow_max_pending: Shadow jobs allowed in flight before skipping
+            batch_max_size: Micro-batch size per model (<= 1 disables batching)
+            batch_max_wait_ms: Micro-batch collection window
+            prediction_log: Where served predictions are recorded (optional)
+            **recommender_kwargs: Passed to every FormulaRecommender
+        """
+        self.model_dir = Path(model_dir)
+        self.models: Dict[str, FormulaRecommender] = {}
+
+        for path in sorted(self.model_dir.glob("*.pkl")):
+            try:
+                self.models[path.stem] = load_recommender(str(path), **recommender_kwargs)
+            except Exception as e:
+                logger.error(f"Skipping model {path.name}: {e}")
+
+        if not self.models:
+            raise FileNotFoundError(f"No loadable model packages in {self.model_dir}")
+
+        if default_model is None:
+            default_model = "knn_v1_legacy" if "knn_v1_legacy" in self.models else next(iter(self.models))
+        self.default_model = self._require(default_model)
+
+        self.split: List[Tuple[str, int]] = []
+        self.set_split(split or {})
+
+        self.shadow_model = self._require(shadow_model) if shadow_model else None
+        self.shadow_stats = ShadowStats()
+        self.shadow_max_pending = shadow_max_pending
+        self._shadow_pending = 0
+        self._shadow_lock = threading.Lock()
+        self._shadow_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+            if self.shadow_model else None
+        )
+
+        self.batchers: Dict[str, MicroBatcher] = {}
+        if batch_max_size > 1:
+            self.batchers = {
+                name: MicroBatcher(rec, max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms)
+                for name, rec in self.models.items()
+            }
+
+        self.prediction_log = prediction_log
+
+        logger.info(
+            f"Model registry: {list(self.models)} (default={self.default_model}, "
+            f"split={dict(self.split_weights())}, shadow={self.shadow_model})"
+        )
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        """Build the serving registry from environment settings (see .env.example)"""
+        return cls(
+            model_dir=os.getenv("MODEL_DIR", DEFAULT_MODEL_DIR),
+            default_model=os.getenv("DEFAULT_MODEL") or None,
+            split=parse_split(os.getenv("MODEL_SPLIT")),
+            shadow_model=os.getenv("SHADOW_MODEL") or None,
+            shadow_max_pending=int(os.getenv("SHADOW_MAX_PENDING", "64")),
+            batch_max_size=int(os.getenv("MICROBATCH_MAX_SIZE", "64")),
+            batch_max_wait_ms=float(os.getenv("MICROBATCH_MAX_WAIT_MS", "2")),
+            grid_path=os.getenv("PROFILE_GRID_PATH") or None,
+            grid_interpolate=os.getenv("PROFILE_GRID_INTERPOLATE", "false").lower() == "true",
+            compact_engine=os.getenv("COMPACT_ENGINE", "true").lower() == "true",
+            drift_monitor=os.getenv("DRIFT_MONITOR", "true").lower() == "true",
+            prediction_log=PredictionLog.from_env()
+        )
+
+    def _require(self, name: str) -> str:
+        """Validate a model version"""
+        if name not in self.models:
+            raise KeyError(f"Unknown model version: {name} (loaded: {list(self.models)})")
+        return name
+
+    def set_split(self, split: Dict[str, float]):
+        """
+        Set the traffic split
+
+        Args:
+            split: Model version -> weight (empty to disable)
+        """
+        total = sum(split.values())
+        buckets = []
+        upper = 0
+        for name, weight in split.items():
+            self._require(name)
+            if weight < 0:
+                raise ValueError(f"Negative split weight for {name}")
+            upper += int(round(SPLIT_BUCKETS * weight / total)) if total else 0
+            buckets.append((name, upper))
+        if buckets:
+            buckets[-1] = (buckets[-1][0], SPLIT_BUCKETS)
+        self.split = buckets
+
+    def split_weights(self) -> List[Tuple[str, float]]:
+        """Traffic share per model version in the current split"""
+        shares = []
+        lower = 0
+        for name, upper in self.split:
+            shares.append((name, (upper - lower) / SPLIT_BUCKETS))
+            lower = upper
+        return shares
+
+    @property
+    def default(self) -> FormulaRecommender:
+        """Recommender of the default model"""
+        return self.models[self.default_model]
+
+    def route(
+        self,
+        model_version: Optional[str] = None,
+        routing_key: Optional[str] = None
+    ) -> FormulaRecommender:
+        """
+        Pick the recommender for a request
+
+        Args:
+            model_version: Explicitly requested model version
+            routing_key: Stable caller key for split bucketing
+
+        Returns:
+            FormulaRecommender
+
+        Raises:
+            KeyError: Requested model version is not loaded
+        """
+        if model_version:
+            return self.models[self._require(model_version)]
+
+        if self.split:
+            if routing_key:
+                bucket = zlib.crc32(routing_key.encode("utf-8")) % SPLIT_BUCKETS
+            else:
+                bucket = random.randrange(SPLIT_BUCKETS)
+            for name, upper in self.split:
+                if bucket < upper:
+                    return self.models[name]
+
+        return self.default
+
+    def batcher(self, rec: FormulaRecommender) -> Optional[MicroBatcher]:
+        """Micro-batcher of a loaded recommender (None when batching is off)"""
+        return self.batchers.get(rec.model_version)
+
+    def shadow(
+        self,
+        primary: FormulaRecommender,
+        baby_profiles: List[Dict],
+        rankings: List[Dict],
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        use_symptoms: bool = False
+    ) -> bool:
+        """
+        Score the shadow model for a served request, off the request path
+
+        Args:
+            primary: Recommender that served the request
+            baby_profiles: Profiles of the request
+            rankings: Rankings returned to the caller
+            top_n, min_good_prob, use_symptoms: Request ranking parameters
+
+        Returns:
+            Whether a shadow job was queued
+        """
+        if self._shadow_executor is None:
+            return False
+        shadow = self.models[self.shadow_model]
+        if shadow is primary:
+            return False
+
+        with self._shadow_lock:
+            if self._shadow_pending >= self.shadow_max_pending:
+                self.shadow_stats.skip()
+                return False
+            self._shadow_pending += 1
+
+        self._shadow_executor.submit(
+            self._run_shadow, shadow, primary.model_version, baby_profiles, rankings,
+            top_n, min_good_prob, use_symptoms
+        )
+        return True
+
+    def log(
+        self,
+        endpoint: str,
+        rec: FormulaRecommender,
+        baby_profiles: List[Dict],
+        rankings: List[Dict],
+        started: float
+    ) -> bool:
+        """
+        Record served rankings in the prediction log (non-blocking)
+
+        Args:
+            endpoint: Serving endpoint name
+            rec: Recommender that served the request
+            baby_profiles: Profiles of the request
+            rankings: Rankings returned to the caller
+            started: time.perf_counter() at the start of the request
+
+        Returns:
+            Whether the request was queued
+        """
+        if self.prediction_log is None:
+            return False
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        return self.prediction_log.log(endpoint, rec.model_version, baby_profiles, rankings, latency_ms)
+
+    def log_prediction(
+        self,
+        endpoint: str,
+        rec: FormulaRecommender,
+        baby_profile: Dict,
+        prediction: Dict,
+        started: float
+    ) -> bool:
+        """Record a single-formula prediction in the prediction log (see log)"""
+        if self.prediction_log is None:
+            return False
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        return self.prediction_log.log_prediction(endpoint, rec.model_version, baby_profile, prediction, latency_ms)
+
+    def _run_shadow(
+        self,
+        shadow: FormulaRecommender,
+        primary_version: str,
+        baby_profiles: List[Dict],
+        rankings: List[Dict],
+        top_n: int,
+        min_good_prob: float,
+        use_symptoms: bool
+    ):
+        """Shadow job: score, compare and log"""
+        try:
+            shadow_rankings = shadow.rank_batch(
+                baby_profiles,
+                top_n=top_n,
+                min_good_prob=min_good_prob,
+                use_symptoms=use_symptoms
+            )
+            for profile, primary_ranking, shadow_ranking in zip(baby_profiles, rankings, shadow_rankings):
+                comparison = compare_rankings(primary_ranking, shadow_ranking)
+                if comparison is None:
+                    continue
+                self.shadow_stats.record(comparison)
+                if not comparison["top1_agree"]:
+                    shadow_logger.info(
+                        f"Shadow disagreement {primary_version} vs {shadow.model_version}: "
+                        f"top={comparison['primary_top']} shadow_top={comparison['shadow_top']} "
+                        f"max_abs_diff={comparison['max_abs_diff']:.3f} "
+                        f"profile=age {profile.get('age_month')}m sex {profile.get('sex')}"
+                    )
+        except Exception as e:
+            self.shadow_stats.error()
+            shadow_logger.error(f"Shadow scoring failed ({shadow.model_version}): {e}")
+        finally:
+            with self._shadow_lock:
+                self._shadow_pending -= 1
+
+    def reload_formulas(self, source: str = "csv"):
+        """Reload the formula catalog of every model"""
+        for rec in self.models.values():
+            rec.load_formula_data(source=source)
+
+    def describe(self) -> Dict:
+        """Loaded models, routing and shadow counters"""
+        return {
+            "models": [
+                {
+                    "model_version": name,
+                    "model_name": rec.model_name,
+                    "engine": "compact" if rec.engine is not None else "sklearn",
+                    "grid": rec.grid is not None,
+                    "drift_monitor": rec.drift is not None,
+                    "batching": self.batchers[name].stats() if name in self.batchers else None,
+                }
+                for name, rec in self.models.items()
+            ],
+            "default_model": self.default_model,
+            "split": dict(self.split_weights()),
+            "shadow_model": self.shadow_model,
+            "shadow": self.shadow_stats.to_dict() if self.shadow_model else None,
+            "prediction_log": self.prediction_log.stats() if self.prediction_log is not None else None,
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the shadow worker and flush the prediction log"""
+        if self._shadow_executor is not None:
+            self._shadow_executor.shutdown(wait=wait)
+        if self.prediction_log is not None:
+            self.prediction_log.close()
+
+
+def compare_rankings(primary: Dict, shadow: Dict) -> Optional[Dict]:
+    """
+    Compare two rankings of the same profile
+
+    Args:
+        primary: Ranking from the serving model
+        shadow: Ranking from the shadow model
+
+    Returns:
+        Agreement metrics, or None if the catalogs differ
+    """
+    primary_ids = primary["catalog"].formula_ids
+    shadow_ids = shadow["catalog"].formula_ids
+    if not np.array_equal(primary_ids, shadow_ids):
+        return None
+
+    primary_top = [int(primary_ids[pos]) for pos in primary["top"]]
+    shadow_top = [int(shadow_ids[pos]) for pos in shadow["top"]]
+    n = max(len(primary_top), len(shadow_top), 1)
+
+    return {
+        "primary_top": primary_top,
+        "shadow_top": shadow_top,
+        "top1_agree": primary_top[:1] == shadow_top[:1],
+        "topn_overlap": len(set(primary_top) & set(shadow_top)) / n,
+        "label_agreement": float(np.mean(primary["predicted_labels"] == shadow["predicted_labels"])),
+        "max_abs_diff": float(np.max(np.abs(primary["good_probabilities"] - shadow["good_probabilities"]))),
+    }
@@ -0,0 +1,94 @@
+"""
+Symptom-based re-ranking weights
+Weight table from MODEL_PROPOSAL.md (Phase 2-2), compiled into a
+formula x symptom matrix so re-ranking is one matrix product
+"""
+import numpy as np
+import logging
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+SYMPTOMS = ["diarrhea", "constipation", "vomiting", "skin_rash"]
+
+# 증상별 분유 카테고리 가중치
+SYMPTOM_WEIGHTS = {
+    "diarrhea": {
+        "low_lactose": 3.0,
+        "gentle": 2.0,
+        "sensitive": 1.5,
+    },
+    "constipation": {
+        "constipation_care": 3.0,
+        "gentle": 1.5,
+    },
+    "vomiting": {
+        "sensitive": 2.5,
+        "gentle": 2.0,
+        "allergy_care": 1.5,
+    },
+    "skin_rash": {
+        "allergy_care": 3.0,
+        "sensitive": 2.0,
+        "low_lactose": 1.0,
+    },
+}
+
+
+def compile_symptom_matrix(categories: Sequence[str]) -> np.ndarray:
+    """
+    Compile SYMPTOM_WEIGHTS for a list of formula categories
+
+    Multiplying a score by w for every present symptom equals
+    score * exp(log_w @ symptom_vector), so the table is stored as log weights.
+
+    Args:
+        categories: Category of each formula, in catalog order
+
+    Returns:
+        Read-only log-weight matrix (n_formulas x n_symptoms)
+    """
+    matrix = np.zeros((len(categories), len(SYMPTOMS)), dtype=np.float64)
+    for j, symptom in enumerate(SYMPTOMS):
+        weights = SYMPTOM_WEIGHTS.get(symptom, {})
+        for i, category in enumerate(categories):
+            if category in weights:
+                matrix[i, j] = np.log(weights[category])
+
+    matrix.flags.writeable = False
+    return matrix
+
+
+def symptom_vectors(profiles: List[Dict]) -> np.ndarray:
+    """
+    Symptom indicator matrix for a batch of profiles
+
+    Args:
+        profiles: Dictionaries with optional SYMPTOMS keys (0/1)
+
+    Returns:
+        Array (n_profiles x n_symptoms)
+    """
+    return np.array(
+        [[float(profile.get(symptom) or 0) for symptom in SYMPTOMS] for profile in profiles],
+        dtype=np.float64
+    ).reshape(len(profiles), len(SYMPTOMS))
+
+
+def adjust_scores(
+    good_probabilities: np.ndarray,
+    symptom_matrix: np.ndarray,
+    symptoms: np.ndarray
+) -> np.ndarray:
+    """
+    Apply symptom weights to 'good' probabilities
+
+    Args:
+        good_probabilities: Probabilities (n_profiles x n_formulas)
+        symptom_matrix: Log weights from compile_symptom_matrix
+        symptoms: Indicators from symptom_vectors (n_profiles x n_symptoms)
+
+    Returns:
+        Adjusted scores (n_profiles x n_formulas)
+    """
+    return good_probabilities * np.exp(symptoms @ symptom_matrix.T)
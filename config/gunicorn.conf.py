@@ -0,0 +1,90 @@
+"""
+Gunicorn configuration for production serving
+
+Usage:
+    gunicorn -c config/gunicorn.conf.py api.main:app
+
+The model registry and formula catalogs are loaded once in the master
+process and shared copy-on-write by the forked workers. `kill -HUP <master>`
+reloads the models in the master and replaces the workers one generation at
+a time: new workers fork from the reloaded master before the old ones are
+stopped gracefully.
+"""
+import gc
+import os
+
+# One BLAS/OpenMP/engine thread per worker; parallelism comes from the workers
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "ENGINE_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+
+def _cpu_count() -> int:
+    """CPUs available to this process (respects affinity / cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("BIND", f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '8000')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Scoring is CPU-bound: one worker per CPU unless overridden
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or _cpu_count()
+
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def _load_registry(server, reload: bool = False):
+    """Load (or reload) models in the master before workers are forked"""
+    from api.routers import recommendation
+
+    old = recommendation.registry if reload else None
+    if reload:
+        recommendation.registry = None
+        gc.unfreeze()
+
+    try:
+        registry = recommendation.get_registry()
+    except Exception:
+        recommendation.registry = old
+        raise
+
+    if old is not None:
+        old.shutdown(wait=False)
+
+    # Move loaded objects out of the collector's generations so GC passes
+    # in the workers do not write to (and un-share) their pages
+    gc.collect()
+    gc.freeze()
+
+    server.log.info(
+        f"Preloaded models {list(registry.models)} for {server.cfg.workers} workers"
+    )
+
+
+def when_ready(server):
+    """Master is ready: load models before the first workers fork"""
+    _load_registry(server)
+
+
+def on_reload(server):
+    """SIGHUP: reload models, then gunicorn rolls the workers"""
+    server.log.info("Reloading models in master")
+    try:
+        _load_registry(server, reload=True)
+    except Exception as e:
+        server.log.error(f"Model reload failed, keeping previous models: {e}")
+
+
+def post_fork(server, worker):
+    """Re-seed per-process randomness used for traffic splits"""
+    import random
+    random.seed()
@@ -0,0 +1,121 @@
+"""
+Benchmark the binary msgpack interface against the HTTP API
+
+Starts both servers as subprocesses, sends the same recommend requests
+over one persistent connection each, and prints latency percentiles
+
+Usage:
+    python scripts/benchmark_binary.py --requests 2000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import httpx
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from api.services.binary_protocol import BinaryClient
+
+PROFILE = {
+    "age_month": 4,
+    "sex": "M",
+    "height_cm": 62.0,
+    "weight_kg": 6.5,
+    "allergy_risk": 0,
+    "lactose_sensitivity": 1,
+    "feed_ml_per_intake": 90,
+}
+
+
+def wait_until(check, timeout: float = 30.0):
+    """Poll until check() succeeds"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Server did not start")
+
+
+def summarize(name: str, latencies: list) -> dict:
+    """Latency summary in milliseconds"""
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        "interface": name,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "req_per_s": round(len(ms) / (ms.sum() / 1000.0), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary vs HTTP recommend benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per interface")
+    parser.add_argument("--http-port", type=int, default=8765)
+    parser.add_argument("--socket", default="/tmp/smartbottle-bench.sock")
+    args = parser.parse_args()
+
+    # Sequential single-connection calls: measure per-call overhead, not batching
+    env = {**os.environ, "MICROBATCH_MAX_SIZE": "1"}
+    root = Path(__file__).parent.parent
+    http = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(args.http_port), "--log-level", "warning"],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    binary = subprocess.Popen(
+        [sys.executable, "-m", "api.binary_server", "--unix", args.socket],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        base = f"http://127.0.0.1:{args.http_port}"
+        session = httpx.Client()
+        wait_until(lambda: session.get(f"{base}/health").is_success)
+        wait_until(lambda: os.path.exists(args.socket))
+
+        results = []
+
+        for include_all in (True, False):
+            url = f"{base}/api/v1/recommend?include_all={str(include_all).lower()}"
+            for _ in range(50):
+                session.post(url, json=PROFILE)
+            latencies = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                response = session.post(url, json=PROFILE)
+                response.json()
+                latencies.append(time.perf_counter() - start)
+            results.append(summarize(f"http (include_all={include_all})", latencies))
+
+        with BinaryClient(args.socket) as client:
+            for _ in range(50):
+                client.call("recommend", profile=PROFILE)
+            latencies = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                client.call("recommend", profile=PROFILE, top_n=3)
+                latencies.append(time.perf_counter() - start)
+            results.append(summarize("msgpack unix socket", latencies))
+
+        print(f"\n{'interface':<28}{'mean_ms':>10}{'p50_ms':>10}{'p99_ms':>10}{'req/s':>10}")
+        for row in results:
+            print(f"{row['interface']:<28}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['req_per_s']:>10}")
+
+    finally:
+        http.terminate()
+        binary.terminate()
+        http.wait()
+        binary.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from src.evaluation.reference import build_reference
+
 print("=" * 60)
 print("Retraining KNN Model with Current scikit-learn Version")
 print("=" * 60)
@@ -144,6 +146,8 @@ model_package = {
     "numeric_features": numeric_features,
     "categorical_features": categorical_features,
     "target_col": target_col,
+    # Training distribution for the serving drift monitor
+    "reference_stats": build_reference(X_train, clf.predict_proba, label_encoder.classes_),
 }
 
 output_path = "models/trained/knn_v1_retrained.pkl"
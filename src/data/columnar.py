@@ -0,0 +1,288 @@
+"""
+Columnar on-disk tables
+Converts CSV tables to one .npy file per column plus a schema.json with
+string dictionaries, so loads are memory-mapped and read only the
+projected columns instead of re-parsing text
+
+Layout of data/processed/<table>/:
+    schema.json      rows, column dtypes, string categories, source file stamp
+    <column>.npy     values (strings as int8/int16/int32 codes)
+
+Usage:
+    python -m src.data.columnar --data-dir data/raw --out data/processed
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = "schema.json"
+
+TABLES = ("formula_master", "feeding_logs")
+
+
+def _code_dtype(n_categories: int) -> np.dtype:
+    """Smallest signed integer type for category codes (-1 = missing)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _source_stamp(path: Path) -> Dict:
+    """Size and mtime of a source file, used to detect stale tables"""
+    stat = os.stat(path)
+    return {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def convert_csv(
+    csv_path: str,
+    out_dir: str,
+    chunksize: int = 1_000_000,
+    dtypes: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    Convert a CSV file to a columnar table
+
+    The CSV is read in chunks; column types are fixed by the first chunk
+    (or dtypes) and string columns are dictionary-encoded with categories
+    in order of first appearance. Values go to raw spill files first and
+    are wrapped as .npy at the end, so memory stays bounded by chunksize.
+    The table is written to a temporary sibling directory and swapped into
+    place when complete, so a failed or concurrent conversion never leaves
+    a schema.json next to columns of another run.
+
+    Args:
+        csv_path: Source CSV
+        out_dir: Table directory to (re)write
+        chunksize: Rows per read chunk
+        dtypes: Column dtype overrides for read_csv
+
+    Returns:
+        Table schema dictionary
+    """
+    csv_path = Path(csv_path)
+    target_dir = Path(out_dir)
+    target_dir.parent.mkdir(parents=True, exist_ok=True)
+    out = Path(tempfile.mkdtemp(prefix=f".{target_dir.name}.", dir=target_dir.parent))
+    start = time.perf_counter()
+    try:
+        schema = _write_table(csv_path, out, chunksize, dtypes)
+    except BaseException:
+        shutil.rmtree(out, ignore_errors=True)
+        raise
+    _swap_directory(out, target_dir)
+
+    logger.info(
+        f"Converted {csv_path} -> {target_dir} ({schema['rows']} rows, {len(schema['columns'])} columns) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return schema
+
+
+def _swap_directory(new: Path, target: Path):
+    """Replace target with the complete directory new"""
+    old = target.with_name(f".{target.name}.old-{os.getpid()}")
+    try:
+        os.replace(target, old)
+    except FileNotFoundError:
+        old = None
+    try:
+        os.replace(new, target)
+    except OSError:
+        # A concurrent conversion put its own complete table in place first
+        logger.warning(f"{target} was replaced concurrently; discarding this conversion")
+        shutil.rmtree(new, ignore_errors=True)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _write_table(csv_path: Path, out: Path, chunksize: int, dtypes: Optional[Dict[str, str]]) -> Dict:
+    """Write the columns and schema.json of a CSV file into an empty directory"""
+    columns: Dict[str, Dict] = {}
+    categories: Dict[str, Dict[str, int]] = {}
+    spills = {}
+    rows = 0
+
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes):
+            if not columns:
+                for name in chunk.columns:
+                    dtype = chunk[name].dtype
+                    if dtype == object or isinstance(dtype, pd.StringDtype):
+                        columns[name] = {"kind": "string"}
+                        categories[name] = {}
+                    else:
+                        columns[name] = {"kind": "numeric", "dtype": dtype.str}
+                    spills[name] = open(out / f"{name}.spill", "wb")
+
+            for name, spec in columns.items():
+                values = chunk[name]
+                if spec["kind"] == "string":
+                    # Extend the dictionary with unseen values, then map
+                    mapping = categories[name]
+                    for value in pd.unique(values.dropna()):
+                        mapping.setdefault(value, len(mapping))
+                    codes = pd.Categorical(values, categories=list(mapping)).codes.astype(np.int64)
+                    spills[name].write(codes.tobytes())
+                else:
+                    array = values.to_numpy()
+                    target = np.dtype(spec["dtype"])
+                    if not np.can_cast(array.dtype, target, casting="same_kind"):
+                        raise ValueError(
+                            f"Column {name} changes type from {target} to {array.dtype} after the first chunk; "
+                            f"pass dtypes={{'{name}': '{array.dtype}'}}"
+                        )
+                    spills[name].write(array.astype(target, copy=False).tobytes())
+            rows += len(chunk)
+    finally:
+        for spill in spills.values():
+            spill.close()
+
+    for name, spec in columns.items():
+        spill = out / f"{name}.spill"
+        if spec["kind"] == "string":
+            spec["categories"] = list(categories[name])
+            dtype = _code_dtype(len(spec["categories"]))
+            spec["dtype"] = dtype.str
+            raw = np.fromfile(spill, dtype=np.int64)
+            np.save(out / f"{name}.npy", raw.astype(dtype))
+        else:
+            dtype = np.dtype(spec["dtype"])
+            target = np.lib.format.open_memmap(out / f"{name}.npy", mode="w+", dtype=dtype, shape=(rows,))
+            target[:] = np.fromfile(spill, dtype=dtype)
+            target.flush()
+            del target
+        spill.unlink()
+
+    schema = {
+        "rows": rows,
+        "columns": columns,
+        "source": _source_stamp(csv_path),
+    }
+    with open(out / SCHEMA_FILE, "w") as f:
+        json.dump(schema, f, indent=2)
+    return schema
+
+
+def read_schema(table_dir: str) -> Optional[Dict]:
+    """Schema of a columnar table, or None if it does not exist"""
+    path = Path(table_dir) / SCHEMA_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def is_current(table_dir: str, csv_path: str) -> bool:
+    """True if the table was converted from the current version of csv_path"""
+    schema = read_schema(table_dir)
+    if schema is None or not Path(csv_path).exists():
+        return False
+    stamp = _source_stamp(Path(csv_path))
+    return schema["source"]["size"] == stamp["size"] and schema["source"]["mtime_ns"] == stamp["mtime_ns"]
+
+
+def read_columnar(
+    table_dir: str,
+    columns: Optional[Sequence[str]] = None,
+    mmap: bool = True,
+    categorical: bool = False
+) -> pd.DataFrame:
+    """
+    Load a columnar table
+
+    Only the requested columns are opened. Numeric columns are memory-mapped
+    (read-only) when mmap is set; string columns are decoded from their
+    codes, as pandas Categorical (no per-row objects) or as object arrays
+    matching what read_csv returns.
+
+    Args:
+        table_dir: Table directory
+        columns: Columns to load (default: all, in stored order)
+        mmap: Memory-map numeric columns
+        categorical: Return string columns as pandas Categorical
+
+    Returns:
+        DataFrame with the requested columns
+    """
+    table = Path(table_dir)
+    schema = read_schema(table)
+    if schema is None:
+        raise FileNotFoundError(f"No columnar table in {table}")
+
+    names: List[str] = list(columns) if columns is not None else list(schema["columns"])
+    unknown = [name for name in names if name not in schema["columns"]]
+    if unknown:
+        raise KeyError(f"Columns not in {table}: {unknown}")
+
+    data = {}
+    for name in names:
+        spec = schema["columns"][name]
+        values = np.load(table / f"{name}.npy", mmap_mode="r" if mmap else None)
+        if spec["kind"] == "string":
+            codes = np.asarray(values)
+            if categorical:
+                values = pd.Categorical.from_codes(codes, categories=spec["categories"])
+            else:
+                lookup = np.array(spec["categories"] + [np.nan], dtype=object)
+                values = lookup[codes]
+        data[name] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def convert_directory(data_dir: str = "data/raw", out_dir: str = "data/processed", **kwargs) -> Dict[str, Dict]:
+    """
+    Convert formula_master.csv and feeding_logs.csv
+
+    Args:
+        data_dir: Directory with the CSV files
+        out_dir: Directory for the columnar tables
+        **kwargs: Passed to convert_csv
+
+    Returns:
+        Table name -> schema
+    """
+    schemas = {}
+    for table in TABLES:
+        csv_path = Path(data_dir) / f"{table}.csv"
+        if csv_path.exists():
+            schemas[table] = convert_csv(csv_path, Path(out_dir) / table, **kwargs)
+        else:
+            logger.warning(f"Skipping missing {csv_path}")
+    return schemas
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Convert CSV data to columnar .npy tables")
+    parser.add_argument("--data-dir", default="data/raw", help="Directory with the CSV files")
+    parser.add_argument("--out", default="data/processed", help="Output directory")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="Rows per read chunk")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Convert from the command line"""
+    args = parse_args(argv)
+    schemas = convert_directory(args.data_dir, args.out, chunksize=args.chunksize)
+    for table, schema in schemas.items():
+        print(f"{table}: {schema['rows']} rows, {len(schema['columns'])} columns")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
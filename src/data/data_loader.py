@@ -3,32 +3,101 @@ Data loader for Smart Bottle ML Service
 Loads data from CSV files and MySQL database
 """
 import pandas as pd
+from sklearn.model_selection import train_test_split
 import logging
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 import sys
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from config.database import get_connection
+from src.data.columnar import convert_directory, is_current, read_columnar
+from src.data.validation import DEFAULT_QUARANTINE_PATH, validate_feeding_logs
 
 logger = logging.getLogger(__name__)
 
+# Model feature definitions
+BABY_FEATURES = [
+    "age_month",
+    "sex",
+    "height_cm",
+    "weight_kg",
+    "allergy_risk",
+    "lactose_sensitivity",
+    "feed_ml_per_intake",
+]
+
+FORMULA_FEATURES = [
+    "formula_id",
+    "category",
+    "lactose_level",
+    "target_issue",
+    "protein_type",
+]
+
+FEATURE_COLS = BABY_FEATURES + FORMULA_FEATURES
+TARGET_COL = "overall_tolerance"
+
+# Preprocessing groups
+NUMERIC_FEATURES = [
+    "age_month",
+    "height_cm",
+    "weight_kg",
+    "allergy_risk",
+    "lactose_sensitivity",
+    "feed_ml_per_intake",
+]
+
+CATEGORICAL_FEATURES = [
+    "sex",
+    "formula_id",
+    "category",
+    "lactose_level",
+    "target_issue",
+    "protein_type",
+]
+
+
+def split_logs(
+    logs: pd.DataFrame,
+    test_size: float = 0.2,
+    random_state: int = 42
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Stratified train/test split of feeding logs
+
+    The split of scripts/retrain_model.py; src/evaluation/evaluate.py
+    holds out the test part by default.
+
+    Args:
+        logs: Feeding logs with the target column
+        test_size: Test fraction
+        random_state: Split seed
+
+    Returns:
+        Tuple of (train logs, test logs)
+    """
+    return train_test_split(logs, test_size=test_size, random_state=random_state, stratify=logs[TARGET_COL])
+
 
 class SmartBottleDataLoader:
     """Data loader for Smart Bottle system"""
 
-    def __init__(self, data_dir: str = "data/raw"):
+    def __init__(self, data_dir: str = "data/raw", processed_dir: str = "data/processed"):
         """
         Initialize data loader
 
         Args:
             data_dir: Directory containing CSV data files
+            processed_dir: Directory with columnar tables (src/data/columnar.py)
         """
         self.data_dir = Path(data_dir)
+        self.processed_dir = Path(processed_dir)
         self.formula_df = None
         self.feeding_logs_df = None
+        self.validation_report = None
 
     def load_csv_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
@@ -57,6 +126,61 @@ class SmartBottleDataLoader:
             logger.error(f"Error loading CSV data: {e}")
             raise
 
+    def convert_to_columnar(self) -> dict:
+        """
+        Write columnar copies of the CSV files to processed_dir
+
+        Returns:
+            Table name -> schema
+        """
+        return convert_directory(self.data_dir, self.processed_dir)
+
+    def has_columnar(self, table: str) -> bool:
+        """True if processed_dir holds an up-to-date copy of <table>.csv"""
+        return is_current(self.processed_dir / table, self.data_dir / f"{table}.csv")
+
+    def load_columnar(
+        self,
+        table: str,
+        columns: Optional[List[str]] = None,
+        mmap: bool = True,
+        categorical: bool = False
+    ) -> pd.DataFrame:
+        """
+        Load a columnar table from processed_dir
+
+        Args:
+            table: "feeding_logs" or "formula_master"
+            columns: Columns to load (default: all)
+            mmap: Memory-map numeric columns
+            categorical: Return string columns as pandas Categorical
+
+        Returns:
+            DataFrame with the requested columns
+        """
+        df = read_columnar(self.processed_dir / table, columns=columns, mmap=mmap, categorical=categorical)
+        logger.info(f"Loaded {len(df)} rows x {df.shape[1]} columns of {table} (columnar)")
+        return df
+
+    def load_data(self, use_columnar: bool = True, mmap: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Load formulas and feeding logs, from columnar tables when they are
+        current and from CSV otherwise
+
+        Args:
+            use_columnar: Allow the columnar tables
+            mmap: Memory-map numeric columns (read-only frames); by default
+                the frames are writable like the CSV ones
+
+        Returns:
+            Tuple of (formula_df, feeding_logs_df)
+        """
+        if use_columnar and self.has_columnar("formula_master") and self.has_columnar("feeding_logs"):
+            self.formula_df = self.load_columnar("formula_master", mmap=mmap)
+            self.feeding_logs_df = self.load_columnar("feeding_logs", mmap=mmap)
+            return self.formula_df, self.feeding_logs_df
+        return self.load_csv_data()
+
     def load_formulas_from_db(self) -> pd.DataFrame:
         """
         Load formula data from database
@@ -241,44 +365,43 @@ class SmartBottleDataLoader:
             logger.error(f"Error loading feeding stats: {e}")
             raise
 
-    def prepare_training_data(self) -> Tuple[pd.DataFrame, pd.Series]:
+    def prepare_training_data(
+        self,
+        validate: bool = True,
+        quarantine_path: Optional[str] = DEFAULT_QUARANTINE_PATH,
+        use_columnar: bool = True
+    ) -> Tuple[pd.DataFrame, pd.Series]:
         """
         Prepare merged data for model training
 
+        Args:
+            validate: Drop invalid and duplicate logs first (see src/data/validation.py)
+            quarantine_path: CSV for rejected rows (None to skip writing)
+            use_columnar: Read processed_dir tables when they are current
+
         Returns:
-            Tuple of (X, y) - features and target
+            Tuple of (X, y) - features and target. The index is the row
+            position in feeding_logs.csv.
         """
         try:
             # Load data
-            formula_df, feeding_logs_df = self.load_csv_data()
+            formula_df, feeding_logs_df = self.load_data(use_columnar=use_columnar)
+
+            if validate:
+                feeding_logs_df, self.validation_report = validate_feeding_logs(
+                    feeding_logs_df,
+                    formula_df["formula_id"],
+                    quarantine_path=quarantine_path
+                )
 
             # Merge formula info with feeding logs
             data = feeding_logs_df.merge(formula_df, on="formula_id", how="left")
+            data.index = feeding_logs_df.index
 
-            # Define features
-            baby_features = [
-                "age_month",
-                "sex",
-                "height_cm",
-                "weight_kg",
-                "allergy_risk",
-                "lactose_sensitivity",
-                "feed_ml_per_intake",
-            ]
-
-            formula_features = [
-                "formula_id",
-                "category",
-                "lactose_level",
-                "target_issue",
-                "protein_type",
-            ]
-
-            feature_cols = baby_features + formula_features
-            target_col = "overall_tolerance"
+            feature_cols = FEATURE_COLS
 
             X = data[feature_cols].copy()
-            y = data[target_col].copy()
+            y = data[TARGET_COL].copy()
 
             logger.info(f"Prepared training data: {len(X)} samples, {len(feature_cols)} features")
 
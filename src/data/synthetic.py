@@ -0,0 +1,397 @@
+"""
+Synthetic feeding log generator for scale testing
+Resamples the seed data (data/raw) with a smoothed bootstrap so the joint
+distribution of profiles, formula choice, symptoms and tolerance is kept,
+and writes chunks in parallel as CSV, Parquet or per-column .npy
+
+Usage:
+    python -m src.data.synthetic --rows 1000000 --formulas 100 --format parquet
+    python -m src.data.synthetic --rows 100000 --format csv --combine --out data/synthetic/100k
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import logging
+from typing import Dict, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.schemas.baby import BabyProfileWithSymptoms, profile_constraints
+
+logger = logging.getLogger(__name__)
+
+LOG_COLUMNS = [
+    "log_id", "baby_id", "age_month", "sex", "height_cm", "weight_kg",
+    "allergy_risk", "lactose_sensitivity", "formula_id", "feed_ml_per_intake",
+    "diarrhea", "constipation", "vomiting", "skin_rash", "overall_tolerance",
+]
+
+# Perturbed jointly with the seed covariance; everything else is copied
+# from the resampled seed row
+CONTINUOUS_COLUMNS = ["age_month", "height_cm", "weight_kg", "feed_ml_per_intake"]
+
+# Resampled together for each log when a baby has several logs
+OUTCOME_COLUMNS = ["formula_id", "diarrhea", "constipation", "vomiting", "skin_rash", "overall_tolerance"]
+
+STRATUM_COLUMNS = ["allergy_risk", "lactose_sensitivity"]
+
+FORMATS = ("csv", "parquet", "npy")
+
+# Fixed category order of string columns in npy output
+NPY_DICTIONARIES = {
+    "sex": ["F", "M"],
+    "overall_tolerance": ["good", "moderate", "poor"],
+}
+
+# Per-process state for pool workers
+_WORKER_STATE: Dict = {}
+
+
+class SeedModel:
+    """
+    Resampling model estimated from the seed logs and formulas
+
+    A synthetic baby is a random seed row with its continuous columns moved
+    by multivariate normal noise (covariance = bandwidth^2 x seed covariance,
+    Silverman bandwidth by default), clipped to the BabyProfile bounds.
+    Binary flags, sex, formula choice and outcomes come from the same seed
+    row, so their joint distribution with the profile is kept. Extra logs
+    of the same baby draw formula and outcome from seed rows with the same
+    allergy_risk / lactose_sensitivity.
+
+    Synthetic formulas 1..n_seed copy the seed formulas; the rest copy the
+    attributes of a random seed formula (their prototype). A seed row's
+    formula maps to a uniform choice among formulas with that prototype.
+    """
+
+    def __init__(self, formula_df: pd.DataFrame, logs_df: pd.DataFrame, bandwidth: Optional[float] = None):
+        """
+        Estimate the model
+
+        Args:
+            formula_df: Seed formula master
+            logs_df: Seed feeding logs
+            bandwidth: Noise scale relative to the seed covariance (default: Silverman)
+        """
+        self.formula_df = formula_df.reset_index(drop=True)
+        self.logs = logs_df[LOG_COLUMNS].reset_index(drop=True)
+
+        continuous = self.logs[CONTINUOUS_COLUMNS].to_numpy(dtype=np.float64)
+        n, d = continuous.shape
+        if bandwidth is None:
+            bandwidth = (4.0 / (d + 2)) ** (1.0 / (d + 4)) * n ** (-1.0 / (d + 4))
+        self.bandwidth = float(bandwidth)
+        cov = np.atleast_2d(np.cov(continuous, rowvar=False)) * self.bandwidth ** 2
+        # Cholesky factor of the noise covariance (jitter for degenerate seeds)
+        self.noise_factor = np.linalg.cholesky(cov + np.eye(d) * 1e-9)
+
+        # Seed rows grouped by stratum for per-log outcome draws
+        strata = self.logs.groupby(STRATUM_COLUMNS, sort=True).ngroup().to_numpy()
+        self.row_stratum = strata
+        self.stratum_order = np.argsort(strata, kind="stable")
+        counts = np.bincount(strata)
+        self.stratum_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.stratum_count = counts
+
+        self.constraints = profile_constraints(BabyProfileWithSymptoms)
+
+    def formulas(self, n_formulas: int, rng: np.random.Generator) -> pd.DataFrame:
+        """
+        Synthetic formula master
+
+        Args:
+            n_formulas: Number of formulas (at least the seed count)
+            rng: Random generator
+
+        Returns:
+            Formula DataFrame with a prototype_id column
+        """
+        n_seed = len(self.formula_df)
+        if n_formulas < n_seed:
+            raise ValueError(f"n_formulas must be at least {n_seed} (seed formulas)")
+
+        proto = np.concatenate([np.arange(n_seed), rng.integers(0, n_seed, n_formulas - n_seed)])
+        formulas = self.formula_df.iloc[proto].reset_index(drop=True)
+        formulas["prototype_id"] = formulas["formula_id"].to_numpy()
+        formulas["formula_id"] = np.arange(1, n_formulas + 1)
+        suffix = np.char.mod("_%05d", np.arange(1, n_formulas + 1))
+        synthetic = np.arange(n_formulas) >= n_seed
+        formulas.loc[synthetic, "formula_brand"] = (
+            formulas.loc[synthetic, "formula_brand"].to_numpy().astype(str) + suffix[synthetic]
+        )
+        return formulas
+
+    def _clip(self, values: np.ndarray, column: str) -> np.ndarray:
+        """Clip to the schema bounds of a profile column"""
+        spec = self.constraints[column]
+        low = spec.get("ge", spec.get("gt"))
+        high = spec.get("le", spec.get("lt"))
+        if "gt" in spec:
+            # Smallest value that still rounds above the strict bound
+            low = low + (1 if spec["type"] is int else 0.1)
+        return np.clip(values, low, high)
+
+    def logs_chunk(
+        self,
+        start: int,
+        size: int,
+        formulas: pd.DataFrame,
+        logs_per_baby: int,
+        rng: np.random.Generator
+    ) -> pd.DataFrame:
+        """
+        Generate log rows start+1 .. start+size
+
+        Args:
+            start: Number of rows before this chunk (multiple of logs_per_baby)
+            size: Rows in this chunk
+            formulas: Synthetic formula master
+            logs_per_baby: Consecutive logs sharing one baby
+            rng: Random generator for this chunk
+
+        Returns:
+            Feeding log DataFrame with LOG_COLUMNS
+        """
+        seed = self.logs
+        log_id = np.arange(start + 1, start + size + 1, dtype=np.int64)
+        baby_id = (log_id - 1) // logs_per_baby + 1
+        first_baby = baby_id[0]
+        n_babies = int(baby_id[-1] - first_baby + 1)
+        baby_pos = baby_id - first_baby
+
+        # Babies: smoothed bootstrap of the seed profiles
+        baby_row = rng.integers(0, len(seed), n_babies)
+        noise = rng.standard_normal((n_babies, len(CONTINUOUS_COLUMNS))) @ self.noise_factor.T
+        continuous = seed[CONTINUOUS_COLUMNS].to_numpy(dtype=np.float64)[baby_row] + noise
+
+        # Outcome rows: the baby's own seed row for its first log, same-stratum
+        # seed rows for the others
+        outcome_row = baby_row[baby_pos]
+        if logs_per_baby > 1:
+            stratum = self.row_stratum[outcome_row]
+            draw = self.stratum_start[stratum] + (rng.random(size) * self.stratum_count[stratum]).astype(np.int64)
+            resampled = self.stratum_order[draw]
+            first = (log_id - 1) % logs_per_baby == 0
+            outcome_row = np.where(first, outcome_row, resampled)
+
+        chunk = {
+            "log_id": log_id,
+            "baby_id": baby_id,
+            "age_month": self._clip(np.rint(continuous[:, 0]), "age_month").astype(np.int64)[baby_pos],
+            "sex": seed["sex"].to_numpy()[baby_row][baby_pos],
+            "height_cm": np.round(self._clip(continuous[:, 1], "height_cm"), 1)[baby_pos],
+            "weight_kg": np.round(self._clip(continuous[:, 2], "weight_kg"), 1)[baby_pos],
+            "allergy_risk": seed["allergy_risk"].to_numpy()[baby_row][baby_pos],
+            "lactose_sensitivity": seed["lactose_sensitivity"].to_numpy()[baby_row][baby_pos],
+            "feed_ml_per_intake": self._clip(np.rint(continuous[:, 3]), "feed_ml_per_intake").astype(np.int64)[baby_pos],
+        }
+        for column in OUTCOME_COLUMNS:
+            chunk[column] = seed[column].to_numpy()[outcome_row]
+
+        # Seed formula -> uniform choice among synthetic formulas with that prototype
+        proto_ids = formulas["prototype_id"].to_numpy()
+        order = np.argsort(proto_ids, kind="stable")
+        uniq, proto_start, proto_count = np.unique(proto_ids[order], return_index=True, return_counts=True)
+        slot = np.searchsorted(uniq, chunk["formula_id"])
+        pick = proto_start[slot] + (rng.random(size) * proto_count[slot]).astype(np.int64)
+        chunk["formula_id"] = formulas["formula_id"].to_numpy()[order][pick]
+
+        return pd.DataFrame(chunk, columns=LOG_COLUMNS)
+
+
+def write_frame(frame: pd.DataFrame, path: Path, fmt: str, header: bool = True):
+    """
+    Write one chunk
+
+    Args:
+        frame: Chunk to write
+        path: Output path without extension (directory for npy)
+        fmt: "csv", "parquet" or "npy"
+        header: Include the CSV header line
+    """
+    if fmt == "csv":
+        frame.to_csv(path.with_suffix(".csv"), index=False, header=header)
+    elif fmt == "parquet":
+        frame.to_parquet(path.with_suffix(".parquet"), index=False)
+    elif fmt == "npy":
+        # One file per column; strings as int8 codes into a shared dictionary
+        path.mkdir(parents=True, exist_ok=True)
+        for column in frame.columns:
+            values = frame[column].to_numpy()
+            if values.dtype == object:
+                values = pd.Categorical(values, categories=NPY_DICTIONARIES[column]).codes
+            np.save(path / f"{column}.npy", values)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _init_worker(model: SeedModel, formulas: pd.DataFrame):
+    """Receive the seed model once per pool worker"""
+    _WORKER_STATE["model"] = model
+    _WORKER_STATE["formulas"] = formulas
+
+
+def _write_chunk(task: Tuple[int, int, int, np.random.SeedSequence, str, str, int]) -> int:
+    """Generate and write one chunk (pool worker); returns rows written"""
+    index, start, size, seed_seq, out_dir, fmt, logs_per_baby = task
+    rng = np.random.default_rng(seed_seq)
+    frame = _WORKER_STATE["model"].logs_chunk(start, size, _WORKER_STATE["formulas"], logs_per_baby, rng)
+    write_frame(frame, Path(out_dir) / "feeding_logs" / f"part-{index:05d}", fmt, header=(index == 0))
+    return size
+
+
+def generate(
+    out_dir: str,
+    n_rows: int,
+    n_formulas: int = 6,
+    logs_per_baby: int = 1,
+    fmt: str = "csv",
+    chunk_size: int = 1_000_000,
+    n_jobs: Optional[int] = None,
+    seed: int = 42,
+    seed_dir: str = "data/raw",
+    combine: bool = False,
+    bandwidth: Optional[float] = None
+) -> Dict:
+    """
+    Generate a synthetic dataset
+
+    Output in out_dir: formula_master.csv, feeding_logs/part-NNNNN.<fmt>
+    (a directory of per-column .npy for npy) and manifest.json. Chunk k is
+    generated from the k-th child of SeedSequence(seed), so output does not
+    depend on n_jobs.
+
+    Args:
+        out_dir: Output directory
+        n_rows: Feeding log rows
+        n_formulas: Formulas (at least the seed count)
+        logs_per_baby: Consecutive logs sharing one baby
+        fmt: "csv", "parquet" or "npy"
+        chunk_size: Rows per part (rounded to a multiple of logs_per_baby)
+        n_jobs: Worker processes (default: CPU count)
+        seed: Random seed
+        seed_dir: Directory with the seed CSVs
+        combine: For csv, also join the parts into out_dir/feeding_logs.csv
+            so SmartBottleDataLoader(data_dir=out_dir) can read it
+        bandwidth: Noise scale (default: Silverman)
+
+    Returns:
+        Manifest dictionary
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (choose from {FORMATS})")
+    if combine and fmt != "csv":
+        raise ValueError("combine is only supported for csv output")
+
+    start_time = time.perf_counter()
+    seed_dir = Path(seed_dir)
+    model = SeedModel(
+        pd.read_csv(seed_dir / "formula_master.csv"),
+        pd.read_csv(seed_dir / "feeding_logs.csv"),
+        bandwidth=bandwidth
+    )
+
+    root = np.random.SeedSequence(seed)
+    formula_seq, chunks_seq = root.spawn(2)
+    formulas = model.formulas(n_formulas, np.random.default_rng(formula_seq))
+
+    out = Path(out_dir)
+    parts_dir = out / "feeding_logs"
+    if parts_dir.exists():
+        shutil.rmtree(parts_dir)
+    parts_dir.mkdir(parents=True)
+    formulas.drop(columns="prototype_id").to_csv(out / "formula_master.csv", index=False)
+
+    chunk_size = max(logs_per_baby, chunk_size - chunk_size % logs_per_baby)
+    starts = list(range(0, n_rows, chunk_size))
+    child_seqs = chunks_seq.spawn(len(starts))
+    tasks = [
+        (i, s, min(chunk_size, n_rows - s), child_seqs[i], str(out), fmt, logs_per_baby)
+        for i, s in enumerate(starts)
+    ]
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(tasks)) or 1
+    if n_jobs == 1:
+        _init_worker(model, formulas)
+        written = sum(map(_write_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(model, formulas)) as pool:
+            written = sum(pool.map(_write_chunk, tasks))
+
+    if combine:
+        with open(out / "feeding_logs.csv", "wb") as combined:
+            for i in range(len(tasks)):
+                with open(parts_dir / f"part-{i:05d}.csv", "rb") as part:
+                    shutil.copyfileobj(part, combined)
+
+    elapsed = time.perf_counter() - start_time
+    manifest = {
+        "rows": written,
+        "formulas": n_formulas,
+        "babies": -(-n_rows // logs_per_baby),
+        "logs_per_baby": logs_per_baby,
+        "format": fmt,
+        "parts": len(tasks),
+        "chunk_size": chunk_size,
+        "seed": seed,
+        "bandwidth": model.bandwidth,
+        "columns": LOG_COLUMNS,
+        "dictionaries": NPY_DICTIONARIES if fmt == "npy" else None,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(written / max(elapsed, 1e-9)),
+    }
+    with open(out / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Generated {written} rows / {n_formulas} formulas in {elapsed:.1f}s -> {out}")
+    return manifest
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Generate synthetic feeding logs from the seed data")
+    parser.add_argument("--rows", type=int, required=True, help="Feeding log rows")
+    parser.add_argument("--formulas", type=int, default=6, help="Number of formulas")
+    parser.add_argument("--logs-per-baby", type=int, default=1, help="Logs sharing one baby")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="Chunk format")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Rows per part")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--seed-dir", default="data/raw", help="Seed CSV directory")
+    parser.add_argument("--out", default=None, help="Output directory (default: data/synthetic/<rows>)")
+    parser.add_argument("--combine", action="store_true", help="Also write one feeding_logs.csv (csv only)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Generate a dataset from the command line"""
+    args = parse_args(argv)
+    manifest = generate(
+        out_dir=args.out or f"data/synthetic/{args.rows}",
+        n_rows=args.rows,
+        n_formulas=args.formulas,
+        logs_per_baby=args.logs_per_baby,
+        fmt=args.format,
+        chunk_size=args.chunk_size,
+        n_jobs=args.n_jobs,
+        seed=args.seed,
+        seed_dir=args.seed_dir,
+        combine=args.combine,
+    )
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -0,0 +1,225 @@
+"""
+Bulk validation and deduplication of feeding logs before training
+Applies the BabyProfileWithSymptoms bounds column-wise, checks formula
+references and log ids, drops duplicate rows by content hash and writes
+rejected rows with their reasons to a quarantine file
+"""
+import re
+import numpy as np
+import pandas as pd
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.schemas.baby import BabyProfile, BabyProfileWithSymptoms, profile_constraints
+
+logger = logging.getLogger(__name__)
+
+TARGET_CLASSES = ("good", "moderate", "poor")
+
+DEFAULT_QUARANTINE_PATH = "data/processed/quarantine/feeding_logs_quarantine.csv"
+
+
+def _value_checks(logs: pd.DataFrame, constraints: Dict[str, Dict]) -> Dict[str, np.ndarray]:
+    """
+    Vectorized schema checks
+
+    Returns:
+        Reason -> boolean mask of failing rows
+    """
+    checks = {}
+    for name, spec in constraints.items():
+        if name not in logs.columns:
+            if spec["required"]:
+                checks[f"{name}_missing"] = np.ones(len(logs), dtype=bool)
+            continue
+
+        column = logs[name]
+        missing = column.isna().to_numpy()
+        if spec["required"] and missing.any():
+            checks[f"{name}_missing"] = missing
+
+        if spec["type"] is str:
+            # Match each distinct value once, then broadcast
+            values = column.astype("string")
+            uniques = values.dropna().unique()
+            pattern = re.compile(spec.get("pattern", ".*"))
+            bad_values = [v for v in uniques if not pattern.match(v)]
+            invalid = values.isin(bad_values).fillna(False).to_numpy()
+            if invalid.any():
+                checks[f"{name}_invalid"] = invalid
+            continue
+
+        numbers = pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64)
+        present = ~missing
+        invalid = present & np.isnan(numbers)
+        if invalid.any():
+            checks[f"{name}_invalid"] = invalid
+
+        valid = present & ~invalid
+        if spec["type"] is int:
+            fractional = valid & (numbers != np.floor(numbers))
+            if fractional.any():
+                checks[f"{name}_not_integer"] = fractional
+
+        with np.errstate(invalid="ignore"):
+            out_of_range = np.zeros(len(logs), dtype=bool)
+            if "ge" in spec:
+                out_of_range |= numbers < spec["ge"]
+            if "gt" in spec:
+                out_of_range |= numbers <= spec["gt"]
+            if "le" in spec:
+                out_of_range |= numbers > spec["le"]
+            if "lt" in spec:
+                out_of_range |= numbers >= spec["lt"]
+        out_of_range &= valid
+        if out_of_range.any():
+            checks[f"{name}_out_of_range"] = out_of_range
+
+    return checks
+
+
+def check_profiles(profiles: pd.DataFrame, schema=BabyProfile) -> Dict[str, np.ndarray]:
+    """
+    Check profile rows against a profile schema's bounds
+
+    Args:
+        profiles: Profile DataFrame
+        schema: Profile schema class (default: BabyProfile)
+
+    Returns:
+        Reason -> boolean mask of failing rows (empty if all rows pass)
+    """
+    return _value_checks(profiles, profile_constraints(schema))
+
+
+def _reasons(checks: Dict[str, np.ndarray], rows: np.ndarray) -> pd.Series:
+    """Semicolon-joined reasons for the given row positions"""
+    reasons = np.full(len(rows), "", dtype=object)
+    for reason, mask in checks.items():
+        hit = mask[rows]
+        reasons[hit] = reasons[hit] + reason + ";"
+    return pd.Series(reasons, dtype=object).str.rstrip(";")
+
+
+def validate_feeding_logs(
+    logs: pd.DataFrame,
+    formula_ids: Iterable,
+    quarantine_path: Optional[str] = DEFAULT_QUARANTINE_PATH,
+    dedup_exclude: Tuple[str, ...] = ("log_id",)
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Validate and deduplicate feeding logs
+
+    Row checks (a row can fail several):
+    - profile and symptom columns against BabyProfileWithSymptoms bounds
+    - formula_id present in the formula master
+    - overall_tolerance one of TARGET_CLASSES
+    - log_id unique (later occurrences rejected)
+    Rows passing every check whose content (all columns except
+    dedup_exclude) hashes equal to an earlier row are dropped as
+    duplicate_row.
+
+    The index of the input is kept, so kept rows can be traced back.
+
+    Args:
+        logs: Raw feeding log DataFrame
+        formula_ids: Known formula ids
+        quarantine_path: CSV for rejected rows (None to skip writing)
+        dedup_exclude: Columns ignored by the content hash
+
+    Returns:
+        Tuple of (clean logs, report dictionary with counts)
+    """
+    checks = _value_checks(logs, profile_constraints(BabyProfileWithSymptoms))
+
+    if "formula_id" in logs.columns:
+        known = pd.Index(pd.unique(np.asarray(list(formula_ids))))
+        unknown = ~logs["formula_id"].isin(known).to_numpy()
+        if unknown.any():
+            checks["formula_id_unknown"] = unknown
+    else:
+        checks["formula_id_missing"] = np.ones(len(logs), dtype=bool)
+
+    if "overall_tolerance" in logs.columns:
+        bad_target = ~logs["overall_tolerance"].isin(TARGET_CLASSES).to_numpy()
+        if bad_target.any():
+            checks["overall_tolerance_invalid"] = bad_target
+    else:
+        checks["overall_tolerance_missing"] = np.ones(len(logs), dtype=bool)
+
+    if "log_id" in logs.columns:
+        duplicate_id = logs["log_id"].duplicated(keep="first").to_numpy()
+        if duplicate_id.any():
+            checks["log_id_duplicate"] = duplicate_id
+
+    rejected = np.zeros(len(logs), dtype=bool)
+    for mask in checks.values():
+        rejected |= mask
+
+    # Content hash over valid rows only, so a bad first copy cannot
+    # shadow a good later one
+    content_cols = [c for c in logs.columns if c not in dedup_exclude]
+    row_hash = pd.util.hash_pandas_object(logs[content_cols], index=False).to_numpy()
+    duplicate_row = np.zeros(len(logs), dtype=bool)
+    valid_pos = np.flatnonzero(~rejected)
+    duplicate_row[valid_pos] = pd.Series(row_hash[valid_pos]).duplicated(keep="first").to_numpy()
+    if duplicate_row.any():
+        checks["duplicate_row"] = duplicate_row
+
+    quarantined = rejected | duplicate_row
+    clean = logs[~quarantined]
+
+    report = {
+        "rows_in": int(len(logs)),
+        "rows_out": int(len(clean)),
+        "quarantined": int(quarantined.sum()),
+        "duplicates": int(duplicate_row.sum()),
+        "reasons": {reason: int(mask.sum()) for reason, mask in sorted(checks.items())},
+        "quarantine_path": None,
+    }
+
+    if quarantine_path is not None and quarantined.any():
+        rows = np.flatnonzero(quarantined)
+        bad = logs.iloc[rows].copy()
+        bad.insert(0, "row", rows)
+        bad["reasons"] = _reasons(checks, rows).to_numpy()
+        path = Path(quarantine_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        bad.to_csv(path, index=False)
+        report["quarantine_path"] = str(path)
+
+    if report["quarantined"]:
+        logger.warning(
+            f"Quarantined {report['quarantined']}/{report['rows_in']} feeding logs: {report['reasons']}"
+        )
+    logger.info(f"Validated feeding logs: {report['rows_out']} of {report['rows_in']} rows kept")
+
+    return clean, report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Validate and deduplicate feeding logs")
+    parser.add_argument("--logs", default="data/raw/feeding_logs.csv", help="Feeding log CSV")
+    parser.add_argument("--formulas", default="data/raw/formula_master.csv", help="Formula master CSV")
+    parser.add_argument("--quarantine", default=DEFAULT_QUARANTINE_PATH, help="Quarantine CSV path")
+    parser.add_argument("--output", default=None, help="Write clean logs to this CSV")
+    args = parser.parse_args()
+
+    clean, report = validate_feeding_logs(
+        pd.read_csv(args.logs),
+        pd.read_csv(args.formulas)["formula_id"],
+        quarantine_path=args.quarantine,
+    )
+    if args.output:
+        clean.to_csv(args.output, index=False)
+    print(json.dumps(report, indent=2))
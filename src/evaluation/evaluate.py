@@ -0,0 +1,538 @@
+"""
+Offline evaluation of Smart Bottle model artifacts
+Scores a model package on held-out feeding logs and writes a JSON report
+with classification, ranking, calibration, latency and memory metrics.
+Matrix factorization packages are scored through CFRecommender (see
+evaluate_cf_model).
+
+Usage:
+    python -m src.evaluation.evaluate --model models/trained/knn_v1_legacy.pkl \
+        --output reports/knn_v1_legacy.json --min-f1-macro 0.3 --max-row-p95-ms 20
+    python -m src.evaluation.evaluate --model models/trained/cf_als_v1.pkl \
+        --data-dir data/synthetic/cf --min-good-auc 0.6
+"""
+import argparse
+import json
+import pickle
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import joblib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.data.data_loader import BABY_FEATURES, FORMULA_FEATURES, TARGET_COL, split_logs
+from src.evaluation.metrics import (
+    classification_metrics,
+    calibration_metrics,
+    probability_metrics,
+    ranking_metrics,
+)
+from src.training.matrix_factorization import MODEL_TYPE as CF_MODEL_TYPE
+
+logger = logging.getLogger(__name__)
+
+# Promotion gates: name -> (report path, comparison)
+GATES = {
+    "min_accuracy": (("classification", "accuracy"), "min"),
+    "min_f1_macro": (("classification", "f1_macro"), "min"),
+    "min_ndcg_at_3": (("ranking", "ndcg@3"), "min"),
+    "max_ece": (("calibration", "ece_top_label"), "max"),
+    # Matrix factorization packages (P(good) only)
+    "min_good_auc": (("calibration", "good_auc"), "min"),
+    "max_row_p95_ms": (("latency", "row", "p95_ms"), "max"),
+    "max_recommend_p95_ms": (("latency", "recommend", "p95_ms"), "max"),
+    "max_batch_us_per_row": (("latency", "batch", "us_per_row"), "max"),
+}
+
+# Keys each package kind must have
+PACKAGE_KEYS = ("model_pipeline", "label_encoder", "feature_cols")
+CF_PACKAGE_KEYS = ("baby_ids", "formula_ids", "calibration", "ratings", "fallback_model")
+
+
+def load_model_package(model_path: str) -> Dict:
+    """
+    Load a model package saved by the training scripts
+
+    Args:
+        model_path: Path to .pkl package
+
+    Returns:
+        Model package dictionary
+    """
+    package = joblib.load(model_path)
+    required = CF_PACKAGE_KEYS if package.get("model_type") == CF_MODEL_TYPE else PACKAGE_KEYS
+    for key in required:
+        if key not in package:
+            raise ValueError(f"Model package missing '{key}': {model_path}")
+    return package
+
+
+def load_holdout(
+    data_dir: str = "data/raw",
+    holdout_path: Optional[str] = None,
+    test_size: float = 0.2,
+    random_state: int = 42
+) -> tuple:
+    """
+    Load held-out feeding logs merged with formula attributes
+
+    Without holdout_path, the test split of retrain_model.py
+    (stratified 80/20, random_state=42) is reproduced.
+
+    Args:
+        data_dir: Directory with formula_master.csv (and feeding_logs.csv)
+        holdout_path: Feeding log CSV to evaluate on (optional)
+        test_size: Test fraction when splitting
+        random_state: Split seed
+
+    Returns:
+        Tuple of (holdout DataFrame, formula DataFrame)
+    """
+    data_dir = Path(data_dir)
+    formula_df = pd.read_csv(data_dir / "formula_master.csv")
+
+    if holdout_path is not None:
+        logs = pd.read_csv(holdout_path)
+    else:
+        logs = pd.read_csv(data_dir / "feeding_logs.csv")
+        _, logs = split_logs(logs, test_size=test_size, random_state=random_state)
+
+    data = logs.merge(formula_df, on="formula_id", how="inner")
+    if len(data) < len(logs):
+        logger.warning(f"Dropped {len(logs) - len(data)} held-out rows with unknown formula_id")
+
+    logger.info(f"Loaded {len(data)} held-out rows")
+    return data.reset_index(drop=True), formula_df
+
+
+def ranking_queries(data: pd.DataFrame, group_col: str) -> tuple:
+    """
+    One ranking query per group of held-out rows
+
+    Args:
+        data: Held-out rows
+        group_col: Column identifying a query (baby)
+
+    Returns:
+        Tuple of (profiles DataFrame with group_col and BABY_FEATURES,
+        set of formula ids logged as good per profile)
+    """
+    profiles = data.groupby(group_col, sort=False)[BABY_FEATURES].first().reset_index()
+    relevant = (
+        data[data[TARGET_COL] == "good"]
+        .groupby(group_col)["formula_id"]
+        .agg(set)
+        .reindex(profiles[group_col])
+    )
+    relevant = [r if isinstance(r, set) else set() for r in relevant]
+    return profiles, relevant
+
+
+def _percentiles(samples_ms: List[float]) -> Dict:
+    """Latency summary in milliseconds"""
+    samples = np.asarray(samples_ms)
+    return {
+        "n": int(len(samples)),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean()),
+    }
+
+
+def measure_latency(
+    model,
+    X: pd.DataFrame,
+    candidates: pd.DataFrame,
+    repeats: int = 50
+) -> Dict:
+    """
+    Measure inference latency through the full pipeline
+
+    Args:
+        model: Fitted pipeline
+        X: Held-out feature rows
+        candidates: One profile crossed with the whole catalog (a /recommend call)
+        repeats: Samples per measurement
+
+    Returns:
+        Dictionary with per-row, per-recommend and per-batch latency
+    """
+    # Warm up
+    model.predict_proba(X.iloc[:1])
+
+    row_ms = []
+    for i in range(repeats):
+        row = X.iloc[[i % len(X)]]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        row_ms.append((time.perf_counter() - start) * 1e3)
+
+    recommend_ms = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_proba(candidates)
+        recommend_ms.append((time.perf_counter() - start) * 1e3)
+
+    batch_ms = []
+    for _ in range(max(3, repeats // 10)):
+        start = time.perf_counter()
+        model.predict_proba(X)
+        batch_ms.append((time.perf_counter() - start) * 1e3)
+
+    batch = _percentiles(batch_ms)
+    batch["rows"] = int(len(X))
+    batch["us_per_row"] = batch["p50_ms"] * 1e3 / len(X)
+
+    recommend = _percentiles(recommend_ms)
+    recommend["rows"] = int(len(candidates))
+
+    return {
+        "row": _percentiles(row_ms),
+        "recommend": recommend,
+        "batch": batch,
+    }
+
+
+def measure_memory(model_path: str, model, X: pd.DataFrame) -> Dict:
+    """
+    Measure model size and peak allocation of a batch prediction
+
+    Args:
+        model_path: Path to model artifact
+        model: Fitted pipeline
+        X: Batch to predict
+
+    Returns:
+        Dictionary with artifact, pickled and peak batch bytes
+    """
+    tracemalloc.start()
+    try:
+        model.predict_proba(X)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "artifact_bytes": Path(model_path).stat().st_size,
+        "model_pickle_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        "batch_peak_bytes": int(peak),
+        "batch_rows": int(len(X)),
+    }
+
+
+def evaluate_model(
+    model_path: str,
+    data_dir: str = "data/raw",
+    holdout_path: Optional[str] = None,
+    ks: tuple = (1, 3, 5),
+    latency_repeats: int = 50
+) -> Dict:
+    """
+    Evaluate a model package on held-out data
+
+    Args:
+        model_path: Path to model package
+        data_dir: Raw data directory
+        holdout_path: Held-out feeding log CSV (optional)
+        ks: Ranking cutoffs
+        latency_repeats: Latency samples per measurement
+
+    Returns:
+        Report dictionary
+    """
+    package = load_model_package(model_path)
+    if package.get("model_type") == CF_MODEL_TYPE:
+        return evaluate_cf_model(model_path, package, data_dir, holdout_path, ks, latency_repeats)
+
+    model = package["model_pipeline"]
+    label_encoder = package["label_encoder"]
+    feature_cols = package["feature_cols"]
+    classes = [str(c) for c in label_encoder.classes_]
+
+    data, formula_df = load_holdout(data_dir, holdout_path)
+    X = data[feature_cols]
+    y_true = label_encoder.transform(data[TARGET_COL])
+
+    proba = model.predict_proba(X)
+
+    # Ranking: score every formula for each baby, relevant = formulas logged as good
+    group_col = "baby_id" if "baby_id" in data.columns else None
+    if group_col is None:
+        data = data.assign(_query=np.arange(len(data)))
+        group_col = "_query"
+    profiles, relevant = ranking_queries(data, group_col)
+
+    formula_features = formula_df[FORMULA_FEATURES]
+    candidates = profiles[BABY_FEATURES].merge(formula_features, how="cross")[feature_cols]
+    ranking = {}
+    if "good" in classes:
+        good_index = classes.index("good")
+        good_scores = model.predict_proba(candidates)[:, good_index].reshape(len(profiles), len(formula_df))
+        ranking = ranking_metrics(good_scores, formula_df["formula_id"].to_numpy(), relevant, ks=ks)
+    else:
+        logger.warning("'good' class not in model, ranking metrics skipped")
+
+    one_profile = candidates.iloc[:len(formula_df)]
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "model": {
+            "path": str(model_path),
+            "version": Path(model_path).stem,
+            "model_name": package.get("model_name"),
+            "classes": classes,
+        },
+        "data": {
+            "holdout_path": holdout_path,
+            "rows": int(len(data)),
+            "queries": int(len(profiles)),
+            "formulas": int(len(formula_df)),
+        },
+        "classification": classification_metrics(y_true, proba, classes),
+        "calibration": calibration_metrics(y_true, proba, classes),
+        "ranking": ranking,
+        "latency": measure_latency(model, X, one_profile, repeats=latency_repeats),
+        "memory": measure_memory(model_path, model, candidates),
+    }
+
+    return report
+
+
+def evaluate_cf_model(
+    model_path: str,
+    package: Dict,
+    data_dir: str = "data/raw",
+    holdout_path: Optional[str] = None,
+    ks: tuple = (1, 3, 5),
+    latency_repeats: int = 50
+) -> Dict:
+    """
+    Evaluate a matrix factorization package as it is served
+
+    Held-out babies are scored by CFRecommender.score_batch against the
+    data directory's formula master: known babies from their factors,
+    the rest by the fallback package. The factors only predict a rating
+    level and P(good), so classification uses the predicted labels and
+    calibration the 'good' probability. Ranking and 'good' probability
+    metrics are also reported for a non-personalized baseline (each
+    formula's mean rating through the same calibration) as
+    "ranking_baseline" and "calibration_baseline".
+
+    Args:
+        model_path: Path to the CF package (its fallback next to it)
+        package: The loaded package
+        data_dir: Raw data directory
+        holdout_path: Held-out feeding log CSV (optional); by default the
+            logs train_from_data left out (eval_size)
+        ks: Ranking cutoffs
+        latency_repeats: Latency samples per measurement
+
+    Returns:
+        Report dictionary (same sections as evaluate_model)
+    """
+    from api.services.cf_recommender import CFRecommender
+
+    data, formula_df = load_holdout(data_dir, holdout_path)
+    if "baby_id" not in data.columns:
+        raise ValueError("Matrix factorization evaluation needs baby_id in the held-out logs")
+    if holdout_path is None and not package.get("params", {}).get("eval_size"):
+        logger.warning("Package was trained on every log (eval_size 0): the default holdout is not held out")
+
+    recommender = CFRecommender(model_path=model_path, model_package=package, drift_monitor=False)
+    recommender.load_formula_data(path=str(Path(data_dir) / "formula_master.csv"))
+    catalog = recommender.catalog
+
+    profiles, relevant = ranking_queries(data, "baby_id")
+    scores = recommender.score_batch(profiles, use_grid=False)
+
+    # Held-out row -> (baby row, catalog position) of the score matrix
+    baby_pos = pd.Index(profiles["baby_id"]).get_indexer(data["baby_id"])
+    formula_pos = pd.Index(catalog.formula_ids).get_indexer(data["formula_id"])
+    good = scores["good_probabilities"][baby_pos, formula_pos]
+    labels = scores["predicted_labels"][baby_pos, formula_pos]
+
+    classes = sorted(package["ratings"])
+    y_true = pd.Categorical(data[TARGET_COL], categories=classes).codes
+    y_pred = pd.Categorical(labels, categories=classes).codes
+    known = y_true >= 0
+    proba = np.eye(len(classes))[y_pred[known]]
+
+    # Baseline: formula mean ratings (global mean for formulas without factors)
+    columns = recommender.formula_columns(catalog)
+    mean_rating = np.where(
+        columns >= 0,
+        recommender.global_mean + recommender.formula_bias[np.maximum(columns, 0)],
+        recommender.global_mean
+    )
+    baseline = np.broadcast_to(recommender.cf_good_probabilities(mean_rating), scores["good_probabilities"].shape)
+    formula_ids = catalog.formula_ids
+    is_good = data[TARGET_COL].to_numpy() == "good"
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "model": {
+            "path": str(model_path),
+            "version": Path(model_path).stem,
+            "model_name": package.get("model_name"),
+            "model_type": CF_MODEL_TYPE,
+            "fallback_model": package["fallback_model"],
+            "classes": classes,
+        },
+        "data": {
+            "holdout_path": holdout_path,
+            "rows": int(len(data)),
+            "queries": int(len(profiles)),
+            "formulas": int(len(catalog)),
+            "cf_scored_rows": int(scores["cf_cells"][baby_pos, formula_pos].sum()),
+        },
+        "classification": classification_metrics(y_true[known], proba, classes),
+        "calibration": probability_metrics(good, is_good),
+        "calibration_baseline": probability_metrics(baseline[baby_pos, formula_pos], is_good),
+        "ranking": ranking_metrics(scores["good_probabilities"], formula_ids, relevant, ks=ks),
+        "ranking_baseline": ranking_metrics(baseline, formula_ids, relevant, ks=ks),
+        "latency": measure_recommender_latency(recommender, profiles, repeats=latency_repeats),
+        "memory": measure_recommender_memory(model_path, recommender, profiles),
+    }
+
+
+def measure_recommender_latency(recommender, profiles: pd.DataFrame, repeats: int = 50) -> Dict:
+    """
+    Measure score_batch latency of a recommender
+
+    Args:
+        recommender: FormulaRecommender (or subclass)
+        profiles: Held-out profiles
+        repeats: Samples per measurement
+
+    Returns:
+        Dictionary with per-recommend (one profile, whole catalog) and
+        per-batch latency; us_per_row is per scored baby-formula pair
+    """
+    one = profiles.iloc[:1]
+    recommender.score_batch(one, use_grid=False)
+
+    recommend_ms = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        recommender.score_batch(one, use_grid=False)
+        recommend_ms.append((time.perf_counter() - start) * 1e3)
+
+    batch_ms = []
+    for _ in range(max(3, repeats // 10)):
+        start = time.perf_counter()
+        recommender.score_batch(profiles, use_grid=False)
+        batch_ms.append((time.perf_counter() - start) * 1e3)
+
+    n_formulas = len(recommender.catalog)
+    recommend = _percentiles(recommend_ms)
+    recommend["rows"] = n_formulas
+    batch = _percentiles(batch_ms)
+    batch["rows"] = int(len(profiles) * n_formulas)
+    batch["us_per_row"] = batch["p50_ms"] * 1e3 / batch["rows"]
+    return {"recommend": recommend, "batch": batch}
+
+
+def measure_recommender_memory(model_path: str, recommender, profiles: pd.DataFrame) -> Dict:
+    """Artifact size and peak allocation of scoring every held-out profile"""
+    tracemalloc.start()
+    try:
+        recommender.score_batch(profiles, use_grid=False)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "artifact_bytes": Path(model_path).stat().st_size,
+        "batch_peak_bytes": int(peak),
+        "batch_rows": int(len(profiles) * len(recommender.catalog)),
+    }
+
+
+def check_gates(report: Dict, gates: Dict[str, float]) -> List[str]:
+    """
+    Check a report against promotion gates
+
+    Args:
+        report: Report from evaluate_model
+        gates: Gate name (see GATES) -> threshold
+
+    Returns:
+        List of failure messages (empty if all gates pass)
+    """
+    failures = []
+    for name, threshold in gates.items():
+        path, kind = GATES[name]
+        value = report
+        for key in path:
+            value = value.get(key, {}) if isinstance(value, dict) else {}
+        if not isinstance(value, (int, float)):
+            failures.append(f"{name}: metric {'.'.join(path)} not available")
+            continue
+        if kind == "min" and value < threshold:
+            failures.append(f"{name}: {value:.4f} < {threshold}")
+        if kind == "max" and value > threshold:
+            failures.append(f"{name}: {value:.4f} > {threshold}")
+    return failures
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Evaluate a model artifact on held-out data")
+    parser.add_argument("--model", default="models/trained/knn_v1_legacy.pkl", help="Model package path")
+    parser.add_argument("--data-dir", default="data/raw", help="Raw data directory")
+    parser.add_argument("--holdout", default=None, help="Held-out feeding log CSV (default: 20%% split of feeding_logs.csv)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Ranking cutoffs")
+    parser.add_argument("--latency-repeats", type=int, default=50, help="Latency samples per measurement")
+    parser.add_argument("--output", default=None, help="Write JSON report to this path")
+    for name in GATES:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=float, default=None,
+                            help=f"Promotion gate: {name}")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """Run evaluation from the command line"""
+    args = parse_args(argv)
+
+    report = evaluate_model(
+        args.model,
+        data_dir=args.data_dir,
+        holdout_path=args.holdout,
+        ks=tuple(args.k),
+        latency_repeats=args.latency_repeats,
+    )
+
+    gates = {name: getattr(args, name) for name in GATES if getattr(args, name) is not None}
+    failures = check_gates(report, gates)
+    report["gates"] = {"thresholds": gates, "failures": failures, "passed": not failures}
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(body)
+        logger.info(f"Report saved to: {args.output}")
+    else:
+        print(body)
+
+    if failures:
+        for failure in failures:
+            logger.error(f"Gate failed - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    sys.exit(main())
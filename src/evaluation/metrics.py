@@ -0,0 +1,216 @@
+"""
+Evaluation metrics for Smart Bottle tolerance models
+"""
+import numpy as np
+from sklearn.metrics import (
+    accuracy_score,
+    balanced_accuracy_score,
+    f1_score,
+    precision_recall_fscore_support,
+    confusion_matrix,
+    log_loss,
+    roc_auc_score,
+)
+import logging
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def classification_metrics(
+    y_true: np.ndarray,
+    proba: np.ndarray,
+    classes: Sequence[str]
+) -> Dict:
+    """
+    Overall and per-class classification metrics
+
+    Args:
+        y_true: Encoded true labels
+        proba: Predicted probabilities (n_samples x n_classes)
+        classes: Class names in encoded order
+
+    Returns:
+        Dictionary with accuracy, macro F1, per-class metrics and confusion matrix
+    """
+    labels = list(range(len(classes)))
+    y_pred = proba.argmax(axis=1)
+
+    precision, recall, f1, support = precision_recall_fscore_support(
+        y_true, y_pred, labels=labels, zero_division=0
+    )
+
+    return {
+        "n_samples": int(len(y_true)),
+        "accuracy": float(accuracy_score(y_true, y_pred)),
+        "balanced_accuracy": float(balanced_accuracy_score(y_true, y_pred)),
+        "f1_macro": float(f1_score(y_true, y_pred, labels=labels, average="macro", zero_division=0)),
+        "f1_weighted": float(f1_score(y_true, y_pred, labels=labels, average="weighted", zero_division=0)),
+        "per_class": {
+            str(name): {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+                "support": int(support[i]),
+            }
+            for i, name in enumerate(classes)
+        },
+        "confusion_matrix": confusion_matrix(y_true, y_pred, labels=labels).tolist(),
+    }
+
+
+def calibration_metrics(
+    y_true: np.ndarray,
+    proba: np.ndarray,
+    classes: Sequence[str],
+    positive_class: str = "good",
+    n_bins: int = 10
+) -> Dict:
+    """
+    Probability calibration metrics
+
+    Args:
+        y_true: Encoded true labels
+        proba: Predicted probabilities (n_samples x n_classes)
+        classes: Class names in encoded order
+        positive_class: Class whose probability drives ranking
+        n_bins: Number of equal-width reliability bins
+
+    Returns:
+        Dictionary with log loss, multi-class Brier score, top-label ECE and
+        reliability bins for the positive class
+    """
+    n_classes = len(classes)
+    onehot = np.eye(n_classes)[y_true]
+
+    # Top-label expected calibration error
+    confidence = proba.max(axis=1)
+    correct = (proba.argmax(axis=1) == y_true).astype(float)
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    bin_ids = np.clip(np.digitize(confidence, edges[1:-1]), 0, n_bins - 1)
+    ece = 0.0
+    for b in range(n_bins):
+        mask = bin_ids == b
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - confidence[mask].mean())
+
+    result = {
+        "log_loss": float(log_loss(y_true, np.clip(proba, 1e-15, 1.0), labels=list(range(n_classes)))),
+        "brier": float(np.mean(np.sum((proba - onehot) ** 2, axis=1))),
+        "ece_top_label": float(ece),
+    }
+
+    if positive_class in classes:
+        pos = list(classes).index(positive_class)
+        result[f"{positive_class}_reliability"] = _reliability(proba[:, pos], y_true == pos, n_bins)
+
+    return result
+
+
+def _reliability(p: np.ndarray, is_pos: np.ndarray, n_bins: int) -> List[Dict]:
+    """Equal-width reliability bins of one class probability"""
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    is_pos = np.asarray(is_pos, dtype=float)
+    pos_bins = np.clip(np.digitize(p, edges[1:-1]), 0, n_bins - 1)
+    reliability = []
+    for b in range(n_bins):
+        mask = pos_bins == b
+        if mask.any():
+            reliability.append({
+                "bin_lower": float(edges[b]),
+                "bin_upper": float(edges[b + 1]),
+                "count": int(mask.sum()),
+                "mean_predicted": float(p[mask].mean()),
+                "observed_rate": float(is_pos[mask].mean()),
+            })
+    return reliability
+
+
+def probability_metrics(
+    p: np.ndarray,
+    is_pos: np.ndarray,
+    positive_class: str = "good",
+    n_bins: int = 10
+) -> Dict:
+    """
+    Discrimination and calibration of a single class probability
+
+    For models that only predict the positive class probability (e.g.
+    matrix factorization P(good)).
+
+    Args:
+        p: Predicted probability of the positive class
+        is_pos: Whether each sample is of the positive class
+        positive_class: Name of the positive class
+        n_bins: Number of equal-width reliability bins
+
+    Returns:
+        Dictionary with ROC AUC, Brier score, ECE and reliability bins of
+        the positive class (AUC None when only one outcome occurs)
+    """
+    p = np.asarray(p, dtype=float)
+    is_pos = np.asarray(is_pos, dtype=float)
+    reliability = _reliability(p, is_pos, n_bins)
+    ece = sum(
+        b["count"] / len(p) * abs(b["observed_rate"] - b["mean_predicted"])
+        for b in reliability
+    )
+    auc = float(roc_auc_score(is_pos, p)) if 0 < is_pos.sum() < len(is_pos) else None
+    return {
+        f"{positive_class}_auc": auc,
+        f"{positive_class}_brier": float(np.mean((p - is_pos) ** 2)),
+        f"{positive_class}_ece": float(ece),
+        f"{positive_class}_reliability": reliability,
+    }
+
+
+def ranking_metrics(
+    scores: np.ndarray,
+    item_ids: np.ndarray,
+    relevant: List[set],
+    ks: Sequence[int] = (1, 3, 5)
+) -> Dict:
+    """
+    Top-k ranking metrics with binary relevance
+
+    Args:
+        scores: Scores per query and item (n_queries x n_items)
+        item_ids: Item id per column
+        relevant: Set of relevant item ids per query
+        ks: Cutoffs
+
+    Returns:
+        Dictionary with precision@k, recall@k, hit_rate@k, ndcg@k and MRR
+        averaged over queries with at least one relevant item
+    """
+    keep = [i for i, rel in enumerate(relevant) if rel]
+    if not keep:
+        logger.warning("No queries with relevant items, ranking metrics skipped")
+        return {"n_queries": 0}
+
+    # Stable descending order so ties keep catalog order (as in serving)
+    order = np.argsort(-scores[keep], axis=1, kind="stable")
+    ranked_ids = item_ids[order]
+    is_rel = np.array([
+        np.isin(ranked_ids[row], list(relevant[q]))
+        for row, q in enumerate(keep)
+    ])
+    n_rel = is_rel.sum(axis=1)
+
+    discounts = 1.0 / np.log2(np.arange(2, scores.shape[1] + 2))
+
+    result = {"n_queries": len(keep)}
+    for k in ks:
+        k_eff = min(k, scores.shape[1])
+        hits = is_rel[:, :k_eff].sum(axis=1)
+        dcg = (is_rel[:, :k_eff] * discounts[:k_eff]).sum(axis=1)
+        ideal = np.array([discounts[:min(int(r), k_eff)].sum() for r in n_rel])
+        result[f"precision@{k}"] = float(np.mean(hits / k_eff))
+        result[f"recall@{k}"] = float(np.mean(hits / n_rel))
+        result[f"hit_rate@{k}"] = float(np.mean(hits > 0))
+        result[f"ndcg@{k}"] = float(np.mean(dcg / ideal))
+
+    first_hit = is_rel.argmax(axis=1)
+    result["mrr"] = float(np.mean(1.0 / (first_hit + 1)))
+
+    return result
@@ -0,0 +1,85 @@
+"""
+Reference statistics of a training set for drift monitoring
+Built by the training scripts and stored in the model package as
+"reference_stats"; api/services/drift.py compares served traffic with them
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence
+
+# Profile inputs that are monitored (formula columns come from the catalog)
+MONITORED_NUMERIC = [
+    "age_month",
+    "height_cm",
+    "weight_kg",
+    "allergy_risk",
+    "lactose_sensitivity",
+    "feed_ml_per_intake",
+]
+MONITORED_CATEGORICAL = ["sex"]
+
+PROFILE_COLS = [
+    "age_month", "sex", "height_cm", "weight_kg",
+    "allergy_risk", "lactose_sensitivity", "feed_ml_per_intake",
+]
+FORMULA_COLS = ["formula_id", "category", "lactose_level", "target_issue", "protein_type"]
+
+
+def _bin_edges(values: np.ndarray, n_bins: int) -> List[float]:
+    """Interior edges at training quantiles (duplicates removed)"""
+    quantiles = np.quantile(values, np.linspace(0.0, 1.0, n_bins + 1)[1:-1])
+    return np.unique(np.concatenate([quantiles, [values.min(), values.max()]])).tolist()
+
+
+def build_reference(
+    X: pd.DataFrame,
+    predict_proba,
+    classes: Sequence[str],
+    n_bins: int = 10
+) -> Dict:
+    """
+    Reference statistics of a training set
+
+    Numeric profile columns get quantile bins (values below the training
+    minimum or above the maximum fall in the outer bins); categorical
+    columns get category counts plus an "other" slot. The predicted class
+    mix is computed like serving does: every distinct training baby scored
+    against every distinct training formula.
+
+    Args:
+        X: Training features (profile and formula columns)
+        predict_proba: Callable returning class probabilities for X-like frames
+        classes: Class labels in probability column order
+        n_bins: Bins per numeric column
+
+    Returns:
+        Reference dictionary for DriftMonitor
+    """
+    features = {}
+    for name in MONITORED_NUMERIC:
+        values = X[name].to_numpy(dtype=np.float64)
+        edges = _bin_edges(values, n_bins)
+        counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        features[name] = {"kind": "numeric", "edges": edges, "counts": counts.tolist()}
+
+    for name in MONITORED_CATEGORICAL:
+        values = X[name].astype(str)
+        categories = sorted(values.unique().tolist())
+        counts = values.value_counts().reindex(categories).to_numpy()
+        features[name] = {
+            "kind": "categorical",
+            "categories": categories,
+            "counts": counts.tolist() + [0],
+        }
+
+    babies = X[PROFILE_COLS].drop_duplicates()
+    formulas = X[FORMULA_COLS].drop_duplicates()
+    candidates = babies.merge(formulas, how="cross")[list(X.columns)]
+    predicted = np.asarray(predict_proba(candidates)).argmax(axis=1)
+
+    return {
+        "rows": int(len(X)),
+        "features": features,
+        "classes": [str(c) for c in classes],
+        "class_counts": np.bincount(predicted, minlength=len(classes)).tolist(),
+    }
@@ -0,0 +1,563 @@
+"""
+Offline bulk scoring
+Streams baby profiles from a CSV or Parquet file (or directory of parts)
+or from the babies table, scores them in large batches with the serving
+model in a process pool and writes the top-N formulas per baby as chunked
+output files
+
+Output directory layout:
+    manifest.json           run settings and, when finished, totals
+    progress.jsonl          one line per finished chunk (used to resume)
+    part-NNNNN.<csv|parquet> rows of (<id>, rank, formula_id,
+                            good_probability, predicted_label)
+
+Rerunning the same command resumes: chunks listed in progress.jsonl are
+read but not scored again.
+
+Usage:
+    python -m src.scoring.bulk --source csv --input data/profiles.csv --out data/scoring/run1
+    python -m src.scoring.bulk --source parquet --input data/profiles/ --n-jobs 8
+    python -m src.scoring.bulk --source db --out data/scoring/all_babies
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.precompute import PROFILE_COLUMNS, db_profile_sql
+from api.services.ranking import top_positions
+from api.services.recommender import FormulaRecommender
+from api.services.cf_recommender import load_recommender
+from src.data.validation import check_profiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = "data/scoring"
+MANIFEST_FILE = "manifest.json"
+PROGRESS_FILE = "progress.jsonl"
+
+SOURCES = ("csv", "parquet", "db")
+FORMATS = ("csv", "parquet")
+
+INTEGER_COLUMNS = ["age_month", "allergy_risk", "lactose_sensitivity", "feed_ml_per_intake"]
+FLOAT_COLUMNS = ["height_cm", "weight_kg"]
+
+# Per-process state for pool workers
+_WORKER_RECOMMENDER: Optional[FormulaRecommender] = None
+
+
+def _input_files(path: str, suffix: str) -> List[Path]:
+    """A single file, or the sorted *<suffix> files of a directory"""
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(path.glob(f"*{suffix}"))
+        if not files:
+            raise FileNotFoundError(f"No {suffix} files in {path}")
+        return files
+    if not path.exists():
+        raise FileNotFoundError(f"Input not found: {path}")
+    return [path]
+
+
+def iter_csv(path: str, batch_size: int, id_column: str) -> Iterator[pd.DataFrame]:
+    """Profile chunks of a CSV file or directory of CSV parts"""
+    wanted = set(PROFILE_COLUMNS) | {id_column}
+    for file in _input_files(path, ".csv"):
+        yield from pd.read_csv(file, chunksize=batch_size, usecols=lambda c: c in wanted)
+
+
+def iter_parquet(path: str, batch_size: int, id_column: str) -> Iterator[pd.DataFrame]:
+    """Profile chunks of a Parquet file or directory of Parquet parts"""
+    import pyarrow.parquet as pq
+
+    wanted = PROFILE_COLUMNS + [id_column]
+    for file in _input_files(path, ".parquet"):
+        parquet = pq.ParquetFile(file)
+        columns = [c for c in wanted if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+
+
+class DbProfileSource:
+    """
+    Profiles of every baby in the babies table, paged by baby_id
+
+    Uses the same column expressions as the precompute job (db_profile_sql,
+    PRECOMPUTE_SQL_<COLUMN> is required for columns not in the babies
+    table): feed_ml_per_intake is the
+    mean amount_consumed over the last `days` days, rounded to whole ml.
+    Babies without recent feedings get a missing amount and are rejected
+    by validation.
+    """
+
+    def __init__(self, batch_size: int = 10000, days: int = 7):
+        """
+        Args:
+            batch_size: Babies per page
+            days: Window for the feeding amount average
+        """
+        self.batch_size = batch_size
+        self.days = days
+        self.profile_sql = db_profile_sql()
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        """Yield one DataFrame (baby_id + PROFILE_COLUMNS) per page"""
+        from config.database import get_connection
+
+        columns = ",\n".join(f"{expr} AS {col}" for col, expr in self.profile_sql.items())
+        conn = get_connection()
+        try:
+            last_id = 0
+            while True:
+                ids = pd.read_sql(
+                    "SELECT baby_id FROM babies WHERE baby_id > %s ORDER BY baby_id LIMIT %s",
+                    conn, params=[int(last_id), int(self.batch_size)]
+                )["baby_id"]
+                if ids.empty:
+                    break
+                low, high = int(ids.iloc[0]), int(ids.iloc[-1])
+                profiles = pd.read_sql(
+                    f"""
+                    SELECT b.baby_id, {columns}
+                    FROM babies b
+                    LEFT JOIN (
+                        SELECT baby_id, AVG(amount_consumed) AS avg_amount
+                        FROM feeding_records
+                        WHERE baby_id BETWEEN %s AND %s
+                          AND timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                        GROUP BY baby_id
+                    ) f ON f.baby_id = b.baby_id
+                    WHERE b.baby_id BETWEEN %s AND %s
+                    ORDER BY b.baby_id
+                    """,
+                    conn, params=[low, high, int(self.days), low, high]
+                )
+                profiles["feed_ml_per_intake"] = profiles["feed_ml_per_intake"].round()
+                yield profiles
+                last_id = high
+        finally:
+            conn.close()
+
+
+def open_source(source: str, path: Optional[str], batch_size: int, id_column: str = "baby_id") -> Iterator[pd.DataFrame]:
+    """
+    Stream of profile chunks
+
+    Args:
+        source: "csv", "parquet" or "db"
+        path: Input file or directory (csv / parquet)
+        batch_size: Profiles per chunk
+        id_column: Identifier column carried to the output
+
+    Returns:
+        Iterator of DataFrames
+    """
+    if source == "db":
+        return iter(DbProfileSource(batch_size=batch_size))
+    if not path:
+        raise ValueError(f"--input is required for source {source}")
+    if source == "csv":
+        return iter_csv(path, batch_size, id_column)
+    if source == "parquet":
+        return iter_parquet(path, batch_size, id_column)
+    raise ValueError(f"Unknown source: {source} (expected one of {SOURCES})")
+
+
+def score_frame(
+    rec: FormulaRecommender,
+    frame: pd.DataFrame,
+    id_column: str = "baby_id",
+    offset: int = 0,
+    top_n: int = 3,
+    min_good_prob: float = 0.3
+) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Top-N formulas for a chunk of profiles
+
+    Rows failing the BabyProfile bounds are skipped and counted. Like
+    /recommend, only formulas with good probability >= min_good_prob are
+    listed, so a baby may have fewer than top_n rows (or none).
+
+    Args:
+        rec: Recommender to score with
+        frame: Profile chunk
+        id_column: Identifier column (global row numbers are used as "row"
+            if the chunk has no such column)
+        offset: Global row number of the chunk's first row
+        top_n: Formulas per baby
+        min_good_prob: Minimum good probability threshold
+
+    Returns:
+        (Long-format results, chunk statistics)
+    """
+    if id_column in frame:
+        ids, id_name = frame[id_column].to_numpy(), id_column
+    else:
+        ids, id_name = np.arange(offset, offset + len(frame)), "row"
+
+    checks = check_profiles(frame)
+    invalid = np.zeros(len(frame), dtype=bool)
+    for mask in checks.values():
+        invalid |= mask
+
+    valid = ~invalid
+    profiles = frame.loc[valid, PROFILE_COLUMNS].astype(
+        {**{c: np.int64 for c in INTEGER_COLUMNS}, **{c: np.float64 for c in FLOAT_COLUMNS}, "sex": str}
+    )
+    if "baby_id" in frame:
+        # Collaborative-filtering models personalize by baby_id
+        profiles["baby_id"] = frame.loc[valid, "baby_id"].to_numpy()
+    ids = ids[valid]
+
+    columns = [id_name, "rank", "formula_id", "good_probability", "predicted_label"]
+    if profiles.empty:
+        results = pd.DataFrame({c: [] for c in columns})
+    else:
+        scores = rec.score_batch(profiles)
+        good = scores["good_probabilities"]
+        eligible = good >= min_good_prob
+        top = top_positions(good, eligible, top_n)
+
+        # Keep each baby's eligible prefix of its top positions
+        keep = np.arange(top.shape[1])[None, :] < eligible.sum(axis=1)[:, None]
+        rows, ranks = np.nonzero(keep)
+        positions = top[rows, ranks]
+        results = pd.DataFrame({
+            id_name: ids[rows],
+            "rank": ranks + 1,
+            "formula_id": scores["catalog"].formula_ids[positions],
+            "good_probability": good[rows, positions],
+            "predicted_label": scores["predicted_labels"][rows, positions].astype(str),
+        })
+
+    stats = {
+        "rows": int(len(frame)),
+        "scored": int(valid.sum()),
+        "invalid": int(invalid.sum()),
+        "reasons": {reason: int(mask.sum()) for reason, mask in sorted(checks.items())},
+        "results": int(len(results)),
+    }
+    return results, stats
+
+
+def write_part(results: pd.DataFrame, path: Path, fmt: str):
+    """Write a chunk's results atomically (temporary name, then rename)"""
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        results.to_parquet(tmp, index=False)
+    else:
+        results.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _init_worker(model_path: str):
+    """Load the model once per pool worker"""
+    global _WORKER_RECOMMENDER
+    logging.getLogger("api.services").setLevel(logging.WARNING)
+    logging.getLogger("src.data").setLevel(logging.WARNING)
+    _WORKER_RECOMMENDER = load_recommender(model_path, drift_monitor=False)
+
+
+def _score_chunk(task: Tuple) -> Dict:
+    """
+    Score one chunk and write its part file (pool worker)
+
+    Args:
+        task: (chunk index, profiles, offset, id_column, part path, format,
+            top_n, min_good_prob)
+
+    Returns:
+        Chunk statistics including "chunk"
+    """
+    index, frame, offset, id_column, path, fmt, top_n, min_good_prob = task
+    results, stats = score_frame(_WORKER_RECOMMENDER, frame, id_column, offset, top_n, min_good_prob)
+    write_part(results, Path(path), fmt)
+    return {"chunk": index, **stats}
+
+
+class BulkScoringJob:
+    """
+    Score a profile stream into an output directory
+
+    Chunks are scored in a process pool with at most max_pending chunks in
+    flight, so memory stays bounded however large the input is. A chunk is
+    recorded in progress.jsonl only after its part file is in place;
+    chunk numbering depends only on the input and batch_size, which is why
+    a resumed run must use the same settings (checked against manifest.json).
+    """
+
+    def __init__(
+        self,
+        source: str,
+        input_path: Optional[str],
+        out_dir: str = DEFAULT_OUTPUT_DIR,
+        model_path: str = "models/trained/knn_v1_legacy.pkl",
+        batch_size: int = 4096,
+        n_jobs: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        top_n: int = 3,
+        min_good_prob: float = 0.3,
+        id_column: str = "baby_id",
+        fmt: str = "parquet",
+        progress_seconds: float = 5.0
+    ):
+        """
+        Args:
+            source: "csv", "parquet" or "db"
+            input_path: Input file or directory (csv / parquet)
+            out_dir: Output directory
+            model_path: Model package to score with
+            batch_size: Profiles per chunk
+            n_jobs: Worker processes (default: CPU count; 1 scores in-process)
+            max_pending: Chunks in flight (default: 2 x n_jobs)
+            top_n: Formulas per baby
+            min_good_prob: Minimum good probability threshold
+            id_column: Identifier column carried to the output
+            fmt: Output format, "parquet" or "csv"
+            progress_seconds: Interval between progress log lines
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown output format: {fmt} (expected one of {FORMATS})")
+        self.source = source
+        self.input_path = input_path
+        self.out_dir = Path(out_dir)
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.n_jobs
+        self.top_n = top_n
+        self.min_good_prob = min_good_prob
+        self.id_column = id_column
+        self.fmt = fmt
+        self.progress_seconds = progress_seconds
+
+    def settings(self) -> Dict:
+        """Run settings that must match when resuming"""
+        return {
+            "source": self.source,
+            "input": str(Path(self.input_path).resolve()) if self.input_path else None,
+            "model_version": Path(self.model_path).stem,
+            "batch_size": self.batch_size,
+            "top_n": self.top_n,
+            "min_good_prob": self.min_good_prob,
+            "id_column": self.id_column,
+            "format": self.fmt,
+        }
+
+    def part_path(self, index: int) -> Path:
+        """Output file of a chunk"""
+        return self.out_dir / f"part-{index:05d}.{self.fmt}"
+
+    def prepare(self, overwrite: bool = False) -> Dict[int, Dict]:
+        """
+        Create or validate the output directory
+
+        Args:
+            overwrite: Discard previous output instead of resuming
+
+        Returns:
+            Chunk index -> statistics of chunks already finished
+        """
+        manifest_path = self.out_dir / MANIFEST_FILE
+        if overwrite and self.out_dir.exists():
+            shutil.rmtree(self.out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+
+        settings = self.settings()
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                previous = json.load(f)["settings"]
+            if previous != settings:
+                changed = sorted(k for k in settings if previous.get(k) != settings[k])
+                raise ValueError(
+                    f"{self.out_dir} holds a run with different settings ({changed}); "
+                    f"use another --out or --overwrite"
+                )
+        else:
+            self._write_manifest({"settings": settings, "completed": False})
+
+        done = {}
+        progress_path = self.out_dir / PROGRESS_FILE
+        if progress_path.exists():
+            with open(progress_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        if self.part_path(entry["chunk"]).exists():
+                            done[entry["chunk"]] = entry
+        return done
+
+    def _write_manifest(self, manifest: Dict):
+        """Replace manifest.json"""
+        tmp = self.out_dir / (MANIFEST_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.out_dir / MANIFEST_FILE)
+
+    def run(self, overwrite: bool = False) -> Dict:
+        """
+        Score the whole input
+
+        Args:
+            overwrite: Discard previous output instead of resuming
+
+        Returns:
+            Run statistics (totals include resumed chunks)
+        """
+        done = self.prepare(overwrite)
+        if done:
+            logger.info(f"Resuming: {len(done)} chunks already scored in {self.out_dir}")
+
+        start = time.perf_counter()
+        self._run_rows = 0
+        self._last_report = start
+        progress = open(self.out_dir / PROGRESS_FILE, "a")
+        finished = dict(done)
+
+        def record(stats: Dict):
+            # Part file is in place; make the chunk resumable
+            progress.write(json.dumps(stats) + "\n")
+            progress.flush()
+            finished[stats["chunk"]] = stats
+            self._run_rows += stats["rows"]
+            self._report(start, finished)
+
+        executor = None
+        try:
+            offset = 0
+            pending = set()
+            for index, frame in enumerate(open_source(self.source, self.input_path, self.batch_size, self.id_column)):
+                task = (
+                    index, frame, offset, self.id_column, str(self.part_path(index)),
+                    self.fmt, self.top_n, self.min_good_prob
+                )
+                offset += len(frame)
+                if index in done:
+                    continue
+
+                if self.n_jobs == 1:
+                    if _WORKER_RECOMMENDER is None:
+                        _init_worker(self.model_path)
+                    record(_score_chunk(task))
+                    continue
+
+                if executor is None:
+                    executor = ProcessPoolExecutor(
+                        max_workers=self.n_jobs,
+                        initializer=_init_worker,
+                        initargs=(self.model_path,)
+                    )
+                # Backpressure: never more than max_pending chunks queued
+                while len(pending) >= self.max_pending:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        record(future.result())
+                pending.add(executor.submit(_score_chunk, task))
+
+            for future in wait(pending).done:
+                record(future.result())
+        finally:
+            progress.close()
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - start
+        totals = {
+            key: sum(stats[key] for stats in finished.values())
+            for key in ("rows", "scored", "invalid", "results")
+        }
+        reasons: Dict[str, int] = {}
+        for stats in finished.values():
+            for reason, count in stats["reasons"].items():
+                reasons[reason] = reasons.get(reason, 0) + count
+
+        summary = {
+            "chunks": len(finished),
+            "resumed_chunks": len(done),
+            **totals,
+            "reasons": reasons,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self._run_rows / max(elapsed, 1e-9), 1),
+        }
+        self._write_manifest({"settings": self.settings(), "completed": True, "summary": summary})
+        logger.info(
+            f"Scored {totals['scored']} of {totals['rows']} profiles into {self.out_dir} "
+            f"({summary['rows_per_second']:.0f} rows/s this run, {totals['invalid']} invalid)"
+        )
+        return summary
+
+    def _report(self, start: float, finished: Dict[int, Dict]):
+        """Log progress at most every progress_seconds"""
+        now = time.perf_counter()
+        if now - self._last_report < self.progress_seconds:
+            return
+        self._last_report = now
+        total = sum(stats["rows"] for stats in finished.values())
+        logger.info(
+            f"{len(finished)} chunks, {total} rows "
+            f"({self._run_rows / max(now - start, 1e-9):.0f} rows/s)"
+        )
+
+
+def read_results(out_dir: str) -> pd.DataFrame:
+    """Load every part file of a bulk scoring run"""
+    paths = sorted(Path(out_dir).glob("part-*.parquet")) + sorted(Path(out_dir).glob("part-*.csv"))
+    frames = [pd.read_parquet(p) if p.suffix == ".parquet" else pd.read_csv(p) for p in paths]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Score baby profiles in bulk")
+    parser.add_argument("--source", choices=SOURCES, default="csv", help="Profile source")
+    parser.add_argument("--input", default=None, help="Input file or directory of parts (csv / parquet)")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR, help="Output directory")
+    parser.add_argument("--model", default="models/trained/knn_v1_legacy.pkl", help="Model package path")
+    parser.add_argument("--batch-size", type=int, default=4096, help="Profiles per chunk")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=None, help="Chunks in flight (default: 2 x n-jobs)")
+    parser.add_argument("--top-n", type=int, default=3, help="Formulas per baby")
+    parser.add_argument("--min-good-prob", type=float, default=0.3, help="Minimum good probability")
+    parser.add_argument("--id-column", default="baby_id", help="Identifier column carried to the output")
+    parser.add_argument("--format", choices=FORMATS, default="parquet", help="Output format")
+    parser.add_argument("--overwrite", action="store_true", help="Discard previous output instead of resuming")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run bulk scoring from the command line"""
+    args = parse_args(argv)
+    job = BulkScoringJob(
+        args.source,
+        args.input,
+        out_dir=args.out,
+        model_path=args.model,
+        batch_size=args.batch_size,
+        n_jobs=args.n_jobs,
+        max_pending=args.max_pending,
+        top_n=args.top_n,
+        min_good_prob=args.min_good_prob,
+        id_column=args.id_column,
+        fmt=args.format,
+    )
+    print(json.dumps(job.run(overwrite=args.overwrite), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
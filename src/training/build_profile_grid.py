@@ -0,0 +1,310 @@
+"""
+Build a precomputed profile grid for a published model
+Scores every formula over a quantized grid of baby profiles in parallel
+and reports the grid's error against exact model scoring
+
+Usage:
+    python -m src.training.build_profile_grid --model models/trained/knn_v1_legacy.pkl \
+        --output models/trained/knn_v1_legacy_grid --n-jobs 8
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from api.services.recommender import FormulaRecommender
+from api.services.profile_grid import (
+    ProfileGrid,
+    GRID_META_FILE,
+    GOOD_PROB_FILE,
+    LABELS_FILE,
+    PROB_SCALE,
+    axis_size,
+    grid_profiles,
+)
+
+logger = logging.getLogger(__name__)
+
+# Quantization steps (1cm / 0.1kg / 10ml)
+DEFAULT_STEPS = {
+    "height_cm": 1.0,
+    "weight_kg": 0.1,
+    "feed_ml_per_intake": 10.0,
+}
+
+# Per-process state for pool workers
+_WORKER_RECOMMENDER: Optional[FormulaRecommender] = None
+
+
+def default_axes(
+    logs: pd.DataFrame,
+    steps: Optional[Dict[str, float]] = None
+) -> List[Dict]:
+    """
+    Grid axes covering the training data range
+
+    Args:
+        logs: Feeding logs used for training
+        steps: Quantization step per numeric axis (default: DEFAULT_STEPS)
+
+    Returns:
+        List of axis definitions
+    """
+    steps = {**DEFAULT_STEPS, **(steps or {})}
+
+    def numeric_axis(name: str, step: float, pad: float) -> Dict:
+        lo = np.floor((logs[name].min() - pad) / step) * step
+        hi = np.ceil((logs[name].max() + pad) / step) * step
+        lo = max(lo, step) if name != "age_month" else max(lo, 0.0)
+        return {
+            "name": name,
+            "start": round(float(lo), 6),
+            "step": step,
+            "size": int(round((hi - lo) / step)) + 1,
+        }
+
+    return [
+        numeric_axis("age_month", 1.0, 0.0),
+        {"name": "sex", "values": ["F", "M"]},
+        {"name": "allergy_risk", "values": [0, 1]},
+        {"name": "lactose_sensitivity", "values": [0, 1]},
+        numeric_axis("height_cm", steps["height_cm"], 2.0),
+        numeric_axis("weight_kg", steps["weight_kg"], 0.5),
+        numeric_axis("feed_ml_per_intake", steps["feed_ml_per_intake"], 10.0),
+    ]
+
+
+def _init_worker(model_path: str):
+    """Load the model once per pool worker"""
+    global _WORKER_RECOMMENDER
+    logging.getLogger("api.services").setLevel(logging.WARNING)
+    _WORKER_RECOMMENDER = FormulaRecommender(model_path=model_path)
+
+
+def _score_chunk(task: Tuple[str, List[Dict], int, int]) -> int:
+    """
+    Score one chunk of grid profiles and write it into the output arrays
+
+    Args:
+        task: (output dir, axes, start index, stop index)
+
+    Returns:
+        Number of profiles written
+    """
+    output_dir, axes, start, stop = task
+    rec = _WORKER_RECOMMENDER
+
+    profiles = grid_profiles(axes, np.arange(start, stop))
+    scores = rec.score_batch(profiles, use_grid=False)
+
+    good_prob = np.load(Path(output_dir) / GOOD_PROB_FILE, mmap_mode="r+")
+    labels = np.load(Path(output_dir) / LABELS_FILE, mmap_mode="r+")
+    good_prob[start:stop] = np.rint(scores["good_probabilities"] * PROB_SCALE).astype(np.uint8)
+    labels[start:stop] = scores["probabilities"].argmax(axis=2).astype(np.uint8)
+    good_prob.flush()
+    labels.flush()
+
+    return stop - start
+
+
+def sample_profiles(axes: List[Dict], n: int, random_state: int = 42) -> pd.DataFrame:
+    """
+    Random off-grid profiles inside the grid bounds
+
+    Args:
+        axes: Grid axes
+        n: Number of profiles
+        random_state: Random seed
+
+    Returns:
+        DataFrame of profiles
+    """
+    rng = np.random.default_rng(random_state)
+    columns = {}
+    for axis in axes:
+        if "values" in axis:
+            columns[axis["name"]] = rng.choice(np.asarray(axis["values"], dtype=object), size=n)
+        elif axis["name"] == "age_month":
+            columns[axis["name"]] = rng.integers(axis["start"], axis["start"] + axis["size"], size=n)
+        else:
+            hi = axis["start"] + axis["step"] * (axis["size"] - 1)
+            columns[axis["name"]] = rng.uniform(axis["start"], hi, size=n)
+    return pd.DataFrame(columns)
+
+
+def error_report(
+    rec: FormulaRecommender,
+    grid: ProfileGrid,
+    n_samples: int = 2000,
+    random_state: int = 42
+) -> Dict:
+    """
+    Compare grid lookups with exact model scoring on random profiles
+
+    Args:
+        rec: Recommender without grid
+        grid: Built grid
+        n_samples: Number of random profiles
+        random_state: Random seed
+
+    Returns:
+        Error metrics for nearest-point and interpolated lookups
+    """
+    profiles = sample_profiles(grid.axes, n_samples, random_state)
+    exact = rec.score_batch(profiles, use_grid=False)
+    exact_good = exact["good_probabilities"]
+    exact_top = np.argsort(-exact_good, axis=1, kind="stable")
+
+    report = {"n_samples": int(n_samples)}
+    for mode, interpolate in (("nearest", False), ("interpolated", True)):
+        approx = grid.lookup(profiles, interpolate=interpolate)
+        err = np.abs(approx["good_probabilities"] - exact_good)
+        approx_top = np.argsort(-approx["good_probabilities"], axis=1, kind="stable")
+        k = min(3, exact_good.shape[1])
+        top_k_overlap = np.mean([
+            len(set(a[:k]) & set(e[:k])) / k for a, e in zip(approx_top, exact_top)
+        ])
+        report[mode] = {
+            "mae": float(err.mean()),
+            "p99_abs_error": float(np.percentile(err, 99)),
+            "max_abs_error": float(err.max()),
+            "top1_agreement": float(np.mean(approx_top[:, 0] == exact_top[:, 0])),
+            f"top{k}_overlap": float(top_k_overlap),
+            "label_agreement": float(np.mean(approx["predicted_labels"] == exact["predicted_labels"])),
+        }
+
+    return report
+
+
+def build_grid(
+    model_path: str,
+    output_dir: str,
+    axes: List[Dict],
+    n_jobs: Optional[int] = None,
+    chunk_size: int = 20000,
+    n_samples: int = 2000
+) -> Dict:
+    """
+    Build and save a profile grid
+
+    Args:
+        model_path: Model package path
+        output_dir: Grid directory to write
+        axes: Grid axes (see default_axes)
+        n_jobs: Worker processes (default: CPU count)
+        chunk_size: Profiles per task
+        n_samples: Random profiles for the error report
+
+    Returns:
+        Grid metadata (including error report)
+    """
+    rec = FormulaRecommender(model_path=model_path)
+    catalog = rec.catalog
+    n_profiles = int(np.prod([axis_size(axis) for axis in axes]))
+    n_formulas = len(catalog)
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    est_bytes = n_profiles * n_formulas * 2
+    logger.info(f"Building grid: {n_profiles} profiles x {n_formulas} formulas (~{est_bytes / 1e6:.1f} MB)")
+
+    good_prob = np.lib.format.open_memmap(output / GOOD_PROB_FILE, mode="w+", dtype=np.uint8, shape=(n_profiles, n_formulas))
+    labels = np.lib.format.open_memmap(output / LABELS_FILE, mode="w+", dtype=np.uint8, shape=(n_profiles, n_formulas))
+    del good_prob, labels
+
+    tasks = [
+        (str(output), axes, start, min(start + chunk_size, n_profiles))
+        for start in range(0, n_profiles, chunk_size)
+    ]
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    start_time = time.perf_counter()
+    done = 0
+    if n_jobs == 1:
+        _init_worker(model_path)
+        for task in tasks:
+            done += _score_chunk(task)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(model_path,)) as executor:
+            for written in executor.map(_score_chunk, tasks):
+                done += written
+                logger.info(f"Scored {done}/{n_profiles} profiles")
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"Grid scored in {elapsed:.1f}s ({n_profiles / max(elapsed, 1e-9):.0f} profiles/s)")
+
+    meta = {
+        "model_path": str(model_path),
+        "model_version": rec.model_version,
+        "formula_ids": [int(fid) for fid in catalog.formula_ids],
+        "classes": [str(c) for c in rec.label_encoder.classes_],
+        "axes": axes,
+        "prob_scale": PROB_SCALE,
+        "n_profiles": n_profiles,
+        "build_seconds": round(elapsed, 3),
+    }
+    (output / GRID_META_FILE).write_text(json.dumps(meta, indent=2))
+
+    grid = ProfileGrid.load(output)
+    meta["error_report"] = error_report(rec, grid, n_samples=n_samples)
+    (output / GRID_META_FILE).write_text(json.dumps(meta, indent=2))
+
+    return meta
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Precompute recommendation scores over a profile grid")
+    parser.add_argument("--model", default="models/trained/knn_v1_legacy.pkl", help="Model package path")
+    parser.add_argument("--output", default=None, help="Grid directory (default: <model>_grid next to the model)")
+    parser.add_argument("--data-dir", default="data/raw", help="Directory with feeding_logs.csv (grid bounds)")
+    parser.add_argument("--height-step", type=float, default=DEFAULT_STEPS["height_cm"], help="Height bucket (cm)")
+    parser.add_argument("--weight-step", type=float, default=DEFAULT_STEPS["weight_kg"], help="Weight bucket (kg)")
+    parser.add_argument("--feed-step", type=float, default=DEFAULT_STEPS["feed_ml_per_intake"], help="Feed bucket (ml)")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Profiles per task")
+    parser.add_argument("--error-samples", type=int, default=2000, help="Random profiles for the error report")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Build a grid from the command line"""
+    args = parse_args(argv)
+
+    logs = pd.read_csv(Path(args.data_dir) / "feeding_logs.csv")
+    axes = default_axes(logs, steps={
+        "height_cm": args.height_step,
+        "weight_kg": args.weight_step,
+        "feed_ml_per_intake": args.feed_step,
+    })
+
+    output = args.output or str(Path(args.model).with_suffix("")) + "_grid"
+    meta = build_grid(
+        args.model, output, axes,
+        n_jobs=args.n_jobs,
+        chunk_size=args.chunk_size,
+        n_samples=args.error_samples,
+    )
+
+    print("\n" + "=" * 60)
+    print(f"Profile grid saved to: {output}")
+    print("=" * 60)
+    print(json.dumps(meta["error_report"], indent=2))
+    print(f"\nServe with: PROFILE_GRID_PATH={output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
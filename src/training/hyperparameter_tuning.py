@@ -0,0 +1,424 @@
+"""
+Hyperparameter search and model comparison for Smart Bottle
+Cross-validates KNN settings and RF/XGBoost/LightGBM/ensemble candidates
+in parallel and ranks them by quality and inference latency (preprocessing
+plus estimator on raw rows, as served)
+
+Usage:
+    python -m src.training.hyperparameter_tuning --families knn rf --n-jobs 4
+"""
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import accuracy_score, balanced_accuracy_score, f1_score
+import joblib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.data.data_loader import (
+    SmartBottleDataLoader,
+    FEATURE_COLS,
+    NUMERIC_FEATURES,
+    CATEGORICAL_FEATURES,
+    TARGET_COL,
+)
+from src.evaluation.reference import build_reference
+from src.training.model_factory import build_preprocessor, build_pipeline, select_candidates
+from src.training.preprocessing_cache import PreprocessingCache, DEFAULT_CACHE_DIR, hash_frame
+
+logger = logging.getLogger(__name__)
+
+# Columns of the ranked comparison table
+REPORT_COLUMNS = [
+    "rank",
+    "name",
+    "family",
+    "scaling",
+    "f1_macro",
+    "f1_macro_std",
+    "accuracy",
+    "balanced_accuracy",
+    "fit_ms",
+    "batch_us_per_row",
+    "single_row_ms",
+]
+
+# Per-process state for pool workers
+_WORKER_FOLDS: Dict = {}
+_WORKER_CANDIDATES: List[Dict] = []
+_WORKER_LATENCY: Dict = {}
+
+
+def make_folds(
+    y: np.ndarray,
+    n_splits: int = 5,
+    random_state: int = 42
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Stratified train/validation fold indices
+
+    Args:
+        y: Encoded target
+        n_splits: Number of folds
+        random_state: Shuffle seed
+
+    Returns:
+        List of (train_idx, val_idx)
+    """
+    skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    return list(skf.split(np.zeros(len(y)), y))
+
+
+def preprocess_folds(
+    X: pd.DataFrame,
+    y: np.ndarray,
+    folds: List[Tuple[np.ndarray, np.ndarray]],
+    scalings: List[str],
+    cache: Optional[PreprocessingCache] = None
+) -> Dict[Tuple[str, int], Tuple]:
+    """
+    Fit the preprocessor once per (scaling, fold)
+
+    Args:
+        X: Raw features
+        y: Encoded target
+        folds: Fold indices from make_folds
+        scalings: Scaler names used by the candidates
+        cache: Preprocessing cache reused across runs (optional)
+
+    Returns:
+        Dict (scaling, fold) -> (X_train, y_train, X_val, y_val) transformed
+    """
+    cache = cache or PreprocessingCache(cache_dir=None)
+    data_hash = hash_frame(X, y)
+
+    fold_cache = {}
+    for scaling in scalings:
+        for fold_idx, (train_idx, val_idx) in enumerate(folds):
+            fold_cache[(scaling, fold_idx)] = cache.transform_fold(
+                build_preprocessor(scaling), X, y, train_idx, val_idx,
+                data_hash=data_hash,
+            )
+
+    logger.info(
+        f"Preprocessed {len(fold_cache)} folds ({len(scalings)} scalings x {len(folds)} folds), "
+        f"cache hits: {cache.hits}, misses: {cache.misses}"
+    )
+    return fold_cache
+
+
+def latency_inputs(
+    X: pd.DataFrame,
+    folds: List[Tuple[np.ndarray, np.ndarray]],
+    scalings: List[str]
+) -> Dict:
+    """
+    Raw validation rows and fitted preprocessors for latency timing
+
+    Folds are fitted on preprocessed arrays (cached), but serving pays for
+    the ColumnTransformer on every request, so latency is timed from raw
+    rows. The preprocessors are only used for timing and are fitted once
+    per scaling on all rows.
+
+    Returns:
+        Dict with "preprocessors" (scaling -> fitted ColumnTransformer) and
+        "val" (fold -> raw validation DataFrame)
+    """
+    return {
+        "preprocessors": {scaling: build_preprocessor(scaling).fit(X) for scaling in scalings},
+        "val": {fold_idx: X.iloc[val_idx] for fold_idx, (_, val_idx) in enumerate(folds)},
+    }
+
+
+def _init_worker(fold_cache: Dict, candidates: List[Dict], latency: Dict):
+    """Install shared folds, candidates and latency inputs in a pool worker"""
+    global _WORKER_FOLDS, _WORKER_CANDIDATES, _WORKER_LATENCY
+    _WORKER_FOLDS = fold_cache
+    _WORKER_CANDIDATES = candidates
+    _WORKER_LATENCY = latency
+
+
+def _measure_latency(preprocessor, estimator, X_raw: pd.DataFrame, repeats: int) -> Tuple[float, float]:
+    """
+    Measure end-to-end inference latency on raw rows
+    (preprocessor transform plus estimator predict_proba)
+
+    Returns:
+        (batch microseconds per row, median single-row milliseconds)
+    """
+    start = time.perf_counter()
+    estimator.predict_proba(preprocessor.transform(X_raw))
+    batch_us_per_row = (time.perf_counter() - start) * 1e6 / len(X_raw)
+
+    single = []
+    for i in range(min(repeats, len(X_raw))):
+        row = X_raw.iloc[i:i + 1]
+        start = time.perf_counter()
+        estimator.predict_proba(preprocessor.transform(row))
+        single.append((time.perf_counter() - start) * 1e3)
+
+    return batch_us_per_row, float(np.median(single))
+
+
+def _evaluate_task(task: Tuple[int, int, int]) -> Dict:
+    """
+    Fit and score one candidate on one fold (runs in a pool worker)
+
+    Args:
+        task: (candidate index, fold index, latency repeats)
+
+    Returns:
+        Fold metrics dictionary
+    """
+    cand_idx, fold_idx, repeats = task
+    candidate = _WORKER_CANDIDATES[cand_idx]
+    X_train, y_train, X_val, y_val = _WORKER_FOLDS[(candidate["scaling"], fold_idx)]
+
+    estimator = clone(candidate["estimator"])
+
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_ms = (time.perf_counter() - start) * 1e3
+
+    y_pred = estimator.predict(X_val)
+    batch_us_per_row, single_row_ms = _measure_latency(
+        _WORKER_LATENCY["preprocessors"][candidate["scaling"]], estimator,
+        _WORKER_LATENCY["val"][fold_idx], repeats,
+    )
+
+    return {
+        "candidate": cand_idx,
+        "fold": fold_idx,
+        "accuracy": accuracy_score(y_val, y_pred),
+        "balanced_accuracy": balanced_accuracy_score(y_val, y_pred),
+        "f1_macro": f1_score(y_val, y_pred, average="macro", zero_division=0),
+        "fit_ms": fit_ms,
+        "batch_us_per_row": batch_us_per_row,
+        "single_row_ms": single_row_ms,
+    }
+
+
+def run_search(
+    X: pd.DataFrame,
+    y: np.ndarray,
+    candidates: List[Dict],
+    n_splits: int = 5,
+    n_jobs: Optional[int] = None,
+    latency_repeats: int = 20,
+    random_state: int = 42,
+    rank_by: str = "f1_macro",
+    cache: Optional[PreprocessingCache] = None
+) -> pd.DataFrame:
+    """
+    Cross-validate all candidates and build a ranked comparison table
+
+    Args:
+        X: Raw features
+        y: Encoded target
+        candidates: Candidates from select_candidates
+        n_splits: Number of CV folds
+        n_jobs: Worker processes (default: CPU count, 1 runs inline)
+        latency_repeats: Single-row latency samples per fold
+        random_state: Fold shuffle seed
+        rank_by: Metric to rank by (higher is better)
+        cache: Preprocessing cache (optional)
+
+    Returns:
+        Ranked comparison DataFrame (REPORT_COLUMNS)
+    """
+    folds = make_folds(y, n_splits=n_splits, random_state=random_state)
+    scalings = sorted({c["scaling"] for c in candidates})
+    fold_cache = preprocess_folds(X, y, folds, scalings, cache=cache)
+    latency = latency_inputs(X, folds, scalings)
+
+    tasks = [
+        (cand_idx, fold_idx, latency_repeats)
+        for cand_idx in range(len(candidates))
+        for fold_idx in range(len(folds))
+    ]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    logger.info(f"Running {len(tasks)} fits on {n_jobs} worker(s)")
+
+    start = time.perf_counter()
+    if n_jobs == 1:
+        _init_worker(fold_cache, candidates, latency)
+        fold_results = [_evaluate_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(fold_cache, candidates, latency),
+        ) as executor:
+            fold_results = list(executor.map(_evaluate_task, tasks, chunksize=max(1, len(tasks) // (n_jobs * 4))))
+    logger.info(f"Search finished in {time.perf_counter() - start:.1f}s")
+
+    per_fold = pd.DataFrame(fold_results)
+    summary = per_fold.groupby("candidate").agg(
+        f1_macro=("f1_macro", "mean"),
+        f1_macro_std=("f1_macro", "std"),
+        accuracy=("accuracy", "mean"),
+        balanced_accuracy=("balanced_accuracy", "mean"),
+        fit_ms=("fit_ms", "median"),
+        batch_us_per_row=("batch_us_per_row", "median"),
+        single_row_ms=("single_row_ms", "median"),
+    )
+    summary["name"] = [candidates[i]["name"] for i in summary.index]
+    summary["family"] = [candidates[i]["family"] for i in summary.index]
+    summary["scaling"] = [candidates[i]["scaling"] for i in summary.index]
+
+    # Ties on quality go to the faster model
+    summary = summary.sort_values([rank_by, "single_row_ms"], ascending=[False, True])
+    summary["rank"] = np.arange(1, len(summary) + 1)
+    summary["candidate"] = summary.index
+
+    return summary.reset_index(drop=True)[REPORT_COLUMNS + ["candidate"]]
+
+
+def save_model(
+    candidate: Dict,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    label_encoder: LabelEncoder,
+    output_path: str,
+    cv_metrics: Optional[Dict] = None,
+    train_log_ids: Optional[np.ndarray] = None
+) -> str:
+    """
+    Refit a candidate on all data and save a model package
+
+    Args:
+        candidate: Candidate dict
+        X: Raw features
+        y: Encoded target
+        label_encoder: Fitted target encoder
+        output_path: Pickle path
+        cv_metrics: Cross-validation metrics to store in the package
+        train_log_ids: Feeding log id of each row of X (neighbor explanations)
+
+    Returns:
+        Output path
+    """
+    clf = build_pipeline(clone(candidate["estimator"]), scaling=candidate["scaling"])
+    clf.fit(X, y)
+
+    model_package = {
+        "model_pipeline": clf,
+        "label_encoder": label_encoder,
+        "feature_cols": FEATURE_COLS,
+        "numeric_features": NUMERIC_FEATURES,
+        "categorical_features": CATEGORICAL_FEATURES,
+        "target_col": TARGET_COL,
+        "model_name": candidate["name"],
+        "cv_metrics": cv_metrics or {},
+        # Training distribution for the serving drift monitor
+        "reference_stats": build_reference(X, clf.predict_proba, label_encoder.classes_),
+    }
+    if train_log_ids is not None:
+        model_package["train_log_ids"] = np.asarray(train_log_ids, dtype=np.int64)
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model_package, output_path)
+    logger.info(f"Model saved to: {output_path}")
+    return output_path
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Hyperparameter search and model comparison")
+    parser.add_argument("--data-dir", default="data/raw", help="Directory with feeding_logs.csv and formula_master.csv")
+    parser.add_argument("--families", nargs="+", default=None,
+                        choices=["knn", "rf", "xgb", "lgbm", "ensemble"],
+                        help="Model families to compare (default: all available)")
+    parser.add_argument("--search", default="grid", choices=["grid", "random"], help="KNN search mode")
+    parser.add_argument("--n-iter", type=int, default=20, help="KNN random search iterations")
+    parser.add_argument("--cv", type=int, default=5, help="Number of CV folds")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--latency-repeats", type=int, default=20, help="Single-row latency samples per fold")
+    parser.add_argument("--rank-by", default="f1_macro",
+                        choices=["f1_macro", "accuracy", "balanced_accuracy"], help="Ranking metric")
+    parser.add_argument("--random-state", type=int, default=42, help="Random seed")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Preprocessing cache directory")
+    parser.add_argument("--cache-max-mb", type=int, default=2048, help="Preprocessing cache disk bound (MB)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not persist preprocessed folds")
+    parser.add_argument("--report", default=None, help="Write comparison table to this CSV path")
+    parser.add_argument("--save-best", default=None,
+                        help="Refit the top-ranked candidate on all data and save it to this .pkl path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the search from the command line"""
+    args = parse_args(argv)
+
+    loader = SmartBottleDataLoader(data_dir=args.data_dir)
+    X, y_raw = loader.prepare_training_data()
+
+    label_encoder = LabelEncoder()
+    y = label_encoder.fit_transform(y_raw)
+
+    candidates = select_candidates(
+        families=args.families,
+        search=args.search,
+        n_iter=args.n_iter,
+        random_state=args.random_state,
+    )
+    if not candidates:
+        raise SystemExit("No candidates to evaluate")
+
+    cache = PreprocessingCache(
+        cache_dir=None if args.no_cache else args.cache_dir,
+        max_disk_bytes=args.cache_max_mb * 1024 ** 2,
+    )
+
+    report = run_search(
+        X, y, candidates,
+        n_splits=args.cv,
+        n_jobs=args.n_jobs,
+        latency_repeats=args.latency_repeats,
+        random_state=args.random_state,
+        rank_by=args.rank_by,
+        cache=cache,
+    )
+
+    print("\n" + "=" * 60)
+    print("Model Comparison")
+    print("=" * 60)
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        print(report[REPORT_COLUMNS].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    if args.report:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        report[REPORT_COLUMNS].to_csv(args.report, index=False)
+        print(f"\nReport saved to: {args.report}")
+
+    if args.save_best:
+        best = report.iloc[0]
+        save_model(
+            candidates[int(best["candidate"])],
+            X, y, label_encoder,
+            args.save_best,
+            cv_metrics=best[REPORT_COLUMNS].to_dict(),
+            train_log_ids=loader.feeding_logs_df["log_id"].to_numpy()[X.index],
+        )
+        print(f"Best model ({best['name']}) saved to: {args.save_best}")
+
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
@@ -0,0 +1,542 @@
+"""
+Matrix factorization (collaborative filtering) for formula tolerance
+Builds a sparse baby x formula rating matrix from feeding logs and fits
+biased factors with alternating least squares; serving scores a baby as a
+dot product against the stored formula factors (see
+api/services/cf_recommender.py)
+
+Ratings: good = 1.0, moderate = 0.5, poor = 0.0 (repeated logs of the
+same pair are averaged). Prediction for baby u and formula i:
+
+    mu + b_u + c_i + p_u . q_i
+
+Predicted ratings are not probabilities: an isotonic map from predicted
+rating to the share of 'good' logs, fit on held-out ratings, is stored
+with the factors so serving reports P(good) on the same scale as the
+classifiers.
+
+Usage:
+    # Factors need several rated formulas per baby
+    python -m src.data.synthetic --rows 300000 --logs-per-baby 15 --combine --out data/synthetic/cf
+    python -m src.training.matrix_factorization --data-dir data/synthetic/cf \
+        --out models/trained/cf_als_v1.pkl --fallback knn_v1_legacy.pkl
+    # Scored on the logs left out of training (the default evaluate.py split)
+    python -m src.evaluation.evaluate --model models/trained/cf_als_v1.pkl --data-dir data/synthetic/cf
+"""
+import argparse
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy import sparse
+from sklearn.isotonic import IsotonicRegression
+from pathlib import Path
+import logging
+from typing import Dict, List, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.data.data_loader import SmartBottleDataLoader, TARGET_COL, split_logs
+from src.data.validation import DEFAULT_QUARANTINE_PATH, validate_feeding_logs
+
+logger = logging.getLogger(__name__)
+
+MODEL_TYPE = "matrix_factorization"
+
+TOLERANCE_RATINGS = {"good": 1.0, "moderate": 0.5, "poor": 0.0}
+
+# Calibration target: share of a pair's logs rated good
+GOOD_RATINGS = {"good": 1.0, "moderate": 0.0, "poor": 0.0}
+
+# Ratings per solve block (bounds the n x d x d Gram tensor)
+BLOCK_NNZ = 1 << 14
+
+
+def build_rating_matrix(
+    logs: pd.DataFrame,
+    formula_ids: Optional[np.ndarray] = None,
+    rating_values: Dict[str, float] = TOLERANCE_RATINGS
+) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """
+    Sparse baby x formula matrix of mean tolerance ratings
+
+    Args:
+        logs: Feeding logs with baby_id, formula_id and overall_tolerance
+        formula_ids: Formula columns (default: formulas in the logs); every
+            catalog formula should be listed so unrated ones get a column
+        rating_values: Rating of each tolerance label
+
+    Returns:
+        (CSR ratings, sorted baby ids, sorted formula ids)
+    """
+    ratings = logs[TARGET_COL].map(rating_values)
+    if formula_ids is None:
+        formula_ids = logs["formula_id"].to_numpy()
+    formula_ids = np.unique(np.asarray(formula_ids, dtype=np.int64))
+
+    formulas = logs["formula_id"].to_numpy(dtype=np.int64)
+    known = ratings.notna().to_numpy() & np.isin(formulas, formula_ids)
+    if not known.all():
+        logger.warning(f"Ignoring {int((~known).sum())} logs with unknown tolerance or formula")
+
+    baby_ids, rows = np.unique(logs["baby_id"].to_numpy(dtype=np.int64)[known], return_inverse=True)
+    cols = np.searchsorted(formula_ids, formulas[known])
+    shape = (len(baby_ids), len(formula_ids))
+
+    # Sum and count duplicates, then average
+    totals = sparse.coo_matrix((ratings.to_numpy()[known], (rows, cols)), shape=shape).tocsr()
+    counts = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=shape).tocsr()
+    totals.sum_duplicates()
+    counts.sum_duplicates()
+    totals.data /= counts.data
+    return totals, baby_ids, formula_ids
+
+
+def _blocks(indptr: np.ndarray, block_nnz: int) -> List[Tuple[int, int]]:
+    """Row ranges holding about block_nnz ratings each (larger rows alone)"""
+    n = len(indptr) - 1
+    bounds = np.searchsorted(indptr, np.arange(0, indptr[-1], block_nnz), side="right") - 1
+    large = np.flatnonzero(np.diff(indptr) > block_nnz)
+    bounds = np.unique(np.concatenate([[0], bounds, large, large + 1, [n]]))
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _solve_rows(
+    matrix: sparse.csr_matrix,
+    residual: np.ndarray,
+    design: np.ndarray,
+    penalty: np.ndarray,
+    out: np.ndarray,
+    start: int,
+    stop: int
+):
+    """
+    Regularized least squares for rows start..stop of one side
+
+    Row u solves (X_u' X_u + diag(n_u * reg, ..., n_u * reg, bias_reg)) w_u
+    = X_u' r_u, where X_u are the design rows of the entities it rated
+    and r_u the residual ratings; penalty holds (reg, bias_reg). Rows
+    without ratings keep zeros.
+    """
+    indptr = matrix.indptr
+    lo, hi = indptr[start], indptr[stop]
+    if hi == lo:
+        return
+    counts = np.diff(indptr[start:stop + 1])
+    rated = counts > 0
+    d = design.shape[1]
+    X = design[matrix.indices[lo:hi]]
+    r = residual[lo:hi]
+
+    if stop - start == 1:
+        # One (possibly very popular) row: plain normal equations
+        A = (X.T @ X)[None]
+        b = (X.T @ r)[None]
+    else:
+        starts = (indptr[start:stop] - lo)[rated]
+        A = np.add.reduceat(X[:, :, None] * X[:, None, :], starts, axis=0)
+        b = np.add.reduceat(X * r[:, None], starts, axis=0)
+
+    reg, bias_reg = penalty
+    factor_diag = np.r_[np.ones(d - 1), 0.0]
+    A += reg * counts[rated][:, None, None] * np.diag(factor_diag)
+    A += bias_reg * np.diag(1.0 - factor_diag)
+    out[start:stop][rated] = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+
+
+def _half_epoch(
+    matrix: sparse.csr_matrix,
+    residual: np.ndarray,
+    design: np.ndarray,
+    penalty: np.ndarray,
+    pool: Optional[ThreadPoolExecutor],
+    blocks: List[Tuple[int, int]]
+) -> np.ndarray:
+    """Solve every row of one side (blocks in parallel; numpy releases the GIL)"""
+    out = np.zeros((matrix.shape[0], design.shape[1]))
+    if pool is None:
+        for start, stop in blocks:
+            _solve_rows(matrix, residual, design, penalty, out, start, stop)
+    else:
+        for future in [pool.submit(_solve_rows, matrix, residual, design, penalty, out, a, b) for a, b in blocks]:
+            future.result()
+    return out
+
+
+def predict_pairs(model: Dict, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """Predicted ratings of (baby row, formula column) pairs"""
+    return (
+        model["global_mean"]
+        + model["baby_bias"][rows]
+        + model["formula_bias"][cols]
+        + np.einsum("nk,nk->n", model["baby_factors"][rows], model["formula_factors"][cols])
+    )
+
+
+def rmse(model: Dict, matrix: sparse.csr_matrix) -> float:
+    """Root mean squared error on the stored ratings of a matrix"""
+    coo = matrix.tocoo()
+    if coo.nnz == 0:
+        return float("nan")
+    errors = predict_pairs(model, coo.row, coo.col) - coo.data
+    return float(np.sqrt(np.mean(errors ** 2)))
+
+
+def train_als(
+    matrix: sparse.csr_matrix,
+    n_factors: int = 16,
+    reg: float = 0.05,
+    n_epochs: int = 15,
+    n_threads: Optional[int] = None,
+    seed: int = 42,
+    holdout: Optional[sparse.csr_matrix] = None,
+    bias_reg: float = 20.0
+) -> Dict:
+    """
+    Fit biased factors by alternating least squares
+
+    Each half-epoch solves one ridge regression per baby (or formula)
+    against the other side's factors plus a constant column, which gives
+    the bias. Rows are solved in blocks of about BLOCK_NNZ ratings on a
+    thread pool.
+
+    The factor penalty grows with the row's ratings (ALS-WR); the bias
+    penalty does not, so well-rated formulas keep their full mean offset
+    while the bias of a baby with a few ratings is shrunk.
+
+    Args:
+        matrix: Baby x formula ratings (CSR)
+        n_factors: Latent dimensions
+        reg: Factor ridge penalty per rating (ALS-WR)
+        n_epochs: Baby + formula update rounds
+        n_threads: Solver threads (default: CPUs available)
+        seed: Initialization seed
+        holdout: Ratings to report RMSE on each epoch (same shape)
+        bias_reg: Ridge penalty of each bias (not scaled by ratings)
+
+    Returns:
+        Dictionary with global_mean, baby/formula factors and biases, and
+        the per-epoch history
+    """
+    n_babies, n_formulas = matrix.shape
+    rng = np.random.default_rng(seed)
+    matrix = matrix.tocsr()
+    by_formula = matrix.T.tocsr()
+    mu = float(matrix.data.mean())
+
+    baby_coo = matrix.tocoo()
+
+    model = {
+        "global_mean": mu,
+        "baby_factors": np.zeros((n_babies, n_factors)),
+        "baby_bias": np.zeros(n_babies),
+        "formula_factors": rng.normal(0.0, 0.1, (n_formulas, n_factors)),
+        "formula_bias": np.zeros(n_formulas),
+    }
+
+    if n_threads is None:
+        try:
+            n_threads = len(os.sched_getaffinity(0))
+        except AttributeError:
+            n_threads = os.cpu_count() or 1
+    pool = ThreadPoolExecutor(max_workers=n_threads, thread_name_prefix="als") if n_threads > 1 else None
+    baby_blocks = _blocks(matrix.indptr, BLOCK_NNZ)
+    formula_blocks = _blocks(by_formula.indptr, BLOCK_NNZ)
+    penalty = np.array([reg, bias_reg])
+
+    history = []
+    try:
+        for epoch in range(1, n_epochs + 1):
+            start = time.perf_counter()
+
+            # Babies: regress (r - mu - c_i) on [q_i, 1]
+            design = np.hstack([model["formula_factors"], np.ones((n_formulas, 1))])
+            residual = matrix.data - mu - model["formula_bias"][matrix.indices]
+            solution = _half_epoch(matrix, residual, design, penalty, pool, baby_blocks)
+            model["baby_factors"], model["baby_bias"] = solution[:, :-1], solution[:, -1]
+
+            # Formulas: regress (r - mu - b_u) on [p_u, 1]
+            design = np.hstack([model["baby_factors"], np.ones((n_babies, 1))])
+            residual = by_formula.data - mu - model["baby_bias"][by_formula.indices]
+            solution = _half_epoch(by_formula, residual, design, penalty, pool, formula_blocks)
+            model["formula_factors"], model["formula_bias"] = solution[:, :-1], solution[:, -1]
+
+            errors = predict_pairs(model, baby_coo.row, baby_coo.col) - baby_coo.data
+            entry = {
+                "epoch": epoch,
+                "train_rmse": float(np.sqrt(np.mean(errors ** 2))),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            if holdout is not None:
+                entry["holdout_rmse"] = rmse(model, holdout)
+            history.append(entry)
+            logger.info(
+                f"ALS epoch {epoch}/{n_epochs}: train RMSE {entry['train_rmse']:.4f}"
+                + (f", holdout RMSE {entry['holdout_rmse']:.4f}" if holdout is not None else "")
+                + f" ({entry['seconds']:.2f}s)"
+            )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    model["history"] = history
+    return model
+
+
+def baseline_rmse(train: sparse.csr_matrix, holdout: sparse.csr_matrix) -> Dict[str, float]:
+    """
+    Holdout RMSE of non-personalized predictions
+
+    Returns:
+        Dictionary with "global_mean" (mean training rating) and
+        "formula_mean" (each formula's mean training rating, the global
+        mean for formulas without one)
+    """
+    mu = train.data.mean()
+    counts = train.getnnz(axis=0)
+    totals = np.asarray(train.sum(axis=0)).ravel()
+    formula_mean = np.where(counts > 0, totals / np.maximum(counts, 1), mu)
+    coo = holdout.tocoo()
+    return {
+        "global_mean": float(np.sqrt(np.mean((coo.data - mu) ** 2))),
+        "formula_mean": float(np.sqrt(np.mean((coo.data - formula_mean[coo.col]) ** 2))),
+    }
+
+
+def split_ratings(
+    matrix: sparse.csr_matrix,
+    test_size: float = 0.1,
+    seed: int = 42
+) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+    """
+    Random holdout of ratings, keeping at least one rating per baby in train
+
+    Returns:
+        (train, holdout) matrices of the same shape
+    """
+    coo = matrix.tocoo()
+    rng = np.random.default_rng(seed)
+    test = rng.random(coo.nnz) < test_size
+
+    # Babies whose every rating was drawn keep their first one
+    counts = np.bincount(coo.row, minlength=matrix.shape[0])
+    test_counts = np.bincount(coo.row, weights=test, minlength=matrix.shape[0])
+    emptied = test_counts == counts
+    first = np.unique(coo.row, return_index=True)[1]
+    test[first[emptied[coo.row[first]]]] = False
+
+    def part(mask):
+        return sparse.csr_matrix((coo.data[mask], (coo.row[mask], coo.col[mask])), shape=matrix.shape)
+
+    return part(~test), part(test)
+
+
+def fit_calibration(model: Dict, holdout: sparse.csr_matrix, good: sparse.csr_matrix) -> Dict:
+    """
+    Isotonic map from predicted rating to P(good), fit on held-out ratings
+
+    Args:
+        model: Factors trained without the holdout
+        holdout: Held-out ratings
+        good: Share of good logs per pair (same shape, covers the holdout)
+
+    Returns:
+        Dictionary with increasing "ratings" knots and their
+        "good_probabilities" (np.interp between knots, clipped outside)
+    """
+    coo = holdout.tocoo()
+    predicted = predict_pairs(model, coo.row, coo.col)
+    target = np.asarray(good[coo.row, coo.col]).ravel()
+    isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip").fit(predicted, target)
+    return {
+        "ratings": isotonic.X_thresholds_.astype(np.float64),
+        "good_probabilities": isotonic.y_thresholds_.astype(np.float64),
+    }
+
+
+def good_probabilities(calibration: Dict, ratings: np.ndarray) -> np.ndarray:
+    """P(good) of predicted ratings through a fit_calibration map"""
+    return np.interp(ratings, calibration["ratings"], calibration["good_probabilities"])
+
+
+def build_package(
+    model: Dict,
+    matrix: sparse.csr_matrix,
+    baby_ids: np.ndarray,
+    formula_ids: np.ndarray,
+    params: Dict,
+    fallback_model: str,
+    calibration: Dict,
+    metrics: Optional[Dict] = None
+) -> Dict:
+    """Model package for CFRecommender (float32 factors)"""
+    return {
+        "model_type": MODEL_TYPE,
+        "model_name": "als",
+        "params": params,
+        "ratings": TOLERANCE_RATINGS,
+        "global_mean": model["global_mean"],
+        "baby_ids": baby_ids,
+        "baby_factors": model["baby_factors"].astype(np.float32),
+        "baby_bias": model["baby_bias"].astype(np.float32),
+        "baby_counts": np.diff(matrix.indptr).astype(np.int32),
+        "formula_ids": formula_ids,
+        "formula_factors": model["formula_factors"].astype(np.float32),
+        "formula_bias": model["formula_bias"].astype(np.float32),
+        "formula_counts": np.asarray(matrix.getnnz(axis=0), dtype=np.int32),
+        # Predicted rating -> P(good) (see fit_calibration)
+        "calibration": calibration,
+        # KNN package (file name, resolved next to this package) for cold starts
+        "fallback_model": fallback_model,
+        "metrics": metrics or {},
+        "history": model.get("history", []),
+    }
+
+
+def train_from_data(
+    data_dir: str = "data/raw",
+    n_factors: int = 16,
+    reg: float = 0.05,
+    n_epochs: int = 15,
+    test_size: float = 0.1,
+    n_threads: Optional[int] = None,
+    seed: int = 42,
+    fallback_model: str = "knn_v1_legacy.pkl",
+    bias_reg: float = 20.0,
+    eval_size: float = 0.2,
+    quarantine_path: Optional[str] = DEFAULT_QUARANTINE_PATH
+) -> Dict:
+    """
+    Train a CF model package from a data directory
+
+    The eval_size share of feeding logs (the split evaluate.py holds out
+    by default) is left out entirely, and the rest goes through
+    validate_feeding_logs like every other trainer. Within those ratings,
+    the holdout RMSE is measured first and the held-out predictions fit
+    the P(good) calibration; the stored factors are then refit on all of
+    them. A holdout needs babies with more than one rated formula (every
+    baby keeps one rating in train).
+
+    Args:
+        data_dir: Directory with feeding_logs.csv and formula_master.csv
+        n_factors, reg, n_epochs, n_threads, seed, bias_reg: See train_als
+        test_size: Share of ratings held out for evaluation and calibration
+        fallback_model: KNN package used for cold-start babies
+        eval_size: Share of logs kept for src.evaluation.evaluate (0 to
+            train on every log)
+        quarantine_path: CSV for rejected logs (None to skip writing)
+
+    Returns:
+        Model package
+
+    Raises:
+        ValueError: If test_size is not positive or no rating could be
+            held out
+    """
+    if test_size <= 0:
+        raise ValueError("test_size must be > 0: held-out ratings calibrate P(good)")
+
+    loader = SmartBottleDataLoader(data_dir=data_dir)
+    formula_df, logs = loader.load_data()
+    if eval_size > 0:
+        logs, _ = split_logs(logs, test_size=eval_size)
+    logs, validation_report = validate_feeding_logs(logs, formula_df["formula_id"], quarantine_path=quarantine_path)
+
+    formula_ids = formula_df["formula_id"].to_numpy()
+    matrix, baby_ids, formula_ids = build_rating_matrix(logs, formula_ids)
+    good, _, _ = build_rating_matrix(logs, formula_ids, GOOD_RATINGS)
+    logger.info(
+        f"Rating matrix: {matrix.shape[0]} babies x {matrix.shape[1]} formulas, "
+        f"{matrix.nnz} ratings ({matrix.nnz / max(np.prod(matrix.shape), 1):.4%} dense)"
+    )
+
+    params = {
+        "n_factors": n_factors,
+        "reg": reg,
+        "bias_reg": bias_reg,
+        "n_epochs": n_epochs,
+        "seed": seed,
+        "eval_size": eval_size,
+    }
+    metrics = {
+        "n_babies": int(matrix.shape[0]),
+        "n_formulas": int(matrix.shape[1]),
+        "n_ratings": int(matrix.nnz),
+        "logs_quarantined": int(validation_report["quarantined"]),
+        "logs_duplicate": int(validation_report["duplicates"]),
+    }
+
+    ratings_per_baby = matrix.nnz / max(matrix.shape[0], 1)
+    if ratings_per_baby < 2:
+        logger.warning(
+            f"Only {ratings_per_baby:.2f} rated formulas per baby: baby factors can only memorize "
+            "single ratings (generate data with src.data.synthetic --logs-per-baby > 1)"
+        )
+
+    train, holdout = split_ratings(matrix, test_size, seed)
+    if holdout.nnz == 0:
+        raise ValueError(
+            "No ratings could be held out: every baby has a single rated formula. "
+            "Use data with several formulas per baby (src.data.synthetic --logs-per-baby > 1)"
+        )
+    evaluation = train_als(train, n_factors, reg, n_epochs, n_threads, seed, holdout=holdout, bias_reg=bias_reg)
+    calibration = fit_calibration(evaluation, holdout, good)
+    metrics.update({
+        "holdout_rmse": evaluation["history"][-1]["holdout_rmse"],
+        **{f"holdout_rmse_{name}": value for name, value in baseline_rmse(train, holdout).items()},
+        "holdout_ratings": int(holdout.nnz),
+    })
+
+    model = train_als(matrix, n_factors, reg, n_epochs, n_threads, seed, bias_reg=bias_reg)
+    metrics["train_rmse"] = model["history"][-1]["train_rmse"]
+    return build_package(model, matrix, baby_ids, formula_ids, params, fallback_model, calibration, metrics)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Train an ALS collaborative-filtering model")
+    parser.add_argument("--data-dir", default="data/raw", help="Directory with feeding_logs.csv and formula_master.csv")
+    parser.add_argument("--out", default="models/trained/cf_als_v1.pkl", help="Model package path")
+    parser.add_argument("--fallback", default="knn_v1_legacy.pkl", help="KNN package for cold-start babies (same directory)")
+    parser.add_argument("--factors", type=int, default=16, help="Latent dimensions")
+    parser.add_argument("--reg", type=float, default=0.05, help="Factor ridge penalty per rating")
+    parser.add_argument("--bias-reg", type=float, default=20.0, help="Bias ridge penalty")
+    parser.add_argument("--epochs", type=int, default=15, help="ALS epochs")
+    parser.add_argument("--test-size", type=float, default=0.1, help="Holdout share for evaluation and P(good) calibration")
+    parser.add_argument("--threads", type=int, default=None, help="Solver threads (default: CPU count)")
+    parser.add_argument("--eval-size", type=float, default=0.2,
+                        help="Share of logs left out for src.evaluation.evaluate (0 to train on all)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Train and save from the command line"""
+    args = parse_args(argv)
+    package = train_from_data(
+        args.data_dir,
+        n_factors=args.factors,
+        reg=args.reg,
+        n_epochs=args.epochs,
+        test_size=args.test_size,
+        n_threads=args.threads,
+        seed=args.seed,
+        fallback_model=args.fallback,
+        bias_reg=args.bias_reg,
+        eval_size=args.eval_size,
+    )
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(package, args.out)
+    print(f"Model saved to {args.out}: {package['metrics']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
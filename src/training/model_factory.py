@@ -0,0 +1,237 @@
+"""
+Model factory for Smart Bottle training
+Builds preprocessing pipelines and candidate classifiers
+"""
+from sklearn.preprocessing import (
+    StandardScaler,
+    MinMaxScaler,
+    RobustScaler,
+    OneHotEncoder,
+)
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from src.data.data_loader import NUMERIC_FEATURES, CATEGORICAL_FEATURES
+
+logger = logging.getLogger(__name__)
+
+SCALERS = {
+    "standard": StandardScaler,
+    "minmax": MinMaxScaler,
+    "robust": RobustScaler,
+    "none": None,
+}
+
+# KNN search space
+KNN_PARAM_GRID = {
+    "n_neighbors": [3, 5, 7, 9, 11, 15],
+    "weights": ["uniform", "distance"],
+    "metric": ["euclidean", "manhattan"],
+    "scaling": ["standard", "minmax", "robust"],
+}
+
+
+def build_preprocessor(scaling: str = "standard") -> ColumnTransformer:
+    """
+    Build the feature preprocessing stage
+
+    Args:
+        scaling: Numeric scaler name from SCALERS
+
+    Returns:
+        Unfitted ColumnTransformer
+    """
+    if scaling not in SCALERS:
+        raise ValueError(f"Unknown scaling: {scaling} (choose from {list(SCALERS)})")
+
+    scaler = SCALERS[scaling]
+    numeric_transformer = "passthrough" if scaler is None else Pipeline(steps=[("scaler", scaler())])
+    categorical_transformer = Pipeline(steps=[("onehot", OneHotEncoder(handle_unknown="ignore"))])
+
+    return ColumnTransformer(
+        transformers=[
+            ("num", numeric_transformer, NUMERIC_FEATURES),
+            ("cat", categorical_transformer, CATEGORICAL_FEATURES),
+        ]
+    )
+
+
+def _xgboost_classifier(random_state: int):
+    """XGBoost classifier, or None if xgboost is not installed"""
+    try:
+        from xgboost import XGBClassifier
+    except ImportError:
+        logger.warning("xgboost not installed, skipping XGBoost candidates")
+        return None
+
+    return XGBClassifier(
+        n_estimators=100,
+        max_depth=6,
+        random_state=random_state,
+        n_jobs=1,
+    )
+
+
+def _lightgbm_classifier(random_state: int):
+    """LightGBM classifier, or None if lightgbm is not installed"""
+    try:
+        from lightgbm import LGBMClassifier
+    except ImportError:
+        logger.warning("lightgbm not installed, skipping LightGBM candidates")
+        return None
+
+    return LGBMClassifier(
+        n_estimators=100,
+        max_depth=8,
+        class_weight="balanced",
+        random_state=random_state,
+        n_jobs=1,
+        verbose=-1,
+    )
+
+
+def build_knn_candidates(
+    search: str = "grid",
+    n_iter: int = 20,
+    random_state: int = 42
+) -> List[Dict]:
+    """
+    Build KNN candidates from KNN_PARAM_GRID
+
+    Args:
+        search: "grid" for the full grid, "random" for sampled settings
+        n_iter: Number of sampled settings for random search
+        random_state: Random seed for random search
+
+    Returns:
+        List of candidate dicts (name, family, scaling, estimator)
+    """
+    if search == "grid":
+        settings = list(ParameterGrid(KNN_PARAM_GRID))
+    elif search == "random":
+        settings = list(ParameterSampler(KNN_PARAM_GRID, n_iter=n_iter, random_state=random_state))
+    else:
+        raise ValueError(f"Unknown search: {search}")
+
+    candidates = []
+    for params in settings:
+        params = dict(params)
+        scaling = params.pop("scaling")
+        name = "knn_k{n_neighbors}_{weights}_{metric}".format(**params) + f"_{scaling}"
+        candidates.append({
+            "name": name,
+            "family": "knn",
+            "scaling": scaling,
+            "params": params,
+            "estimator": KNeighborsClassifier(**params),
+        })
+
+    return candidates
+
+
+def build_model_candidates(random_state: int = 42) -> List[Dict]:
+    """
+    Build RF / XGBoost / LightGBM / soft-voting ensemble candidates
+    (MODEL_PROPOSAL.md Phase 1-2)
+
+    Args:
+        random_state: Random seed
+
+    Returns:
+        List of candidate dicts (name, family, scaling, estimator)
+    """
+    rf_clf = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=10,
+        class_weight="balanced",
+        random_state=random_state,
+        n_jobs=1,
+    )
+    xgb_clf = _xgboost_classifier(random_state)
+    lgbm_clf = _lightgbm_classifier(random_state)
+
+    members = [("rf", rf_clf), ("xgb", xgb_clf), ("lgbm", lgbm_clf)]
+    members = [(name, clf) for name, clf in members if clf is not None]
+
+    candidates = [
+        {
+            "name": name,
+            "family": name,
+            "scaling": "standard",
+            "params": clf.get_params(),
+            "estimator": clf,
+        }
+        for name, clf in members
+    ]
+
+    if len(members) > 1:
+        ensemble_clf = VotingClassifier(estimators=members, voting="soft")
+        candidates.append({
+            "name": "ensemble_" + "_".join(name for name, _ in members),
+            "family": "ensemble",
+            "scaling": "standard",
+            "params": {"voting": "soft", "members": [name for name, _ in members]},
+            "estimator": ensemble_clf,
+        })
+
+    return candidates
+
+
+def build_pipeline(estimator, scaling: str = "standard") -> Pipeline:
+    """
+    Build a full serving pipeline (preprocessor + classifier)
+
+    Args:
+        estimator: Classifier
+        scaling: Numeric scaler name
+
+    Returns:
+        Unfitted Pipeline
+    """
+    return Pipeline(
+        steps=[
+            ("preprocessor", build_preprocessor(scaling)),
+            ("classifier", estimator),
+        ]
+    )
+
+
+def select_candidates(
+    families: Optional[List[str]] = None,
+    search: str = "grid",
+    n_iter: int = 20,
+    random_state: int = 42
+) -> List[Dict]:
+    """
+    Build all candidates for the requested model families
+
+    Args:
+        families: Families to include (knn, rf, xgb, lgbm, ensemble); None for all
+        search: KNN search mode ("grid" or "random")
+        n_iter: KNN random search iterations
+        random_state: Random seed
+
+    Returns:
+        List of candidate dicts
+    """
+    candidates = []
+    if families is None or "knn" in families:
+        candidates += build_knn_candidates(search=search, n_iter=n_iter, random_state=random_state)
+
+    candidates += [
+        c for c in build_model_candidates(random_state=random_state)
+        if families is None or c["family"] in families
+    ]
+
+    logger.info(f"Built {len(candidates)} candidates")
+    return candidates
@@ -0,0 +1,263 @@
+"""
+Content-addressed cache for fitted preprocessing output
+Keys are derived from the data, fold indices and transformer params so
+that repeated sweeps and training runs reuse transformed folds
+"""
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from sklearn.base import clone
+import joblib
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import sys
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "data/features/preprocessing_cache"
+
+
+def hash_frame(X: pd.DataFrame, y: Optional[np.ndarray] = None) -> str:
+    """
+    Content hash of a DataFrame (values, index and column names)
+    and optionally its target
+
+    Args:
+        X: DataFrame to hash
+        y: Target array (optional)
+
+    Returns:
+        Hex digest
+    """
+    h = hashlib.sha256()
+    h.update(repr(list(X.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(X, index=True).to_numpy().tobytes())
+    if y is not None:
+        h.update(np.ascontiguousarray(y).tobytes())
+    return h.hexdigest()
+
+
+def _nbytes(obj) -> int:
+    """Approximate memory footprint of cached arrays"""
+    if isinstance(obj, (tuple, list)):
+        return sum(_nbytes(o) for o in obj)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, "data") and hasattr(obj, "indices") and hasattr(obj, "indptr"):
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    return 0
+
+
+class PreprocessingCache:
+    """
+    Two-level (memory + disk) cache of transformed CV folds
+
+    Entries are keyed by data hash, fold indices and transformer params.
+    Both levels are bounded in bytes and evict least recently used entries.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = 2 * 1024 ** 3,
+        max_memory_bytes: int = 512 * 1024 ** 2
+    ):
+        """
+        Initialize cache
+
+        Args:
+            cache_dir: Directory for persisted entries (None for memory only)
+            max_disk_bytes: Disk size bound
+            max_memory_bytes: In-memory size bound
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+
+        self._memory: "OrderedDict[str, Tuple]" = OrderedDict()
+        self._memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        data_hash: str,
+        train_idx: np.ndarray,
+        val_idx: np.ndarray,
+        transformer
+    ) -> str:
+        """
+        Build a cache key
+
+        Args:
+            data_hash: Hash of the raw features and target (see hash_frame)
+            train_idx: Training row indices
+            val_idx: Validation row indices
+            transformer: Unfitted transformer (its params are hashed)
+
+        Returns:
+            Hex digest key
+        """
+        h = hashlib.sha256()
+        h.update(data_hash.encode("ascii"))
+        h.update(np.ascontiguousarray(train_idx, dtype=np.int64).tobytes())
+        h.update(b"|")
+        h.update(np.ascontiguousarray(val_idx, dtype=np.int64).tobytes())
+        h.update(joblib.hash(clone(transformer)).encode("ascii"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.joblib"
+
+    def _remember(self, key: str, value: Tuple):
+        """Insert into the memory LRU, evicting as needed"""
+        size = _nbytes(value)
+        if size > self.max_memory_bytes:
+            return
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _nbytes(evicted)
+
+    def _evict_disk(self):
+        """Remove least recently used files until under max_disk_bytes"""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*.joblib"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+                logger.debug(f"Evicted cache entry: {path.name}")
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[Tuple]:
+        """
+        Look up a cached entry
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value, or None on miss
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                value = joblib.load(path)
+                os.utime(path)
+                self._remember(key, value)
+                self.hits += 1
+                return value
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+                path.unlink(missing_ok=True)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Tuple):
+        """
+        Store an entry in memory and on disk
+
+        Args:
+            key: Cache key
+            value: Transformed fold tuple
+        """
+        self._remember(key, value)
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            joblib.dump(value, tmp_path)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+    def transform_fold(
+        self,
+        transformer,
+        X: pd.DataFrame,
+        y: np.ndarray,
+        train_idx: np.ndarray,
+        val_idx: np.ndarray,
+        data_hash: Optional[str] = None
+    ) -> Tuple:
+        """
+        Fit transformer on the training fold and transform both folds,
+        reusing a cached result when available
+
+        Args:
+            transformer: Unfitted transformer
+            X: Raw features
+            y: Encoded target
+            train_idx: Training row indices
+            val_idx: Validation row indices
+            data_hash: Precomputed hash_frame(X, y) (computed if None)
+
+        Returns:
+            (X_train, y_train, X_val, y_val) transformed
+        """
+        data_hash = data_hash or hash_frame(X, y)
+        key = self.make_key(data_hash, train_idx, val_idx, transformer)
+
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        fitted = clone(transformer)
+        X_train = fitted.fit_transform(X.iloc[train_idx])
+        X_val = fitted.transform(X.iloc[val_idx])
+        value = (X_train, y[train_idx], X_val, y[val_idx])
+
+        self.put(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and memory usage"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+    def clear(self):
+        """Drop all memory and disk entries"""
+        self._memory.clear()
+        self._memory_bytes = 0
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob("*.joblib"):
+                path.unlink(missing_ok=True)
@@ -0,0 +1,140 @@
+"""
+Tests for feeding anomaly detection (api/services/anomaly.py,
+api/routers/anomaly.py)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import api.routers.anomaly as anomaly_router
+from api.services.anomaly import FeedingAnomalyDetector
+
+STATE_ARRAYS = ["baby_ids", "counts", "means", "variances", "last_seen", "global_count", "global_mean", "global_m2"]
+
+
+def make_records(n_babies: int = 5, per_baby: int = 30, seed: int = 0) -> pd.DataFrame:
+    """Regular feedings every 3 hours, interleaved across babies"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")
+    rows = []
+    for k in range(per_baby):
+        for baby in range(1, n_babies + 1):
+            rows.append({
+                "feeding_id": len(rows) + 1,
+                "baby_id": baby,
+                "amount_consumed": 100 + 10 * baby + rng.normal(0, 4),
+                "temperature": 37 + rng.normal(0, 0.2),
+                "duration": 15 + rng.normal(0, 1),
+                "timestamp": start + pd.Timedelta(hours=3 * k + rng.uniform(0, 0.2)),
+            })
+    return pd.DataFrame(rows)
+
+
+def state(detector: FeedingAnomalyDetector) -> dict:
+    """Used part of the state arrays"""
+    size = len(detector.baby_ids)
+    arrays = {name: getattr(detector, name) for name in STATE_ARRAYS}
+    for name in ("counts", "means", "variances", "last_seen"):
+        arrays[name] = arrays[name][:size]
+    return arrays
+
+
+def assert_same_state(a: FeedingAnomalyDetector, b: FeedingAnomalyDetector):
+    sa, sb = state(a), state(b)
+    order_a, order_b = np.argsort(sa["baby_ids"]), np.argsort(sb["baby_ids"])
+    for name in STATE_ARRAYS:
+        if name.startswith("global"):
+            np.testing.assert_allclose(sa[name], sb[name], err_msg=name)
+        else:
+            np.testing.assert_allclose(sa[name][order_a], sb[name][order_b], err_msg=name)
+    assert a.records_seen == b.records_seen
+
+
+def test_spike_flagged_after_warmup_only():
+    records = make_records(n_babies=1, per_baby=30)
+    records.loc[3, "amount_consumed"] = 400
+    records.loc[20, "amount_consumed"] = 400
+
+    scored = FeedingAnomalyDetector(warmup=10).score(records)
+
+    # Record 3: neither the baby nor the population has 10 values yet
+    assert np.isnan(scored.loc[3, "z_amount_consumed"])
+    assert not scored.loc[3, "is_anomaly"]
+    assert scored.loc[20, "is_anomaly"]
+    assert "amount_consumed_high" in scored.loc[20, "reasons"]
+    assert scored["is_anomaly"].sum() == 1
+
+
+def test_split_batches_match_one_batch():
+    records = make_records()
+    whole = FeedingAnomalyDetector()
+    whole.score(records)
+
+    split = FeedingAnomalyDetector()
+    for chunk in np.array_split(np.arange(len(records)), 7):
+        split.score(records.iloc[chunk])
+
+    assert_same_state(whole, split)
+
+
+def test_save_load_round_trip(tmp_path):
+    detector = FeedingAnomalyDetector(alpha=0.2, warmup=5, z_threshold=4.0)
+    detector.score(make_records())
+    detector.mark = 150
+    detector.save(tmp_path / "state.npz")
+
+    loaded = FeedingAnomalyDetector.load(tmp_path / "state.npz")
+
+    assert loaded.params == detector.params
+    assert loaded.stats() == detector.stats()
+    assert_same_state(detector, loaded)
+    assert loaded.baby_stats(3) == detector.baby_stats(3)
+
+    # The restored detector keeps scoring the same way
+    more = make_records(seed=1)
+    more["timestamp"] += pd.Timedelta(days=10)
+    pd.testing.assert_frame_equal(detector.score(more), loaded.score(more))
+
+
+def test_score_without_update_leaves_state_unchanged():
+    detector = FeedingAnomalyDetector()
+    detector.score(make_records())
+    before = {name: value.copy() for name, value in state(detector).items()}
+    counters = detector.stats()
+
+    new_baby = make_records(n_babies=6, per_baby=2, seed=2)
+    detector.score(new_baby, update=False)
+
+    assert detector.stats() == counters
+    assert detector.baby_stats(6) is None
+    for name, value in state(detector).items():
+        np.testing.assert_array_equal(value, before[name], err_msg=name)
+
+
+@pytest.fixture
+def router_state(tmp_path, monkeypatch):
+    state_path = tmp_path / "state.npz"
+    monkeypatch.setenv("ANOMALY_STATE_PATH", str(state_path))
+    monkeypatch.setenv("ANOMALY_MODEL_PATH", str(tmp_path / "missing.pkl"))
+    monkeypatch.setenv("ANOMALY_RELOAD_SECONDS", "0")
+    monkeypatch.setattr(anomaly_router, "detector", None)
+    monkeypatch.setattr(anomaly_router, "_state_mtime", None)
+    monkeypatch.setattr(anomaly_router, "_checked_at", 0.0)
+    return state_path
+
+
+def test_router_reloads_state_when_file_changes(router_state):
+    fresh = anomaly_router.get_detector()
+    assert fresh.records_seen == 0
+    assert anomaly_router.get_detector() is fresh
+
+    writer = FeedingAnomalyDetector()
+    writer.score(make_records())
+    writer.mark = 150
+    writer.save(router_state)
+
+    reloaded = anomaly_router.get_detector()
+    assert reloaded is not fresh
+    assert reloaded.mark == 150
+    # Unchanged file: same detector
+    assert anomaly_router.get_detector() is reloaded
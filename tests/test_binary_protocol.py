@@ -0,0 +1,166 @@
+"""
+Tests for the binary protocol (api/services/binary_protocol.py,
+api/binary_server.py)
+"""
+import asyncio
+
+import msgpack
+import pytest
+
+import api.services.binary_protocol as binary_protocol
+from api.binary_server import BinaryServer
+from api.services.binary_protocol import (
+    HEADER,
+    MAX_FRAME_BYTES,
+    ProtocolError,
+    pack_frame,
+    unpack_payload,
+)
+
+PROFILE = {
+    "age_month": 6,
+    "sex": "F",
+    "height_cm": 65.0,
+    "weight_kg": 7.2,
+    "allergy_risk": 0,
+    "lactose_sensitivity": 1,
+    "feed_ml_per_intake": 120,
+}
+
+
+class StubCatalog:
+    formula_ids = [1, 2, 3]
+
+    def __contains__(self, formula_id):
+        return formula_id in self.formula_ids
+
+    def records(self):
+        return [{"formula_id": formula_id, "formula_brand": "x" * 64} for formula_id in self.formula_ids]
+
+
+class StubRecommender:
+    model_version = "v1"
+    catalog = StubCatalog()
+
+    def predict_single(self, profile, formula_id):
+        return {"formula_id": formula_id, "predicted_tolerance": "good"}
+
+
+class StubRegistry:
+    """Just enough of ModelRegistry for dispatch"""
+
+    default = StubRecommender()
+
+    def route(self, model_version=None, routing_key=None):
+        if model_version and model_version != "v1":
+            raise KeyError(f"Model version {model_version} not loaded")
+        return self.default
+
+    def log_prediction(self, *args):
+        pass
+
+
+class FakeWriter:
+    """Collects written frames"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data: bytes):
+        self.buffer += data
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+    def close(self):
+        pass
+
+    def frames(self):
+        frames, view = [], bytes(self.buffer)
+        while view:
+            (length,) = HEADER.unpack(view[:HEADER.size])
+            frames.append(unpack_payload(view[HEADER.size:HEADER.size + length]))
+            view = view[HEADER.size + length:]
+        return frames
+
+
+def call(request: dict) -> dict:
+    """Run one request through BinaryServer.handle_frame"""
+    writer = FakeWriter()
+    payload = msgpack.packb(request, use_bin_type=True)
+    asyncio.run(BinaryServer(StubRegistry()).handle_frame(payload, writer))
+    (response,) = writer.frames()
+    return response
+
+
+def test_frame_round_trip():
+    message = {"id": 7, "op": "recommend", "profile": PROFILE, "data": b"\x00\x01", "scores": [0.5, 1.25]}
+    frame = pack_frame(message)
+
+    (length,) = HEADER.unpack(frame[:HEADER.size])
+    assert length == len(frame) - HEADER.size
+    assert unpack_payload(frame[HEADER.size:]) == message
+
+
+def test_non_map_payload_is_rejected():
+    with pytest.raises(ProtocolError):
+        unpack_payload(msgpack.packb([1, 2, 3]))
+
+
+def test_oversize_request_gets_413():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(HEADER.pack(MAX_FRAME_BYTES + 1))
+        reader.feed_eof()
+        writer = FakeWriter()
+        await BinaryServer(StubRegistry()).handle_connection(reader, writer)
+        return writer.frames()
+
+    (response,) = asyncio.run(run())
+    assert response["ok"] is False
+    assert response["code"] == 413
+
+
+def test_oversize_response_gets_413_with_id(monkeypatch):
+    monkeypatch.setattr(binary_protocol, "MAX_FRAME_BYTES", 128)
+    response = call({"id": 5, "op": "formulas"})
+
+    assert response["id"] == 5
+    assert response["ok"] is False
+    assert response["code"] == 413
+
+
+def test_ping_and_formulas():
+    assert call({"id": 1, "op": "ping"})["result"] == "pong"
+    assert [r["formula_id"] for r in call({"id": 2, "op": "formulas"})["result"]] == [1, 2, 3]
+
+
+def test_unknown_op_is_400():
+    response = call({"id": 3, "op": "nope"})
+
+    assert response == {"id": 3, "ok": False, "code": 400, "error": "Unknown op: nope"}
+
+
+def test_unknown_model_version_is_400():
+    response = call({"id": 4, "op": "predict", "model_version": "v9", "profile": PROFILE, "formula_id": 1})
+
+    assert response["code"] == 400
+    assert "v9" in response["error"]
+
+
+@pytest.mark.parametrize("formula_id", [99, True, "1", None])
+def test_predict_unknown_formula_is_404(formula_id):
+    response = call({"id": 6, "op": "predict", "profile": PROFILE, "formula_id": formula_id})
+
+    assert response["ok"] is False
+    assert response["code"] == 404
+
+
+def test_predict_known_formula():
+    response = call({"id": 8, "op": "predict", "profile": PROFILE, "formula_id": 2})
+
+    assert response["ok"] is True
+    assert response["result"] == {"model_version": "v1", "formula_id": 2, "predicted_tolerance": "good"}
@@ -0,0 +1,113 @@
+"""
+Tests for offline bulk scoring (src/scoring/bulk.py)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.services.cf_recommender import load_recommender
+from api.services.precompute import PROFILE_COLUMNS
+from src.scoring.bulk import BulkScoringJob, read_results, score_frame
+
+MODEL_PATH = "models/trained/knn_v1_legacy.pkl"
+
+
+@pytest.fixture(scope="module")
+def rec():
+    return load_recommender(MODEL_PATH, drift_monitor=False)
+
+
+@pytest.fixture
+def profiles() -> pd.DataFrame:
+    logs = pd.read_csv("data/raw/feeding_logs.csv")
+    return logs[["baby_id"] + PROFILE_COLUMNS].reset_index(drop=True)
+
+
+def test_invalid_rows_are_counted_and_skipped(rec, profiles):
+    frame = profiles.head(20).copy()
+    frame.loc[2, "age_month"] = 99
+    frame.loc[5, "sex"] = "X"
+
+    results, stats = score_frame(rec, frame, top_n=3, min_good_prob=0.0)
+
+    assert stats["rows"] == 20
+    assert stats["invalid"] == 2
+    assert stats["scored"] == 18
+    assert sum(stats["reasons"].values()) >= 2
+    assert set(results["baby_id"]) == set(frame["baby_id"]) - {frame.loc[2, "baby_id"], frame.loc[5, "baby_id"]}
+    # With no threshold every scored baby gets top_n rows
+    assert stats["results"] == len(results) == 18 * 3
+
+
+def test_results_are_the_eligible_prefix(rec, profiles):
+    frame = profiles.head(40)
+    min_good_prob = 0.85
+
+    results, _ = score_frame(rec, frame, top_n=3, min_good_prob=min_good_prob)
+    scores = rec.score_batch(frame[PROFILE_COLUMNS])
+    formula_ids = scores["catalog"].formula_ids
+
+    for row, baby_id in enumerate(frame["baby_id"]):
+        good = scores["good_probabilities"][row]
+        order = [p for p in np.argsort(-good, kind="stable") if good[p] >= min_good_prob][:3]
+        listed = results[results["baby_id"] == baby_id].sort_values("rank")
+        assert listed["rank"].tolist() == list(range(1, len(order) + 1))
+        assert listed["formula_id"].tolist() == formula_ids[order].tolist()
+        np.testing.assert_allclose(listed["good_probability"], good[order])
+    assert (results["good_probability"] >= min_good_prob).all()
+    # The threshold leaves some babies with fewer than top_n formulas
+    assert len(results) < 3 * len(frame)
+
+
+def test_row_numbers_without_id_column(rec, profiles):
+    frame = profiles.head(10).drop(columns="baby_id")
+    frame.loc[3, "age_month"] = 99
+
+    results, _ = score_frame(rec, frame, offset=100, top_n=1, min_good_prob=0.0)
+
+    assert "row" in results and "baby_id" not in results
+    assert results["row"].tolist() == [100 + i for i in range(10) if i != 3]
+
+
+def make_job(input_path, out_dir, **kwargs) -> BulkScoringJob:
+    settings = {"batch_size": 30, "n_jobs": 1, "fmt": "csv", "min_good_prob": 0.0}
+    return BulkScoringJob("csv", str(input_path), out_dir=str(out_dir), model_path=MODEL_PATH, **{**settings, **kwargs})
+
+
+def test_resume_rescores_only_missing_chunks(tmp_path, profiles):
+    input_path = tmp_path / "profiles.csv"
+    profiles.to_csv(input_path, index=False)
+    out_dir = tmp_path / "out"
+
+    first = make_job(input_path, out_dir).run()
+    expected = read_results(out_dir)
+    assert first["chunks"] == 4
+    assert first["scored"] == expected["baby_id"].nunique()
+
+    # Chunk 3's part file is lost: the chunk is listed in progress.jsonl but must be scored again
+    (out_dir / "part-00003.csv").unlink()
+    kept = (out_dir / "part-00000.csv").stat().st_mtime_ns
+
+    second = make_job(input_path, out_dir).run()
+
+    assert second["resumed_chunks"] == 3
+    assert second["chunks"] == 4
+    assert {k: second[k] for k in ("rows", "scored", "invalid", "results")} == {
+        k: first[k] for k in ("rows", "scored", "invalid", "results")
+    }
+    assert (out_dir / "part-00000.csv").stat().st_mtime_ns == kept
+    pd.testing.assert_frame_equal(read_results(out_dir), expected)
+
+
+def test_settings_mismatch_is_refused(tmp_path, profiles):
+    input_path = tmp_path / "profiles.csv"
+    profiles.to_csv(input_path, index=False)
+    out_dir = tmp_path / "out"
+    make_job(input_path, out_dir).run()
+
+    with pytest.raises(ValueError, match="top_n"):
+        make_job(input_path, out_dir, top_n=5).run()
+
+    summary = make_job(input_path, out_dir, top_n=5).run(overwrite=True)
+    assert summary["resumed_chunks"] == 0
+    assert summary["results"] == 5 * summary["scored"]
@@ -0,0 +1,100 @@
+"""
+Tests for the compact KNN serving engine (api/services/engine.py)
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from api.services.engine import KNNServingEngine
+from src.data.data_loader import FEATURE_COLS
+from src.training.model_factory import build_pipeline
+
+
+def make_frame(n: int, seed: int) -> pd.DataFrame:
+    """Random feature rows with continuous numerics (no distance ties)"""
+    rng = np.random.default_rng(seed)
+    formula_id = rng.integers(1, 7, n)
+    return pd.DataFrame({
+        "age_month": rng.uniform(0, 36, n),
+        "sex": rng.choice(["M", "F"], n),
+        "height_cm": rng.uniform(45, 100, n),
+        "weight_kg": rng.uniform(2.5, 16, n),
+        "allergy_risk": rng.integers(0, 2, n),
+        "lactose_sensitivity": rng.integers(0, 2, n),
+        "feed_ml_per_intake": rng.uniform(40, 250, n),
+        "formula_id": formula_id,
+        "category": np.array(["normal", "sensitive", "allergy"])[formula_id % 3],
+        "lactose_level": np.array(["normal", "low"])[formula_id % 2],
+        "target_issue": np.array(["none", "sensitive", "allergy"])[formula_id % 3],
+        "protein_type": np.array(["standard", "partially_hydrolyzed"])[formula_id % 2],
+    })[FEATURE_COLS]
+
+
+def fit_pipeline(scaling: str, **knn_params):
+    """Preprocessor + KNN pipeline fitted on random rows"""
+    X = make_frame(600, seed=0)
+    y = np.random.default_rng(1).choice(["good", "moderate", "poor"], len(X))
+    return build_pipeline(KNeighborsClassifier(**knn_params), scaling=scaling).fit(X, y)
+
+
+@pytest.mark.parametrize("scaling, metric, weights", [
+    ("standard", "euclidean", "uniform"),
+    ("standard", "manhattan", "distance"),
+    ("minmax", "euclidean", "distance"),
+    ("robust", "manhattan", "uniform"),
+])
+def test_kneighbors_matches_sklearn(scaling, metric, weights):
+    pipeline = fit_pipeline(scaling, n_neighbors=7, metric=metric, weights=weights)
+    engine = KNNServingEngine.from_pipeline(pipeline)
+    assert engine is not None
+
+    queries = make_frame(200, seed=2)
+    encoded = pipeline.named_steps["preprocessor"].transform(queries)
+    expected_dist, expected_idx = pipeline.named_steps["classifier"].kneighbors(encoded)
+    dist, idx = engine.kneighbors(queries)
+
+    np.testing.assert_array_equal(idx, expected_idx)
+    np.testing.assert_allclose(dist, expected_dist, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(engine.predict_proba(queries), pipeline.predict_proba(queries), atol=1e-5)
+
+
+def test_blocked_and_threaded_search_match_single_block(monkeypatch):
+    monkeypatch.setattr("api.services.engine.PARALLEL_MIN_PAIRS", 0)
+    pipeline = fit_pipeline("standard", n_neighbors=5)
+    queries = make_frame(300, seed=3)
+
+    single = KNNServingEngine.from_pipeline(pipeline)
+    expected = single.kneighbors(queries)
+
+    blocked = KNNServingEngine.from_pipeline(pipeline)
+    blocked.query_block, blocked.train_block, blocked.n_threads = 32, 50, 4
+    dist, idx = blocked.kneighbors(queries)
+
+    np.testing.assert_array_equal(idx, expected[1])
+    np.testing.assert_array_equal(dist, expected[0])
+
+
+def test_unseen_category_matches_sklearn():
+    pipeline = fit_pipeline("standard", n_neighbors=3)
+    engine = KNNServingEngine.from_pipeline(pipeline)
+
+    queries = make_frame(20, seed=4)
+    queries["formula_id"] = 99
+    queries.loc[:4, "sex"] = "X"
+    encoded = pipeline.named_steps["preprocessor"].transform(queries)
+    expected_dist, expected_idx = pipeline.named_steps["classifier"].kneighbors(encoded)
+    with warnings.catch_warnings():
+        # Unseen values are encoded without any (deprecation) warning
+        warnings.simplefilter("error")
+        dist, idx = engine.kneighbors(queries)
+
+    np.testing.assert_array_equal(idx, expected_idx)
+    np.testing.assert_allclose(dist, expected_dist, rtol=1e-4, atol=1e-4)
+
+
+def test_unsupported_pipeline_returns_none():
+    pipeline = fit_pipeline("standard", n_neighbors=3, metric="chebyshev")
+    assert KNNServingEngine.from_pipeline(pipeline) is None
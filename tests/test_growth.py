@@ -0,0 +1,119 @@
+"""
+Tests for growth forecasting (api/services/growth.py, api/schemas/growth.py)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+from scipy.special import ndtr
+
+from api.schemas.growth import GrowthForecastRequest
+from api.services.growth import (
+    fit_growth,
+    forecast,
+    projected_profiles,
+    who_cv,
+    who_median,
+)
+
+PROFILE = {
+    "age_month": 4,
+    "sex": "M",
+    "height_cm": 62.0,
+    "weight_kg": 6.5,
+    "allergy_risk": 0,
+    "lactose_sensitivity": 1,
+    "feed_ml_per_intake": 90,
+}
+
+
+def channel(baby_id: int, sex: str, ages, z) -> pd.DataFrame:
+    """Measurements at WHO z-scores z (scalar or one per age)"""
+    ages = np.asarray(ages, dtype=np.float64)
+    z = np.broadcast_to(z, ages.shape)
+    female = np.full(ages.shape, sex == "F")
+    frame = pd.DataFrame({"baby_id": baby_id, "sex": sex, "age_month": ages})
+    for measure in ("weight_kg", "height_cm"):
+        frame[measure] = who_median(measure, female, ages) * np.exp(z * who_cv(measure, female, ages))
+    return frame.assign(allergy_risk=1, lactose_sensitivity=0, feed_ml_per_intake=120)
+
+
+def test_constant_channel_has_no_slope():
+    trends = fit_growth(channel(1, "F", [0, 1, 2, 4, 6], 0.8))
+
+    assert trends.loc[1, "last_age"] == 6
+    assert trends.loc[1, "n_weight_kg"] == 5
+    np.testing.assert_allclose(trends.loc[1, ["weight_kg_level", "height_cm_level"]], 0.8)
+    np.testing.assert_allclose(trends.loc[1, ["weight_kg_slope", "height_cm_slope"]], 0.0, atol=1e-12)
+
+    projected = forecast(trends, [1, 3, 6])
+    np.testing.assert_allclose(projected["weight_kg_percentile"], 100 * ndtr(0.8))
+    np.testing.assert_allclose(projected["weight_kg"], channel(1, "F", [7, 9, 12], 0.8)["weight_kg"])
+
+
+def test_trend_is_recovered_and_shrunk_by_penalty():
+    ages = np.arange(0, 7)
+    measurements = channel(1, "M", ages, -1.0 + 0.2 * ages)
+
+    exact = fit_growth(measurements, slope_penalty=0.0)
+    np.testing.assert_allclose(exact.loc[1, "weight_kg_slope"], 0.2)
+    np.testing.assert_allclose(exact.loc[1, "weight_kg_level"], 0.2)
+
+    shrunk = fit_growth(measurements)
+    assert 0 < shrunk.loc[1, "weight_kg_slope"] < 0.2
+
+
+def test_single_measurement_keeps_its_percentile():
+    trends = fit_growth(channel(1, "M", [5], -0.5))
+
+    assert trends.loc[1, "weight_kg_slope"] == 0
+    projected = forecast(trends, [2])
+    np.testing.assert_allclose(projected["height_cm_percentile"], 100 * ndtr(-0.5))
+
+
+def test_babies_are_fitted_independently():
+    a = channel(1, "M", [0, 2, 3, 5], [0.0, 0.4, 0.3, 0.9])
+    b = channel(2, "F", [1, 2, 8], [-1.0, -1.2, -0.7])
+    b.loc[1, "height_cm"] = np.nan
+    mixed = pd.concat([b, a]).sample(frac=1.0, random_state=0)
+
+    together = fit_growth(mixed).sort_index()
+    alone = pd.concat([fit_growth(a), fit_growth(b)])
+
+    pd.testing.assert_frame_equal(together, alone, check_like=True)
+    assert together.loc[2, "n_height_cm"] == 2
+
+
+def test_forecast_drops_ages_past_36_months():
+    trends = fit_growth(pd.concat([channel(1, "F", [30, 34], 0.0), channel(2, "M", [10], 0.0)]))
+
+    projected = forecast(trends, [1, 3])
+
+    assert projected[projected["baby_id"] == 1]["age_month"].tolist() == [35.0]
+    assert projected[projected["baby_id"] == 2]["age_month"].tolist() == [11.0, 13.0]
+
+
+def test_projected_profiles_are_valid_baby_profiles():
+    trends = fit_growth(channel(1, "M", [2.5, 3.5], [4.0, 9.0]), slope_penalty=0.0)
+    projected = forecast(trends, [1.0, 30.0])
+
+    profiles = projected_profiles(trends, projected)
+
+    assert profiles["age_month"].tolist() == [4, 33]
+    # An extreme trend is clipped to the BabyProfile bounds
+    assert profiles["weight_kg"].max() == 50
+    assert profiles["height_cm"].max() == 150
+    np.testing.assert_allclose(profiles["weight_kg"], np.round(profiles["weight_kg"], 1))
+    assert profiles["feed_ml_per_intake"].tolist() == [120, 120]
+    assert profiles["allergy_risk"].tolist() == [1, 1]
+
+    with pytest.raises(ValueError, match="feed_ml_per_intake"):
+        projected_profiles(trends.drop(columns="feed_ml_per_intake"), projected)
+
+
+def test_measurements_must_precede_the_profile():
+    GrowthForecastRequest(baby_profile=PROFILE, measurements=[{"age_month": 3.9, "weight_kg": 6.0}])
+
+    for age in (4, 4.5):
+        with pytest.raises(ValidationError, match="not before"):
+            GrowthForecastRequest(baby_profile=PROFILE, measurements=[{"age_month": age, "weight_kg": 6.0}])
@@ -0,0 +1,201 @@
+"""
+Tests for the ALS recommender (src/training/matrix_factorization.py,
+api/services/cf_recommender.py)
+"""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from api.services.cf_recommender import CFRecommender
+from src.data.data_loader import FEATURE_COLS, TARGET_COL, split_logs
+from src.evaluation.evaluate import evaluate_model
+from src.training.matrix_factorization import (
+    baseline_rmse,
+    build_rating_matrix,
+    split_ratings,
+    train_als,
+    train_from_data,
+)
+from src.training.model_factory import build_pipeline
+
+N_BABIES = 400
+N_FORMULAS = 12
+LOGS_PER_BABY = 8
+
+# Tolerance distribution when a baby's hidden type matches the formula's
+MATCH = {"good": 0.8, "moderate": 0.1, "poor": 0.1}
+MISMATCH = {"good": 0.15, "moderate": 0.25, "poor": 0.6}
+
+
+def make_data(data_dir, seed: int = 0):
+    """
+    Feeding logs where tolerance depends on a baby type that no profile
+    column shows: only the baby's other ratings reveal it
+    """
+    rng = np.random.default_rng(seed)
+    seed_formulas = pd.read_csv("data/raw/formula_master.csv")
+    formulas = seed_formulas.iloc[np.arange(N_FORMULAS) % len(seed_formulas)].reset_index(drop=True)
+    formulas["formula_id"] = np.arange(1, N_FORMULAS + 1)
+    formulas["formula_brand"] = [f"Brand_{i:02d}" for i in formulas["formula_id"]]
+
+    baby_type = rng.integers(0, 2, N_BABIES)
+    rows = []
+    log_id = 1
+    for baby in range(N_BABIES):
+        profile = {
+            "baby_id": baby + 1,
+            "age_month": int(rng.integers(0, 24)),
+            "sex": str(rng.choice(["M", "F"])),
+            "height_cm": round(float(rng.uniform(50, 90)), 1),
+            "weight_kg": round(float(rng.uniform(3, 12)), 1),
+            "allergy_risk": int(rng.integers(0, 2)),
+            "lactose_sensitivity": int(rng.integers(0, 2)),
+            "feed_ml_per_intake": int(rng.integers(60, 200)),
+        }
+        for formula_id in rng.choice(formulas["formula_id"], LOGS_PER_BABY, replace=False):
+            dist = MATCH if formula_id % 2 == baby_type[baby] else MISMATCH
+            rows.append({
+                "log_id": log_id,
+                **profile,
+                "formula_id": int(formula_id),
+                "diarrhea": 0,
+                "constipation": 0,
+                "vomiting": 0,
+                "skin_rash": 0,
+                TARGET_COL: str(rng.choice(list(dist), p=list(dist.values()))),
+            })
+            log_id += 1
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    formulas.to_csv(data_dir / "formula_master.csv", index=False)
+    pd.DataFrame(rows).to_csv(data_dir / "feeding_logs.csv", index=False)
+    return formulas, pd.DataFrame(rows)
+
+
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory):
+    """Planted data set, KNN fallback package and CF package"""
+    root = tmp_path_factory.mktemp("cf")
+    data_dir = root / "data"
+    formulas, logs = make_data(data_dir)
+
+    data = logs.merge(formulas, on="formula_id")
+    label_encoder = LabelEncoder().fit(data[TARGET_COL])
+    pipeline = build_pipeline(KNeighborsClassifier(n_neighbors=5)).fit(
+        data[FEATURE_COLS], label_encoder.transform(data[TARGET_COL])
+    )
+    model_dir = root / "models"
+    model_dir.mkdir()
+    joblib.dump(
+        {"model_pipeline": pipeline, "label_encoder": label_encoder, "feature_cols": FEATURE_COLS},
+        model_dir / "knn.pkl"
+    )
+
+    package = train_from_data(
+        str(data_dir), n_factors=2, n_epochs=10, n_threads=1,
+        fallback_model="knn.pkl", quarantine_path=None
+    )
+    joblib.dump(package, model_dir / "cf.pkl")
+    return {"data_dir": data_dir, "model_path": model_dir / "cf.pkl", "package": package, "logs": logs}
+
+
+def load_cf(trained) -> CFRecommender:
+    recommender = CFRecommender(model_path=str(trained["model_path"]), drift_monitor=False)
+    recommender.load_formula_data(path=str(trained["data_dir"] / "formula_master.csv"))
+    return recommender
+
+
+def test_als_beats_non_personalized_baselines(trained):
+    matrix, _, _ = build_rating_matrix(trained["logs"])
+    train, holdout = split_ratings(matrix, test_size=0.2, seed=0)
+    model = train_als(train, n_factors=2, n_epochs=10, n_threads=1, holdout=holdout)
+    baselines = baseline_rmse(train, holdout)
+
+    holdout_rmse = model["history"][-1]["holdout_rmse"]
+    assert holdout_rmse < baselines["global_mean"] - 0.03
+    assert holdout_rmse < baselines["formula_mean"] - 0.03
+
+
+def test_package_metrics_and_calibration(trained):
+    package = trained["package"]
+    metrics = package["metrics"]
+    assert metrics["holdout_rmse"] < metrics["holdout_rmse_formula_mean"]
+
+    calibration = package["calibration"]
+    assert np.all(np.diff(calibration["ratings"]) > 0)
+    assert np.all(np.diff(calibration["good_probabilities"]) >= 0)
+    assert 0.0 <= calibration["good_probabilities"].min() <= calibration["good_probabilities"].max() <= 1.0
+
+
+def test_training_leaves_out_eval_logs_and_validates(tmp_path, trained):
+    logs = pd.read_csv(trained["data_dir"] / "feeding_logs.csv")
+    logs.loc[:9, "age_month"] = 99
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    logs.to_csv(data_dir / "feeding_logs.csv", index=False)
+    (data_dir / "formula_master.csv").write_text((trained["data_dir"] / "formula_master.csv").read_text())
+
+    package = train_from_data(str(data_dir), n_factors=2, n_epochs=2, n_threads=1, quarantine_path=None)
+    train_logs, _ = split_logs(logs, test_size=0.2)
+    n_invalid = int((train_logs["age_month"] == 99).sum())
+
+    assert package["params"]["eval_size"] == 0.2
+    assert package["metrics"]["logs_quarantined"] == n_invalid
+    # Every baby-formula pair is logged once, so each valid training log is one rating
+    assert package["metrics"]["n_ratings"] == len(train_logs) - n_invalid
+
+
+def test_test_size_must_be_positive(trained):
+    with pytest.raises(ValueError, match="test_size"):
+        train_from_data(str(trained["data_dir"]), test_size=0, quarantine_path=None)
+
+
+def test_warm_scores_are_calibrated_probabilities(trained):
+    recommender = load_cf(trained)
+    profiles = trained["logs"].groupby("baby_id").first().reset_index().head(50)
+    scores = recommender.score_batch(profiles)
+
+    assert scores["cf_cells"].all()
+    rows = recommender.factor_rows(profiles)
+    columns = recommender.formula_columns(recommender.catalog)
+    ratings = recommender.cf_ratings(rows, columns)
+    calibration = trained["package"]["calibration"]
+    expected = np.interp(ratings, calibration["ratings"], calibration["good_probabilities"])
+    np.testing.assert_allclose(scores["good_probabilities"], expected)
+    assert ((scores["good_probabilities"] >= 0) & (scores["good_probabilities"] <= 1)).all()
+
+
+def test_explain_keeps_cf_scores(trained):
+    recommender = load_cf(trained)
+    profile = trained["logs"].iloc[0][["baby_id", "age_month", "sex", "height_cm", "weight_kg",
+                                       "allergy_risk", "lactose_sensitivity", "feed_ml_per_intake"]].to_dict()
+    plain = recommender.rank(profile, top_n=3)
+    explained = recommender.rank(profile, top_n=3, explain=True)
+
+    np.testing.assert_array_equal(plain["top"], explained["top"])
+    np.testing.assert_allclose(plain["good_probabilities"], explained["good_probabilities"])
+    # Factor-scored formulas have no neighbors to show
+    assert recommender.explain(profile, explained) == []
+
+    single = recommender.predict_single(profile, formula_id=1, explain=True)
+    assert single["source"] == "cf"
+    assert "explanation" not in single
+
+    cold = {key: value for key, value in profile.items() if key != "baby_id"}
+    ranking = recommender.rank(cold, top_n=3, explain=True)
+    assert [e["formula_id"] for e in recommender.explain(cold, ranking)] == [
+        int(recommender.catalog.formula_ids[pos]) for pos in ranking["top"]
+    ]
+
+
+def test_evaluate_cf_package_beats_baseline(trained):
+    report = evaluate_model(str(trained["model_path"]), data_dir=str(trained["data_dir"]), latency_repeats=2)
+
+    assert report["model"]["model_type"] == "matrix_factorization"
+    assert report["data"]["cf_scored_rows"] > 0
+    assert report["calibration"]["good_auc"] > report["calibration_baseline"]["good_auc"] + 0.1
+    assert report["ranking"]["ndcg@3"] > report["ranking_baseline"]["ndcg@3"]
+    assert report["classification"]["n_samples"] == report["data"]["rows"]
@@ -0,0 +1,123 @@
+"""
+Tests for the precompute job (api/services/precompute.py)
+"""
+from concurrent.futures import Future
+
+import pandas as pd
+import pytest
+
+import api.services.precompute as precompute
+from api.services.cf_recommender import load_recommender
+from api.services.precompute import CsvChangeSource, PrecomputeJob, ResultStore
+
+MODEL_PATH = "models/trained/knn_v1_legacy.pkl"
+
+
+@pytest.fixture
+def files(tmp_path):
+    logs = pd.read_csv("data/raw/feeding_logs.csv")
+    formulas = pd.read_csv("data/raw/formula_master.csv")
+    logs.to_csv(tmp_path / "feeding_logs.csv", index=False)
+    formulas.to_csv(tmp_path / "formula_master.csv", index=False)
+    return {"logs": tmp_path / "feeding_logs.csv", "formulas": tmp_path / "formula_master.csv", "dir": tmp_path}
+
+
+def make_job(files, **kwargs) -> PrecomputeJob:
+    store = ResultStore(files["dir"] / "results.sqlite")
+    return PrecomputeJob(
+        CsvChangeSource(files["logs"]), store, model_path=MODEL_PATH,
+        formula_path=str(files["formulas"]), **kwargs
+    )
+
+
+def stored_at(store: ResultStore) -> dict:
+    rows = store._connection().execute("SELECT baby_id, source_mark, updated_at FROM baby_recommendations")
+    return {baby_id: (mark, updated_at) for baby_id, mark, updated_at in rows}
+
+
+def test_result_store_upserts(tmp_path):
+    store = ResultStore(tmp_path / "results.sqlite")
+    store.put_many([(1, "v1", b'{"a": 1}', 10), (2, "v1", b'{"a": 2}', 10)])
+    store.put_many([(1, "v2", b'{"a": 3}', 11)])
+
+    assert store.count() == 2
+    assert store.get(1)[:2] == ("v2", b'{"a": 3}')
+    assert store.get(2)[:2] == ("v1", b'{"a": 2}')
+    assert store.get(3) is None
+
+
+def test_only_changed_babies_are_recomputed(files):
+    job = make_job(files, n_jobs=1, chunk_size=16)
+    try:
+        first = job.run_once()
+        assert first["babies"] == job.store.count() > 0
+        before = stored_at(job.store)
+
+        assert job.run_once()["babies"] == 0
+        assert stored_at(job.store) == before
+
+        logs = pd.read_csv(files["logs"])
+        baby_id = int(logs["baby_id"].iloc[0])
+        new_log = logs.iloc[[0]].assign(log_id=logs["log_id"].max() + 1)
+        pd.concat([logs, new_log]).to_csv(files["logs"], index=False)
+
+        assert job.run_once()["babies"] == 1
+        after = stored_at(job.store)
+        assert after[baby_id][0] == new_log["log_id"].iloc[0]
+        assert after[baby_id][1] > before[baby_id][1]
+        assert all(after[b] == before[b] for b in before if b != baby_id)
+    finally:
+        job.close()
+
+
+def test_catalog_change_recomputes_everyone(files):
+    job = make_job(files, n_jobs=1, chunk_size=64)
+    try:
+        n_babies = job.run_once()["babies"]
+        old_key = job.mark_key
+
+        formulas = pd.read_csv(files["formulas"])
+        formulas.loc[0, "formula_brand"] = "Renamed Brand"
+        formulas.to_csv(files["formulas"], index=False)
+
+        assert job.run_once()["babies"] == n_babies
+        assert job.mark_key != old_key
+        baby_id = next(iter(stored_at(job.store)))
+        assert b"Renamed Brand" in job.store.get(baby_id)[1]
+    finally:
+        job.close()
+
+
+class RecordingPool:
+    """Runs chunks inline and records how many are in flight"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    def submit(self, fn, task):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        future = Future()
+        future.set_result(fn(task))
+        return future
+
+
+def test_backpressure_caps_chunks_in_flight(files, monkeypatch):
+    monkeypatch.setattr(precompute, "_WORKER_RECOMMENDER", load_recommender(MODEL_PATH, drift_monitor=False))
+    job = make_job(files, chunk_size=5, max_pending=3)
+    pool = RecordingPool()
+    store_chunks = job._store
+
+    def store(done):
+        pool.in_flight -= len(done)
+        return store_chunks(done)
+
+    monkeypatch.setattr(job, "_pool", lambda: pool)
+    monkeypatch.setattr(job, "_store", store)
+
+    result = job.run_once()
+
+    assert result["babies"] == job.store.count() > 15
+    assert pool.peak == 3
+    assert pool.in_flight == 0
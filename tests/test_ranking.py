@@ -0,0 +1,71 @@
+"""
+Tests for top-N selection (api/services/ranking.py)
+"""
+import numpy as np
+import pytest
+
+from api.services.ranking import ranking_order, top_positions
+
+
+def full_sort_top(scores: np.ndarray, eligible: np.ndarray, k: int) -> np.ndarray:
+    """Reference: stable descending sort of the masked scores, first k"""
+    masked = np.where(eligible, scores, -np.inf)
+    return np.argsort(-masked, axis=1, kind="stable")[:, :k]
+
+
+@pytest.mark.parametrize("k", [0, 1, 3, 7, 12, 20])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_full_sort(k, seed):
+    rng = np.random.default_rng(seed)
+    # Coarse scores so rows have many ties
+    scores = np.round(rng.random((50, 12)), 1)
+    eligible = scores >= 0.3
+
+    positions = top_positions(scores, eligible, k)
+
+    assert positions.shape == (50, min(k, 12))
+    np.testing.assert_array_equal(positions, full_sort_top(scores, eligible, k))
+
+
+def test_eligible_prefix_is_the_thresholded_ranking():
+    rng = np.random.default_rng(3)
+    scores = rng.random((200, 30))
+    min_good_prob = 0.7
+    eligible = scores >= min_good_prob
+    k = 5
+
+    positions = top_positions(scores, eligible, k)
+    n_eligible = eligible.sum(axis=1)
+
+    for row in range(len(scores)):
+        # Eligible positions by descending score, as a list filter + sort would give
+        kept = [p for p in np.argsort(-scores[row], kind="stable") if scores[row, p] >= min_good_prob][:k]
+        prefix = positions[row, :min(k, n_eligible[row])]
+        assert prefix.tolist() == kept
+        assert eligible[row, prefix].all()
+        assert not eligible[row, positions[row, len(prefix):]].any()
+
+
+def test_no_eligible_positions_fall_back_to_position_order():
+    scores = np.array([[0.1, 0.2, 0.05, 0.2]])
+    eligible = np.zeros_like(scores, dtype=bool)
+
+    np.testing.assert_array_equal(top_positions(scores, eligible, 2), [[0, 1]])
+
+
+def test_ties_keep_lowest_positions():
+    scores = np.array([[0.5, 0.9, 0.5, 0.5, 0.9]])
+    eligible = np.ones_like(scores, dtype=bool)
+
+    np.testing.assert_array_equal(top_positions(scores, eligible, 3), [[1, 4, 0]])
+
+
+def test_ranking_order_prefers_adjusted_scores_and_caches():
+    ranking = {
+        "good_probabilities": np.array([0.9, 0.1, 0.5]),
+        "adjusted_scores": np.array([0.2, 0.8, 0.2]),
+    }
+    order = ranking_order(ranking)
+
+    np.testing.assert_array_equal(order, [1, 0, 2])
+    assert ranking_order(ranking) is order
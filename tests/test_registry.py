@@ -0,0 +1,139 @@
+"""
+Tests for the model registry (api/services/registry.py)
+"""
+import shutil
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.routers.recommendation as recommendation
+from api.services.registry import SPLIT_BUCKETS, ModelRegistry
+
+PROFILE = {
+    "age_month": 6,
+    "sex": "F",
+    "height_cm": 65.0,
+    "weight_kg": 7.2,
+    "allergy_risk": 0,
+    "lactose_sensitivity": 1,
+    "feed_ml_per_intake": 120,
+}
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """Two copies of the legacy package under different versions"""
+    model_dir = tmp_path_factory.mktemp("models")
+    for name in ("knn_v1_legacy", "knn_v2"):
+        shutil.copy("models/trained/knn_v1_legacy.pkl", model_dir / f"{name}.pkl")
+    return model_dir
+
+
+def make_registry(model_dir, **kwargs) -> ModelRegistry:
+    return ModelRegistry(model_dir=str(model_dir), drift_monitor=False, **kwargs)
+
+
+def test_explicit_version_wins(model_dir):
+    registry = make_registry(model_dir, split={"knn_v1_legacy": 100})
+
+    assert registry.default_model == "knn_v1_legacy"
+    assert registry.route().model_version == "knn_v1_legacy"
+    assert registry.route("knn_v2", routing_key="anyone").model_version == "knn_v2"
+
+
+def test_unknown_version_raises(model_dir):
+    registry = make_registry(model_dir)
+
+    with pytest.raises(KeyError, match="knn_v9"):
+        registry.route("knn_v9")
+    with pytest.raises(KeyError):
+        make_registry(model_dir, default_model="knn_v9")
+
+
+def test_split_is_sticky_per_routing_key(model_dir):
+    registry = make_registry(model_dir, split={"knn_v1_legacy": 70, "knn_v2": 30})
+    keys = [f"caller-{i}" for i in range(2000)]
+
+    first = [registry.route(routing_key=key).model_version for key in keys]
+    assert first == [registry.route(routing_key=key).model_version for key in keys]
+
+    expected = [
+        "knn_v1_legacy" if zlib.crc32(key.encode("utf-8")) % SPLIT_BUCKETS < 7000 else "knn_v2"
+        for key in keys
+    ]
+    assert first == expected
+    assert 0.65 < first.count("knn_v1_legacy") / len(keys) < 0.75
+    assert registry.split_weights() == [("knn_v1_legacy", 0.7), ("knn_v2", 0.3)]
+
+
+class HeldExecutor:
+    """Queues shadow jobs without running them"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args in jobs:
+            fn(*args)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_shadow_drops_when_queue_is_full(model_dir):
+    registry = make_registry(model_dir, shadow_model="knn_v2", shadow_max_pending=2)
+    executor = HeldExecutor()
+    registry._shadow_executor = executor
+    primary = registry.default
+    ranking = primary.rank(PROFILE)
+
+    queued = [registry.shadow(primary, [PROFILE], [ranking]) for _ in range(4)]
+    assert queued == [True, True, False, False]
+    assert registry.shadow_stats.to_dict()["skipped"] == 2
+
+    executor.run_all()
+    stats = registry.shadow_stats.to_dict()
+    assert stats["scored"] == 2
+    # Same package under both names: the shadow agrees exactly
+    assert stats["top1_agreement"] == 1.0
+    assert registry.shadow(primary, [PROFILE], [ranking]) is True
+    # The shadow model itself is never shadowed
+    assert registry.shadow(registry.models["knn_v2"], [PROFILE], [ranking]) is False
+
+
+def test_version_header_routes_http_requests(model_dir, monkeypatch):
+    monkeypatch.setattr(recommendation, "registry", make_registry(model_dir))
+    app = FastAPI()
+    app.include_router(recommendation.router)
+    client = TestClient(app)
+
+    response = client.post("/api/v1/recommend", json=PROFILE, headers={"X-Model-Version": "knn_v2"})
+    assert response.status_code == 200
+    assert response.json()["model_version"] == "knn_v2"
+
+    assert client.post("/api/v1/recommend", json=PROFILE).json()["model_version"] == "knn_v1_legacy"
+
+    response = client.post("/api/v1/recommend", json=PROFILE, headers={"X-Model-Version": "knn_v9"})
+    assert response.status_code == 400
+    assert "knn_v9" in response.json()["detail"]
+
+
+def test_metrics_json_nests_models(model_dir, monkeypatch):
+    from api.main import app
+
+    registry = ModelRegistry(model_dir=str(model_dir), drift_monitor=True)
+    monkeypatch.setattr(recommendation, "registry", registry)
+    registry.default.rank(PROFILE)
+
+    metrics = TestClient(app).get("/metrics", params={"format": "json"}).json()
+
+    assert set(metrics) == {"models", "prediction_log"}
+    assert set(metrics["models"]) == {"knn_v1_legacy", "knn_v2"}
+    assert metrics["models"]["knn_v1_legacy"]["profiles_seen"] == 1
+    assert metrics["prediction_log"] is None
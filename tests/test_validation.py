@@ -0,0 +1,119 @@
+"""
+Tests for feeding log validation (src/data/validation.py)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.validation import check_profiles, validate_feeding_logs
+
+FORMULA_IDS = [1, 2, 3]
+
+
+def make_logs(n: int = 4) -> pd.DataFrame:
+    """Valid feeding logs with distinct content"""
+    return pd.DataFrame({
+        "log_id": np.arange(1, n + 1),
+        "baby_id": np.arange(1, n + 1),
+        "age_month": [3, 0, 6, 12][:n],
+        "sex": ["M", "F", "M", "F"][:n],
+        "height_cm": [56.5, 50.8, 66.0, 74.2][:n],
+        "weight_kg": [5.3, 3.5, 7.9, 9.1][:n],
+        "allergy_risk": [1, 0, 0, 1][:n],
+        "lactose_sensitivity": [1, 0, 1, 0][:n],
+        "formula_id": [1, 2, 3, 1][:n],
+        "feed_ml_per_intake": [81, 57, 150, 200][:n],
+        "diarrhea": [0, 0, 1, 0][:n],
+        "constipation": [1, 1, 0, 0][:n],
+        "vomiting": [0, 0, 0, 1][:n],
+        "skin_rash": [0, 0, 0, 0][:n],
+        "overall_tolerance": ["moderate", "good", "poor", "good"][:n],
+    })
+
+
+def test_valid_logs_pass_unchanged():
+    logs = make_logs()
+    clean, report = validate_feeding_logs(logs, FORMULA_IDS, quarantine_path=None)
+
+    pd.testing.assert_frame_equal(clean, logs)
+    assert report["rows_in"] == report["rows_out"] == 4
+    assert report["quarantined"] == 0
+    assert report["reasons"] == {}
+
+
+@pytest.mark.parametrize("column, value, reason", [
+    ("age_month", 40, "age_month_out_of_range"),
+    ("age_month", 2.5, "age_month_not_integer"),
+    ("height_cm", 0.0, "height_cm_out_of_range"),
+    ("weight_kg", np.nan, "weight_kg_missing"),
+    ("feed_ml_per_intake", 301, "feed_ml_per_intake_out_of_range"),
+    ("sex", "X", "sex_invalid"),
+    ("formula_id", 99, "formula_id_unknown"),
+    ("overall_tolerance", "great", "overall_tolerance_invalid"),
+])
+def test_bounds_and_references(column, value, reason):
+    logs = make_logs()
+    logs[column] = logs[column].astype(object)
+    logs.loc[1, column] = value
+    clean, report = validate_feeding_logs(logs, FORMULA_IDS, quarantine_path=None)
+
+    assert report["reasons"] == {reason: 1}
+    assert list(clean.index) == [0, 2, 3]
+
+
+def test_duplicate_log_id_keeps_first():
+    logs = make_logs()
+    logs.loc[2, "log_id"] = logs.loc[0, "log_id"]
+    clean, report = validate_feeding_logs(logs, FORMULA_IDS, quarantine_path=None)
+
+    assert report["reasons"] == {"log_id_duplicate": 1}
+    assert list(clean.index) == [0, 1, 3]
+
+
+def test_duplicate_content_ignores_log_id():
+    logs = pd.concat([make_logs(), make_logs().iloc[[1]]], ignore_index=True)
+    logs.loc[4, "log_id"] = 5
+    clean, report = validate_feeding_logs(logs, FORMULA_IDS, quarantine_path=None)
+
+    assert report["duplicates"] == 1
+    assert report["reasons"] == {"duplicate_row": 1}
+    assert list(clean.index) == [0, 1, 2, 3]
+
+
+def test_rejected_copy_does_not_hide_valid_duplicate():
+    logs = make_logs(3)
+    # Row 1 is rejected for its reused log_id; row 2 has the same content
+    logs.loc[1, "log_id"] = logs.loc[0, "log_id"]
+    logs.loc[2, logs.columns != "log_id"] = logs.loc[1, logs.columns != "log_id"]
+    clean, report = validate_feeding_logs(logs, FORMULA_IDS, quarantine_path=None)
+
+    assert report["reasons"] == {"log_id_duplicate": 1}
+    assert list(clean.index) == [0, 2]
+
+
+def test_quarantine_file_lists_every_reason(tmp_path):
+    logs = make_logs()
+    logs["sex"] = logs["sex"].astype(object)
+    logs.loc[3, "sex"] = "X"
+    logs.loc[3, "age_month"] = 40
+    logs.loc[1, "formula_id"] = 99
+    path = tmp_path / "quarantine.csv"
+    clean, report = validate_feeding_logs(logs, FORMULA_IDS, quarantine_path=str(path))
+
+    assert report["quarantine_path"] == str(path)
+    quarantined = pd.read_csv(path)
+    assert list(quarantined["row"]) == [1, 3]
+    assert quarantined.loc[0, "reasons"] == "formula_id_unknown"
+    assert set(quarantined.loc[1, "reasons"].split(";")) == {"age_month_out_of_range", "sex_invalid"}
+    assert list(clean.index) == [0, 2]
+
+
+def test_check_profiles_bounds():
+    profiles = make_logs()[["age_month", "sex", "height_cm", "weight_kg", "allergy_risk",
+                            "lactose_sensitivity", "feed_ml_per_intake"]]
+    assert check_profiles(profiles) == {}
+
+    profiles = profiles.assign(lactose_sensitivity=[0, 2, 1, 0])
+    checks = check_profiles(profiles)
+    assert list(checks) == ["lactose_sensitivity_out_of_range"]
+    assert checks["lactose_sensitivity_out_of_range"].tolist() == [False, True, False, False]